@@ -159,3 +159,25 @@ class CompanyProfileAdmin(admin.ModelAdmin):
 
 
     
+
+
+from .models import TarefaSegundoPlano
+
+
+@admin.register(TarefaSegundoPlano)
+class TarefaSegundoPlanoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'tipo', 'user', 'status', 'progresso', 'tentativas', 'criado_em', 'concluido_em')
+    list_filter = ('status', 'tipo')
+    search_fields = ('user__username', 'tipo')
+    readonly_fields = ('criado_em', 'iniciado_em', 'concluido_em', 'heartbeat_em', 'worker')
+
+
+from .models import PerfilRequisicao
+
+
+@admin.register(PerfilRequisicao)
+class PerfilRequisicaoAdmin(admin.ModelAdmin):
+    list_display = ('criado_em', 'metodo', 'caminho', 'status', 'solicitante', 'tenant', 'duracao_ms', 'total_consultas')
+    list_filter = ('view',)
+    search_fields = ('caminho', 'view', 'solicitante__username')
+    readonly_fields = ('criado_em', 'consultas', 'resumo')
@@ -1,26 +1,53 @@
 # accounts/context_processors.py
 
-from .models import AnuncioGlobal
-from .models import CompanyUserLink
+from .models import AnuncioGlobal, Subscription
+from .utils_contexto import contexto_do_tenant_preguicoso, obter_global, valor_do_tenant, valor_global
+
+
+@valor_global('global_announcement')
+def anuncio_ativo():
+    # O primeiro anúncio marcado como "ativo" e mais recente (graças ao 'ordering' no modelo)
+    return AnuncioGlobal.objects.filter(is_active=True).first()
+
 
 def global_announcement(request):
     """
-    Busca o anúncio global ativo mais recente e o injeta
-    no contexto de TODOS os templates.
+    Injeta o anúncio global ativo mais recente no contexto de TODOS os templates.
+    Fica em memória por alguns segundos (sem consulta a cada renderização) e é
+    descartado quando um AnuncioGlobal é salvo ou excluído.
     """
     
     # Se o usuário não estiver logado, não retorna nada
     if not request.user.is_authenticated:
         return {}
 
-    # Busca o primeiro anúncio que esteja marcado como "ativo"
-    # e que seja o mais recente (graças ao 'ordering' no modelo)
-    anuncio = AnuncioGlobal.objects.filter(is_active=True).first()
-    
     return {
-        'global_announcement': anuncio
+        'global_announcement': obter_global('global_announcement')
+    }
+
+
+@valor_do_tenant('modulos_assinatura')
+def modulos_da_assinatura(user):
+    try:
+        assinatura = user.subscription
+    except Subscription.DoesNotExist:
+        assinatura = None
+    return {
+        'financeiro': bool(assinatura and assinatura.has_financial_module),
+        'comercial': bool(assinatura and assinatura.has_commercial_module),
+        'fiscal': bool(assinatura and assinatura.has_fiscal_module),
     }
 
+
+def tenant_values(request):
+    """
+    Valores do tenant em cache (módulos da assinatura...),
+    calculados para o dono dos dados. Novos valores: @valor_do_tenant.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return contexto_do_tenant_preguicoso(request.user)
+
 # 2. <-- ADICIONE TODA A FUNÇÃO ABAIXO -->
 def employee_context(request):
     """
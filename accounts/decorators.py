@@ -25,8 +25,12 @@ def subscription_required(view_func):
         # Confiamos no 'company_link' que o Middleware já preparou.
         
         link = getattr(request, 'company_link', None)
+        contexto = getattr(request, 'tenant', None)
 
-        if link:
+        if contexto is not None:
+            # Assinatura do dono já resolvida (e em cache) pelo middleware
+            subscription_to_check = contexto.subscription
+        elif link:
             # É UM FUNCIONÁRIO (O link veio do middleware)
             subscription_to_check = link.owner.subscription
         else:
@@ -142,6 +146,9 @@ def module_access_required(module_name):
 
             # 2. Busca a assinatura (Tenta no request, no link ou no user)
             subscription = getattr(request, 'active_subscription', None)
+            contexto = getattr(request, 'tenant', None)
+            if not subscription and contexto is not None:
+                subscription = contexto.subscription
             if not subscription:
                 link = getattr(request, 'company_link', None)
                 if link:
@@ -0,0 +1,130 @@
+# accounts/management/commands/benchmark_startup.py
+"""
+Mede o custo de boot de um worker: tempo de import (python -X importtime) e
+memória (RSS máximo) de um processo novo que faz django.setup() e carrega
+todas as URLs, como um worker do gunicorn antes da primeira requisição.
+
+Falha (código de saída 1) quando um orçamento é estourado ou quando alguma
+dependência pesada volta a ser importada no boot, para rodar no CI:
+
+    python manage.py benchmark_startup --max-import-ms 1500 --max-rss-mb 120
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Só devem ser importados dentro das views/utils que os usam
+MODULOS_PESADOS = [
+    'pandas',
+    'openpyxl',
+    'reportlab',
+    'xhtml2pdf',
+    'ofxparse',
+    'stripe',
+    'requests_oauthlib',
+    'google.generativeai',
+]
+
+# Orçamentos padrão (podem vir do settings ou da linha de comando)
+ORCAMENTO_IMPORT_MS = 1500
+ORCAMENTO_RSS_MB = 120
+
+# RSS máximo do processo filho, em MB. No Linux vem de VmHWM (/proc), que é do
+# espaço de memória do processo: ru_maxrss herda o pico do processo que chamou o
+# fork/exec (ex: a suíte de testes) e mediria a memória dele. ru_maxrss fica como
+# alternativa onde não há /proc (KB no Linux, bytes no macOS).
+SCRIPT_FILHO = """
+import json, resource, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+try:
+    with open('/proc/self/status') as status:
+        linha = next(l for l in status if l.startswith('VmHWM:'))
+    rss_mb = int(linha.split()[1]) / 1024
+except (OSError, StopIteration):
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+print(json.dumps({'rss_mb': rss_mb, 'modulos': sorted(sys.modules)}))
+"""
+
+LINHA_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo de import e a memória do boot de um worker e falha se passar do orçamento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-import-ms', type=float,
+            default=getattr(settings, 'STARTUP_IMPORT_BUDGET_MS', ORCAMENTO_IMPORT_MS),
+            help='Orçamento do tempo total de import, em ms',
+        )
+        parser.add_argument(
+            '--max-rss-mb', type=float,
+            default=getattr(settings, 'STARTUP_RSS_BUDGET_MB', ORCAMENTO_RSS_MB),
+            help='Orçamento da memória (RSS máximo) do processo após o boot, em MB',
+        )
+        parser.add_argument('--repeticoes', type=int, default=3, help='Execuções (vale a mais rápida)')
+        parser.add_argument('--top', type=int, default=15, help='Quantos imports mais caros listar')
+
+    def handle(self, *args, **options):
+        medicoes = [self._medir() for _ in range(max(1, options['repeticoes']))]
+        melhor = min(medicoes, key=lambda m: m['import_ms'])
+        rss_mb = min(m['rss_mb'] for m in medicoes)
+
+        self.stdout.write(f"Tempo de import: {melhor['import_ms']:.0f}ms (orçamento {options['max_import_ms']:.0f}ms)")
+        self.stdout.write(f"RSS após o boot: {rss_mb:.1f}MB (orçamento {options['max_rss_mb']:.0f}MB)")
+        self.stdout.write('Imports mais caros (cumulativo):')
+        for nome, ms in melhor['mais_caros'][:options['top']]:
+            self.stdout.write(f'  {ms:8.1f}ms  {nome}')
+
+        problemas = []
+        if melhor['import_ms'] > options['max_import_ms']:
+            problemas.append(f"tempo de import {melhor['import_ms']:.0f}ms > {options['max_import_ms']:.0f}ms")
+        if rss_mb > options['max_rss_mb']:
+            problemas.append(f"RSS {rss_mb:.1f}MB > {options['max_rss_mb']:.0f}MB")
+        if melhor['pesados']:
+            problemas.append('dependências pesadas importadas no boot: ' + ', '.join(melhor['pesados']))
+
+        if problemas:
+            raise CommandError('Boot acima do orçamento: ' + '; '.join(problemas))
+        self.stdout.write(self.style.SUCCESS('Boot dentro do orçamento.'))
+
+    def _medir(self):
+        """ Roda o boot num processo novo e devolve tempos, RSS e módulos pesados carregados. """
+        env = os.environ.copy()
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'setup.settings')
+        processo = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', SCRIPT_FILHO],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if processo.returncode != 0:
+            raise CommandError(f'O boot falhou:\n{processo.stderr[-2000:]}')
+
+        total_us = 0
+        mais_caros = []
+        for linha in processo.stderr.splitlines():
+            encontrado = LINHA_IMPORTTIME.match(linha)
+            if not encontrado:
+                continue
+            proprio, cumulativo, recuo, nome = encontrado.groups()
+            total_us += int(proprio)
+            if len(recuo) == 1:  # import de primeiro nível (o cumulativo já inclui os filhos)
+                mais_caros.append((nome, int(cumulativo) / 1000))
+        mais_caros.sort(key=lambda item: item[1], reverse=True)
+
+        resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+        modulos = set(resultado['modulos'])
+        return {
+            'import_ms': total_us / 1000,
+            'rss_mb': resultado['rss_mb'],
+            'mais_caros': mais_caros,
+            'pesados': [m for m in MODULOS_PESADOS if m in modulos],
+        }
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+
+from accounts.utils_resumo import reconstruir_resumo
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o rollup diário (ResumoDiario) de contas a pagar/receber'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, help='Username de um usuário específico (padrão: todos)')
+
+    def handle(self, *args, **options):
+        username = options.get('user')
+
+        if username:
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                self.stdout.write(self.style.ERROR(f'Usuário "{username}" não encontrado.'))
+                return
+            total_linhas = reconstruir_resumo(user.id)
+            self.stdout.write(self.style.SUCCESS(f'Resumo de {username} reconstruído: {total_linhas} linha(s).'))
+        else:
+            total_linhas = 0
+            for user_id in User.objects.values_list('id', flat=True).iterator():
+                total_linhas += reconstruir_resumo(user_id)
+            self.stdout.write(self.style.SUCCESS(f'Resumo diário reconstruído: {total_linhas} linha(s).'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+
+from accounts.utils_saldos import recalcular_saldos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o saldo persistido (SaldoBancario) das contas bancárias a partir das contas pagas/recebidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str, help='Username de um usuário específico (padrão: todos)')
+
+    def handle(self, *args, **options):
+        username = options.get('user')
+
+        if username:
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                self.stdout.write(self.style.ERROR(f'Usuário "{username}" não encontrado.'))
+                return
+            total_bancos = recalcular_saldos(user_id=user.id)
+            self.stdout.write(self.style.SUCCESS(f'Saldos de {username} recalculados: {total_bancos} banco(s).'))
+        else:
+            total_bancos = recalcular_saldos()
+            self.stdout.write(self.style.SUCCESS(f'Saldos bancários recalculados: {total_bancos} banco(s).'))
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.utils_tarefas import executar_tarefa, identificador_worker, recuperar_travadas, reservar_proxima
+
+
+class Command(BaseCommand):
+    help = 'Executa as tarefas em segundo plano (sincronizações, exportações) da fila TarefaSegundoPlano'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Processa as tarefas prontas e sai (útil em cron/testes)')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos de espera quando a fila está vazia')
+        parser.add_argument('--max-tasks', type=int, default=0, help='Sai após N tarefas (0 = sem limite)')
+
+    def handle(self, *args, **options):
+        worker = identificador_worker()
+        executadas = 0
+        self.stdout.write(f'Worker {worker} iniciado.')
+
+        while True:
+            close_old_connections()
+            recuperadas = recuperar_travadas()
+            if recuperadas:
+                self.stdout.write(self.style.WARNING(f'{recuperadas} tarefa(s) travada(s) devolvida(s) à fila.'))
+
+            tarefa = reservar_proxima(worker)
+            if tarefa is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            tarefa = executar_tarefa(tarefa, worker)
+            executadas += 1
+            estilo = self.style.SUCCESS if tarefa.status == 'CONCLUIDA' else self.style.WARNING
+            self.stdout.write(estilo(f'{tarefa.tipo} #{tarefa.pk} (user {tarefa.user_id}): {tarefa.get_status_display()}'))
+
+            if options['max_tasks'] and executadas >= options['max_tasks']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} finalizado: {executadas} tarefa(s) executada(s).'))
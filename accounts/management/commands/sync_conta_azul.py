@@ -1,23 +1,47 @@
 
 
+import multiprocessing
 import os
+import threading
 import time
-import requests
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import StringIO
+from accounts.utils_http import requisitar
 import traceback
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db import connections
 from datetime import datetime, timedelta, date
 from django.utils import timezone
 from decimal import Decimal, InvalidOperation
 
 from accounts.models import ContaAzulCredentials as ContaAzulToken
-from accounts.models import ReceivableAccount, PayableAccount, Category, ClassificacaoAutomatica, BankAccount
+from accounts.models import ReceivableAccount, PayableAccount, Category, BankAccount
+from accounts.utils_classificacao import classificador_do_usuario
+from accounts.utils_coleta import (
+    ErroColeta, coletar_paginas, inicio_incremental, registrar_sincronizacao, repartir_limites,
+)
+from accounts.utils_resumo import resumo_em_lote
 
 CLIENT_ID = os.environ.get('CONTA_AZUL_CLIENT_ID')
 CLIENT_SECRET = os.environ.get('CONTA_AZUL_CLIENT_SECRET')
 TOKEN_URL = 'https://auth.contaazul.com/oauth2/token'
 API_BASE_URL = 'https://api-v2.contaazul.com'
+# Itens por página nas listagens; página menor que isso é a última
+TAMANHO_PAGINA = 50
+
+
+def filtro_alteracao_conta_azul(desde, ate):
+    """
+    Janela de alteração no horário local (TIME_ZONE), como no filtro da Omie:
+    formatar o datetime em UTC direto deslocaria a marca d'água em 3 horas.
+    """
+    return {
+        'data_alteracao_de': timezone.localtime(desde).strftime('%Y-%m-%dT%H:%M:%S'),
+        'data_alteracao_ate': timezone.localtime(ate).strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
 
 class Command(BaseCommand):
     help = "Sincroniza Contas (Abertas, Atrasadas e Quitadas) com Busca Dupla (Vencimento e Pagamento)."
@@ -26,18 +50,15 @@ class Command(BaseCommand):
 
     # --- SUBSTITUA A PARTIR DAQUI (Dentro da class Command) ---
 
-    def prever_classificacao(self, user, descricao, tipo):
-        # Proteção extra: se a descrição vier vazia, retorna nada imediatamente
-        if not descricao:
-            return None, None, None, None
-
-        regras = ClassificacaoAutomatica.objects.filter(user=user, tipo=tipo)
-        descricao_lower = descricao.lower()
-        
-        for regra in regras:
-            if regra.termo.lower() in descricao_lower:
-                return regra.categoria, regra.dre_area, regra.bank_account, regra.centro_custo  
-        return None, None, None, None
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completa', action='store_true',
+            help="Ignora a marca d'água e busca toda a janela de vencimentos."
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processos sincronizando tenants em paralelo (padrão: 1, um tenant por vez)'
+        )
 
     def handle(self, *args, **options):
         User = get_user_model()
@@ -47,368 +68,535 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR("Client ID ou Client Secret não configurados."))
             return
 
-        for user in User.objects.filter(is_active=True):
-            self.stdout.write(f"\n--- Sincronizando Conta Azul para: {user.username} ---")
-
-            token_obj = ContaAzulToken.objects.filter(user=user).first()
-            if not token_obj:
-                self.stdout.write(self.style.WARNING(f"Usuário {user.username} sem credenciais Conta Azul."))
-                continue
-
-            # --- Atualização de Token ---
-            access_token = token_obj.access_token
-            headers = {}
-            now = timezone.now()
-            if not token_obj.expires_at or token_obj.expires_at <= (now + timedelta(minutes=5)):
-                self.stdout.write("⚠️ Token expirado ou próximo. Tentando atualizar...")
-                if not token_obj.refresh_token:
-                    continue
-                auth = (CLIENT_ID, CLIENT_SECRET)
-                data = {"grant_type": "refresh_token", "refresh_token": token_obj.refresh_token}
+        usuarios = list(
+            User.objects.filter(is_active=True, contaazul_creds__isnull=False)
+            .order_by('id').values_list('id', flat=True)
+        )
+        workers = max(1, min(options['workers'], len(usuarios) or 1))
+
+        if workers == 1:
+            resumos = [self._executar_tenant(user_id, options['completa']) for user_id in usuarios]
+        else:
+            resumos = self._executar_em_paralelo(usuarios, workers, options['completa'])
+
+        self._imprimir_resumo(resumos)
+        self.stdout.write(self.style.SUCCESS("--- Fim do processo de sincronização ---"))
+
+    def _executar_tenant(self, user_id, completa):
+        """ Um tenant isolado: erros não interrompem os demais e o tempo é medido. """
+        inicio = time.monotonic()
+        user = get_user_model().objects.get(pk=user_id)
+        try:
+            resumo = self.sincronizar_usuario(user, completa)
+        except Exception as e:
+            self.stderr.write(self.style.ERROR(f"Erro inesperado em {user.username}: {e}"))
+            resumo = {'usuario': user.username, 'status': 'erro', 'erro': str(e)}
+        resumo['segundos'] = time.monotonic() - inicio
+        return resumo
+
+    def _executar_em_paralelo(self, usuarios, workers, completa):
+        """
+        Distribui os tenants entre processos (um tenant por vez em cada um, cada
+        processo com a sua conexão ao banco). A saída de cada tenant é impressa
+        de uma vez, quando ele termina, para não misturar linhas.
+        """
+        self.stdout.write(f"Sincronizando {len(usuarios)} tenants em {workers} processos...")
+        # As conexões do processo pai não podem ser herdadas pelos filhos (fork)
+        connections.close_all()
+
+        resumos = []
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto,
+                                 initializer=_iniciar_processo, initargs=(workers,)) as executor:
+            futuros = {executor.submit(_sincronizar_tenant, user_id, completa): user_id for user_id in usuarios}
+            for futuro in as_completed(futuros):
                 try:
-                    response = requests.post(TOKEN_URL, data=data, auth=auth)
-                    response.raise_for_status()
-                    new_token = response.json()
-                    token_obj.access_token = new_token["access_token"]
-                    token_obj.refresh_token = new_token.get("refresh_token", token_obj.refresh_token)
-                    token_obj.expires_at = timezone.now() + timedelta(seconds=new_token.get('expires_in', 3600))
-                    token_obj.save()
-                    access_token = token_obj.access_token
-                    self.stdout.write("✅ Token atualizado.")
+                    resumo, saida, erros = futuro.result()
                 except Exception as e:
-                    self.stderr.write(self.style.ERROR(f"Erro token: {e}"))
-                    continue
-
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json",
-                "User-Agent": "SistemClass/1.0"
-            }
+                    # O processo morreu (ex: falta de memória): registra e segue com os demais
+                    resumo, saida, erros = {'usuario': f"id {futuros[futuro]}", 'status': 'erro', 'erro': str(e)}, '', ''
+                self.stdout.write(saida, ending='')
+                if erros:
+                    self.stderr.write(erros, ending='')
+                resumos.append(resumo)
+        return resumos
+
+    def _imprimir_resumo(self, resumos):
+        """ Tabela por tenant, do mais lento para o mais rápido. """
+        if not resumos:
+            self.stdout.write("Nenhum tenant com credenciais Conta Azul.")
+            return
 
-            def call_api_with_retry(url, params=None):
-                for attempt in range(3):
-                    try:
-                        r = requests.get(url, headers=headers, params=params, timeout=30)
-                        if r.status_code == 429:
-                            time.sleep(5)
-                            continue
-                        if r.status_code >= 400:
-                            r.raise_for_status()
-                        return r
-                    except Exception:
-                        if attempt == 2: return None
-                        time.sleep(2)
+        self.stdout.write("\n--- Resumo por tenant ---")
+        self.stdout.write(
+            f"{'Usuário':<30} {'Status':<16} {'Modo':<12} {'Tempo':>8} {'Receber':>8} {'Pagar':>8} "
+            f"{'Req.':>6} {'Repet.':>6} {'429':>5} {'Falhas':>6}"
+        )
+        for r in sorted(resumos, key=lambda r: r.get('segundos', 0), reverse=True):
+            linha = (
+                f"{r['usuario'][:30]:<30} {r['status']:<16} {r.get('modo', '-'):<12} {r.get('segundos', 0):>7.1f}s "
+                f"{r.get('receber', 0):>8} {r.get('pagar', 0):>8} {r.get('requisicoes', 0):>6} "
+                f"{r.get('repetidas', 0):>6} {r.get('limitadas', 0):>5} {r.get('falhas', 0):>6}"
+            )
+            self.stdout.write(linha if r['status'] == 'ok' else self.style.WARNING(linha))
+
+        total = sum(r.get('segundos', 0) for r in resumos)
+        com_problema = sum(1 for r in resumos if r['status'] != 'ok')
+        self.stdout.write(f"{len(resumos)} tenants, {total:.1f}s somados, {com_problema} com problema.")
+
+    def sincronizar_usuario(self, user, completa=False):
+        """
+        Sincroniza um tenant e devolve o resumo da execução
+        (status, modo, itens processados e requisições feitas).
+        """
+        resumo = {
+            'usuario': user.username, 'status': 'ok', 'modo': '-',
+            'receber': 0, 'pagar': 0, 'requisicoes': 0, 'repetidas': 0, 'limitadas': 0, 'falhas': 0,
+        }
+        self.stdout.write(f"\n--- Sincronizando Conta Azul para: {user.username} ---")
+
+        token_obj = ContaAzulToken.objects.filter(user=user).first()
+        if not token_obj:
+            self.stdout.write(self.style.WARNING(f"Usuário {user.username} sem credenciais Conta Azul."))
+            resumo['status'] = 'sem credenciais'
+            return resumo
+
+        # --- Atualização de Token ---
+        access_token = token_obj.access_token
+        headers = {}
+        now = timezone.now()
+        if not token_obj.expires_at or token_obj.expires_at <= (now + timedelta(minutes=5)):
+            self.stdout.write("⚠️ Token expirado ou próximo. Tentando atualizar...")
+            if not token_obj.refresh_token:
+                resumo['status'] = 'erro token'
+                return resumo
+            auth = (CLIENT_ID, CLIENT_SECRET)
+            data = {"grant_type": "refresh_token", "refresh_token": token_obj.refresh_token}
+            try:
+                response = requisitar('conta_azul', 'POST', TOKEN_URL, data=data, auth=auth)
+                response.raise_for_status()
+                new_token = response.json()
+                token_obj.access_token = new_token["access_token"]
+                token_obj.refresh_token = new_token.get("refresh_token", token_obj.refresh_token)
+                token_obj.expires_at = timezone.now() + timedelta(seconds=new_token.get('expires_in', 3600))
+                token_obj.save()
+                access_token = token_obj.access_token
+                self.stdout.write("✅ Token atualizado.")
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"Erro token: {e}"))
+                resumo['status'] = 'erro token'
+                return resumo
+
+        # Regras de classificação do usuário compiladas uma vez para toda a sincronização
+        classificador = classificador_do_usuario(user)
+
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+            "User-Agent": "SistemClass/1.0"
+        }
+
+        trava_contadores = threading.Lock()
+
+        def contar_tentativa(tentativa, status):
+            # Inclui as repetições feitas dentro do requisitar (429/5xx/conexão)
+            with trava_contadores:
+                resumo['requisicoes'] += 1
+                if tentativa > 1:
+                    resumo['repetidas'] += 1
+                if status == 429:
+                    resumo['limitadas'] += 1
+
+        def call_api_with_retry(url, params=None):
+            # 429/5xx e falhas de conexão já são repetidos com backoff pelo cliente HTTP
+            try:
+                r = requisitar(
+                    'conta_azul', 'GET', url, headers=headers, params=params, timeout=30,
+                    ao_tentar=contar_tentativa,
+                )
+                r.raise_for_status()
+                return r
+            except Exception:
                 return None
-            
-            # --- [NOVO] Função auxiliar para buscar data real nas baixas ---
-            def buscar_data_real(endpoint_tipo, id_conta):
-                # endpoint_tipo deve ser 'contas-a-receber' ou 'contas-a-pagar'
+
+        def buscador(url, filtros):
+            """ Busca de uma página da listagem para coletar_paginas (roda no pool de threads). """
+            def buscar_pagina(page):
+                params = {'pagina': page, 'tamanho_pagina': TAMANHO_PAGINA}
+                params.update(filtros)
+                resp = call_api_with_retry(url, params=params)
+                if not resp:
+                    raise ErroColeta(f"Falha ao buscar a página {page}")
                 try:
-                    url_detalhe = f"{API_BASE_URL}/v1/financeiro/eventos-financeiros/{endpoint_tipo}/{id_conta}"
-                    # Reutilizamos sua função de retry para garantir a conexão
-                    resp = call_api_with_retry(url_detalhe)
-                    if resp and resp.status_code == 200:
-                        dados = resp.json()
-                        baixas = dados.get('baixas', [])
-                        if baixas:
-                            # Retorna a data da última baixa encontrada
-                            return baixas[-1].get('data_pagamento')
-                except:
-                    pass
-                return None
-            # ---------------------------------------------------------------
-
-            # --- CONFIGURAÇÃO DE DATAS ---
-            # Voltamos ao padrão seguro: Busca por vencimento com janela larga
-            # Isso pega o que venceu recentemente E o que estava atrasado (dentro de 5 dias)
-            dias_busca = 5
-            data_fim_dt = timezone.now().date()
-            data_inicio_dt = data_fim_dt - timedelta(days=dias_busca)
-            
-            data_inicio_str = data_inicio_dt.strftime('%Y-%m-%d')
-            data_fim_str = data_fim_dt.strftime('%Y-%m-%d')
-            # Pega também o futuro próximo (30 dias) para manter o financeiro previsto em dia
-            data_futura_str = (data_fim_dt + timedelta(days=30)).strftime('%Y-%m-%d')
-
-            # =========================================================================
-            # CONTAS A RECEBER
-            # =========================================================================
-            # Removemos a estratégia "Por Pagamento" pois a API não aceita.
-            # Usamos uma janela única e robusta de vencimento.
-            estrategias_receber = [
-                {
-                    'nome': 'Geral (Vencimento)',
-                    'params': {
-                        'status': ['EM_ABERTO', 'ATRASADO', 'RECEBIDO'], 
-                        'data_vencimento_de': data_inicio_str, 
-                        'data_vencimento_ate': data_futura_str
-                    }
+                    return {'pagina': page, 'itens': resp.json().get('itens', [])}
+                except ValueError:
+                    raise ErroColeta(f"Resposta inválida na página {page}")
+            return buscar_pagina
+        
+        # --- [NOVO] Função auxiliar para buscar data real nas baixas ---
+        def buscar_data_real(endpoint_tipo, id_conta):
+            # endpoint_tipo deve ser 'contas-a-receber' ou 'contas-a-pagar'
+            try:
+                url_detalhe = f"{API_BASE_URL}/v1/financeiro/eventos-financeiros/{endpoint_tipo}/{id_conta}"
+                # Reutilizamos sua função de retry para garantir a conexão
+                resp = call_api_with_retry(url_detalhe)
+                if resp and resp.status_code == 200:
+                    dados = resp.json()
+                    baixas = dados.get('baixas', [])
+                    if baixas:
+                        # Retorna a data da última baixa encontrada
+                        return baixas[-1].get('data_pagamento')
+            except:
+                pass
+            return None
+        # ---------------------------------------------------------------
+
+        # --- SINCRONIZAÇÃO INCREMENTAL ---
+        # Com marca d'água, só o que foi alterado desde a última execução bem-sucedida;
+        # sem ela (ou na reconciliação periódica), a janela de vencimentos abaixo
+        inicio_execucao = timezone.now()
+        desde = inicio_incremental(token_obj, completa)
+        falhas = 0
+
+        # --- CONFIGURAÇÃO DE DATAS ---
+        # Voltamos ao padrão seguro: Busca por vencimento com janela larga
+        # Isso pega o que venceu recentemente E o que estava atrasado (dentro de 5 dias)
+        dias_busca = 5
+        data_fim_dt = timezone.now().date()
+        data_inicio_dt = data_fim_dt - timedelta(days=dias_busca)
+        
+        data_inicio_str = data_inicio_dt.strftime('%Y-%m-%d')
+        data_fim_str = data_fim_dt.strftime('%Y-%m-%d')
+        # Pega também o futuro próximo (30 dias) para manter o financeiro previsto em dia
+        data_futura_str = (data_fim_dt + timedelta(days=30)).strftime('%Y-%m-%d')
+
+        # =========================================================================
+        # CONTAS A RECEBER
+        # =========================================================================
+        # Removemos a estratégia "Por Pagamento" pois a API não aceita.
+        # Usamos uma janela única e robusta de vencimento.
+        estrategias_receber = [
+            {
+                'nome': 'Geral (Vencimento)',
+                'params': {
+                    'status': ['EM_ABERTO', 'ATRASADO', 'RECEBIDO'], 
+                    'data_vencimento_de': data_inicio_str, 
+                    'data_vencimento_ate': data_futura_str
                 }
-            ]
-            
-            self.stdout.write("--- Buscando Contas a Receber ---")
-            
+            }
+        ]
+        if desde is not None:
             for estrategia in estrategias_receber:
-                page = 1
-                while True:
-                    url = f"{API_BASE_URL}/v1/financeiro/eventos-financeiros/contas-a-receber/buscar"
-                    params = {'pagina': page, 'tamanho_pagina': 50}
-                    params.update(estrategia['params'])
+                estrategia['nome'] = 'Alteradas (Incremental)'
+                estrategia['params'] = {
+                    'status': ['EM_ABERTO', 'ATRASADO', 'RECEBIDO'],
+                    **filtro_alteracao_conta_azul(desde, inicio_execucao)
+                }
+        
+        self.stdout.write("--- Buscando Contas a Receber ---")
+        
+        url_receber = f"{API_BASE_URL}/v1/financeiro/eventos-financeiros/contas-a-receber/buscar"
 
-                    resp = call_api_with_retry(url, params=params)
-                    if not resp: break
+        def processar_pagina_receber(pagina):
+            items = pagina['itens']
+            if not items:
+                return
+            resumo['receber'] += len(items)
 
+            self.stdout.write(f"  Processando {len(items)} itens (Pág {pagina['pagina']})...")
+
+            for conta in items:
+                try:
+                    status_ca = conta.get('status_traduzido')
+                    is_received = status_ca == 'RECEBIDO'
+                    # --- ADICIONE ESTE BLOCO DEBUG TEMPORÁRIO ---
+                    if is_received:
+                        self.stdout.write(self.style.WARNING(f"--- DEBUG JSON CONTA {conta.get('id')} ---"))
+                        self.stdout.write(str(conta)) # Vai imprimir tudo que a API mandou
+                        self.stdout.write(self.style.WARNING("-----------------------------------"))
+
+                    data_pagamento = None
+
+                    if is_received:
+                        data_pagamento = None
+                        # 1. Tenta pegar direto da listagem (rápido)
+                        baixas = conta.get('baixas', [])
+                        dt_str = baixas[0].get('data_pagamento') if baixas else (conta.get('data_pagamento') or conta.get('data_compensacao'))
+
+                        if dt_str:
+                            try: data_pagamento = datetime.strptime(dt_str, '%Y-%m-%d').date()
+                            except: data_pagamento = None
+
+                        # 2. [NOVO] Se não veio data, usa a função de busca detalhada (lento mas preciso)
+                        if not data_pagamento:
+                            dt_real_str = buscar_data_real('contas-a-receber', conta.get('id'))
+                            if dt_real_str:
+                                try: data_pagamento = datetime.strptime(dt_real_str, '%Y-%m-%d').date()
+                                except: pass
+
+                        # 3. Fallback: Se tudo falhar, usa Vencimento
+                        if not data_pagamento:
+                            venc_str = conta.get('data_vencimento')
+                            if venc_str:
+                                try: data_pagamento = datetime.strptime(venc_str, '%Y-%m-%d').date()
+                                except: data_pagamento = timezone.now().date()
+                            else:
+                                data_pagamento = timezone.now().date()
+
+                    # CORREÇÃO DO NONE: Usa 'or' para garantir string
+                    cli_data = conta.get('cliente') or {}
+                    cliente_nome = cli_data.get('nome') or 'Cliente CA V2'
+
+                    valor = Decimal(str(conta.get('total', '0.0')).replace(',', '.'))
+                    dt_venc = conta.get('data_vencimento')
+                    if not dt_venc: continue
+                    data_venc = datetime.strptime(dt_venc, '%Y-%m-%d').date()
+
+                    # 1. Blindagem
                     try:
-                        items = resp.json().get('itens', [])
-                        if not items: break
-
-                        self.stdout.write(f"  Processando {len(items)} itens (Pág {page})...")
-                        
-                        for conta in items:
-                            try:
-                                status_ca = conta.get('status_traduzido')
-                                is_received = status_ca == 'RECEBIDO'
-                                # --- ADICIONE ESTE BLOCO DEBUG TEMPORÁRIO ---
-                                if is_received:
-                                    self.stdout.write(self.style.WARNING(f"--- DEBUG JSON CONTA {conta.get('id')} ---"))
-                                    self.stdout.write(str(conta)) # Vai imprimir tudo que a API mandou
-                                    self.stdout.write(self.style.WARNING("-----------------------------------"))
-                            
-                                data_pagamento = None
-
-                                if is_received:
-                                    data_pagamento = None
-                                    # 1. Tenta pegar direto da listagem (rápido)
-                                    baixas = conta.get('baixas', [])
-                                    dt_str = baixas[0].get('data_pagamento') if baixas else (conta.get('data_pagamento') or conta.get('data_compensacao'))
-                                    
-                                    if dt_str:
-                                        try: data_pagamento = datetime.strptime(dt_str, '%Y-%m-%d').date()
-                                        except: data_pagamento = None
-                                    
-                                    # 2. [NOVO] Se não veio data, usa a função de busca detalhada (lento mas preciso)
-                                    if not data_pagamento:
-                                        dt_real_str = buscar_data_real('contas-a-receber', conta.get('id'))
-                                        if dt_real_str:
-                                            try: data_pagamento = datetime.strptime(dt_real_str, '%Y-%m-%d').date()
-                                            except: pass
-
-                                    # 3. Fallback: Se tudo falhar, usa Vencimento
-                                    if not data_pagamento:
-                                        venc_str = conta.get('data_vencimento')
-                                        if venc_str:
-                                            try: data_pagamento = datetime.strptime(venc_str, '%Y-%m-%d').date()
-                                            except: data_pagamento = timezone.now().date()
-                                        else:
-                                            data_pagamento = timezone.now().date()
-
-                                # CORREÇÃO DO NONE: Usa 'or' para garantir string
-                                cli_data = conta.get('cliente') or {}
-                                cliente_nome = cli_data.get('nome') or 'Cliente CA V2'
-                                
-                                valor = Decimal(str(conta.get('total', '0.0')).replace(',', '.'))
-                                dt_venc = conta.get('data_vencimento')
-                                if not dt_venc: continue
-                                data_venc = datetime.strptime(dt_venc, '%Y-%m-%d').date()
-                                
-                                # 1. Blindagem
-                                try:
-                                    obj_existente = ReceivableAccount.objects.get(external_id=conta.get('id'))
-                                    existe = True
-                                except ReceivableAccount.DoesNotExist:
-                                    obj_existente = None
-                                    existe = False
-
-                                # 2. Previsão (Agora segura contra None)
-                                cat_s, dre_s, bank_s, cc_s = self.prever_classificacao(user, cliente_nome, 'RECEIVABLE')
-                                cat_padrao, _ = Category.objects.get_or_create(name='Receitas de Vendas', category_type='RECEIVABLE', user=user)
-
-                                # 3. Definição
-                                if existe:
-                                    cat_final, dre_final, bank_final = obj_existente.category, obj_existente.dre_area, obj_existente.bank_account
-                                else:
-                                    cat_final = cat_s if cat_s else cat_padrao
-                                    dre_final = dre_s if dre_s else 'BRUTA'
-                                    bank_final = bank_s
-
-                                # 4. Salvar
-                                obj, created = ReceivableAccount.objects.update_or_create(
-                                    external_id=conta.get('id'),
-                                    defaults={
-                                        'user': user,
-                                        'name': cliente_nome,
-                                        'description': conta.get('descricao') or '', # Proteção contra None
-                                        'amount': valor,
-                                        'due_date': data_venc,
-                                        'is_received': is_received,
-                                        'payment_date': data_pagamento,
-                                        'category': cat_final,
-                                        'dre_area': dre_final,
-                                        'bank_account': bank_final, 
-                                        'occurrence': 'AVULSO',
-                                        'payment_method': 'BOLETO'
-                                    }
-                                    
-                                )
-                                # LOG VISUAL (LINHAS AMARELAS)
-                                acao = "Criada" if created else "Atualizada"
-                                # Se a variável do nome for 'cliente_nome' use ela, se for 'nome' troque abaixo
-                                nome_exibicao = locals().get('cliente_nome') or locals().get('nome') or 'Cliente'
-                                valor_exibicao = locals().get('valor') or locals().get('vlr') or 0
-                                
-                                self.stdout.write(self.style.WARNING(f"    -> {acao}: {nome_exibicao} | R$ {valor_exibicao}"))
-                                
-                                # 5. Smart Update
-                                if not created and obj.category.name == 'Receitas de Vendas' and cat_s:
-                                     obj.category = cat_s
-                                     obj.dre_area = dre_s or obj.dre_area
-                                     if bank_s: obj.bank_account = bank_s
-                                     obj.save()
-
-                            except Exception as e:
-                                pass # Ignora erros pontuais para não travar o loop
-
-                    except Exception:
-                         break
-                    page += 1
-                    time.sleep(0.5)
-
-            # =========================================================================
-            # CONTAS A PAGAR
-            # =========================================================================
-            estrategias_pagar = [
-                {
-                    'nome': 'Geral (Vencimento)',
-                    'params': {
-                        'status': ['EM_ABERTO', 'ATRASADO', 'RECEBIDO'], 
-                        'data_vencimento_de': data_inicio_str, 
-                        'data_vencimento_ate': data_futura_str
-                    }
+                        obj_existente = ReceivableAccount.objects.get(external_id=conta.get('id'))
+                        existe = True
+                    except ReceivableAccount.DoesNotExist:
+                        obj_existente = None
+                        existe = False
+
+                    # 2. Previsão (Agora segura contra None)
+                    cat_s, dre_s, bank_s, cc_s = classificador.prever(cliente_nome, 'RECEIVABLE')
+                    cat_padrao, _ = Category.objects.get_or_create(name='Receitas de Vendas', category_type='RECEIVABLE', user=user)
+
+                    # 3. Definição
+                    if existe:
+                        cat_final, dre_final, bank_final = obj_existente.category, obj_existente.dre_area, obj_existente.bank_account
+                    else:
+                        cat_final = cat_s if cat_s else cat_padrao
+                        dre_final = dre_s if dre_s else 'BRUTA'
+                        bank_final = bank_s
+
+                    # 4. Salvar
+                    obj, created = ReceivableAccount.objects.update_or_create(
+                        external_id=conta.get('id'),
+                        defaults={
+                            'user': user,
+                            'name': cliente_nome,
+                            'description': conta.get('descricao') or '', # Proteção contra None
+                            'amount': valor,
+                            'due_date': data_venc,
+                            'is_received': is_received,
+                            'payment_date': data_pagamento,
+                            'category': cat_final,
+                            'dre_area': dre_final,
+                            'bank_account': bank_final, 
+                            'occurrence': 'AVULSO',
+                            'payment_method': 'BOLETO'
+                        }
+
+                    )
+                    # LOG VISUAL (LINHAS AMARELAS)
+                    acao = "Criada" if created else "Atualizada"
+                    # Se a variável do nome for 'cliente_nome' use ela, se for 'nome' troque abaixo
+                    nome_exibicao = locals().get('cliente_nome') or locals().get('nome') or 'Cliente'
+                    valor_exibicao = locals().get('valor') or locals().get('vlr') or 0
+
+                    self.stdout.write(self.style.WARNING(f"    -> {acao}: {nome_exibicao} | R$ {valor_exibicao}"))
+
+                    # 5. Smart Update
+                    if not created and obj.category.name == 'Receitas de Vendas' and cat_s:
+                         obj.category = cat_s
+                         obj.dre_area = dre_s or obj.dre_area
+                         if bank_s: obj.bank_account = bank_s
+                         obj.save()
+
+                except Exception as e:
+                    pass # Ignora erros pontuais para não travar o loop
+
+        # Páginas seguintes buscadas à frente, em paralelo, até uma vir incompleta;
+        # a gravação acontece nesta thread, enquanto as próximas páginas chegam.
+        # Rollup, saldos e cache do ledger são atualizados uma vez por busca (resumo_em_lote)
+        for estrategia in estrategias_receber:
+            try:
+                with resumo_em_lote():
+                    coletar_paginas(
+                        'conta_azul', buscador(url_receber, estrategia['params']), processar_pagina_receber,
+                        ultima_pagina=lambda pagina: len(pagina['itens']) < TAMANHO_PAGINA
+                    )
+            except ErroColeta as e:
+                falhas += 1
+                self.stderr.write(self.style.ERROR(f"Busca '{estrategia['nome']}' interrompida: {e}"))
+
+        # =========================================================================
+        # CONTAS A PAGAR
+        # =========================================================================
+        estrategias_pagar = [
+            {
+                'nome': 'Geral (Vencimento)',
+                'params': {
+                    'status': ['EM_ABERTO', 'ATRASADO', 'RECEBIDO'], 
+                    'data_vencimento_de': data_inicio_str, 
+                    'data_vencimento_ate': data_futura_str
+                }
+            }
+        ]
+        if desde is not None:
+            for estrategia in estrategias_pagar:
+                estrategia['nome'] = 'Alteradas (Incremental)'
+                estrategia['params'] = {
+                    'status': ['EM_ABERTO', 'ATRASADO', 'RECEBIDO'],
+                    **filtro_alteracao_conta_azul(desde, inicio_execucao)
                 }
-            ]
 
-            self.stdout.write("--- Buscando Contas a Pagar ---")
+        self.stdout.write("--- Buscando Contas a Pagar ---")
 
-            for estrategia in estrategias_pagar:
-                page = 1
-                while True:
-                    url = f"{API_BASE_URL}/v1/financeiro/eventos-financeiros/contas-a-pagar/buscar"
-                    params = {'pagina': page, 'tamanho_pagina': 50}
-                    params.update(estrategia['params'])
+        url_pagar = f"{API_BASE_URL}/v1/financeiro/eventos-financeiros/contas-a-pagar/buscar"
 
-                    resp = call_api_with_retry(url, params=params)
-                    if not resp: break
+        def processar_pagina_pagar(pagina):
+            items = pagina['itens']
+            if not items:
+                return
+            resumo['pagar'] += len(items)
 
+            self.stdout.write(f"  Processando {len(items)} itens (Pág {pagina['pagina']})...")
+
+            for conta in items:
+                try:
+                    status_ca = conta.get('status_traduzido')
+                    is_paid = status_ca == 'RECEBIDO'
+                    data_pagamento = None
+
+                    if is_paid:
+                        data_pagamento = None
+                        # 1. Tenta pegar direto da listagem
+                        baixas = conta.get('baixas', [])
+                        dt_str = baixas[0].get('data_pagamento') if baixas else (conta.get('data_pagamento') or conta.get('data_compensacao'))
+
+                        if dt_str:
+                            try: data_pagamento = datetime.strptime(dt_str, '%Y-%m-%d').date()
+                            except: data_pagamento = None
+
+                        # 2. [NOVO] Se não veio data, usa a função de busca detalhada
+                        if not data_pagamento:
+                            # ATENÇÃO: endpoint muda para 'contas-a-pagar'
+                            dt_real_str = buscar_data_real('contas-a-pagar', conta.get('id'))
+                            if dt_real_str:
+                                try: data_pagamento = datetime.strptime(dt_real_str, '%Y-%m-%d').date()
+                                except: pass
+
+                        # 3. Fallback: Se tudo falhar, usa Vencimento
+                        if not data_pagamento:
+                            venc_str = conta.get('data_vencimento')
+                            if venc_str:
+                                try: data_pagamento = datetime.strptime(venc_str, '%Y-%m-%d').date()
+                                except: data_pagamento = timezone.now().date()
+                            else:
+                                data_pagamento = timezone.now().date()
+
+                    # CORREÇÃO DO NONE: Proteção no nome do fornecedor
+                    forn_data = conta.get('fornecedor') or {}
+                    fornecedor_nome = forn_data.get('nome') or 'Fornecedor CA V2'
+
+                    valor = Decimal(str(conta.get('total', '0.0')).replace(',', '.'))
+                    dt_venc = conta.get('data_vencimento')
+                    if not dt_venc: continue
+                    data_venc = datetime.strptime(dt_venc, '%Y-%m-%d').date()
+
+                    # 1. Blindagem
                     try:
-                        items = resp.json().get('itens', [])
-                        if not items: break
-
-                        self.stdout.write(f"  Processando {len(items)} itens (Pág {page})...")
-                        
-                        for conta in items:
-                            try:
-                                status_ca = conta.get('status_traduzido')
-                                is_paid = status_ca == 'RECEBIDO'
-                                data_pagamento = None
-
-                                if is_paid:
-                                    data_pagamento = None
-                                    # 1. Tenta pegar direto da listagem
-                                    baixas = conta.get('baixas', [])
-                                    dt_str = baixas[0].get('data_pagamento') if baixas else (conta.get('data_pagamento') or conta.get('data_compensacao'))
-                                    
-                                    if dt_str:
-                                        try: data_pagamento = datetime.strptime(dt_str, '%Y-%m-%d').date()
-                                        except: data_pagamento = None
-                                    
-                                    # 2. [NOVO] Se não veio data, usa a função de busca detalhada
-                                    if not data_pagamento:
-                                        # ATENÇÃO: endpoint muda para 'contas-a-pagar'
-                                        dt_real_str = buscar_data_real('contas-a-pagar', conta.get('id'))
-                                        if dt_real_str:
-                                            try: data_pagamento = datetime.strptime(dt_real_str, '%Y-%m-%d').date()
-                                            except: pass
-                                    
-                                    # 3. Fallback: Se tudo falhar, usa Vencimento
-                                    if not data_pagamento:
-                                        venc_str = conta.get('data_vencimento')
-                                        if venc_str:
-                                            try: data_pagamento = datetime.strptime(venc_str, '%Y-%m-%d').date()
-                                            except: data_pagamento = timezone.now().date()
-                                        else:
-                                            data_pagamento = timezone.now().date()
-                                
-                                # CORREÇÃO DO NONE: Proteção no nome do fornecedor
-                                forn_data = conta.get('fornecedor') or {}
-                                fornecedor_nome = forn_data.get('nome') or 'Fornecedor CA V2'
-
-                                valor = Decimal(str(conta.get('total', '0.0')).replace(',', '.'))
-                                dt_venc = conta.get('data_vencimento')
-                                if not dt_venc: continue
-                                data_venc = datetime.strptime(dt_venc, '%Y-%m-%d').date()
-                                
-                                # 1. Blindagem
-                                try:
-                                    obj_existente = PayableAccount.objects.get(external_id=conta.get('id'))
-                                    existe = True
-                                except PayableAccount.DoesNotExist:
-                                    obj_existente = None
-                                    existe = False
-
-                                # 2. Previsão
-                                cat_s, dre_s, bank_s, cc_s = self.prever_classificacao(user, fornecedor_nome, 'PAYABLE')
-                                cat_padrao, _ = Category.objects.get_or_create(name='Despesas Operacionais (-)', category_type='PAYABLE', user=user)
-
-                                # 3. Definição
-                                if existe:
-                                    cat_final, dre_final, bank_final = obj_existente.category, obj_existente.dre_area, obj_existente.bank_account
-                                else:
-                                    cat_final = cat_s if cat_s else cat_padrao
-                                    dre_final = dre_s if dre_s else 'OPERACIONAL'
-                                    bank_final = bank_s
-
-                                # 4. Salvar
-                                obj, created = PayableAccount.objects.update_or_create(
-                                    external_id=conta.get('id'),
-                                    defaults={
-                                        'user': user,
-                                        'name': fornecedor_nome,
-                                        'description': conta.get('descricao') or '', # Proteção contra None
-                                        'amount': valor,
-                                        'due_date': data_venc,
-                                        'is_paid': is_paid,
-                                        'payment_date': data_pagamento,
-                                        'category': cat_final,
-                                        'dre_area': dre_final,
-                                        'bank_account': bank_final,
-                                        'occurrence': 'AVULSO',
-                                        'cost_type': 'FIXO',
-                                        'payment_method': 'BOLETO'
-                                    }
-                                )
-                                # LOG VISUAL (LINHAS AMARELAS)
-                                acao = "Criada" if created else "Atualizada"
-                                # Se a variável do nome for 'fornecedor_nome' use ela, se for 'nome' troque abaixo
-                                nome_exibicao = locals().get('fornecedor_nome') or locals().get('nome') or 'Fornecedor'
-                                valor_exibicao = locals().get('valor') or locals().get('vlr') or 0
-
-                                self.stdout.write(self.style.WARNING(f"    -> {acao}: {nome_exibicao} | R$ {valor_exibicao}"))
-
-                                # 5. Smart Update
-                                if not created and obj.category.name == 'Despesas Operacionais (-)' and cat_s:
-                                    obj.category = cat_s
-                                    obj.dre_area = dre_s or obj.dre_area
-                                    if bank_s: obj.bank_account = bank_s
-                                    obj.save()
-
-                            except Exception as e:
-                                pass
-
-                    except Exception:
-                         break
-                    page += 1
-                    time.sleep(0.5)
-
-            self.stdout.write(self.style.SUCCESS(f"Sincronização concluída para {user.username}."))
-
-        self.stdout.write(self.style.SUCCESS("--- Fim do processo de sincronização ---"))
\ No newline at end of file
+                        obj_existente = PayableAccount.objects.get(external_id=conta.get('id'))
+                        existe = True
+                    except PayableAccount.DoesNotExist:
+                        obj_existente = None
+                        existe = False
+
+                    # 2. Previsão
+                    cat_s, dre_s, bank_s, cc_s = classificador.prever(fornecedor_nome, 'PAYABLE')
+                    cat_padrao, _ = Category.objects.get_or_create(name='Despesas Operacionais (-)', category_type='PAYABLE', user=user)
+
+                    # 3. Definição
+                    if existe:
+                        cat_final, dre_final, bank_final = obj_existente.category, obj_existente.dre_area, obj_existente.bank_account
+                    else:
+                        cat_final = cat_s if cat_s else cat_padrao
+                        dre_final = dre_s if dre_s else 'OPERACIONAL'
+                        bank_final = bank_s
+
+                    # 4. Salvar
+                    obj, created = PayableAccount.objects.update_or_create(
+                        external_id=conta.get('id'),
+                        defaults={
+                            'user': user,
+                            'name': fornecedor_nome,
+                            'description': conta.get('descricao') or '', # Proteção contra None
+                            'amount': valor,
+                            'due_date': data_venc,
+                            'is_paid': is_paid,
+                            'payment_date': data_pagamento,
+                            'category': cat_final,
+                            'dre_area': dre_final,
+                            'bank_account': bank_final,
+                            'occurrence': 'AVULSO',
+                            'cost_type': 'FIXO',
+                            'payment_method': 'BOLETO'
+                        }
+                    )
+                    # LOG VISUAL (LINHAS AMARELAS)
+                    acao = "Criada" if created else "Atualizada"
+                    # Se a variável do nome for 'fornecedor_nome' use ela, se for 'nome' troque abaixo
+                    nome_exibicao = locals().get('fornecedor_nome') or locals().get('nome') or 'Fornecedor'
+                    valor_exibicao = locals().get('valor') or locals().get('vlr') or 0
+
+                    self.stdout.write(self.style.WARNING(f"    -> {acao}: {nome_exibicao} | R$ {valor_exibicao}"))
+
+                    # 5. Smart Update
+                    if not created and obj.category.name == 'Despesas Operacionais (-)' and cat_s:
+                        obj.category = cat_s
+                        obj.dre_area = dre_s or obj.dre_area
+                        if bank_s: obj.bank_account = bank_s
+                        obj.save()
+
+                except Exception as e:
+                    pass
+
+        # Páginas seguintes buscadas à frente, em paralelo, até uma vir incompleta;
+        # a gravação acontece nesta thread, enquanto as próximas páginas chegam
+        for estrategia in estrategias_pagar:
+            try:
+                with resumo_em_lote():
+                    coletar_paginas(
+                        'conta_azul', buscador(url_pagar, estrategia['params']), processar_pagina_pagar,
+                        ultima_pagina=lambda pagina: len(pagina['itens']) < TAMANHO_PAGINA
+                    )
+            except ErroColeta as e:
+                falhas += 1
+                self.stderr.write(self.style.ERROR(f"Busca '{estrategia['nome']}' interrompida: {e}"))
+
+        # A marca d'água só avança quando todas as buscas chegaram ao fim
+        if not falhas:
+            registrar_sincronizacao(token_obj, inicio_execucao, completa=desde is None)
+        else:
+            resumo['status'] = 'parcial'
+
+        modo = 'completa' if desde is None else 'incremental'
+        resumo['modo'] = modo
+        resumo['falhas'] = falhas
+        self.stdout.write(self.style.SUCCESS(f"Sincronização {modo} concluída para {user.username}."))
+        return resumo
+
+
+def _iniciar_processo(workers):
+    """
+    Inicialização de cada processo do pool: descarta as conexões herdadas do pai
+    e divide os limites da Conta Azul (taxa e requisições simultâneas) entre
+    os processos, para que o total continue dentro do limite da API.
+    """
+    connections.close_all()
+    repartir_limites('conta_azul', workers)
+
+
+def _sincronizar_tenant(user_id, completa):
+    """ Roda em um processo do pool; devolve (resumo, saída, erros) do tenant. """
+    saida, erros = StringIO(), StringIO()
+    comando = Command(stdout=saida, stderr=erros, no_color=True)
+    try:
+        return comando._executar_tenant(user_id, completa), saida.getvalue(), erros.getvalue()
+    finally:
+        # Cada tenant com a sua conexão: nada fica aberto entre um tenant e outro
+        connections.close_all()
@@ -1,6 +1,7 @@
-from django.contrib.auth.models import User
 from django.utils.deprecation import MiddlewareMixin
-from accounts.models import CompanyUserLink, Subscription
+from accounts.utils_tenant import aplicar_contexto, contexto_do_tenant
+from accounts.utils_desempenho import medir, registrar_requisicao, server_timing
+from accounts.utils_perfil import deve_perfilar, perfilar
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,36 +17,65 @@ class BPOManagementMiddleware(MiddlewareMixin):
         request.is_managing = False     # É um BPO gerenciando?
         request.company_link = None     # É um funcionário? (Se sim, armazena o link)
         request.real_user = request.user # Por padrão, o usuário real é o usuário logado
+        request.tenant = None           # Contexto resolvido (utils_tenant.ContextoTenant)
 
         if not request.user.is_authenticated:
             return
 
-        # Caso 1: BPO Admin gerenciando cliente
+        # Caso 1: BPO Admin gerenciando cliente (via sessão)
+        managed_user_id = None
         if 'real_user_id' in request.session and 'managed_user_id' in request.session:
-            try:
-                real_user = User.objects.get(id=request.session['real_user_id'])
-                managed_user = User.objects.get(id=request.session['managed_user_id'])
-                
-                request.real_user = real_user   # O BPO
-                request.user = managed_user     # O Cliente
-                request.is_managing = True
-                request.company_link = None     # BPOs não são funcionários
-                return
-            except User.DoesNotExist:
-                logger.warning("Falha no BPO Middleware: Usuário não encontrado. Limpando sessão BPO.")
-                request.session.pop('real_user_id', None)
-                request.session.pop('managed_user_id', None)
-
-        # Caso 2: Funcionário vinculado a um dono
-        try:
-            # Tenta encontrar um link de funcionário para o usuário logado
-            link = CompanyUserLink.objects.select_related('owner').get(employee=request.user, is_active=True)
-            
-            request.company_link = link         # <-- A MUDANÇA IMPORTANTE
-            request.real_user = request.user    # O Funcionário
-            request.user = link.owner           # O Dono da Licença
-            # request.is_employee não é mais necessário, usamos 'company_link'
-        except CompanyUserLink.DoesNotExist:
-            # É o dono da conta logado (ou um BPO não-gerenciando)
-            # request.company_link continua None
-            pass
+            if request.session['real_user_id'] == request.user.id:
+                managed_user_id = request.session['managed_user_id']
+            else:
+                logger.warning("Falha no BPO Middleware: sessão BPO de outro usuário. Limpando sessão BPO.")
+                self._limpar_sessao_bpo(request)
+
+        # Caso 2: Funcionário vinculado a um dono (via CompanyUserLink)
+        # Os dois casos (e o dono logado) são resolvidos de uma vez e ficam em cache
+        contexto = contexto_do_tenant(request.user, managed_user_id)
+        if contexto is None:
+            logger.warning("Falha no BPO Middleware: cliente não encontrado ou não gerenciado. Limpando sessão BPO.")
+            self._limpar_sessao_bpo(request)
+            contexto = contexto_do_tenant(request.user)
+
+        aplicar_contexto(request, contexto)
+
+    @staticmethod
+    def _limpar_sessao_bpo(request):
+        request.session.pop('real_user_id', None)
+        request.session.pop('managed_user_id', None)
+
+
+class DesempenhoMiddleware:
+    """
+    Mede cada requisição (tempo total, consultas SQL e chamadas HTTP externas),
+    grava uma linha de log estruturada e devolve o cabeçalho Server-Timing.
+    Fica no início da lista para cobrir os demais middlewares e a view.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with medir() as medicao:
+            response = self.get_response(request)
+        total_ms = medicao.total_ms
+
+        response['Server-Timing'] = server_timing(medicao, total_ms)
+        registrar_requisicao(request, response, medicao, total_ms)
+        return response
+
+
+class PerfilMiddleware:
+    """
+    Profiler sob demanda: superusuários (inclusive em modo BPO) com ?_perfil=1
+    ou o cabeçalho X-Perfil têm a requisição perfilada (ver utils_perfil).
+    Fica depois do BPOManagementMiddleware, que define request.real_user.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not deve_perfilar(request):
+            return self.get_response(request)
+        return perfilar(request, self.get_response)
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def popular_resumo(apps, schema_editor):
+    # Carga inicial do rollup a partir das contas já existentes
+    ResumoDiario = apps.get_model('accounts', 'ResumoDiario')
+    modelos = (
+        ('PAYABLE', apps.get_model('accounts', 'PayableAccount'), 'is_paid'),
+        ('RECEIVABLE', apps.get_model('accounts', 'ReceivableAccount'), 'is_received'),
+    )
+    for tipo, model, campo_liquidado in modelos:
+        campos = ['user_id', 'due_date', 'dre_area', 'category_id', 'bank_account_id', campo_liquidado]
+        if tipo == 'PAYABLE':
+            campos.append('cost_type')
+        grupos = model.objects.values(*campos).annotate(total=Sum('amount'), quantidade=Count('id')).order_by()
+        ResumoDiario.objects.bulk_create(
+            (
+                ResumoDiario(
+                    user_id=g['user_id'], tipo=tipo, dia=g['due_date'], dre_area=g['dre_area'],
+                    category_id=g['category_id'], bank_account_id=g['bank_account_id'],
+                    cost_type=g.get('cost_type') or '', liquidado=g[campo_liquidado],
+                    total=g['total'] or 0, quantidade=g['quantidade'],
+                )
+                for g in grupos.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0097_alter_classificacaoautomatica_dre_area_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('PAYABLE', 'Contas a Pagar'), ('RECEIVABLE', 'Contas a Receber')], max_length=10)),
+                ('dia', models.DateField(verbose_name='Dia (Vencimento)')),
+                ('dre_area', models.CharField(choices=[('NAO_CONSTAR', 'Não constar DRE'), ('BRUTA', 'Receitas Brutas (+)'), ('DEDUCAO', 'Dedução da Receita Bruta (-)'), ('CUSTOS', 'Custos CSP/CMV (-)'), ('OPERACIONAL', 'Despesas Operacionais (-)'), ('DEPRECIACAO', 'Depreciação e Amortização (-)'), ('NAO_OPERACIONAL', 'Despesas Não Operacionais (-)'), ('RETIRADA_SOCIOS', 'Retirada de Sócios (-)'), ('APORTE_SOCIOS', 'Aporte Financeiro (+)'), ('OUTRAS_RECEITAS', 'Outras Receitas (+)'), ('TRIBUTACAO', 'IRPJ e CSLL (Tributação) (-)'), ('DISTRIBUICAO', 'Distribuição de Lucro Sócios (-)')], max_length=50)),
+                ('cost_type', models.CharField(blank=True, choices=[('FIXO', 'Fixo'), ('VARIAVEL', 'Variável')], default='', max_length=20)),
+                ('liquidado', models.BooleanField(default=False, verbose_name='Pago/Recebido')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('bank_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.bankaccount')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'indexes': [models.Index(fields=['user', 'tipo', 'dia'], name='accounts_re_user_id_7a5f7d_idx')],
+            },
+        ),
+        migrations.RunPython(popular_resumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:58
+
+import django.db.models.deletion
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def popular_saldos(apps, schema_editor):
+    # Carga inicial do saldo persistido a partir das contas já liquidadas
+    BankAccount = apps.get_model('accounts', 'BankAccount')
+    SaldoBancario = apps.get_model('accounts', 'SaldoBancario')
+    modelos = (
+        (apps.get_model('accounts', 'PayableAccount'), 'is_paid', -1),
+        (apps.get_model('accounts', 'ReceivableAccount'), 'is_received', 1),
+    )
+    movimentos = defaultdict(Decimal)
+    for model, campo_liquidado, sinal in modelos:
+        totais = (
+            model.objects.filter(bank_account__isnull=False, **{campo_liquidado: True})
+            .values('bank_account_id').annotate(total=Sum('amount')).order_by()
+        )
+        for item in totais:
+            movimentos[item['bank_account_id']] += (item['total'] or 0) * sinal
+
+    SaldoBancario.objects.bulk_create(
+        (SaldoBancario(bank_account_id=banco, movimentos=movimentos[banco])
+         for banco in BankAccount.objects.values_list('id', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0098_resumodiario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoBancario',
+            fields=[
+                ('bank_account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='saldo', serialize=False, to='accounts.bankaccount')),
+                ('movimentos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Saldo Bancário',
+                'verbose_name_plural': 'Saldos Bancários',
+            },
+        ),
+        migrations.RunPython(popular_saldos, migrations.RunPython.noop),
+    ]
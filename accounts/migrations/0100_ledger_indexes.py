@@ -0,0 +1,76 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:02
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcorrente(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY no PostgreSQL (as tabelas do ledger continuam
+    aceitando escritas durante o deploy); AddIndex comum nos demais bancos.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    # CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0099_saldobancario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcorrente(
+            model_name='classificacaoautomatica',
+            index=models.Index(fields=['user', 'tipo'], name='classif_user_tipo_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='payableaccount',
+            index=models.Index(fields=['user', 'is_paid', 'due_date'], include=('amount',), name='payable_user_paid_due_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='payableaccount',
+            index=models.Index(fields=['user', 'dre_area', 'due_date'], name='payable_user_dre_due_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='payableaccount',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['user', 'due_date'], name='payable_open_due_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='payableaccount',
+            index=models.Index(condition=models.Q(('is_paid', True)), fields=['user', 'payment_date'], name='payable_paid_paydate_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='receivableaccount',
+            index=models.Index(fields=['user', 'is_received', 'due_date'], include=('amount',), name='receiv_user_recv_due_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='receivableaccount',
+            index=models.Index(fields=['user', 'dre_area', 'due_date'], name='receiv_user_dre_due_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='receivableaccount',
+            index=models.Index(condition=models.Q(('is_received', False)), fields=['user', 'due_date'], name='receiv_open_due_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='receivableaccount',
+            index=models.Index(condition=models.Q(('is_received', True)), fields=['user', 'payment_date'], name='receiv_recv_paydate_idx'),
+        ),
+        AddIndexConcorrente(
+            model_name='venda',
+            index=models.Index(fields=['user', 'data_venda'], name='venda_user_data_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:20
+
+from django.db import migrations
+
+# (tabela, coluna) pesquisadas pela busca do ledger (accounts/utils_busca.py)
+COLUNAS_BUSCA = (
+    ('accounts_payableaccount', 'name'),
+    ('accounts_payableaccount', 'description'),
+    ('accounts_receivableaccount', 'name'),
+    ('accounts_receivableaccount', 'description'),
+    ('accounts_category', 'name'),
+)
+
+
+def _nome_indice(tabela, coluna):
+    return f"{tabela.replace('accounts_', '')}_{coluna}_trgm_idx"
+
+
+def criar_busca_postgres(apps, schema_editor):
+    # Extensões e índices só existem no PostgreSQL; no SQLite as funções são registradas em Python
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    # unaccent() não é IMMUTABLE; o wrapper permite usá-lo em índices
+    schema_editor.execute(
+        "CREATE OR REPLACE FUNCTION sc_unaccent(text) RETURNS text AS "
+        "$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$ "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+    )
+
+
+def remover_busca_postgres(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP FUNCTION IF EXISTS sc_unaccent(text)')
+
+
+def criar_indices_postgres(apps, schema_editor):
+    # CONCURRENTLY (fora de transação): o ledger continua aceitando escritas durante o build
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for tabela, coluna in COLUNAS_BUSCA:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {_nome_indice(tabela, coluna)} '
+            f'ON {tabela} USING gin (lower(sc_unaccent({coluna})) gin_trgm_ops)'
+        )
+
+
+def remover_indices_postgres(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for tabela, coluna in COLUNAS_BUSCA:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {_nome_indice(tabela, coluna)}')
+
+
+class Migration(migrations.Migration):
+
+    # CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0100_ledger_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_busca_postgres, remover_busca_postgres),
+        migrations.RunPython(criar_indices_postgres, remover_indices_postgres),
+    ]
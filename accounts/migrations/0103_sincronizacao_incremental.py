@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0102_tarefasegundoplano'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contaazulcredentials',
+            name='ultima_sincronizacao',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização'),
+        ),
+        migrations.AddField(
+            model_name='contaazulcredentials',
+            name='ultima_sincronizacao_completa',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização Completa'),
+        ),
+        migrations.AddField(
+            model_name='nibocredentials',
+            name='ultima_sincronizacao',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização'),
+        ),
+        migrations.AddField(
+            model_name='nibocredentials',
+            name='ultima_sincronizacao_completa',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização Completa'),
+        ),
+        migrations.AddField(
+            model_name='omiecredentials',
+            name='ultima_sincronizacao',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização'),
+        ),
+        migrations.AddField(
+            model_name='omiecredentials',
+            name='ultima_sincronizacao_completa',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização Completa'),
+        ),
+        migrations.AddField(
+            model_name='tinycredentials',
+            name='ultima_sincronizacao',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização'),
+        ),
+        migrations.AddField(
+            model_name='tinycredentials',
+            name='ultima_sincronizacao_completa',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Sincronização Completa'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:13
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0103_sincronizacao_incremental'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerfilRequisicao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metodo', models.CharField(max_length=10)),
+                ('caminho', models.CharField(max_length=500)),
+                ('view', models.CharField(blank=True, default='', max_length=200)),
+                ('status', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('duracao_ms', models.FloatField(default=0)),
+                ('total_consultas', models.PositiveIntegerField(default=0)),
+                ('sql_ms', models.FloatField(default=0)),
+                ('consultas', models.JSONField(blank=True, default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('resumo', models.TextField(blank=True, default='', verbose_name='Funções mais caras (cumulativo)')),
+                ('arquivo', models.FileField(blank=True, null=True, upload_to='perfis/%Y/%m/%d/')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('solicitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='perfis_solicitados', to=settings.AUTH_USER_MODEL)),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Perfil de Requisição',
+                'verbose_name_plural': 'Perfis de Requisição',
+                'ordering': ['-criado_em'],
+            },
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings 
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 
 USER_TYPE_CHOICES = (
@@ -94,6 +96,15 @@ class BankAccount(models.Model):
     def __str__(self):
         return self.bank_name
 
+    @property
+    def current_balance(self):
+        """ Saldo atual = saldo inicial + movimentos liquidados (mantidos em SaldoBancario). """
+        try:
+            movimentos = self.saldo.movimentos
+        except ObjectDoesNotExist:
+            movimentos = 0
+        return self.initial_balance + movimentos
+
 class OFXImport(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE)
@@ -134,6 +145,13 @@ class PayableAccount(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['due_date']),
+            # Telas financeiras: user + is_paid + intervalo de vencimento (amount incluso p/ somas só no índice)
+            models.Index(fields=['user', 'is_paid', 'due_date'], include=['amount'], name='payable_user_paid_due_idx'),
+            models.Index(fields=['user', 'dre_area', 'due_date'], name='payable_user_dre_due_idx'),
+            # Parcial: contas em aberto (listas, alertas de vencimento)
+            models.Index(fields=['user', 'due_date'], condition=models.Q(is_paid=False), name='payable_open_due_idx'),
+            # Parcial: fluxo realizado por data de pagamento
+            models.Index(fields=['user', 'payment_date'], condition=models.Q(is_paid=True), name='payable_paid_paydate_idx'),
         ]
 
 class ReceivableAccount(models.Model):
@@ -165,6 +183,10 @@ class ReceivableAccount(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['due_date']),
+            models.Index(fields=['user', 'is_received', 'due_date'], include=['amount'], name='receiv_user_recv_due_idx'),
+            models.Index(fields=['user', 'dre_area', 'due_date'], name='receiv_user_dre_due_idx'),
+            models.Index(fields=['user', 'due_date'], condition=models.Q(is_received=False), name='receiv_open_due_idx'),
+            models.Index(fields=['user', 'payment_date'], condition=models.Q(is_received=True), name='receiv_recv_paydate_idx'),
         ]
 
 class Estado(models.Model):
@@ -289,6 +311,12 @@ class Venda(models.Model):
     cidade = models.CharField(max_length=100, blank=False, null=False)
     estado = models.CharField(max_length=2, blank=False, null=False) # Para UFs como SP, RJ, MG
     endereco = models.CharField(max_length=255, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Dashboard comercial e listas de vendas: user + período
+            models.Index(fields=['user', 'data_venda'], name='venda_user_data_idx'),
+        ]
     
     def __str__(self):
         return f"Venda #{self.id} - {self.cliente.nome} - R$ {self.valor_total_liquido}"
@@ -739,7 +767,24 @@ class Contract(models.Model):
         return f"{self.title} - {self.client.nome}"
 
 
-class ContaAzulCredentials(models.Model):
+class MarcaSincronizacaoMixin(models.Model):
+    """
+    Sincronização incremental (utils_coleta.inicio_incremental): marca d'água da
+    última execução bem-sucedida e da última reconciliação completa.
+    """
+    ultima_sincronizacao = models.DateTimeField(null=True, blank=True, verbose_name="Última Sincronização")
+    ultima_sincronizacao_completa = models.DateTimeField(null=True, blank=True, verbose_name="Última Sincronização Completa")
+
+    class Meta:
+        abstract = True
+
+    def reiniciar_marca(self):
+        """ Descarta a marca d'água (ex: outra conta no ERP): a próxima sincronização é completa. """
+        self.ultima_sincronizacao = None
+        self.ultima_sincronizacao_completa = None
+
+
+class ContaAzulCredentials(MarcaSincronizacaoMixin):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -868,6 +913,10 @@ class ClassificacaoAutomatica(models.Model):
 
     class Meta:
         unique_together = ('user', 'termo', 'tipo')
+        indexes = [
+            # Carga das regras do usuário por tipo (classificação automática)
+            models.Index(fields=['user', 'tipo'], name='classif_user_tipo_idx'),
+        ]
         verbose_name = "Regra de Classificação"
         verbose_name_plural = "Regras de Classificação"
 
@@ -970,7 +1019,7 @@ class AsaasCredentials(models.Model):
         env = "Sandbox" if self.is_sandbox else "Produção"
         return f"Asaas ({env}) - {self.user.username}"    
 
-class OmieCredentials(models.Model):
+class OmieCredentials(MarcaSincronizacaoMixin):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='omie_creds')
     app_key = models.CharField(max_length=255, verbose_name="App Key (Chave)")
     app_secret = models.CharField(max_length=255, verbose_name="App Secret (Segredo)")
@@ -984,7 +1033,7 @@ class OmieCredentials(models.Model):
 
 # accounts/models.py
 
-class NiboCredentials(models.Model):
+class NiboCredentials(MarcaSincronizacaoMixin):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='nibo_creds')
     api_token = models.CharField(max_length=500, verbose_name="API Token")
     organization_id = models.CharField(max_length=100, verbose_name="ID da Empresa (Organization ID)", help_text="O ID da sua empresa na URL do Nibo ou API.")
@@ -999,7 +1048,7 @@ class NiboCredentials(models.Model):
 
 # Adicione ao final de accounts/models.py
 
-class TinyCredentials(models.Model):
+class TinyCredentials(MarcaSincronizacaoMixin):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='tiny_creds')
     token = models.CharField(max_length=255, verbose_name="Token da API")
     
@@ -1075,3 +1124,130 @@ class SicrediCredentials(models.Model):
         return f"Sicredi Creds - {self.user.username}"
 
 
+
+
+class ResumoDiario(models.Model):
+    """
+    Rollup diário das contas a pagar/receber: uma linha por
+    (usuário, dia, área DRE, categoria, banco, tipo de custo, liquidado).
+    Mantido por accounts/utils_resumo.py (signals + comando rebuild_resumo_diario).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=10, choices=CATEGORY_TYPES)
+    dia = models.DateField(verbose_name="Dia (Vencimento)")
+    dre_area = models.CharField(max_length=50, choices=DRE_AREAS)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.SET_NULL, null=True, blank=True)
+    cost_type = models.CharField(max_length=20, choices=COST_TYPES, blank=True, default='')
+    liquidado = models.BooleanField(default=False, verbose_name="Pago/Recebido")
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantidade = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumo Diário"
+        verbose_name_plural = "Resumos Diários"
+        indexes = [
+            models.Index(fields=['user', 'tipo', 'dia']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.dia} - R$ {self.total}"
+
+
+class SaldoBancario(models.Model):
+    """
+    Soma dos movimentos liquidados (recebidos - pagos) de uma conta bancária.
+    Atualizada de forma incremental por accounts/utils_saldos.py (signals) e
+    reconstruída pelo comando recompute_bank_balances.
+    """
+    bank_account = models.OneToOneField(BankAccount, on_delete=models.CASCADE, primary_key=True, related_name='saldo')
+    movimentos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Saldo Bancário"
+        verbose_name_plural = "Saldos Bancários"
+
+    def __str__(self):
+        return f"{self.bank_account} - R$ {self.movimentos}"
+
+
+class TarefaSegundoPlano(models.Model):
+    """
+    Fila de tarefas longas (sincronizações de ERP/extratos, exportações grandes)
+    executadas fora da requisição pelo comando run_task_worker.
+    Ver accounts/utils_tarefas.py.
+    """
+    STATUS_CHOICES = [
+        ('PENDENTE', 'Pendente'),
+        ('EXECUTANDO', 'Executando'),
+        ('CONCLUIDA', 'Concluída'),
+        ('FALHOU', 'Falhou'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tarefas')
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDENTE')
+
+    tentativas = models.PositiveIntegerField(default=0)
+    max_tentativas = models.PositiveIntegerField(default=3)
+    executar_apos = models.DateTimeField(default=timezone.now, verbose_name="Executar a partir de")
+
+    progresso = models.PositiveSmallIntegerField(default=0, verbose_name="Progresso (%)")
+    mensagem = models.CharField(max_length=255, blank=True, default='')
+    resultado = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    erro = models.TextField(blank=True, default='')
+    arquivo = models.FileField(upload_to='tarefas/%Y/%m/%d/', null=True, blank=True)
+
+    worker = models.CharField(max_length=100, blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    heartbeat_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'executar_apos'], name='tarefa_status_exec_idx'),
+            models.Index(fields=['user', 'status'], name='tarefa_user_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.get_status_display()}) - {self.user}"
+
+    @property
+    def finalizada(self):
+        return self.status in ('CONCLUIDA', 'FALHOU')
+
+
+class PerfilRequisicao(models.Model):
+    """
+    Perfil (cProfile + consultas SQL) de uma requisição, pedido por um
+    superusuário com ?_perfil=1 ou o cabeçalho X-Perfil. Ver accounts/utils_perfil.py.
+    """
+    solicitante = models.ForeignKey(User, on_delete=models.CASCADE, related_name='perfis_solicitados')
+    tenant = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    metodo = models.CharField(max_length=10)
+    caminho = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True, default='')
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    duracao_ms = models.FloatField(default=0)
+    total_consultas = models.PositiveIntegerField(default=0)
+    sql_ms = models.FloatField(default=0)
+    consultas = models.JSONField(default=list, blank=True, encoder=DjangoJSONEncoder)
+    resumo = models.TextField(blank=True, default='', verbose_name="Funções mais caras (cumulativo)")
+    arquivo = models.FileField(upload_to='perfis/%Y/%m/%d/', null=True, blank=True)
+
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Perfil de Requisição"
+        verbose_name_plural = "Perfis de Requisição"
+        ordering = ['-criado_em']
+
+    def __str__(self):
+        return f"{self.metodo} {self.caminho} ({self.duracao_ms:.0f}ms) - {self.solicitante}"
@@ -1,4 +1,4 @@
-import requests
+from .utils_http import requisitar
 import logging
 import re
 import json
@@ -53,14 +53,14 @@ class AsaasMarketplaceService:
             "incomeValue": 5000.00, 
         }
 
-        response = requests.post(f"{self.base_url}/accounts", json=payload, headers=headers, timeout=self.timeout)
+        response = requisitar('asaas', 'POST', f"{self.base_url}/accounts", json=payload, headers=headers, timeout=self.timeout)
         data = self.safe_json(response)
 
         # 2. SE JÁ EXISTIR, BUSCA E SINCRONIZA ID E API KEY
         if response.status_code == 400 and "já está em uso" in str(data):
             print(f"🔄 CNPJ já em uso. Sincronizando ID e API Key para: {cnpj_limpo}")
             url_busca = f"{self.base_url}/accounts?cpfCnpj={cnpj_limpo}" # Usando cpfCnpj como filtro de busca
-            res_busca = requests.get(url_busca, headers=headers)
+            res_busca = requisitar('asaas', 'GET', url_busca, headers=headers)
             dados_busca = self.safe_json(res_busca)
             
             if res_busca.status_code == 200 and dados_busca.get('data'):
@@ -120,7 +120,7 @@ class AsaasMarketplaceService:
             "companyType": self._get_company_type(profile.regime_tributario),
             "site": "https://sistemclass.com.br"
         }
-        requests.post(url_business, json=payload_business, headers=headers)
+        requisitar('asaas', 'POST', url_business, json=payload_business, headers=headers)
 
         # --- PASSO 2: CONFIGURAÇÃO FISCAL ---
         url = f"{self.base_url}/config/fiscal"
@@ -141,13 +141,13 @@ class AsaasMarketplaceService:
         
         try:
             # Tentativa 1: Endpoint de Subconta via API KEY
-            response = requests.post(url, data=payload, files=files, headers=headers, timeout=self.timeout)
+            response = requisitar('asaas', 'POST', url, data=payload, files=files, headers=headers, timeout=self.timeout)
             
             # SE AINDA DER 404, tentamos o Plano B (Endpoint via Master Key)
             if response.status_code == 404:
                 print("🔄 [DEBUG ASAAS] Endpoint /config/fiscal não achado. Tentando via Master Key...")
                 url_master = f"{self.base_url}/accounts/{profile.asaas_subaccount_id}/config/fiscal"
-                response = requests.post(url_master, data=payload, files=files, headers={"access_token": self.api_key}, timeout=self.timeout)
+                response = requisitar('asaas', 'POST', url_master, data=payload, files=files, headers={"access_token": self.api_key}, timeout=self.timeout)
 
             data = self.safe_json(response)
             
@@ -164,7 +164,7 @@ class AsaasMarketplaceService:
         headers = self.get_common_headers(profile.asaas_api_key)
 
         url_busca = f"{self.base_url}/customers?cpfCnpj={documento}"
-        res_busca = requests.get(url_busca, headers=headers, timeout=self.timeout)
+        res_busca = requisitar('asaas', 'GET', url_busca, headers=headers, timeout=self.timeout)
         dados = self.safe_json(res_busca)
 
         if res_busca.status_code == 200 and dados.get('data'):
@@ -183,7 +183,7 @@ class AsaasMarketplaceService:
             "notificationDisabled": True
         }
 
-        res_criacao = requests.post(f"{self.base_url}/customers", json=payload, headers=headers, timeout=self.timeout)
+        res_criacao = requisitar('asaas', 'POST', f"{self.base_url}/customers", json=payload, headers=headers, timeout=self.timeout)
         return self.safe_json(res_criacao).get('id')
 
     def emitir_nota_com_cobranca(self, profile, venda, dados_nota):
@@ -215,7 +215,7 @@ class AsaasMarketplaceService:
             }
         }
 
-        response = requests.post(url, json=payload, headers=headers, timeout=self.timeout)
+        response = requisitar('asaas', 'POST', url, json=payload, headers=headers, timeout=self.timeout)
         return self.safe_json(response)
     
     def resolve_municipal_service(self, profile, codigo_servico):
@@ -224,7 +224,7 @@ class AsaasMarketplaceService:
         headers = self.get_common_headers(profile.asaas_api_key)
         params = {"description": codigo_servico} 
         
-        res = requests.get(url, headers=headers, params=params, timeout=self.timeout)
+        res = requisitar('asaas', 'GET', url, headers=headers, params=params, timeout=self.timeout)
         dados = self.safe_json(res)
         
         if res.status_code == 200 and not dados.get('non_json_error') and dados.get('data'):
@@ -255,5 +255,5 @@ class AsaasMarketplaceService:
             }
         }
 
-        response = requests.post(url, json=payload, headers=headers, timeout=self.timeout)
+        response = requisitar('asaas', 'POST', url, json=payload, headers=headers, timeout=self.timeout)
         return self.safe_json(response)
\ No newline at end of file
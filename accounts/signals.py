@@ -0,0 +1,168 @@
+# accounts/signals.py
+
+from django.contrib.auth.models import User
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import (
+    AnuncioGlobal, BankAccount, BPOClientLink, Category, CentroCusto, ClassificacaoAutomatica, CompanyProfile,
+    CompanyUserLink, ItemVenda, MetaFaturamento, PayableAccount, ReceivableAccount, Subscription, Venda,
+)
+from .utils_busca import registrar_funcoes_sqlite
+from .utils_cache import invalidar_ledger
+from .utils_classificacao import invalidar_regras
+from .utils_contexto import invalidar_global
+from .utils_resumo import atualizar_resumo
+from .utils_saldos import MODELOS_SALDO, ajustar_saldos, contribuicao, recalcular_saldos
+from .utils_tenant import invalidar_tenant
+
+TIPO_POR_MODELO = {PayableAccount: 'PAYABLE', ReceivableAccount: 'RECEIVABLE'}
+
+
+def _estado_saldo(sender, instance):
+    """ (banco, valor, liquidado) da conta, ou None se algum campo veio adiado (.only/.defer). """
+    campo_liquidado = MODELOS_SALDO[TIPO_POR_MODELO[sender]][1]
+    campos = instance.__dict__
+    if any(c not in campos for c in ('bank_account_id', 'amount', campo_liquidado)):
+        return None
+    return campos['bank_account_id'], campos['amount'], campos[campo_liquidado]
+
+
+@receiver(post_init, sender=PayableAccount)
+@receiver(post_init, sender=ReceivableAccount)
+def guardar_chave_resumo(sender, instance, **kwargs):
+    """
+    Guarda usuário e vencimento originais para saber quais dias
+    do rollup precisam ser recalculados quando a conta mudar de data,
+    e o banco/valor/liquidação originais para ajustar o saldo bancário.
+    """
+    # Lê direto de __dict__: campos adiados (.only/.defer) não podem disparar consultas aqui
+    instance._resumo_original = (instance.__dict__.get('user_id'), instance.__dict__.get('due_date'))
+    instance._saldo_original = _estado_saldo(sender, instance)
+
+
+@receiver(post_save, sender=PayableAccount)
+@receiver(post_save, sender=ReceivableAccount)
+def atualizar_resumo_ao_salvar(sender, instance, created=False, **kwargs):
+    user_original, dia_original = getattr(instance, '_resumo_original', (None, None))
+
+    if user_original and user_original != instance.user_id:
+        atualizar_resumo(user_original, {dia_original})
+        atualizar_resumo(instance.user_id, {instance.due_date})
+    else:
+        atualizar_resumo(instance.user_id, {instance.due_date, dia_original})
+
+    instance._resumo_original = (instance.user_id, instance.due_date)
+
+    # Saldo bancário: desfaz o efeito antigo e aplica o novo
+    tipo = TIPO_POR_MODELO[sender]
+    saldo_original = None if created else getattr(instance, '_saldo_original', None)
+    saldo_novo = _estado_saldo(sender, instance)
+
+    if not created and saldo_original is None:
+        # Estado anterior desconhecido: recalcula o banco atual do zero
+        if instance.bank_account_id:
+            recalcular_saldos(bank_account_ids=[instance.bank_account_id])
+    else:
+        deltas = {}
+        antigo = contribuicao(tipo, *saldo_original) if saldo_original else None
+        novo = contribuicao(tipo, *saldo_novo) if saldo_novo else None
+        if antigo:
+            deltas[antigo[0]] = deltas.get(antigo[0], 0) - antigo[1]
+        if novo:
+            deltas[novo[0]] = deltas.get(novo[0], 0) + novo[1]
+        ajustar_saldos(deltas)
+
+    instance._saldo_original = saldo_novo
+
+
+@receiver(post_delete, sender=PayableAccount)
+@receiver(post_delete, sender=ReceivableAccount)
+def atualizar_resumo_ao_excluir(sender, instance, **kwargs):
+    atualizar_resumo(instance.user_id, {instance.due_date})
+
+    saldo = _estado_saldo(sender, instance)
+    efeito = contribuicao(TIPO_POR_MODELO[sender], *saldo) if saldo else None
+    if efeito:
+        ajustar_saldos({efeito[0]: -efeito[1]})
+
+
+@receiver(post_save, sender=Venda)
+@receiver(post_delete, sender=Venda)
+@receiver(post_save, sender=BankAccount)
+@receiver(post_delete, sender=BankAccount)
+@receiver(post_save, sender=MetaFaturamento)
+@receiver(post_delete, sender=MetaFaturamento)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CentroCusto)
+@receiver(post_delete, sender=CentroCusto)
+@receiver(post_save, sender=CompanyProfile)
+@receiver(post_delete, sender=CompanyProfile)
+def invalidar_cache_tenant(sender, instance, **kwargs):
+    """
+    Vendas, bancos e metas alteram os dashboards; nomes de categoria, centro de
+    custo e empresa aparecem nos contextos em cache: nova versão do ledger do tenant.
+    """
+    invalidar_ledger(instance.user_id)
+
+
+@receiver(post_save, sender=ItemVenda)
+@receiver(post_delete, sender=ItemVenda)
+def invalidar_cache_item_venda(sender, instance, **kwargs):
+    invalidar_ledger(instance.venda.user_id)
+
+
+@receiver(post_save, sender=ClassificacaoAutomatica)
+@receiver(post_delete, sender=ClassificacaoAutomatica)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=BankAccount)
+@receiver(post_delete, sender=CentroCusto)
+def invalidar_regras_classificacao(sender, instance, **kwargs):
+    """
+    Regras criadas/alteradas/excluídas (aprender_classificacao, admin) ou
+    categoria/banco/centro de custo removidos (SET_NULL sem signal na regra):
+    o classificador compilado do tenant precisa ser refeito.
+    """
+    invalidar_regras(instance.user_id)
+
+
+@receiver(post_save, sender=CompanyUserLink)
+@receiver(post_delete, sender=CompanyUserLink)
+def invalidar_tenant_funcionario(sender, instance, **kwargs):
+    """ Vínculo ou permissões do funcionário mudaram: refaz o contexto dele. """
+    invalidar_tenant(instance.employee_id, instance.owner_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidar_tenant_assinatura(sender, instance, **kwargs):
+    """ Assinatura mudou: refaz o contexto do dono, dos funcionários e dos BPOs que o gerenciam. """
+    invalidar_tenant(instance.user_id)
+
+
+@receiver(post_save, sender=BPOClientLink)
+@receiver(post_delete, sender=BPOClientLink)
+def invalidar_tenant_bpo(sender, instance, **kwargs):
+    invalidar_tenant(instance.bpo_admin_id, instance.client_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_tenant_usuario(sender, instance, **kwargs):
+    """ O contexto guarda o usuário efetivo (is_active, is_superuser, nome...). """
+    invalidar_tenant(instance.pk)
+
+
+@receiver(post_save, sender=AnuncioGlobal)
+@receiver(post_delete, sender=AnuncioGlobal)
+def invalidar_anuncio_global(sender, instance, **kwargs):
+    invalidar_global('global_announcement')
+
+
+@receiver(connection_created)
+def preparar_conexao_sqlite(sender, connection, **kwargs):
+    """ No SQLite, registra as funções de busca (sc_unaccent/similarity) que o PostgreSQL já tem. """
+    if connection.vendor == 'sqlite':
+        registrar_funcoes_sqlite(connection)
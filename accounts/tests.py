@@ -1,3 +1,1329 @@
-from django.test import TestCase
+import json
+import os
+import pstats
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from urllib.parse import parse_qs, urlparse
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import StreamingHttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import utils_coleta, utils_contexto, utils_desempenho
+from .models import (
+    AnuncioGlobal, BankAccount, BPOClientLink, Category, ClassificacaoAutomatica, CompanyProfile, CompanyUserLink,
+    OFXImport, OmieCredentials, PayableAccount, PerfilRequisicao, ProdutoServico, ReceivableAccount, ResumoDiario,
+    SaldoBancario, Subscription, TarefaSegundoPlano, Venda,
+)
+from .utils_busca import filtrar_por_busca, ordenar_por_relevancia
+from .utils_cache import versao_ledger
+from .utils_classificacao import aprender_classificacao, classificador_do_usuario
+from .utils_coleta import ErroColeta, coletar_paginas
+from .utils_conciliacao_ofx import conciliar_extrato_ofx
+from .utils_dre import calcular_dre_mensal, calcular_dre_periodo, calcular_ponto_equilibrio
+from .utils_exports import gerar_csv_generic, gerar_excel_generic, resposta_excel_write_only
+from .utils_extratos import ingerir_extrato
+from .utils_http import requisitar
+from .utils_importacao import importar_catalogo_planilha, importar_contas_planilha, ler_planilha_contas
+from .utils_paginacao import codificar_cursor, paginar_lancamentos
+from .utils_recorrencia import criar_serie
+from .utils_resumo import reconstruir_resumo, resumo_em_lote
+from .utils_saldos import recalcular_saldos
+from .utils_tarefas import _sincronizar_erp, identificador_worker, recuperar_travadas
+from .utils_tenant import contexto_do_tenant
+
+# Os testes de views renderizam templates com {% static %}: sem o manifest do collectstatic
+STORAGES_TESTE = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class LedgerMixin:
+    """ Compara o rollup e os saldos mantidos incrementalmente com um recálculo do zero. """
+
+    def resumo(self, user):
+        return sorted(
+            ResumoDiario.objects.filter(user=user).values_list(
+                'tipo', 'dia', 'dre_area', 'category_id', 'bank_account_id', 'cost_type', 'liquidado', 'total', 'quantidade',
+            )
+        )
+
+    def saldos(self, user):
+        return dict(SaldoBancario.objects.filter(bank_account__user=user).values_list('bank_account_id', 'movimentos'))
+
+    def assertResumoConsistente(self, user):
+        incremental = self.resumo(user)
+        reconstruir_resumo(user.id)
+        self.assertEqual(incremental, self.resumo(user))
+
+    def assertSaldosConsistentes(self, user):
+        incremental = {banco: valor for banco, valor in self.saldos(user).items() if valor}
+        recalcular_saldos(user_id=user.id)
+        self.assertEqual(incremental, {banco: valor for banco, valor in self.saldos(user).items() if valor})
+
+    def criar_conta(self, modelo=PayableAccount, **campos):
+        padrao = dict(
+            user=self.user, name='Conta', due_date=date(2025, 3, 10), amount=Decimal('100.00'),
+            payment_method='PIX', occurrence='AVULSO', dre_area='OPERACIONAL', category=self.categoria,
+            bank_account=self.banco,
+        )
+        padrao.update(campos)
+        return modelo.objects.create(**padrao)
+
+    def criar_cadastros(self, username='ledger'):
+        self.user = User.objects.create_user(username)
+        self.banco = BankAccount.objects.create(
+            user=self.user, bank_name='Banco', agency='1', account_number='1', initial_balance=0,
+        )
+        self.categoria = Category.objects.create(user=self.user, name='Geral', category_type='PAYABLE')
+
+
+def criar_assinante(username, **assinatura):
+    """ Usuário com assinatura ativa (a assinatura é criada pelo signal de User). """
+    user = User.objects.create_user(username, password='senha')
+    Subscription.objects.filter(user=user).update(status='active', valid_until=None, **assinatura)
+    return user
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'EXPLAIN dos índices exige PostgreSQL (DATABASE_URL)')
+class IndicesLedgerExplainTest(TestCase):
+    """
+    Popula um PostgreSQL local com vários clientes e garante que as consultas
+    principais dos dashboards usam os índices (nenhum Seq Scan nas tabelas do ledger).
+    Rode com: DATABASE_URL=postgres://... python manage.py test accounts
+    """
+    TOTAL_USUARIOS = 60
+    CONTAS_POR_USUARIO = 400
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(42)
+        usuarios = User.objects.bulk_create(
+            [User(username=f'explain_{i}') for i in range(cls.TOTAL_USUARIOS)]
+        )
+        hoje = date.today()
+        pagar, receber, vendas, regras, resumos = [], [], [], [], []
+        for user in usuarios:
+            for i in range(cls.CONTAS_POR_USUARIO):
+                vencimento = hoje - timedelta(days=rnd.randint(0, 720))
+                liquidado = rnd.random() < 0.7
+                comum = dict(
+                    user=user, name=f'Conta {i % 50}', due_date=vencimento,
+                    amount=Decimal(rnd.randint(100, 99999)) / 100,
+                    payment_method='PIX', occurrence='AVULSO',
+                    payment_date=vencimento if liquidado else None,
+                )
+                pagar.append(PayableAccount(dre_area=rnd.choice(['CUSTOS', 'OPERACIONAL', 'DEDUCAO']), is_paid=liquidado, **comum))
+                receber.append(ReceivableAccount(dre_area='BRUTA', is_received=liquidado, **comum))
+                resumos.append(ResumoDiario(
+                    user=user, tipo='PAYABLE', dia=vencimento, dre_area='CUSTOS',
+                    liquidado=liquidado, total=comum['amount'], quantidade=1,
+                ))
+            for i in range(50):
+                vendas.append(Venda(user=user, cidade='São Paulo', estado='SP'))
+                regras.append(ClassificacaoAutomatica(
+                    user=user, termo=f'termo {i}', dre_area='CUSTOS',
+                    tipo='PAYABLE' if i % 2 else 'RECEIVABLE',
+                ))
+        PayableAccount.objects.bulk_create(pagar, batch_size=5000)
+        ReceivableAccount.objects.bulk_create(receber, batch_size=5000)
+        ResumoDiario.objects.bulk_create(resumos, batch_size=5000)
+        Venda.objects.bulk_create(vendas, batch_size=5000)
+        ClassificacaoAutomatica.objects.bulk_create(regras, batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = usuarios[len(usuarios) // 2]
+
+    def assertSemSeqScan(self, queryset, tabela):
+        plano = queryset.explain()
+        self.assertNotIn(f'Seq Scan on {tabela}', plano, msg=plano)
+
+    def test_consultas_dos_dashboards_usam_indices(self):
+        hoje = date.today()
+        inicio = hoje - timedelta(days=90)
+        consultas = [
+            (PayableAccount.objects.filter(user=self.user, is_paid=True, due_date__range=[inicio, hoje]).values('amount'),
+             'accounts_payableaccount'),
+            (ReceivableAccount.objects.filter(user=self.user, is_received=True, due_date__range=[inicio, hoje]).values('amount'),
+             'accounts_receivableaccount'),
+            (PayableAccount.objects.filter(user=self.user, dre_area='CUSTOS', due_date__range=[inicio, hoje]),
+             'accounts_payableaccount'),
+            (PayableAccount.objects.filter(user=self.user, is_paid=False, due_date__lt=hoje).order_by('due_date'),
+             'accounts_payableaccount'),
+            (ReceivableAccount.objects.filter(user=self.user, is_received=False, due_date__lt=hoje).order_by('due_date'),
+             'accounts_receivableaccount'),
+            (PayableAccount.objects.filter(user=self.user, is_paid=True, payment_date__year=hoje.year),
+             'accounts_payableaccount'),
+            (ResumoDiario.objects.filter(user=self.user, tipo='PAYABLE', dia__range=[inicio, hoje]),
+             'accounts_resumodiario'),
+            (Venda.objects.filter(user=self.user, data_venda__range=[
+                timezone.make_aware(datetime.combine(inicio, datetime.min.time())), timezone.now()]),
+             'accounts_venda'),
+            (ClassificacaoAutomatica.objects.filter(user=self.user, tipo='PAYABLE'),
+             'accounts_classificacaoautomatica'),
+        ]
+        for queryset, tabela in consultas:
+            with self.subTest(tabela=tabela, sql=str(queryset.query)):
+                self.assertSemSeqScan(queryset, tabela)
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class TarefaProgressoTest(TestCase):
+    """ Painel de progresso das telas que acompanham uma tarefa em segundo plano (?tarefa=). """
+
+    def setUp(self):
+        self.user = criar_assinante('tarefas')
+        self.client.login(username='tarefas', password='senha')
+
+    def test_id_invalido_ou_de_outro_usuario_e_ignorado(self):
+        outro = criar_assinante('outro')
+        tarefa_alheia = TarefaSegundoPlano.objects.create(user=outro, tipo='sync_omie')
+        for valor in ('abc', '-1', '', str(tarefa_alheia.pk)):
+            with self.subTest(tarefa=valor):
+                resposta = self.client.get(reverse('contas_pagar'), {'tarefa': valor})
+                self.assertEqual(resposta.status_code, 200)
+                self.assertNotContains(resposta, 'id="tarefa-progresso"')
+
+    def test_tarefa_do_usuario_mostra_o_painel(self):
+        tarefa = TarefaSegundoPlano.objects.create(user=self.user, tipo='sync_omie')
+        resposta = self.client.get(reverse('contas_pagar'), {'tarefa': tarefa.pk})
+        self.assertContains(resposta, reverse('tarefa_status', args=[tarefa.pk]))
+
+
+class RecuperarTravadasTest(TestCase):
+    """ Tarefas sem heartbeat só voltam para a fila quando o worker não está vivo. """
+
+    def setUp(self):
+        self.user = User.objects.create_user('fila')
+        self.antigo = timezone.now() - timedelta(seconds=settings.TAREFAS_TIMEOUT + 60)
+
+    def criar_executando(self, worker, heartbeat_em):
+        return TarefaSegundoPlano.objects.create(
+            user=self.user, tipo='sync_omie', status='EXECUTANDO', worker=worker, heartbeat_em=heartbeat_em,
+        )
+
+    def test_worker_vivo_no_mesmo_host_mantem_a_tarefa(self):
+        tarefa = self.criar_executando(identificador_worker(), self.antigo)
+        self.assertEqual(recuperar_travadas(), 0)
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, 'EXECUTANDO')
+
+    def test_worker_morto_ou_de_outro_host_volta_para_a_fila(self):
+        processo = subprocess.Popen([sys.executable, '-c', 'pass'])
+        processo.wait()
+        morto = self.criar_executando(f'{socket.gethostname()}:{processo.pid}', self.antigo)
+        remoto = self.criar_executando('outro-host:123', self.antigo)
+        recente = self.criar_executando('outro-host:456', timezone.now())
+
+        self.assertEqual(recuperar_travadas(), 2)
+        status = dict(TarefaSegundoPlano.objects.values_list('pk', 'status'))
+        self.assertEqual(status[morto.pk], 'PENDENTE')
+        self.assertEqual(status[remoto.pk], 'PENDENTE')
+        self.assertEqual(status[recente.pk], 'EXECUTANDO')
+
+    def test_sincronizacao_envia_heartbeat_por_pagina(self):
+        tarefa = self.criar_executando(identificador_worker(), self.antigo)
+        heartbeats = []
+
+        def sincronizar(user, forcar_completa=False):
+            def processar_pagina(numero):
+                heartbeats.append(TarefaSegundoPlano.objects.get(pk=tarefa.pk).heartbeat_em)
+
+            coletar_paginas('teste', lambda numero: numero, processar_pagina, total_paginas=lambda dados: 3)
+            return {'pagar_novos': 0, 'receber_novos': 0, 'pagar_atualizados': 0, 'receber_atualizados': 0}
+
+        _sincronizar_erp(tarefa, 'Teste', sincronizar)
+        tarefa.refresh_from_db()
+        # Cada página lê o heartbeat deixado pela anterior
+        self.assertEqual(len(heartbeats), 3)
+        self.assertGreater(heartbeats[1], self.antigo)
+        self.assertIn('3 páginas', tarefa.mensagem)
+
+
+class ResumoDiarioTest(LedgerMixin, TestCase):
+    """ O rollup diário mantido pelos signals bate com a reconstrução a partir das contas. """
+
+    def setUp(self):
+        self.criar_cadastros()
+
+    def test_criar_editar_pagar_excluir(self):
+        pagar = self.criar_conta()
+        receber = self.criar_conta(ReceivableAccount, dre_area='BRUTA', amount=Decimal('250.00'))
+        self.assertResumoConsistente(self.user)
+
+        pagar.amount = Decimal('80.00')
+        pagar.due_date = date(2025, 4, 2)
+        pagar.save()
+        self.assertResumoConsistente(self.user)
+
+        pagar.is_paid = True
+        pagar.payment_date = date(2025, 4, 2)
+        pagar.save()
+        receber.is_received = True
+        receber.save()
+        self.assertResumoConsistente(self.user)
+
+        pagar.delete()
+        self.assertResumoConsistente(self.user)
+        receber.delete()
+        self.assertEqual(self.resumo(self.user), [])
+
+    def test_resumo_em_lote_recalcula_uma_vez(self):
+        with CaptureQueriesContext(connection) as consultas:
+            with resumo_em_lote():
+                for dia in range(1, 21):
+                    self.criar_conta(due_date=date(2025, 5, dia), is_paid=True, payment_date=date(2025, 5, dia))
+        apagados = [q for q in consultas.captured_queries if q['sql'].startswith('DELETE FROM "accounts_resumodiario"')]
+        self.assertEqual(len(apagados), 1)
+        self.assertResumoConsistente(self.user)
+
+    def test_sincronizacao_omie_atualiza_rollup_em_lote(self):
+        from .utils_omie import sincronizar_omie_completo
+
+        OmieCredentials.objects.create(user=self.user, app_key='k', app_secret='s')
+        registros = [
+            {
+                'codigo_lancamento_omie': 1000 + dia, 'descricao': f'Fornecedor {dia}', 'valor_documento': 10 * dia,
+                'data_vencimento': f'{dia:02d}/06/2025', 'status_titulo': 'PAGO', 'data_pagamento': f'{dia:02d}/06/2025',
+            }
+            for dia in range(1, 11)
+        ]
+
+        def omie_request(endpoint, call, creds, params):
+            if call == 'ListarContasPagar':
+                return {'total_de_paginas': 1, 'conta_pagar_cadastro': registros}
+            return {'total_de_paginas': 1, 'conta_receber_cadastro': []}
+
+        with mock.patch('accounts.utils_omie.omie_request', side_effect=omie_request):
+            with CaptureQueriesContext(connection) as consultas:
+                resultado = sincronizar_omie_completo(self.user)
+        self.assertEqual(resultado['pagar_novos'], 10)
+        apagados = [q for q in consultas.captured_queries if q['sql'].startswith('DELETE FROM "accounts_resumodiario"')]
+        self.assertEqual(len(apagados), 1)
+        self.assertResumoConsistente(self.user)
+        self.assertSaldosConsistentes(self.user)
+
+
+class _ServidorPaginas(BaseHTTPRequestHandler):
+    """
+    API paginada de teste: GET /?pagina=N devolve {"pagina": N, "total": TOTAL}.
+    Páginas em `limitadas` respondem 429 na primeira vez; em `lentas`, demoram;
+    em `com_erro`, respondem 500 (depois do atraso de `lentas`, se houver).
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        servidor = self.server
+        pagina = int(parse_qs(urlparse(self.path).query)['pagina'][0])
+        with servidor.trava:
+            servidor.pedidos.append(pagina)
+            servidor.ativos += 1
+            servidor.max_ativos = max(servidor.max_ativos, servidor.ativos)
+            limitar = pagina in servidor.limitadas and servidor.pedidos.count(pagina) == 1
+        try:
+            time.sleep(servidor.lentas.get(pagina, 0.02))
+            if limitar:
+                self._responder(429, {}, {'Retry-After': '0'})
+            elif pagina in servidor.com_erro:
+                self._responder(500, {'erro': pagina})
+            else:
+                self._responder(200, {'pagina': pagina, 'total': servidor.total})
+        finally:
+            with servidor.trava:
+                servidor.ativos -= 1
+
+    def _responder(self, status, corpo, cabecalhos=None):
+        conteudo = json.dumps(corpo).encode()
+        self.send_response(status)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def log_message(self, *args):
+        pass
+
+
+class ColetarPaginasServidorLocalTest(SimpleTestCase):
+    """ coletar_paginas + requisitar contra um servidor HTTP local (porta efêmera). """
+    PROVEDOR = 'teste_local'
+    CONCORRENCIA = 3
+    tentativas = 2
+
+    def setUp(self):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), _ServidorPaginas)
+        self.servidor.trava = threading.Lock()
+        self.servidor.pedidos = []
+        self.servidor.ativos = self.servidor.max_ativos = 0
+        self.servidor.total = 10
+        self.tentativas_feitas = []
+        self.servidor.limitadas, self.servidor.lentas, self.servidor.com_erro = set(), {}, set()
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+
+        limites = mock.patch.multiple(
+            utils_coleta,
+            CONCORRENCIA_PROVEDOR={self.PROVEDOR: self.CONCORRENCIA},
+            REQUISICOES_POR_SEGUNDO={self.PROVEDOR: 1000},
+        )
+        limites.start()
+        self.addCleanup(limites.stop)
+        utils_coleta._limites.pop(self.PROVEDOR, None)
+        self.addCleanup(utils_coleta._limites.pop, self.PROVEDOR, None)
+
+    def buscar_pagina(self, numero):
+        resposta = requisitar(
+            self.PROVEDOR, 'GET', f'http://127.0.0.1:{self.servidor.server_port}/',
+            params={'pagina': numero}, tentativas=self.tentativas,
+            ao_tentar=lambda tentativa, status: self.tentativas_feitas.append((numero, tentativa, status)),
+        )
+        if resposta.status_code != 200:
+            raise ErroColeta(f'página {numero}: HTTP {resposta.status_code}')
+        return resposta.json()
+
+    def coletar(self):
+        processadas = []
+        total = coletar_paginas(
+            self.PROVEDOR, self.buscar_pagina, lambda dados: processadas.append(dados['pagina']),
+            total_paginas=lambda dados: dados['total'],
+        )
+        return total, processadas
+
+    def test_todas_as_paginas_uma_vez_com_429_e_pagina_lenta(self):
+        self.servidor.limitadas = {3}
+        self.servidor.lentas = {5: 0.3}
+
+        total, processadas = self.coletar()
+
+        self.assertEqual(total, 10)
+        self.assertEqual(processadas[0], 1)
+        self.assertEqual(sorted(processadas), list(range(1, 11)))
+        # Ordem de chegada: a página lenta é gravada depois das que chegaram antes dela
+        self.assertLess(processadas.index(6), processadas.index(5))
+        # O 429 foi repetido pelo requisitar, avisado a quem contabiliza, e a página só foi gravada uma vez
+        self.assertEqual(self.servidor.pedidos.count(3), 2)
+        self.assertEqual([t for t in self.tentativas_feitas if t[0] == 3], [(3, 1, 429), (3, 2, 200)])
+        self.assertEqual(len(self.tentativas_feitas), 11)
+        self.assertLessEqual(self.servidor.max_ativos, self.CONCORRENCIA)
+        self.assertGreater(self.servidor.max_ativos, 1)
+
+    def test_primeiro_erro_interrompe_a_coleta(self):
+        self.tentativas = 1
+        self.servidor.total = 50
+        self.servidor.com_erro = {4, 6}
+        self.servidor.lentas = {6: 0.3}
+
+        with self.assertRaisesMessage(ErroColeta, 'página 4'):
+            self.coletar()
+        # A janela não avança depois do erro: o resto das páginas não chega a ser pedido
+        self.assertLess(max(self.servidor.pedidos), 20)
+
+
+class FluxoAnaliticoCacheTest(LedgerMixin, TestCase):
+    """ A matriz do fluxo analítico em cache é invalidada por escritas no ledger. """
+
+    def setUp(self):
+        cache.clear()
+        self.criar_cadastros()
+        self.request = types.SimpleNamespace(user=self.user)
+
+    def fluxo(self):
+        from relatorios.views import _processar_dados_fluxo
+        return _processar_dados_fluxo(self.request, 2025, 3, 'mensal', 'previsto')
+
+    def test_nova_conta_invalida_a_matriz(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_conta()
+        self.assertEqual(self.fluxo()['total_despesas_ano'], Decimal('100.00'))
+
+        with self.assertNumQueries(0):
+            self.fluxo()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.criar_conta(amount=Decimal('50.00'))
+        self.assertEqual(self.fluxo()['total_despesas_ano'], Decimal('150.00'))
+
+
+class SerieRecorrenteTest(LedgerMixin, TestCase):
+    """ criar_serie grava as parcelas em lote sem deixar rollup e saldos desatualizados. """
+
+    def setUp(self):
+        self.criar_cadastros()
+
+    def test_serie_a_partir_de_parcela_paga(self):
+        conta = self.criar_conta(
+            occurrence='RECORRENTE', amount=Decimal('99.99'), due_date=date(2025, 1, 31),
+            is_paid=True, payment_date=date(2025, 1, 31),
+        )
+        parcelas = criar_serie(conta, 4)
+
+        serie = PayableAccount.objects.filter(recurrence_group_id=conta.recurrence_group_id).order_by('recurrence_index')
+        self.assertEqual(len(parcelas), 3)
+        self.assertEqual(
+            list(serie.values_list('recurrence_index', 'due_date', 'amount', 'is_paid')),
+            [
+                (1, date(2025, 1, 31), Decimal('99.99'), True),
+                (2, date(2025, 2, 28), Decimal('99.99'), False),
+                (3, date(2025, 3, 31), Decimal('99.99'), False),
+                (4, date(2025, 4, 30), Decimal('99.99'), False),
+            ],
+        )
+        self.assertResumoConsistente(self.user)
+        self.assertSaldosConsistentes(self.user)
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class SincronizacaoIncrementalTest(TestCase):
+    """ Marca d'água das sincronizações de ERP. """
+
+    def test_filtro_conta_azul_usa_horario_local(self):
+        from .management.commands.sync_conta_azul import filtro_alteracao_conta_azul
+
+        desde = datetime(2025, 3, 10, 15, 0, tzinfo=dt_timezone.utc)
+        filtro = filtro_alteracao_conta_azul(desde, desde + timedelta(hours=1))
+        self.assertEqual(filtro, {
+            'data_alteracao_de': '2025-03-10T12:00:00',
+            'data_alteracao_ate': '2025-03-10T13:00:00',
+        })
+
+    def test_sincronizacao_completa_pela_tela(self):
+        user = criar_assinante('erp')
+        OmieCredentials.objects.create(user=user, app_key='k', app_secret='s')
+        self.client.force_login(user)
+
+        self.client.post(reverse('importar_ofx'), {'sync_omie': '1'})
+        self.client.post(reverse('importar_ofx'), {'sync_omie': '1', 'forcar_completa': '1'})
+
+        self.assertEqual(
+            list(TarefaSegundoPlano.objects.filter(user=user, tipo='sync_omie').order_by('pk').values_list('parametros', flat=True)),
+            [{}, {'forcar_completa': True}],
+        )
+
+    def test_troca_de_credenciais_reinicia_a_marca(self):
+        user = criar_assinante('erp2')
+        agora = timezone.now()
+        OmieCredentials.objects.create(
+            user=user, app_key='k', app_secret='s', ultima_sincronizacao=agora, ultima_sincronizacao_completa=agora,
+        )
+        self.client.force_login(user)
+
+        self.client.post(reverse('configurar_omie'), {'app_key': 'outra', 'app_secret': 's'})
+
+        creds = OmieCredentials.objects.get(user=user)
+        self.assertEqual((creds.app_key, creds.ultima_sincronizacao, creds.ultima_sincronizacao_completa), ('outra', None, None))
+
+
+class RepartirLimitesTest(SimpleTestCase):
+    """ Pools de processos dividem taxa e concorrência do provedor entre si. """
+
+    def test_divide_taxa_e_concorrencia(self):
+        with mock.patch.multiple(
+            utils_coleta,
+            CONCORRENCIA_PROVEDOR={'conta_azul': 4},
+            REQUISICOES_POR_SEGUNDO={'conta_azul': 4},
+            _limites={},
+        ):
+            utils_coleta.repartir_limites('conta_azul', 2)
+            self.assertEqual(utils_coleta.CONCORRENCIA_PROVEDOR['conta_azul'], 2)
+            self.assertEqual(utils_coleta.REQUISICOES_POR_SEGUNDO['conta_azul'], 2)
+
+            semaforo, limite = utils_coleta.limites_do_provedor('conta_azul')
+            self.assertTrue(semaforo.acquire(blocking=False))
+            self.assertTrue(semaforo.acquire(blocking=False))
+            self.assertFalse(semaforo.acquire(blocking=False))
+            self.assertEqual(limite.intervalo, 0.5)
+
+            # Nunca abaixo de uma requisição simultânea por processo
+            utils_coleta.repartir_limites('conta_azul', 8)
+            self.assertEqual(utils_coleta.CONCORRENCIA_PROVEDOR['conta_azul'], 1)
+
+
+class IndicesLedgerTest(TestCase):
+    """ Os índices do ledger existem no banco (qualquer backend), com as colunas declaradas no modelo. """
+    INDICES = {
+        PayableAccount: [
+            'payable_user_paid_due_idx', 'payable_user_dre_due_idx', 'payable_open_due_idx', 'payable_paid_paydate_idx',
+        ],
+        ReceivableAccount: [
+            'receiv_user_recv_due_idx', 'receiv_user_dre_due_idx', 'receiv_open_due_idx', 'receiv_recv_paydate_idx',
+        ],
+        ClassificacaoAutomatica: ['classif_user_tipo_idx'],
+        Venda: ['venda_user_data_idx'],
+    }
+
+    def test_indices_existem_no_banco(self):
+        for modelo, nomes in self.INDICES.items():
+            declarados = {indice.name: indice for indice in modelo._meta.indexes}
+            with connection.cursor() as cursor:
+                restricoes = connection.introspection.get_constraints(cursor, modelo._meta.db_table)
+            for nome in nomes:
+                with self.subTest(indice=nome):
+                    self.assertIn(nome, declarados)
+                    self.assertIn(nome, restricoes)
+                    self.assertTrue(restricoes[nome]['index'])
+                    colunas = [modelo._meta.get_field(campo).column for campo in declarados[nome].fields]
+                    self.assertEqual(restricoes[nome]['columns'][:len(colunas)], colunas)
+
+
+class BenchmarkStartupTest(SimpleTestCase):
+    """ O boot de um worker fica dentro do orçamento de tempo/memória, sem dependências pesadas. """
+
+    def test_boot_dentro_do_orcamento(self):
+        saida = StringIO()
+        # Levanta CommandError se o orçamento (settings/padrões do comando) for estourado
+        call_command('benchmark_startup', repeticoes=1, stdout=saida)
+        self.assertIn('Boot dentro do orçamento.', saida.getvalue())
+
+
+class ImportacaoPlanilhaTest(LedgerMixin, TestCase):
+    """ Importação de contas por planilha: contagens, duplicidades e erros por linha. """
+
+    def setUp(self):
+        self.criar_cadastros()
+
+    def importar(self, linhas, tipo='PAYABLE'):
+        import pandas as pd
+        return importar_contas_planilha(self.user, ler_planilha_contas(pd.DataFrame(linhas), tipo), tipo)
+
+    def test_contagens_e_erros_por_linha(self):
+        self.criar_conta(name='Aluguel', due_date=date(2025, 3, 5), amount=Decimal('1500.00'))
+        resultado = self.importar([
+            {'Nome': 'Energia', 'Vencimento': '10/03/2025', 'Valor': '320,50', 'Forma de pagamento': 'Crédito',
+             'Banco': 'banco', 'Status': 'Pago'},
+            {'Nome': 'Aluguel', 'Vencimento': '05/03/2025', 'Valor': '1500'},
+            {'Nome': 'Internet', 'Vencimento': '12/03/2025', 'Valor': '99,90', 'Forma de pagamento': 'Transferência bancária'},
+            {'Nome': '', 'Vencimento': '12/03/2025', 'Valor': '10'},
+            {'Nome': 'Água', 'Vencimento': '31/02/2025', 'Valor': '80'},
+            {'Nome': 'Energia', 'Vencimento': '10/03/2025', 'Valor': '320,50'},
+        ])
+
+        self.assertEqual(resultado['importados'], 1)
+        self.assertEqual(resultado['duplicados'], 2)
+        self.assertEqual(sorted(resultado['falhas']), [
+            "Linha 4: Payment method: Valor 'Transferência bancária' não é uma opção válida.",
+            'Linha 5: Nome em branco.',
+            'Linha 6: Formato de data de vencimento inválido.',
+        ])
+
+        energia = PayableAccount.objects.get(user=self.user, name='Energia')
+        self.assertEqual(
+            (energia.amount, energia.payment_method, energia.is_paid, energia.payment_date, energia.bank_account),
+            (Decimal('320.50'), 'CREDITO', True, date(2025, 3, 10), self.banco),
+        )
+        self.assertResumoConsistente(self.user)
+        self.assertSaldosConsistentes(self.user)
+
+
+class ContextoTemplatesTest(TestCase):
+    """ Context processors em cache: anúncio global e valores do tenant. """
+
+    def setUp(self):
+        cache.clear()
+        utils_contexto._globais_memoria.clear()
+        self.user = criar_assinante('contexto', has_commercial_module=True, has_fiscal_module=False)
+        self.request = types.SimpleNamespace(user=self.user)
+
+    def anuncio(self):
+        from .context_processors import global_announcement
+        return global_announcement(self.request)['global_announcement']
+
+    def test_anuncio_em_memoria_invalidado_apos_o_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            AnuncioGlobal.objects.create(mensagem='primeiro', is_active=True)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.anuncio().mensagem, 'primeiro')
+            self.anuncio()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AnuncioGlobal.objects.create(mensagem='segundo', is_active=True)
+            # Antes do commit, quem renderiza continua vendo (e guardando) o valor em memória
+            self.assertEqual(self.anuncio().mensagem, 'primeiro')
+        self.assertEqual(self.anuncio().mensagem, 'segundo')
+
+    def test_modulos_da_assinatura_invalidados_na_mudanca(self):
+        from .context_processors import tenant_values
+
+        def modulos():
+            return dict(tenant_values(self.request)['modulos_assinatura'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(modulos(), {'financeiro': True, 'comercial': True, 'fiscal': False})
+        with self.assertNumQueries(0):
+            modulos()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            assinatura = Subscription.objects.get(user=self.user)
+            assinatura.has_fiscal_module = True
+            assinatura.save()
+        # Próxima requisição: usuário carregado de novo
+        self.request.user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(modulos()['fiscal'])
+
+
+class SaldoBancarioTest(LedgerMixin, TestCase):
+    """ Saldos persistidos pelos signals batem com o recálculo a partir das contas. """
+
+    def setUp(self):
+        self.criar_cadastros()
+        self.outro_banco = BankAccount.objects.create(
+            user=self.user, bank_name='Outro', agency='2', account_number='2', initial_balance=Decimal('50.00'),
+        )
+
+    def saldo(self, banco):
+        return BankAccount.objects.select_related('saldo').get(pk=banco.pk).current_balance
+
+    def test_criar_editar_pagar_excluir(self):
+        pagar = self.criar_conta(is_paid=True, payment_date=date(2025, 3, 10))
+        receber = self.criar_conta(ReceivableAccount, dre_area='BRUTA', amount=Decimal('400.00'))
+        self.assertEqual(self.saldo(self.banco), Decimal('-100.00'))
+        self.assertSaldosConsistentes(self.user)
+
+        receber.is_received = True
+        receber.payment_date = date(2025, 3, 11)
+        receber.save()
+        pagar.amount = Decimal('120.00')
+        pagar.save()
+        self.assertEqual(self.saldo(self.banco), Decimal('280.00'))
+        self.assertSaldosConsistentes(self.user)
+
+        # Troca de banco e estorno
+        pagar.bank_account = self.outro_banco
+        pagar.save()
+        receber.is_received = False
+        receber.save()
+        self.assertEqual(self.saldo(self.banco), Decimal('0'))
+        self.assertEqual(self.saldo(self.outro_banco), Decimal('-70.00'))
+        self.assertSaldosConsistentes(self.user)
+
+        pagar.delete()
+        self.assertEqual(self.saldo(self.outro_banco), Decimal('50.00'))
+        self.assertSaldosConsistentes(self.user)
+
+    def test_comando_recompute_bank_balances_repara(self):
+        self.criar_conta(is_paid=True, payment_date=date(2025, 3, 10))
+        SaldoBancario.objects.filter(bank_account=self.banco).update(movimentos=Decimal('999'))
+
+        call_command('recompute_bank_balances', user=self.user.username, stdout=StringIO())
+
+        self.assertEqual(self.saldo(self.banco), Decimal('-100.00'))
+
+
+class ConciliacaoOfxTest(LedgerMixin, TestCase):
+    """ Conciliação em lote do OFX: conta existente liquidada, transações novas e reimportação ignorada. """
+
+    def setUp(self):
+        self.criar_cadastros()
+        self.categoria_receber = Category.objects.create(user=self.user, name='Receitas', category_type='RECEIVABLE')
+
+    def transacao(self, fitid, valor, memo, dia):
+        return types.SimpleNamespace(id=fitid, amount=Decimal(valor), memo=memo, date=datetime(2025, 3, dia, 12))
+
+    def conciliar(self, transacoes):
+        ofx = OFXImport.objects.create(user=self.user, bank_account=self.banco, bank_name='Banco', file='extrato.ofx')
+        return conciliar_extrato_ofx(self.user, ofx, self.banco, transacoes, self.categoria, self.categoria_receber)
+
+    def test_concilia_cria_e_ignora_duplicadas(self):
+        aberta = self.criar_conta(name='Energia Eletrica', amount=Decimal('150.00'), bank_account=None)
+        extrato = [
+            self.transacao('F1', '-150.00', 'PAGAMENTO PIX ENERGIA ELETRICA', 11),
+            self.transacao('F2', '500.00', 'PIX RECEBIDO CLIENTE FULANO', 12),
+            self.transacao('F3', '-30.00', 'TARIFA PACOTE', 12),
+        ]
+
+        self.assertEqual(self.conciliar(extrato), {'novos': 2, 'ignorados': 0, 'conciliados': 1})
+
+        aberta.refresh_from_db()
+        self.assertEqual(
+            (aberta.is_paid, aberta.payment_date, aberta.fitid, aberta.bank_account_id),
+            (True, date(2025, 3, 11), 'F1', self.banco.pk),
+        )
+        self.assertEqual(PayableAccount.objects.filter(user=self.user).count(), 2)
+        recebida = ReceivableAccount.objects.get(user=self.user, fitid='F2')
+        self.assertEqual((recebida.amount, recebida.is_received, recebida.category), (Decimal('500.00'), True, self.categoria_receber))
+        self.assertResumoConsistente(self.user)
+        self.assertSaldosConsistentes(self.user)
+        self.assertEqual(self.banco.current_balance, Decimal('320.00'))
+
+        # O mesmo extrato de novo: nada é criado ou conciliado
+        self.assertEqual(self.conciliar(extrato), {'novos': 0, 'ignorados': 3, 'conciliados': 0})
+        self.assertEqual(PayableAccount.objects.filter(user=self.user).count(), 2)
+
+    def test_consultas_nao_crescem_com_o_extrato(self):
+        def consultas(quantidade, inicio):
+            extrato = [self.transacao(f'N{inicio + i}', '-10.00', f'COMPRA LOJA {i}', 1 + i % 5) for i in range(quantidade)]
+            with CaptureQueriesContext(connection) as capturadas:
+                self.conciliar(extrato)
+            return len(capturadas)
+
+        consultas(5, 0)  # cria o SaldoBancario e carrega as regras
+        # 40 linhas cabem num único INSERT mesmo no limite de parâmetros do SQLite
+        self.assertEqual(consultas(5, 100), consultas(40, 200))
+
+
+class ClassificadorTest(LedgerMixin, TestCase):
+    """ Prioridade das regras compiladas e invalidação do classificador do tenant. """
+
+    def setUp(self):
+        cache.clear()
+        self.criar_cadastros()
+        self.outro_banco = BankAccount.objects.create(
+            user=self.user, bank_name='Outro', agency='2', account_number='2', initial_balance=0,
+        )
+        self.categorias = {
+            nome: Category.objects.create(user=self.user, name=nome, category_type='PAYABLE')
+            for nome in ('Transporte', 'Viagem', 'Uber outro banco', 'Uber sem banco')
+        }
+
+    def regra(self, termo, categoria, bank_account=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ClassificacaoAutomatica.objects.create(
+                user=self.user, termo=termo, categoria=self.categorias[categoria], dre_area='OPERACIONAL',
+                tipo='PAYABLE', bank_account=bank_account,
+            )
+
+    def classificar(self, descricao, bank_account=None):
+        categoria = classificador_do_usuario(self.user).prever(descricao, 'PAYABLE', bank_account)[0]
+        return categoria.name if categoria else None
+
+    def test_prioridade_banco_termo_mais_longo_e_pk(self):
+        self.regra('uber', 'Transporte')
+        self.regra('uber trip', 'Viagem')
+        self.assertEqual(self.classificar('PIX UBER TRIP SP'), 'Viagem')
+        self.assertEqual(self.classificar('Uber eats'), 'Transporte')
+        self.assertIsNone(self.classificar('Padaria'))
+        self.assertEqual(classificador_do_usuario(self.user).prever('uber', 'RECEIVABLE')[0], None)
+
+        # Regra da mesma conta bancária vence mesmo com termo mais curto; a de outro banco fica por último
+        self.regra('ube', 'Uber outro banco', bank_account=self.outro_banco)
+        self.assertEqual(self.classificar('PIX UBER TRIP SP', self.outro_banco), 'Uber outro banco')
+        self.assertEqual(self.classificar('PIX UBER TRIP SP', self.banco), 'Viagem')
+
+        # Empate em banco e tamanho: a regra mais antiga (menor pk)
+        self.regra('trip', 'Uber sem banco')
+        self.regra('Trip', 'Transporte')
+        self.assertEqual(self.classificar('trip', self.banco), 'Uber sem banco')
+
+    def test_alteracoes_invalidam_o_classificador(self):
+        regra = self.regra('cemig', 'Transporte')
+        self.assertEqual(self.classificar('CEMIG energia'), 'Transporte')
+        with self.assertNumQueries(0):
+            self.classificar('CEMIG energia')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            aprender_classificacao(self.user, 'cemig', self.categorias['Viagem'], 'OPERACIONAL', 'PAYABLE')
+        self.assertEqual(self.classificar('CEMIG energia'), 'Viagem')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            regra.delete()
+        self.assertIsNone(self.classificar('CEMIG energia'))
+
+
+class IngestaoExtratoTest(LedgerMixin, TestCase):
+    """ Motor único dos extratos via API: importação, reimportação pelo external_id e conciliação. """
+
+    def setUp(self):
+        self.criar_cadastros()
+        self.categoria_receber = Category.objects.create(user=self.user, name='Vendas', category_type='RECEIVABLE')
+
+    def item(self, external_id, tipo, valor, dia, nome):
+        return {
+            'external_id': external_id, 'tipo': tipo, 'date': date(2025, 3, dia), 'amount': Decimal(valor),
+            'name': nome, 'description': nome, 'classificar': nome,
+        }
+
+    def ingerir(self, itens, conciliar=False):
+        return ingerir_extrato(
+            self.user, self.banco, itens, 'Banco', conciliar=conciliar,
+            categorias_padrao={'PAYABLE': self.categoria, 'RECEIVABLE': self.categoria_receber},
+        )
+
+    def test_importa_e_ignora_reimportacao(self):
+        itens = [
+            self.item('E1', 'PAYABLE', '80.00', 10, 'Tarifa'),
+            self.item('E2', 'RECEIVABLE', '300.00', 11, 'Pix recebido'),
+            self.item('E2', 'RECEIVABLE', '300.00', 11, 'Pix recebido'),  # repetido no mesmo extrato
+        ]
+        self.assertEqual(self.ingerir(itens), {'importados': 2, 'duplicados': 1, 'conciliados': 0})
+
+        paga = PayableAccount.objects.get(user=self.user, external_id='E1')
+        self.assertEqual((paga.is_paid, paga.payment_date, paga.category), (True, date(2025, 3, 10), self.categoria))
+        self.assertResumoConsistente(self.user)
+        self.assertSaldosConsistentes(self.user)
+
+        self.assertEqual(self.ingerir(itens), {'importados': 0, 'duplicados': 3, 'conciliados': 0})
+        self.assertEqual(PayableAccount.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(ReceivableAccount.objects.filter(user=self.user).count(), 1)
+
+    def test_concilia_a_conta_de_vencimento_mais_proximo(self):
+        distante = self.criar_conta(name='Aluguel', amount=Decimal('200.00'), due_date=date(2025, 3, 8), bank_account=None)
+        proxima = self.criar_conta(name='Aluguel', amount=Decimal('200.00'), due_date=date(2025, 3, 11), bank_account=None)
+        fora_da_janela = self.criar_conta(name='Aluguel', amount=Decimal('200.00'), due_date=date(2025, 3, 20), bank_account=None)
+
+        resultado = self.ingerir([self.item('E9', 'PAYABLE', '200.00', 12, 'Pix aluguel')], conciliar=True)
+
+        self.assertEqual(resultado, {'importados': 0, 'duplicados': 0, 'conciliados': 1})
+        for conta in (distante, proxima, fora_da_janela):
+            conta.refresh_from_db()
+        self.assertEqual(
+            (proxima.is_paid, proxima.payment_date, proxima.external_id, proxima.bank_account_id),
+            (True, date(2025, 3, 12), 'E9', self.banco.pk),
+        )
+        self.assertFalse(distante.is_paid or fora_da_janela.is_paid)
+        self.assertResumoConsistente(self.user)
+        self.assertSaldosConsistentes(self.user)
+
+
+class ContextoTenantTest(TestCase):
+    """ Contexto do tenant em cache: reaproveitado sem consultas e refeito quando vínculo ou assinatura mudam. """
+
+    def setUp(self):
+        cache.clear()
+        self.dono = criar_assinante('dono')
+        self.funcionario = User.objects.create_user('funcionario')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.link = CompanyUserLink.objects.create(owner=self.dono, employee=self.funcionario)
+
+    def contexto(self):
+        return contexto_do_tenant(User.objects.get(pk=self.funcionario.pk))
+
+    def test_vinculo_e_assinatura_invalidam_o_contexto(self):
+        contexto = self.contexto()
+        self.assertEqual((contexto.user.pk, contexto.company_link.pk), (self.dono.pk, self.link.pk))
+        self.assertEqual(contexto.subscription.status, 'active')
+
+        funcionario = User.objects.get(pk=self.funcionario.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(contexto_do_tenant(funcionario).user.pk, self.dono.pk)
+
+        # Assinatura do dono cancelada: o contexto do funcionário enxerga a mudança
+        with self.captureOnCommitCallbacks(execute=True):
+            assinatura = Subscription.objects.get(user=self.dono)
+            assinatura.status = 'canceled'
+            assinatura.save()
+        self.assertEqual(self.contexto().subscription.status, 'canceled')
+
+        # Vínculo desativado: o funcionário volta a ser o próprio tenant
+        with self.captureOnCommitCallbacks(execute=True):
+            self.link.is_active = False
+            self.link.save()
+        contexto = self.contexto()
+        self.assertEqual((contexto.user.pk, contexto.company_link), (self.funcionario.pk, None))
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class DesempenhoMiddlewareTest(TestCase):
+    """ Cabeçalho Server-Timing, log estruturado e buffer de requisições lentas. """
+
+    def setUp(self):
+        self.user = criar_assinante('medido')
+        self.client.force_login(self.user)
+
+    @override_settings(DESEMPENHO_LIMITE_CONSULTAS=1)
+    def test_server_timing_log_e_requisicao_lenta(self):
+        with self.assertLogs('accounts.utils_desempenho', 'INFO') as logs:
+            resposta = self.client.get(reverse('contas_pagar'))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertRegex(
+            resposta['Server-Timing'],
+            r'^total;dur=[\d.]+, sql;dur=[\d.]+;desc="[1-9]\d* consultas", http;dur=0\.0;desc="0 chamadas"$',
+        )
+        registro = json.loads(logs.records[-1].getMessage().split(' ', 1)[1])
+        self.assertEqual(
+            (registro['view'], registro['status'], registro['usuario'], registro['tenant'], registro['http_chamadas']),
+            ('contas_pagar', 200, 'medido', self.user.pk, 0),
+        )
+        self.assertEqual(utils_desempenho.requisicoes_lentas()[0], registro)
+
+
+class BuscaLedgerTest(LedgerMixin, TestCase):
+    """ Busca sem acentos/maiúsculas e ordenação por similaridade de trigramas. """
+
+    def setUp(self):
+        self.criar_cadastros()
+
+    def nomes(self, queryset):
+        return list(queryset.values_list('name', flat=True))
+
+    def test_acentos_nos_dois_sentidos(self):
+        self.criar_conta(name='Conta de agua')
+        self.criar_conta(name='ÁGUA Mineral')
+        self.criar_conta(name='Energia')
+        contas = PayableAccount.objects.filter(user=self.user).order_by('id')
+
+        self.assertEqual(self.nomes(filtrar_por_busca(contas, 'Água')), ['Conta de agua', 'ÁGUA Mineral'])
+        self.assertEqual(self.nomes(filtrar_por_busca(contas, 'agua')), ['Conta de agua', 'ÁGUA Mineral'])
+        # Categoria também entra nos campos padrão
+        self.assertEqual(len(filtrar_por_busca(contas, 'gerál')), 3)
+
+    def test_mais_parecido_primeiro(self):
+        self.criar_conta(name='Cemig Distribuição Energia Elétrica')
+        self.criar_conta(name='Cemig')
+        self.criar_conta(name='Cemig Energia')
+        contas = filtrar_por_busca(PayableAccount.objects.filter(user=self.user), 'cemig', campos=('name',))
+
+        self.assertEqual(
+            self.nomes(ordenar_por_relevancia(contas, 'cemig')),
+            ['Cemig', 'Cemig Energia', 'Cemig Distribuição Energia Elétrica'],
+        )
+
+    def test_funcoes_registradas_em_conexao_nova(self):
+        nova = connections.create_connection('default')
+        try:
+            with nova.cursor() as cursor:
+                cursor.execute("SELECT sc_unaccent('Água'), similarity('cemig', 'Cemig')")
+                self.assertEqual(cursor.fetchone(), ('agua', 1.0))
+        finally:
+            nova.close()
+
+
+class PaginacaoKeysetTest(LedgerMixin, TestCase):
+    """ Cursor das listagens de contas: próxima/anterior/última, empates no vencimento e fallback do Paginator. """
+
+    def setUp(self):
+        cache.clear()
+        self.criar_cadastros()
+        # Vencimentos repetidos: o desempate pelo id decide a ordem dentro do mesmo dia
+        dias = [10, 10, 10, 11, 11, 12, 12, 12, 13]
+        self.ordem = [self.criar_conta(name=f'Conta {i}', due_date=date(2025, 3, dia)).pk for i, dia in enumerate(dias)]
+        self.contas = PayableAccount.objects.filter(user=self.user).order_by('due_date')
+
+    def pagina(self, **parametros):
+        request = RequestFactory().get('/contas/', parametros)
+        request.user = self.user
+        pagina, total = paginar_lancamentos(request, self.contas, 'contas_pagar', 4)
+        return pagina, total
+
+    def ids(self, pagina):
+        return [conta.pk for conta in pagina]
+
+    def test_proxima_anterior_e_ultima(self):
+        primeira, total = self.pagina()
+        self.assertEqual(total, Decimal('900.00'))
+        self.assertEqual((self.ids(primeira), primeira.has_previous(), primeira.has_next()), (self.ordem[:4], False, True))
+
+        segunda, _ = self.pagina(cursor=primeira.cursor_proximo)
+        terceira, _ = self.pagina(cursor=segunda.cursor_proximo)
+        self.assertEqual(self.ids(segunda), self.ordem[4:8])
+        self.assertEqual((self.ids(terceira), terceira.has_next()), (self.ordem[8:], False))
+
+        # Voltando a partir do primeiro registro da terceira página
+        de_volta, _ = self.pagina(cursor=terceira.cursor_anterior)
+        self.assertEqual((self.ids(de_volta), de_volta.has_previous(), de_volta.has_next()), (self.ordem[4:8], True, True))
+        inicio, _ = self.pagina(cursor=de_volta.cursor_anterior)
+        self.assertEqual((self.ids(inicio), inicio.has_previous()), (self.ordem[:4], False))
+
+        ultima, _ = self.pagina(cursor=primeira.cursor_ultima)
+        self.assertEqual((self.ids(ultima), ultima.has_previous(), ultima.has_next()), (self.ordem[5:], True, False))
+
+    def test_cursor_invalido_volta_para_a_primeira_pagina(self):
+        for cursor in ('lixo', '!!!', codificar_cursor('x', date(2025, 3, 10), 1), 'cHxub3RhZGF0ZXwx'):
+            with self.subTest(cursor=cursor):
+                pagina, _ = self.pagina(cursor=cursor)
+                self.assertEqual(self.ids(pagina), self.ordem[:4])
+
+    def test_page_e_busca_usam_o_paginator(self):
+        vistos = []
+        for numero in (1, 2, 3):
+            pagina, _ = self.pagina(page=str(numero))
+            self.assertFalse(getattr(pagina, 'is_keyset', False))
+            vistos += self.ids(pagina)
+        self.assertEqual((vistos, pagina.paginator.num_pages), (self.ordem, 3))
+
+        self.criar_conta(name='Energia eletrica', due_date=date(2025, 3, 1))
+        self.criar_conta(name='Energia', due_date=date(2025, 3, 2))
+        self.contas = filtrar_por_busca(PayableAccount.objects.filter(user=self.user), 'energia', campos=('name',))
+        pagina, total = self.pagina(search_query='energia')
+        self.assertEqual(([c.name for c in pagina], total), (['Energia', 'Energia eletrica'], Decimal('200.00')))
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class ExportacaoStreamingTest(LedgerMixin, TestCase):
+    """ Exportações em streaming (CSV) e write-only (Excel); as grandes vão para segundo plano. """
+
+    def setUp(self):
+        self.criar_cadastros()
+        self.criar_conta(name='Aluguel', description='Sala; térreo', amount=Decimal('1234.50'), is_paid=True)
+        self.criar_conta(name='Energia', description='', amount=Decimal('89.90'), due_date=date(2025, 3, 11))
+        self.contas = PayableAccount.objects.filter(user=self.user).order_by('due_date')
+
+    def test_csv_de_contas(self):
+        resposta = gerar_csv_generic(self.contas, 'pagar')
+
+        self.assertIsInstance(resposta, StreamingHttpResponse)
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(b''.join(resposta.streaming_content), (
+            '\ufeffNome;Descrição;Vencimento;Valor;Status;Categoria;Área-DRE;Centro de Custo;Banco;Forma Pag.\r\n'
+            'Aluguel;"Sala; térreo";10/03/2025;1234,50;Pago;Geral;Despesas Operacionais (-);-;Banco;PIX\r\n'
+            'Energia;;11/03/2025;89,90;Aberto;Geral;Despesas Operacionais (-);-;Banco;PIX\r\n'
+        ).encode('utf-8'))
+
+    def test_excel_write_only_abre_no_openpyxl(self):
+        import openpyxl
+
+        linhas = ([nome, valor] for nome, valor in self.contas.values_list('name', 'amount'))
+        resposta = resposta_excel_write_only('contas.xlsx', 'Contas', ['Nome', 'Valor (R$)'], linhas)
+        planilha = openpyxl.load_workbook(BytesIO(resposta.content))['Contas']
+        self.assertEqual(
+            list(planilha.iter_rows(values_only=True)),
+            [('Nome', 'Valor (R$)'), ('Aluguel', 1234.5), ('Energia', 89.9)],
+        )
+
+        planilha = openpyxl.load_workbook(BytesIO(gerar_excel_generic(self.contas, 'pagar').content))['Relatório']
+        linhas = list(planilha.iter_rows(values_only=True))
+        self.assertEqual(linhas[2][:4], ('Nome', 'Descrição', 'Vencimento', 'Valor'))
+        self.assertEqual([linha[0] for linha in linhas[3:]], ['Aluguel', 'Energia'])
+        self.assertEqual(planilha.cell(row=4, column=4).number_format, '#,##0.00')
+
+    def test_exportacao_grande_vai_para_segundo_plano(self):
+        Subscription.objects.filter(user=self.user).update(status='active', valid_until=None)
+        self.client.force_login(self.user)
+
+        with mock.patch('accounts.utils_exports.LIMITE_EXPORTACAO_NA_REQUISICAO', 1):
+            resposta = self.client.get(reverse('contas_pagar'), {'export_excel': '1'})
+        tarefa = TarefaSegundoPlano.objects.get(tipo='exportar_contas')
+        self.assertRedirects(resposta, f"{reverse('contas_pagar')}?tarefa={tarefa.pk}", fetch_redirect_response=False)
+        self.assertEqual((tarefa.parametros['tipo_conta'], tarefa.parametros['formato']), ('pagar', 'excel'))
+
+        # Abaixo do limite o arquivo sai na própria requisição
+        resposta = self.client.get(reverse('contas_pagar'), {'export_excel': '1'})
+        self.assertEqual(resposta['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        self.assertEqual(TarefaSegundoPlano.objects.count(), 1)
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class PerfilRequisicaoTest(TestCase):
+    """ Profiler sob demanda: só superusuários (inclusive em modo BPO) e downloads restritos. """
+
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=pasta)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.cliente = criar_assinante('cliente')
+        self.admin = criar_assinante('suporte')
+        User.objects.filter(pk=self.admin.pk).update(is_superuser=True, is_staff=True)
+
+    def gerenciar_cliente(self):
+        BPOClientLink.objects.create(bpo_admin=self.admin, client=self.cliente)
+        self.client.force_login(self.admin)
+        sessao = self.client.session
+        sessao.update({'real_user_id': self.admin.pk, 'managed_user_id': self.cliente.pk})
+        sessao.save()
+
+    def test_usuario_comum_nao_e_perfilado(self):
+        self.client.force_login(self.cliente)
+        for pedido in ({'data': {'_perfil': '1'}}, {'headers': {'X-Perfil': '1'}}):
+            with self.subTest(**pedido):
+                resposta = self.client.get(reverse('contas_pagar'), **pedido)
+                self.assertEqual(resposta.status_code, 200)
+                self.assertNotIn('X-Perfil-Url', resposta)
+        self.assertFalse(PerfilRequisicao.objects.exists())
+
+    def test_superusuario_gerenciando_cliente_grava_o_perfil(self):
+        self.gerenciar_cliente()
+        resposta = self.client.get(reverse('contas_pagar'), {'_perfil': '1'})
+
+        perfil = PerfilRequisicao.objects.get()
+        self.assertTrue(resposta['X-Perfil-Url'].endswith(reverse('perfil_download', args=[perfil.pk])))
+        self.assertEqual(
+            (perfil.solicitante, perfil.tenant, perfil.view, perfil.status),
+            (self.admin, self.cliente, 'contas_pagar', 200),
+        )
+        self.assertEqual(perfil.total_consultas, len(perfil.consultas))
+        self.assertTrue(any('accounts_payableaccount' in consulta['sql'] for consulta in perfil.consultas))
+        self.assertGreater(pstats.Stats(perfil.arquivo.path).total_calls, 0)
+
+        download = self.client.get(resposta['X-Perfil-Url'])
+        self.assertEqual(download.status_code, 200)
+        with perfil.arquivo.open('rb') as arquivo:
+            self.assertEqual(b''.join(download.streaming_content), arquivo.read())
+        download.close()
+        sql = self.client.get(reverse('perfil_sql', args=[perfil.pk])).json()
+        self.assertEqual(len(sql['consultas']), perfil.total_consultas)
+
+    def test_mantem_apenas_os_perfis_mais_recentes(self):
+        self.client.force_login(self.admin)
+        with mock.patch('accounts.utils_perfil.MAX_PERFIS', 2):
+            for _ in range(3):
+                self.client.get(reverse('contas_pagar'), headers={'X-Perfil': '1'})
+
+        perfis = list(PerfilRequisicao.objects.order_by('pk'))
+        self.assertEqual(len(perfis), 2)
+        self.assertEqual(
+            sorted(os.listdir(os.path.dirname(perfis[0].arquivo.path))),
+            sorted(os.path.basename(perfil.arquivo.name) for perfil in perfis),
+        )
+
+    def test_downloads_negados_a_quem_nao_e_superusuario(self):
+        self.gerenciar_cliente()
+        self.client.get(reverse('contas_pagar'), {'_perfil': '1'})
+        perfil = PerfilRequisicao.objects.get()
+
+        self.client.force_login(self.cliente)
+        for rota in ('perfil_download', 'perfil_sql'):
+            with self.subTest(rota=rota):
+                self.assertEqual(self.client.get(reverse(rota, args=[perfil.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('perfis')).status_code, 403)
+
+
+class ImportacaoCatalogoTest(TestCase):
+    """ Upsert do catálogo em blocos: contagens na primeira importação e na reimportação. """
+
+    def setUp(self):
+        self.user = User.objects.create_user('catalogo')
+
+    def planilha(self):
+        linhas = ['codigo,nome,tipo,preco_venda,estoque,ncm']
+        # Bloco 1 (2000 linhas): 1998 códigos, um código repetido (vale a última) e uma linha sem nome
+        linhas += [f'C{i:04d},Produto {i},P,"10,50",3,8471.60.52' for i in range(1998)]
+        linhas += ['C0005,Produto 5 novo,P,99,1,', 'C9999,,P,1,1,']
+        # Bloco 2 (500 linhas): 499 códigos novos e um já gravado no bloco anterior
+        linhas += [f'C{i:04d},Produto {i},S,20,5,' for i in range(1998, 2497)]
+        linhas += ['C0000,Produto 0 alterado,P,1,1,']
+        return SimpleUploadedFile('catalogo.csv', '\n'.join(linhas).encode())
+
+    def test_contagens_com_blocos_e_codigo_repetido(self):
+        self.assertEqual(
+            importar_catalogo_planilha(self.user, self.planilha()),
+            {'inseridos': 2497, 'atualizados': 1, 'ignorados': 2},
+        )
+        produtos = ProdutoServico.objects.filter(user=self.user)
+        self.assertEqual(produtos.count(), 2497)
+        self.assertEqual(
+            (produtos.get(codigo='C0005').nome, produtos.get(codigo='C0005').preco_venda), ('Produto 5 novo', Decimal('99.00')),
+        )
+        self.assertEqual(produtos.get(codigo='C0000').nome, 'Produto 0 alterado')
+        servico = produtos.get(codigo='C2000')
+        self.assertEqual((servico.tipo, servico.estoque_atual), ('SERVICO', 0))
+        self.assertEqual(produtos.get(codigo='C0001').ncm, '84716052')
+
+        self.assertEqual(
+            importar_catalogo_planilha(self.user, self.planilha()),
+            {'inseridos': 0, 'atualizados': 2498, 'ignorados': 2},
+        )
+        self.assertEqual(produtos.count(), 2497)
+
+
+class MotorDreTest(LedgerMixin, TestCase):
+    """ Números da DRE (rollup + COMPONENTES_DRE) conferidos com valores calculados à mão. """
+
+    def setUp(self):
+        self.criar_cadastros()
+        self.categoria_receber = Category.objects.create(user=self.user, name='Vendas', category_type='RECEIVABLE')
+        receber = dict(modelo=ReceivableAccount, category=self.categoria_receber)
+        # (modelo/categoria, dia, dre_area, valor, liquidada, tipo de custo)
+        for extra, dia, area, valor, liquidada, custo in [
+            (receber, date(2025, 1, 5), 'BRUTA', '10000.00', True, None),
+            (receber, date(2025, 1, 20), 'BRUTA', '2000.00', False, None),
+            (receber, date(2025, 1, 7), 'NAO_CONSTAR', '500.00', True, None),
+            ({}, date(2025, 1, 10), 'DEDUCAO', '1000.00', True, 'VARIAVEL'),
+            ({}, date(2025, 1, 10), 'CUSTOS', '3000.00', True, 'VARIAVEL'),
+            ({}, date(2025, 1, 15), 'CUSTOS', '500.00', True, 'FIXO'),
+            ({}, date(2025, 1, 31), 'OPERACIONAL', '2000.00', True, 'FIXO'),
+            ({}, date(2025, 1, 31), 'NAO_CONSTAR', '700.00', True, 'FIXO'),
+            ({}, date(2025, 1, 25), 'OPERACIONAL', '400.00', False, 'FIXO'),
+            (receber, date(2025, 2, 1), 'BRUTA', '5000.00', True, None),
+            ({}, date(2025, 2, 3), 'CUSTOS', '1000.00', True, 'VARIAVEL'),
+            ({}, date(2025, 2, 10), 'DEPRECIACAO', '200.00', True, 'FIXO'),
+            ({}, date(2025, 2, 20), 'TRIBUTACAO', '300.00', True, 'VARIAVEL'),
+            ({}, date(2025, 2, 28), 'DISTRIBUICAO', '1000.00', True, 'VARIAVEL'),
+        ]:
+            campos = dict(extra, due_date=dia, dre_area=area, amount=Decimal(valor))
+            if campos.get('modelo') is ReceivableAccount:
+                campos['is_received'] = liquidada
+            else:
+                campos.update(is_paid=liquidada, cost_type=custo)
+            self.criar_conta(**campos)
+
+    def assertDre(self, dre, **esperado):
+        obtido = {nome: round(dre[nome], 2) for nome in esperado}
+        self.assertEqual(obtido, {nome: Decimal(valor) for nome, valor in esperado.items()})
+
+    def test_mensal_por_caixa(self):
+        meses = calcular_dre_mensal(self.user, date(2025, 1, 1), date(2025, 3, 31))
+
+        self.assertEqual(list(meses), [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertDre(
+            meses[date(2025, 1, 1)],
+            receita_bruta='10000', impostos='1000', receita_liquida='9000', custos='3500', lucro_bruto='5500',
+            despesas_operacionais='2000', ebitda='3500', resultado_final='3500', custos_variaveis='3000',
+            custos_fixos='2500', margem_contribuicao='6000', ponto_equilibrio='3750', entradas='10000', saidas='6500',
+        )
+        self.assertDre(
+            meses[date(2025, 2, 1)],
+            receita_bruta='5000', custos='1000', ebitda='4000', depreciacao='200', ebit='3800', tributacao='300',
+            lucro_liquido='3500', distribuicao_lucro='1000', resultado_final='2500', custos_fixos='200',
+            ponto_equilibrio='250', entradas='5000', saidas='2500',
+        )
+        self.assertDre(meses[date(2025, 3, 1)], receita_bruta='0', saidas='0', ponto_equilibrio='0')
+
+    def test_periodo_por_caixa_e_competencia(self):
+        inicio, fim = date(2025, 1, 1), date(2025, 2, 28)
+        self.assertDre(
+            calcular_dre_periodo(self.user, inicio, fim),
+            receita_liquida='14000', lucro_bruto='9500', ebitda='7500', lucro_liquido='7000', resultado_final='6000',
+            custos_variaveis='4000', custos_fixos='2700', ponto_equilibrio='3780',
+        )
+        # Competência: entram a receita de 2000 e a despesa fixa de 400 ainda em aberto
+        self.assertDre(
+            calcular_dre_periodo(self.user, inicio, fim, regime='competencia'),
+            receita_bruta='17000', despesas_operacionais='2400', ebitda='9100', resultado_final='7600',
+            custos_fixos='3100', ponto_equilibrio='4133.33', entradas='17000', saidas='9400',
+        )
+
+    def test_ponto_de_equilibrio_sem_margem(self):
+        self.assertEqual(calcular_ponto_equilibrio(Decimal('1000'), Decimal('1200'), Decimal('500')), Decimal('0'))
+        self.assertEqual(calcular_ponto_equilibrio(Decimal('0'), Decimal('0'), Decimal('500')), Decimal('0'))
+
+
+@override_settings(STORAGES=STORAGES_TESTE)
+class HomeCacheTest(TestCase):
+    """ Nomes guardados nos contextos em cache acompanham renomeações de empresa e categoria. """
+
+    def setUp(self):
+        cache.clear()
+        self.user = criar_assinante('home')
+        self.client.force_login(self.user)
+
+    def test_renomear_empresa_e_categoria_invalida_o_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            perfil = CompanyProfile.objects.create(user=self.user, nome_empresa='Empresa Antiga')
+        self.assertEqual(self.client.get(reverse('home')).context['company_name'], 'Empresa Antiga')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            perfil.nome_empresa = 'Empresa Nova'
+            perfil.save()
+        self.assertEqual(self.client.get(reverse('home')).context['company_name'], 'Empresa Nova')
+
+        versao = versao_ledger(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(user=self.user, name='Aluguel', category_type='PAYABLE')
+        self.assertNotEqual(versao_ledger(self.user.id), versao)
@@ -72,6 +72,13 @@ from .views import (
     centro_custo_json,
     centro_custo_criar,
     centro_custo_deletar,
+    cache_stats_view,
+    requisicoes_lentas_view,
+    perfis_view,
+    perfil_download_view,
+    perfil_sql_view,
+    tarefa_status_view,
+    tarefa_download_view,
 )
 
 urlpatterns = [
@@ -151,4 +158,11 @@ urlpatterns = [
     path('contas-pagar/centro-custo/json/', centro_custo_json, name='centro_custo_json'),
     path('contas-pagar/centro-custo/criar/', centro_custo_criar, name='centro_custo_criar'),
     path('contas-pagar/centro-custo/deletar/<int:cc_id>/', centro_custo_deletar, name='centro_custo_deletar'),
-]
\ No newline at end of file
+    path('admin-tools/cache-stats/', cache_stats_view, name='cache_stats'),
+    path('admin-tools/requisicoes-lentas/', requisicoes_lentas_view, name='requisicoes_lentas'),
+    path('admin-tools/perfis/', perfis_view, name='perfis'),
+    path('admin-tools/perfis/<int:perfil_id>/download/', perfil_download_view, name='perfil_download'),
+    path('admin-tools/perfis/<int:perfil_id>/sql/', perfil_sql_view, name='perfil_sql'),
+    path('tarefas/<int:tarefa_id>/status/', tarefa_status_view, name='tarefa_status'),
+    path('tarefas/<int:tarefa_id>/download/', tarefa_download_view, name='tarefa_download'),
+]
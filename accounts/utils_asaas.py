@@ -1,4 +1,4 @@
-import requests
+from .utils_http import requisitar
 from datetime import datetime
 from .models import AsaasCredentials
 
@@ -35,7 +35,7 @@ def buscar_saldo_asaas(user):
     url = f"{config['base_url']}/finance/balance"
 
     try:
-        response = requests.get(url, headers=config['headers'])
+        response = requisitar('asaas', 'GET', url, headers=config['headers'])
         response.raise_for_status()
         data = response.json()
         
@@ -69,7 +69,7 @@ def buscar_extrato_asaas(user, start_date, end_date):
         }
 
         try:
-            response = requests.get(url, headers=config['headers'], params=params)
+            response = requisitar('asaas', 'GET', url, headers=config['headers'], params=params)
             response.raise_for_status()
             data = response.json()
             
@@ -3,14 +3,22 @@
 import os
 import json
 import re
-import google.generativeai as genai
+from functools import lru_cache
+
 from pypdf import PdfReader
 
 # Mantendo EXATAMENTE como você enviou
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-if GEMINI_API_KEY:
+
+
+@lru_cache(maxsize=1)
+def _modelo():
+    # google.generativeai leva ~1s para importar: só carrega na primeira leitura de boleto
+    import google.generativeai as genai
+
     genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-flash-latest')
+    return genai.GenerativeModel('gemini-flash-latest')
+
 
 def extrair_dados_boleto(arquivo_pdf):
     if not GEMINI_API_KEY:
@@ -54,7 +62,7 @@ def extrair_dados_boleto(arquivo_pdf):
         """
 
         print("--- [SistemClass] Enviando para Gemini ---")
-        response = model.generate_content(prompt)
+        response = _modelo().generate_content(prompt)
         res_text = response.text.strip()
         
         # Tratamento robusto para extrair o JSON se a IA colocar crases ou texto extra
@@ -0,0 +1,85 @@
+# accounts/utils_busca.py
+"""
+Busca textual do ledger (contas, fornecedores e clientes).
+
+Compara os textos sem acento e em minúsculas e ordena por similaridade de
+trigramas. No PostgreSQL usa as extensões pg_trgm/unaccent e os índices GIN
+criados na migração 0101 (a função imutável sc_unaccent envolve o unaccent).
+No SQLite (desenvolvimento/testes) as mesmas funções SQL são registradas em
+Python a cada conexão, então a consulta gerada pelo ORM é a mesma.
+"""
+import unicodedata
+
+from django.db.models import FloatField, Func, Q, Value
+from django.db.models.functions import Lower
+
+# Campos pesquisados nas listagens de contas a pagar/receber
+CAMPOS_LANCAMENTO = ('name', 'description', 'category__name')
+
+
+def normalizar_texto(texto):
+    """ Remove acentos e converte para minúsculas ('Cemig Distribuição' -> 'cemig distribuicao'). """
+    if texto is None:
+        return None
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return texto.lower()
+
+
+def _trigramas(texto):
+    """ Trigramas no formato do pg_trgm: cada palavra com dois espaços antes e um depois. """
+    trigramas = set()
+    for palavra in ''.join(c if c.isalnum() else ' ' for c in normalizar_texto(texto or '')).split():
+        palavra = f'  {palavra} '
+        trigramas.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return trigramas
+
+
+def similaridade_trigramas(a, b):
+    """ Mesma métrica do similarity() do pg_trgm: |A ∩ B| / |A ∪ B|. """
+    ta, tb = _trigramas(a), _trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def registrar_funcoes_sqlite(connection):
+    """ Registra sc_unaccent() e similarity() numa conexão SQLite. """
+    connection.connection.create_function('sc_unaccent', 1, normalizar_texto, deterministic=True)
+    connection.connection.create_function('similarity', 2, similaridade_trigramas, deterministic=True)
+
+
+class SemAcento(Func):
+    function = 'sc_unaccent'
+
+
+class Similaridade(Func):
+    function = 'similarity'
+    output_field = FloatField()
+
+
+def texto_busca(campo):
+    """ Expressão normalizada de um campo: lower(sc_unaccent(campo)) — a mesma dos índices GIN. """
+    return Lower(SemAcento(campo))
+
+
+def filtrar_por_busca(queryset, termo, campos=CAMPOS_LANCAMENTO):
+    """ Filtra registros cujo texto (sem acento/maiúsculas) contenha o termo em qualquer dos campos. """
+    termo = normalizar_texto(termo or '').strip()
+    if not termo:
+        return queryset
+
+    aliases = {f'busca_{i}': texto_busca(campo) for i, campo in enumerate(campos)}
+    filtro = Q()
+    for alias in aliases:
+        filtro |= Q(**{f'{alias}__contains': termo})
+    return queryset.alias(**aliases).filter(filtro)
+
+
+def ordenar_por_relevancia(queryset, termo, campo='name', desempate=('due_date', 'id')):
+    """ Ordena pela similaridade entre o termo e o campo principal (mais parecidos primeiro). """
+    termo = normalizar_texto(termo or '').strip()
+    if not termo:
+        return queryset
+    return queryset.annotate(
+        relevancia=Similaridade(texto_busca(campo), Value(termo))
+    ).order_by('-relevancia', *desempate)
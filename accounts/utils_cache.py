@@ -0,0 +1,124 @@
+# accounts/utils_cache.py
+"""
+Cache de resultados dos dashboards por cliente (tenant).
+
+A chave é (tenant, view, parâmetros GET, versão do ledger, dia). A versão do
+ledger de cada tenant é incrementada sempre que contas a pagar/receber,
+vendas ou bancos daquele usuário mudam (signals e caminhos em lote), o que
+invalida de uma vez todos os resultados antigos sem precisar apagá-los.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+CHAVE_VERSAO = 'ledger_versao:{user_id}'
+CHAVE_RESULTADO = 'resultado:{user_id}:{view}:{versao}:{dia}:{params}'
+CHAVE_CONTADOR = 'resultado_cache:{evento}:{view}'
+
+# Views/consultas cujos contadores de acerto/erro são expostos em estatisticas_cache()
+VIEWS_EM_CACHE = (
+    'home', 'dashboards', 'dre_view', 'faturamento_dashboard_view',
+    'contas_pagar_totais', 'contas_receber_totais', 'fluxo_analitico',
+)
+
+
+def versao_da_chave(chave):
+    """ Valor atual de um contador de versão no cache (criado na primeira leitura). """
+    versao = cache.get(chave)
+    if versao is None:
+        # Começa em um valor baseado no relógio: se a chave for expulsa do cache,
+        # a nova versão nunca coincide com a de resultados antigos ainda guardados.
+        cache.add(chave, time.time_ns(), timeout=None)
+        versao = cache.get(chave)
+    return versao
+
+
+def incrementar_versao(chave):
+    """ Incrementa o contador de versão após o commit da transação atual. """
+    def incrementar():
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.set(chave, time.time_ns(), timeout=None)
+
+    # Só depois do commit: antes disso outra requisição ainda enxergaria os dados antigos
+    transaction.on_commit(incrementar)
+
+
+def versao_ledger(user_id):
+    """ Versão atual do ledger do tenant (criada na primeira leitura). """
+    return versao_da_chave(CHAVE_VERSAO.format(user_id=user_id))
+
+
+def invalidar_ledger(user_id):
+    """ Incrementa a versão do ledger do tenant, invalidando os resultados em cache. """
+    if not user_id:
+        return
+    incrementar_versao(CHAVE_VERSAO.format(user_id=user_id))
+
+
+def _contar(evento, view):
+    chave = CHAVE_CONTADOR.format(evento=evento, view=view)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.add(chave, 0, timeout=None)
+        cache.incr(chave)
+
+
+def valor_em_cache(user_id, nome, parametros, calcular, timeout=None):
+    """
+    Devolve `calcular()` para o tenant, reaproveitando o valor em cache enquanto
+    a versão do ledger (e o dia) não mudarem. `parametros` entra no hash da chave.
+    """
+    chave = CHAVE_RESULTADO.format(
+        user_id=user_id,
+        view=nome,
+        versao=versao_ledger(user_id),
+        dia=timezone.localdate().isoformat(),
+        params=hashlib.md5(repr(parametros).encode()).hexdigest(),
+    )
+
+    resultado = cache.get(chave)
+    if resultado is not None:
+        _contar('hit', nome)
+        return resultado
+
+    _contar('miss', nome)
+    resultado = calcular()
+    cache.set(chave, resultado, timeout or settings.RESULTADO_CACHE_TIMEOUT)
+    return resultado
+
+
+def parametros_get(request, ignorar=()):
+    """ Parâmetros GET da requisição, ordenados, para compor chaves de cache. """
+    return sorted((k, tuple(request.GET.getlist(k))) for k in request.GET if k not in ignorar)
+
+
+def resultado_em_cache(request, view, calcular, timeout=None):
+    """ Resultado de uma view para o tenant da requisição, em cache por parâmetros GET e versão do ledger. """
+    return valor_em_cache(request.user.id, view, parametros_get(request), calcular, timeout)
+
+
+def estatisticas_cache():
+    """ Contadores de acerto/erro por view: {view: {'hits', 'misses', 'hit_rate'}}. """
+    chaves = {
+        (evento, view): CHAVE_CONTADOR.format(evento=evento, view=view)
+        for view in VIEWS_EM_CACHE for evento in ('hit', 'miss')
+    }
+    valores = cache.get_many(list(chaves.values()))
+    estatisticas = {}
+    for view in VIEWS_EM_CACHE:
+        hits = valores.get(chaves[('hit', view)], 0)
+        misses = valores.get(chaves[('miss', view)], 0)
+        total = hits + misses
+        estatisticas[view] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total * 100, 1) if total else 0,
+        }
+    return estatisticas
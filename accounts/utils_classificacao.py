@@ -0,0 +1,188 @@
+# accounts/utils_classificacao.py
+"""
+Classificação automática de lançamentos (regras de ClassificacaoAutomatica).
+
+As regras de cada tenant são compiladas uma única vez em um autômato
+Aho-Corasick por tipo (PAYABLE/RECEIVABLE): a descrição é percorrida em uma
+só passada, encontrando todos os termos contidos nela, independentemente da
+quantidade de regras. Entre os termos encontrados vence a regra da mesma conta
+bancária, depois a de termo mais longo (mais específico).
+
+O classificador compilado fica em memória no processo, validado por uma versão
+por tenant guardada no cache compartilhado; qualquer alteração nas regras (ou
+exclusão de categoria/banco/centro de custo referenciados) incrementa a versão.
+"""
+import threading
+from collections import OrderedDict, deque
+
+from .models import ClassificacaoAutomatica
+from .utils_cache import incrementar_versao, versao_da_chave
+
+CHAVE_VERSAO_REGRAS = 'classificacao_versao:{user_id}'
+
+# Quantos tenants mantêm o classificador compilado em memória por processo
+MAX_CLASSIFICADORES_EM_MEMORIA = 256
+
+SEM_CLASSIFICACAO = (None, None, None, None)
+
+_classificadores = OrderedDict()
+_trava = threading.Lock()
+
+
+class AutomatoTermos:
+    """ Autômato Aho-Corasick sobre uma lista de termos (já em minúsculas). """
+
+    def __init__(self, termos):
+        self.transicoes = [{}]
+        self.falhas = [0]
+        self.saidas = [()]
+
+        for indice, termo in enumerate(termos):
+            no = 0
+            for caractere in termo:
+                proximo = self.transicoes[no].get(caractere)
+                if proximo is None:
+                    proximo = len(self.transicoes)
+                    self.transicoes.append({})
+                    self.falhas.append(0)
+                    self.saidas.append(())
+                    self.transicoes[no][caractere] = proximo
+                no = proximo
+            self.saidas[no] += (indice,)
+
+        # Links de falha em largura: cada nó herda as saídas do seu sufixo mais longo
+        fila = deque(self.transicoes[0].values())
+        while fila:
+            no = fila.popleft()
+            for caractere, filho in self.transicoes[no].items():
+                fila.append(filho)
+                falha = self.falhas[no]
+                while falha and caractere not in self.transicoes[falha]:
+                    falha = self.falhas[falha]
+                destino = self.transicoes[falha].get(caractere, 0)
+                self.falhas[filho] = destino if destino != filho else 0
+                self.saidas[filho] += self.saidas[self.falhas[filho]]
+
+    def encontrar(self, texto):
+        """ Índices de todos os termos contidos em `texto`. """
+        encontrados = set()
+        no = 0
+        for caractere in texto:
+            while no and caractere not in self.transicoes[no]:
+                no = self.falhas[no]
+            no = self.transicoes[no].get(caractere, 0)
+            if self.saidas[no]:
+                encontrados.update(self.saidas[no])
+        return encontrados
+
+
+class ClassificadorCompilado:
+    """ Regras de um tenant compiladas por tipo. Imutável depois de construído. """
+
+    def __init__(self, regras):
+        por_tipo = {}
+        for regra in regras:
+            termo = (regra.termo or '').lower().strip()
+            if termo:
+                por_tipo.setdefault(regra.tipo, {}).setdefault(termo, []).append(regra)
+
+        self.termos = {}
+        self.automatos = {}
+        for tipo, regras_por_termo in por_tipo.items():
+            self.termos[tipo] = list(regras_por_termo.items())
+            self.automatos[tipo] = AutomatoTermos([termo for termo, _ in self.termos[tipo]])
+
+    def prever(self, descricao, tipo, bank_account=None):
+        """
+        (categoria, dre_area, banco, centro_custo) da regra mais prioritária
+        cujo termo aparece na descrição, ou quatro Nones.
+        """
+        automato = self.automatos.get(tipo)
+        if not descricao or automato is None:
+            return SEM_CLASSIFICACAO
+
+        indices = automato.encontrar(descricao.lower())
+        if not indices:
+            return SEM_CLASSIFICACAO
+
+        bank_id = getattr(bank_account, 'id', bank_account)
+        termos = self.termos[tipo]
+
+        def prioridade(item):
+            termo, regra = item
+            if bank_id is None:
+                banco = 0
+            else:
+                banco = 0 if regra.bank_account_id == bank_id else 1 if regra.bank_account_id is None else 2
+            return banco, -len(termo), regra.pk
+
+        _, regra = min(
+            ((termos[indice][0], regra) for indice in indices for regra in termos[indice][1]),
+            key=prioridade,
+        )
+        return regra.categoria, regra.dre_area, regra.bank_account, regra.centro_custo
+
+
+def versao_regras(user_id):
+    return versao_da_chave(CHAVE_VERSAO_REGRAS.format(user_id=user_id))
+
+
+def invalidar_regras(user_id):
+    """ Nova versão das regras do tenant: os classificadores compilados são refeitos na próxima leitura. """
+    if user_id:
+        incrementar_versao(CHAVE_VERSAO_REGRAS.format(user_id=user_id))
+
+
+def classificador_do_usuario(user):
+    """
+    Classificador compilado do tenant. Em loops de importação, obtenha-o uma vez
+    e chame `.prever()` por linha.
+    """
+    user_id = getattr(user, 'id', user)
+    versao = versao_regras(user_id)
+
+    with _trava:
+        em_memoria = _classificadores.get(user_id)
+        if em_memoria and em_memoria[0] == versao:
+            _classificadores.move_to_end(user_id)
+            return em_memoria[1]
+
+    regras = ClassificacaoAutomatica.objects.filter(user_id=user_id).select_related(
+        'categoria', 'bank_account', 'centro_custo'
+    )
+    classificador = ClassificadorCompilado(regras)
+
+    with _trava:
+        _classificadores[user_id] = (versao, classificador)
+        _classificadores.move_to_end(user_id)
+        while len(_classificadores) > MAX_CLASSIFICADORES_EM_MEMORIA:
+            _classificadores.popitem(last=False)
+    return classificador
+
+
+def prever_classificacao(user, descricao, tipo, bank_account=None):
+    """
+    Retorna 4 valores: (categoria, dre, banco, centro_custo).
+    """
+    return classificador_do_usuario(user).prever(descricao, tipo, bank_account)
+
+
+def aprender_classificacao(user, nome, categoria, dre_area, tipo, bank_account=None, centro_custo=None):
+    """
+    Salva ou ATUALIZA a regra incluindo o Centro de Custo.
+    A versão das regras do tenant é incrementada pelo signal de ClassificacaoAutomatica.
+    """
+    if nome and categoria and dre_area:
+        # update_or_create: se a regra já existir, ATUALIZA com o novo centro de custo
+        ClassificacaoAutomatica.objects.update_or_create(
+            user=user,
+            termo__iexact=nome.strip(),
+            tipo=tipo,
+            defaults={
+                'termo': nome.strip(),
+                'categoria': categoria,
+                'dre_area': dre_area,
+                'bank_account': bank_account,
+                'centro_custo': centro_custo,
+            }
+        )
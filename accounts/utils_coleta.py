@@ -0,0 +1,276 @@
+# accounts/utils_coleta.py
+"""
+Coleta concorrente das páginas das APIs de ERP (Omie, Tiny, Nibo, Conta Azul).
+
+A primeira página é buscada sozinha; quando ela informa o total de páginas, as
+demais são independentes e vão para um pool de threads limitado. Sem total
+(APIs que só avisam o fim com uma página vazia/curta), as páginas seguintes
+são buscadas à frente em uma janela até alguma indicar o fim.
+
+As threads só fazem HTTP: cada página baixada entra numa fila e é gravada na
+thread chamadora (a única que usa o ORM), então a espera de rede de uma página
+se sobrepõe à gravação da anterior. Cada provedor tem, por processo, um teto
+de requisições simultâneas e um limite de requisições por segundo, válidos
+para todos os tenants sincronizando ao mesmo tempo. Dentro de
+acompanhar_paginas, cada página gravada é avisada a um callback (as tarefas
+em segundo plano usam isso como progresso/heartbeat).
+
+Sincronização incremental: cada credencial guarda a marca d'água da última
+execução bem-sucedida (ultima_sincronizacao); as execuções seguintes pedem à
+API só o que mudou desde ela (com uma margem), e a cada
+DIAS_ENTRE_SINCRONIZACOES_COMPLETAS é feita uma reconciliação completa.
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# provedor -> requisições simultâneas
+CONCORRENCIA_PROVEDOR = {
+    'omie': 3,
+    'tiny': 2,
+    'nibo': 4,
+    'conta_azul': 4,
+}
+CONCORRENCIA_PADRAO = 2
+
+# provedor -> requisições por segundo
+REQUISICOES_POR_SEGUNDO = {
+    'omie': 4,
+    'tiny': 0.5,
+    'nibo': 5,
+    'conta_azul': 4,
+}
+REQUISICOES_POR_SEGUNDO_PADRAO = 2
+
+# Reconciliação completa periódica (pega exclusões e o que o filtro incremental não cobre)
+DIAS_ENTRE_SINCRONIZACOES_COMPLETAS = 7
+
+# Recuo aplicado à marca d'água (relógios diferentes, registros gravados durante a execução)
+MARGEM_INCREMENTAL = timedelta(minutes=10)
+
+# Proteção contra APIs que ignoram a paginação e devolvem sempre a mesma página
+MAX_PAGINAS = 1000
+
+_limites = {}
+_trava = threading.Lock()
+
+# Chamado a cada página gravada (ex: heartbeat da tarefa em segundo plano); ver acompanhar_paginas
+_ao_processar_pagina = contextvars.ContextVar('ao_processar_pagina', default=None)
+
+
+class ErroColeta(Exception):
+    """ Página que não pôde ser obtida; interrompe a coleta. """
+
+
+class LimiteTaxa:
+    """ Espaça as requisições de um provedor em pelo menos 1/taxa segundos (thread-safe). """
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1.0 / por_segundo
+        self._proxima = 0.0
+        self._trava = threading.Lock()
+
+    def aguardar(self):
+        with self._trava:
+            agora = time.monotonic()
+            vez = max(agora, self._proxima)
+            self._proxima = vez + self.intervalo
+        if vez > agora:
+            time.sleep(vez - agora)
+
+
+def limites_do_provedor(provedor):
+    """ (semáforo de concorrência, limite de taxa) compartilhados pelo processo. """
+    with _trava:
+        if provedor not in _limites:
+            _limites[provedor] = (
+                threading.BoundedSemaphore(CONCORRENCIA_PROVEDOR.get(provedor, CONCORRENCIA_PADRAO)),
+                LimiteTaxa(REQUISICOES_POR_SEGUNDO.get(provedor, REQUISICOES_POR_SEGUNDO_PADRAO)),
+            )
+        return _limites[provedor]
+
+
+def repartir_limites(provedor, processos):
+    """
+    Para pools de processos (cada um com os seus limites): deixa este processo
+    com 1/processos da taxa e das requisições simultâneas do provedor, para que
+    a soma continue dentro do limite da API. Cada processo fica com pelo menos
+    uma requisição simultânea, então com mais processos que o teto do provedor
+    só a taxa continua garantida.
+    """
+    with _trava:
+        taxa = REQUISICOES_POR_SEGUNDO.get(provedor, REQUISICOES_POR_SEGUNDO_PADRAO)
+        concorrencia = CONCORRENCIA_PROVEDOR.get(provedor, CONCORRENCIA_PADRAO)
+        REQUISICOES_POR_SEGUNDO[provedor] = taxa / processos
+        CONCORRENCIA_PROVEDOR[provedor] = max(1, concorrencia // processos)
+        _limites.pop(provedor, None)
+
+
+@contextmanager
+def acompanhar_paginas(callback):
+    """
+    Dentro do bloco, toda coleta chama `callback(paginas)` depois de gravar
+    cada página, com o total de páginas gravadas no bloco até ali.
+    """
+    contador = {'paginas': 0}
+
+    def contar():
+        contador['paginas'] += 1
+        callback(contador['paginas'])
+
+    token = _ao_processar_pagina.set(contar)
+    try:
+        yield
+    finally:
+        _ao_processar_pagina.reset(token)
+
+
+def coletar_paginas(provedor, buscar_pagina, processar_pagina, total_paginas=None, ultima_pagina=None,
+                    max_paginas=MAX_PAGINAS):
+    """
+    Busca as páginas 1..N e entrega cada uma a `processar_pagina(dados)`.
+
+    - buscar_pagina(numero) -> dados: roda nas threads do pool; só HTTP, sem ORM.
+      Para abortar a coleta, levante ErroColeta.
+    - processar_pagina(dados): roda na thread chamadora, na ordem de chegada.
+    - total_paginas(dados) -> int | None: total informado pela primeira página.
+    - ultima_pagina(dados) -> bool: sem total, indica a página que encerra a lista.
+
+    Sem nenhum dos dois, só a primeira página é buscada. Retorna o número de
+    páginas processadas; exceções de buscar_pagina são repassadas ao chamador.
+    """
+    semaforo, taxa = limites_do_provedor(provedor)
+    ao_processar = _ao_processar_pagina.get()
+    if ao_processar is not None:
+        gravar_pagina = processar_pagina
+
+        def processar_pagina(dados):
+            gravar_pagina(dados)
+            ao_processar()
+
+    def buscar(numero):
+        with semaforo:
+            taxa.aguardar()
+            return buscar_pagina(numero)
+
+    primeira = buscar(1)
+    total = total_paginas(primeira) if total_paginas else None
+    if total is not None:
+        fim = min(total, max_paginas)
+    elif ultima_pagina is not None and not ultima_pagina(primeira):
+        fim = max_paginas
+    else:
+        fim = 1
+
+    if fim <= 1:
+        processar_pagina(primeira)
+        return 1
+
+    concorrencia = CONCORRENCIA_PROVEDOR.get(provedor, CONCORRENCIA_PADRAO)
+    janela = concorrencia * 2
+    fila = queue.Queue()
+
+    def buscar_para_fila(numero):
+        try:
+            fila.put((numero, buscar(numero), None))
+        except Exception as erro:
+            fila.put((numero, None, erro))
+
+    processadas = 0
+    proxima = 2
+    pendentes = 0
+    executor = ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix=f'coleta-{provedor}')
+    try:
+        def completar_janela():
+            nonlocal proxima, pendentes
+            while proxima <= fim and pendentes < janela:
+                # Cada página leva uma cópia do contexto (medição de desempenho da requisição)
+                executor.submit(contextvars.copy_context().run, buscar_para_fila, proxima)
+                proxima += 1
+                pendentes += 1
+
+        # As próximas páginas já estão a caminho enquanto a primeira é gravada
+        completar_janela()
+        processar_pagina(primeira)
+        processadas += 1
+
+        while pendentes:
+            numero, dados, erro = fila.get()
+            pendentes -= 1
+            if erro is not None:
+                raise erro
+            if numero > fim:
+                continue  # buscada à frente, mas depois da última página
+            if total is None and ultima_pagina(dados):
+                fim = numero
+            processar_pagina(dados)
+            processadas += 1
+            completar_janela()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return processadas
+
+
+def inicio_incremental(creds, forcar_completa=False):
+    """
+    Data/hora a partir da qual buscar alterações, ou None quando a execução
+    deve ser completa (primeira vez, forçada ou reconciliação vencida).
+    """
+    if forcar_completa or not creds.ultima_sincronizacao or not creds.ultima_sincronizacao_completa:
+        return None
+    if timezone.now() - creds.ultima_sincronizacao_completa >= timedelta(days=DIAS_ENTRE_SINCRONIZACOES_COMPLETAS):
+        return None
+    return creds.ultima_sincronizacao - MARGEM_INCREMENTAL
+
+
+def registrar_sincronizacao(creds, inicio, completa):
+    """ Avança a marca d'água da credencial para o início da execução bem-sucedida. """
+    campos = {'ultima_sincronizacao': inicio}
+    if completa:
+        campos['ultima_sincronizacao_completa'] = inicio
+    # update() para não mexer nos demais campos (tokens podem ter sido renovados durante a execução)
+    type(creds).objects.filter(pk=creds.pk).update(**campos)
+    for campo, valor in campos.items():
+        setattr(creds, campo, valor)
+
+
+def sincronizar_com_marca(creds, executar, forcar_completa=False):
+    """
+    Executa `executar(desde)` (desde=None: completa), que devolve o dicionário
+    de resultado da sincronização. Se a busca incremental falhar, tenta uma
+    completa; a marca d'água só avança quando não há 'erro' no resultado.
+    """
+    inicio = timezone.now()
+    desde = inicio_incremental(creds, forcar_completa)
+
+    resultado = executar(desde)
+    if 'erro' in resultado and desde is not None:
+        logger.warning(
+            'Sincronização incremental de %s (user %s) falhou, tentando completa: %s',
+            type(creds).__name__, creds.user_id, resultado['erro'],
+        )
+        desde = None
+        resultado = executar(None)
+
+    if 'erro' not in resultado:
+        registrar_sincronizacao(creds, inicio, completa=desde is None)
+        resultado['modo'] = 'completa' if desde is None else 'incremental'
+    return resultado
+
+
+def contas_existentes(modelo, user, external_ids):
+    """ {external_id: conta} das contas já importadas de uma página, em uma única consulta. """
+    return {
+        conta.external_id: conta
+        for conta in modelo.objects.filter(user=user, external_id__in={i for i in external_ids if i})
+    }
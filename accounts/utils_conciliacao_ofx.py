@@ -0,0 +1,260 @@
+# accounts/utils_conciliacao_ofx.py
+"""
+Conciliação em lote de um extrato OFX (usada por importar_ofx_view).
+
+Em vez de consultar regras, candidatos e gravar uma conta por transação, o
+pipeline carrega as regras de classificação uma vez, busca numa única
+consulta todas as contas em aberto da janela de datas do extrato (indexadas
+em memória por valor), concilia em memória e grava tudo com bulk_create /
+bulk_update numa transação. O rollup diário e os saldos bancários, que
+dependem de signals, são atualizados explicitamente no fim.
+"""
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import PayableAccount, ReceivableAccount
+from .utils_classificacao import classificador_do_usuario
+from .utils_resumo import atualizar_resumo
+from .utils_saldos import ajustar_saldos, contribuicao
+
+# Janela de dias (antes e depois) para procurar a conta manual correspondente
+DATE_WINDOW_DAYS = 3
+
+# Máximo de candidatos avaliados por transação (mais próximos do vencimento primeiro)
+MAX_CANDIDATOS = 20
+
+TERMOS_BANCARIOS_MATCH = [
+    'PAGAMENTO PIX', 'PIX_DEB', 'PIX_CRED', 'PIX ENVIADO', 'PIX RECEBIDO', 'PIX',
+    'TRANSACAO OFX', 'TRANSFERENCIA', 'TRANSF', 'TRF', 'TED', 'DOC', 'TEV',
+    'PAGAMENTO DE TITULO', 'PAGAMENTO BOLETO', 'PAGAMENTO', 'PGTO', 'PAGTO',
+    'COMPRA CARTAO', 'COMPRA DEBITO', 'COMPRA CREDITO',
+    'SISPAG', 'INTERNET BANKING', 'AUTOATENDIMENTO', 'MOBILE', 'APP', 'AGENCIA',
+    'SICREDI'
+]
+
+# Mesmos termos, como regex, para limpar o nome exibido (inclui códigos CX)
+TERMOS_BANCARIOS_NOME = [
+    r'PAGAMENTO PIX', r'PIX_DEB', r'PIX_CRED', r'PIX ENVIADO', r'PIX RECEBIDO', r'PIX',
+    r'TRANSACAO OFX', r'TRANSFERENCIA', r'TRANSF', r'TRF', r'TED', r'DOC', r'TEV',
+    r'PAGAMENTO DE TITULO', r'PAGAMENTO BOLETO', r'PAGAMENTO', r'PGTO', r'PAGTO',
+    r'COMPRA CARTAO', r'COMPRA DEBITO', r'COMPRA CREDITO',
+    r'SISPAG', r'INTERNET BANKING', r'AUTOATENDIMENTO', r'MOBILE', r'APP', r'AGENCIA',
+    r'SICREDI', r'CX[\-\s]*\d+'
+]
+
+PALAVRAS_GENERICAS = {
+    'PAGAMENTO', 'TRANSACAO', 'OFX', 'PIX', 'BANCO',
+    'COMPRA', 'DEBITO', 'CREDITO', 'COMPANHIA',
+    'ENERGETICA', 'DISTRIBUICAO', 'TRANSFERENCIA'
+}
+
+
+def normalizar_nome_match(texto):
+    texto = (texto or '').upper().strip()
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+    for termo in TERMOS_BANCARIOS_MATCH:
+        texto = texto.replace(termo, ' ')
+
+    texto = re.sub(r'CX[\-\s]*\d+', ' ', texto, flags=re.IGNORECASE)
+    texto = re.sub(r'(?:\d[\s\.\-\/]*){5,}', ' ', texto)
+    texto = re.sub(r'[^A-Z\s]', ' ', texto)
+    texto = re.sub(r'\s+', ' ', texto).strip()
+
+    return texto
+
+
+def nomes_compativeis(nome_ofx, nome_sistema, descricao_sistema=None):
+    base = normalizar_nome_match(nome_ofx)
+    if not base:
+        return False
+
+    tokens_base = {t for t in base.split() if len(t) >= 3}
+
+    for alvo in [normalizar_nome_match(nome_sistema), normalizar_nome_match(descricao_sistema)]:
+        if not alvo:
+            continue
+
+        # caso um nome esteja contido no outro
+        if base in alvo or alvo in base:
+            return True
+
+        intersecao = tokens_base & {t for t in alvo.split() if len(t) >= 3}
+        if not intersecao:
+            continue
+
+        # se tiver 2 palavras iguais
+        if len(intersecao) >= 2:
+            return True
+
+        # se tiver 1 palavra forte
+        token = next(iter(intersecao))
+        if len(token) >= 5 and token not in PALAVRAS_GENERICAS:
+            return True
+
+    return False
+
+
+def limpar_nome_ofx(name):
+    """ Remove termos bancários, documentos e símbolos do memo (estilo Cora/Asaas). """
+    nome_limpo = name
+    for termo in TERMOS_BANCARIOS_NOME:
+        nome_limpo = re.sub(termo, '', nome_limpo, flags=re.IGNORECASE)
+
+    # Sequências numéricas longas (CNPJ/CPF/IDs), mesmo com espaços ou traços (ex: 41 568 113)
+    nome_limpo = re.sub(r'(?:\d[\s\.\-\/]*){5,}', '', nome_limpo)
+    nome_limpo = re.sub(r'[^\w\s]', ' ', nome_limpo)
+    nome_limpo = re.sub(r'\s+', ' ', nome_limpo).strip()
+
+    return nome_limpo or name
+
+
+def _candidatos_por_valor(modelo, campo_liquidado, user, bank_account, inicio, fim):
+    """ Contas em aberto (sem FITID) da janela do extrato, agrupadas por valor e ordenadas por vencimento. """
+    contas = modelo.objects.filter(
+        Q(bank_account=bank_account) | Q(bank_account__isnull=True),
+        user=user,
+        fitid__isnull=True,
+        due_date__range=[inicio, fim],
+        **{campo_liquidado: False}
+    ).order_by('due_date', 'id')
+
+    por_valor = defaultdict(list)
+    for conta in contas:
+        por_valor[conta.amount].append(conta)
+    return por_valor
+
+
+def _chaves_existentes(modelo, user, bank_account):
+    return set(
+        modelo.objects.filter(
+            user=user, bank_account=bank_account, fitid__isnull=False, payment_date__isnull=False
+        ).values_list('fitid', 'amount', 'payment_date')
+    )
+
+
+def conciliar_extrato_ofx(user, ofx_import, bank_account, transacoes, payable_category, receivable_category):
+    """
+    Importa/concilia as transações de um extrato OFX.
+    Retorna {'novos': n, 'ignorados': n, 'conciliados': n}.
+    """
+    contadores = {'novos': 0, 'ignorados': 0, 'conciliados': 0}
+
+    # 1. Normaliza as transações do extrato
+    itens = []
+    for transacao in transacoes:
+        amount = Decimal(str(transacao.amount))
+        name = (transacao.memo or f"Transação OFX {transacao.id}").encode('ascii', errors='ignore').decode('ascii')
+        itens.append({
+            'fitid': transacao.id,
+            'amount': amount,
+            'valor': abs(amount),
+            'date': transacao.date.date(),
+            'name': limpar_nome_ofx(name),
+            'description': f"Transação OFX {transacao.id}",
+            'tipo': 'PAYABLE' if amount < 0 else 'RECEIVABLE',
+        })
+    if not itens:
+        return contadores
+
+    # 2. Uma consulta por modelo: regras, chaves já importadas e candidatos da janela inteira
+    classificador = classificador_do_usuario(user)
+    janela = timedelta(days=DATE_WINDOW_DAYS)
+    inicio = min(item['date'] for item in itens) - janela
+    fim = max(item['date'] for item in itens) + janela
+
+    existentes = {
+        'PAYABLE': _chaves_existentes(PayableAccount, user, bank_account),
+        'RECEIVABLE': _chaves_existentes(ReceivableAccount, user, bank_account),
+    }
+    candidatos = {
+        'PAYABLE': _candidatos_por_valor(PayableAccount, 'is_paid', user, bank_account, inicio, fim),
+        'RECEIVABLE': _candidatos_por_valor(ReceivableAccount, 'is_received', user, bank_account, inicio, fim),
+    }
+
+    novos = {'PAYABLE': [], 'RECEIVABLE': []}
+    conciliados = {'PAYABLE': [], 'RECEIVABLE': []}
+
+    # 3. Concilia em memória, na ordem do extrato
+    for item in itens:
+        tipo, fitid, valor, data = item['tipo'], item['fitid'], item['valor'], item['date']
+
+        # Anti-duplicação (ID + valor + data)
+        chave = (fitid, valor, data)
+        if fitid and chave in existentes[tipo]:
+            contadores['ignorados'] += 1
+            continue
+
+        cat_prevista, dre_prevista, _, centro_previsto = classificador.prever(item['name'], tipo, bank_account)
+
+        # Smart-matching: contas abertas do mesmo valor dentro da janela, mais antigas primeiro
+        lista = candidatos[tipo].get(valor, [])
+        na_janela = [c for c in lista if data - janela <= c.due_date <= data + janela][:MAX_CANDIDATOS]
+        match = next((c for c in na_janela if nomes_compativeis(item['name'], c.name, c.description)), None)
+
+        if match:
+            lista.remove(match)  # já liquidada: não serve para as próximas transações
+            match.payment_date = data
+            match.fitid = fitid
+            match.bank_account = bank_account
+            match.ofx_import = ofx_import
+            if tipo == 'PAYABLE':
+                match.is_paid = True
+                if not match.centro_custo_id:
+                    match.centro_custo = centro_previsto
+            else:
+                match.is_received = True
+            conciliados[tipo].append(match)
+            contadores['conciliados'] += 1
+        else:
+            comum = dict(
+                user=user, name=item['name'], description=item['description'], due_date=data,
+                amount=valor, payment_method='PIX', occurrence='AVULSO', payment_date=data,
+                bank_account=bank_account, ofx_import=ofx_import, fitid=fitid,
+            )
+            if tipo == 'PAYABLE':
+                novos[tipo].append(PayableAccount(
+                    category=cat_prevista or payable_category, dre_area=dre_prevista or 'OPERACIONAL',
+                    centro_custo=centro_previsto, is_paid=True, cost_type='VARIAVEL', **comum
+                ))
+            else:
+                novos[tipo].append(ReceivableAccount(
+                    category=cat_prevista or receivable_category, dre_area=dre_prevista or 'BRUTA',
+                    is_received=True, **comum
+                ))
+            contadores['novos'] += 1
+        existentes[tipo].add(chave)
+
+    # 4. Grava tudo de uma vez
+    campos_conciliacao = {
+        'PAYABLE': ['is_paid', 'payment_date', 'fitid', 'bank_account', 'ofx_import', 'centro_custo'],
+        'RECEIVABLE': ['is_received', 'payment_date', 'fitid', 'bank_account', 'ofx_import'],
+    }
+    modelos = {'PAYABLE': PayableAccount, 'RECEIVABLE': ReceivableAccount}
+    with transaction.atomic():
+        for tipo, modelo in modelos.items():
+            if novos[tipo]:
+                modelo.objects.bulk_create(novos[tipo], batch_size=500)
+            if conciliados[tipo]:
+                modelo.objects.bulk_update(conciliados[tipo], campos_conciliacao[tipo], batch_size=500)
+
+        # bulk_create/bulk_update não disparam signals: rollup e saldos atualizados aqui.
+        # As contas conciliadas estavam em aberto, então antes não contavam no saldo.
+        deltas = defaultdict(Decimal)
+        dias = set()
+        for tipo in modelos:
+            for conta in novos[tipo] + conciliados[tipo]:
+                dias.add(conta.due_date)
+                efeito = contribuicao(tipo, conta.bank_account_id, conta.amount, True)
+                if efeito:
+                    deltas[efeito[0]] += efeito[1]
+        ajustar_saldos(dict(deltas))
+        atualizar_resumo(user.id, dias)
+
+    return contadores
@@ -0,0 +1,99 @@
+# accounts/utils_contexto.py
+"""
+Valores em cache para os context processors dos templates.
+
+Context processors rodam em toda renderização (páginas, parciais HTMX, PDFs),
+então qualquer consulta feita neles se repete em cada uma. Aqui ficam dois
+tipos de valor registrado:
+
+- globais (ex: anúncio ativo): iguais para todos, guardados em memória no
+  processo por alguns segundos e descartados ao salvar/excluir a origem;
+- do tenant (ex: módulos da assinatura): calculados juntos
+  para o dono dos dados e guardados no cache compartilhado, validados pela
+  versão do tenant (utils_tenant). Chegam ao template como valores
+  preguiçosos: só são buscados se o template usar algum deles.
+"""
+import threading
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+
+from .utils_cache import versao_da_chave
+from .utils_tenant import CHAVE_VERSAO_TENANT, TIMEOUT_CONTEXTO
+
+CHAVE_VALORES_TENANT = 'contexto_tenant:{user_id}:{versao}'
+
+# Validade padrão dos valores globais em memória (segundos)
+TTL_GLOBAL = 60
+
+_globais = {}           # nome -> (calcular, ttl)
+_globais_memoria = {}   # nome -> (expira_em, valor)
+_do_tenant = {}         # nome -> calcular(user)
+_trava = threading.Lock()
+
+
+def valor_global(nome, ttl=TTL_GLOBAL):
+    """ Registra `calcular()` como valor global em memória, válido por `ttl` segundos. """
+    def registrar(calcular):
+        _globais[nome] = (calcular, ttl)
+        return calcular
+    return registrar
+
+
+def valor_do_tenant(nome):
+    """ Registra `calcular(user)` como valor do tenant (user = dono dos dados). """
+    def registrar(calcular):
+        _do_tenant[nome] = calcular
+        return calcular
+    return registrar
+
+
+def obter_global(nome):
+    agora = time.monotonic()
+    em_memoria = _globais_memoria.get(nome)
+    if em_memoria and em_memoria[0] > agora:
+        return em_memoria[1]
+
+    calcular, ttl = _globais[nome]
+    valor = calcular()
+    with _trava:
+        _globais_memoria[nome] = (agora + ttl, valor)
+    return valor
+
+
+def invalidar_global(nome):
+    """
+    Descarta o valor em memória deste processo (os demais expiram pelo TTL)
+    após o commit da transação atual: antes disso, uma renderização ainda
+    leria e guardaria o valor antigo.
+    """
+    def descartar():
+        with _trava:
+            _globais_memoria.pop(nome, None)
+
+    transaction.on_commit(descartar)
+
+
+def valores_do_tenant(user):
+    """ Todos os valores registrados para o tenant, em uma leitura do cache quando válidos. """
+    versao = versao_da_chave(CHAVE_VERSAO_TENANT.format(user_id=user.pk))
+    chave = CHAVE_VALORES_TENANT.format(user_id=user.pk, versao=versao)
+
+    valores = cache.get(chave)
+    if valores is None or not _do_tenant.keys() <= valores.keys():
+        valores = {nome: calcular(user) for nome, calcular in _do_tenant.items()}
+        cache.set(chave, valores, TIMEOUT_CONTEXTO)
+    return valores
+
+
+def contexto_do_tenant_preguicoso(user):
+    """ {nome: valor preguiçoso}: o cache só é consultado se o template usar algum valor. """
+    valores = SimpleLazyObject(partial(valores_do_tenant, user))
+
+    def valor(nome):
+        return valores[nome]
+
+    return {nome: SimpleLazyObject(partial(valor, nome)) for nome in _do_tenant}
@@ -1,4 +1,4 @@
-import requests
+from .utils_http import requisitar
 from datetime import datetime, timedelta
 from django.utils import timezone
 from decimal import Decimal
@@ -56,7 +56,7 @@ def get_cora_config(user):
         if not creds.access_token or (creds.expires_at and agora >= creds.expires_at):
             payload = {'grant_type': 'client_credentials', 'client_id': creds.client_id}
             
-            response = requests.post(token_url, data=payload, cert=cora_ssl_cert, timeout=30)
+            response = requisitar('cora', 'POST', token_url, data=payload, cert=cora_ssl_cert, timeout=30)
             
             if response.status_code != 200:
                 return {'erro': f"Falha Login Cora ({response.status_code}): {response.text}"}
@@ -98,7 +98,7 @@ def buscar_saldo_cora(user):
     params = {'start': hoje, 'end': hoje, 'perPage': 1}
 
     try:
-        response = requests.get(url, headers=config['headers'], params=params, cert=config['ssl_cert'], timeout=15)
+        response = requisitar('cora', 'GET', url, headers=config['headers'], params=params, cert=config['ssl_cert'], timeout=15)
         response.raise_for_status()
         
         # Se chegou aqui, a conexão é SUCESSO!
@@ -138,7 +138,7 @@ def buscar_extrato_cora(user, start_date, end_date):
         }
 
         try:
-            response = requests.get(url, headers=config['headers'], params=params, cert=config['ssl_cert'], timeout=60)
+            response = requisitar('cora', 'GET', url, headers=config['headers'], params=params, cert=config['ssl_cert'], timeout=60)
             response.raise_for_status()
             
             data = response.json()
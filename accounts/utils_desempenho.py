@@ -0,0 +1,145 @@
+# accounts/utils_desempenho.py
+"""
+Medição de desempenho por requisição (usada por DesempenhoMiddleware).
+
+Cada requisição ganha uma Medicao guardada numa ContextVar: as consultas SQL
+são contadas por um execute_wrapper nas conexões do banco e as chamadas HTTP
+externas por utils_http.requisitar (threads do pool de coleta herdam o
+contexto, então também entram na conta). Ao final, o middleware grava uma
+linha de log estruturada (JSON) e o cabeçalho Server-Timing; requisições
+acima dos limites ficam num buffer circular em memória do processo, exibido
+aos superusuários em admin-tools/requisicoes-lentas/.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Padrões (podem ser sobrescritos no settings)
+LIMITE_MS = 1000            # requisição lenta a partir de (ms)
+LIMITE_CONSULTAS = 50       # ou a partir de tantas consultas SQL
+TAMANHO_BUFFER = 200        # requisições lentas guardadas por processo
+
+_medicao_atual = ContextVar('medicao_desempenho', default=None)
+_lentas = deque(maxlen=getattr(settings, 'DESEMPENHO_TAMANHO_BUFFER', TAMANHO_BUFFER))
+_trava = threading.Lock()
+
+
+class Medicao:
+    """ Contadores de uma requisição (thread-safe: chamadas HTTP podem vir do pool de coleta). """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.sql_consultas = 0
+        self.sql_ms = 0.0
+        self.http_chamadas = 0
+        self.http_ms = 0.0
+        self._trava = threading.Lock()
+
+    def registrar_sql(self, duracao_ms):
+        with self._trava:
+            self.sql_consultas += 1
+            self.sql_ms += duracao_ms
+
+    def registrar_http(self, duracao_ms):
+        with self._trava:
+            self.http_chamadas += 1
+            self.http_ms += duracao_ms
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+
+def _cronometrar_sql(execute, sql, params, many, context):
+    """ execute_wrapper: soma a consulta na medição da requisição atual. """
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            medicao.registrar_sql((time.perf_counter() - inicio) * 1000)
+
+
+@contextmanager
+def medir():
+    """ Mede o bloco (uma requisição): devolve a Medicao, preenchida ao longo do bloco. """
+    medicao = Medicao()
+    token = _medicao_atual.set(medicao)
+    try:
+        with ExitStack() as pilha:
+            for conexao in connections.all():
+                pilha.enter_context(conexao.execute_wrapper(_cronometrar_sql))
+            yield medicao
+    finally:
+        _medicao_atual.reset(token)
+
+
+def registrar_http(duracao_ms):
+    """ Chamado por utils_http a cada tentativa; fora de uma requisição medida, não faz nada. """
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.registrar_http(duracao_ms)
+
+
+def nome_da_view(request):
+    """ Nome da rota (ex: 'dre') ou caminho da função; vazio quando a URL não foi resolvida. """
+    rota = getattr(request, 'resolver_match', None)
+    if rota is None:
+        return ''
+    return rota.view_name or rota._func_path
+
+
+def server_timing(medicao, total_ms):
+    return ', '.join([
+        f'total;dur={total_ms:.1f}',
+        f'sql;dur={medicao.sql_ms:.1f};desc="{medicao.sql_consultas} consultas"',
+        f'http;dur={medicao.http_ms:.1f};desc="{medicao.http_chamadas} chamadas"',
+    ])
+
+
+def registrar_requisicao(request, response, medicao, total_ms):
+    """ Log estruturado da requisição; as lentas também vão para o buffer circular. """
+    # Respostas devolvidas antes do AuthenticationMiddleware não têm usuário
+    user = getattr(request, 'user', None)
+    real_user = getattr(request, 'real_user', user)
+    registro = {
+        'instante': timezone.now().isoformat(timespec='seconds'),
+        'metodo': request.method,
+        'caminho': request.path,
+        'view': nome_da_view(request),
+        'status': response.status_code,
+        'usuario': real_user.get_username() if real_user and real_user.is_authenticated else None,
+        'tenant': user.pk if user and user.is_authenticated else None,
+        'total_ms': round(total_ms, 1),
+        'sql_consultas': medicao.sql_consultas,
+        'sql_ms': round(medicao.sql_ms, 1),
+        'http_chamadas': medicao.http_chamadas,
+        'http_ms': round(medicao.http_ms, 1),
+    }
+    logger.info('requisicao %s', json.dumps(registro, ensure_ascii=False))
+
+    lenta = (
+        total_ms >= getattr(settings, 'DESEMPENHO_LIMITE_MS', LIMITE_MS)
+        or medicao.sql_consultas >= getattr(settings, 'DESEMPENHO_LIMITE_CONSULTAS', LIMITE_CONSULTAS)
+    )
+    if lenta:
+        with _trava:
+            _lentas.append(registro)
+    return registro
+
+
+def requisicoes_lentas():
+    """ Requisições lentas deste processo, da mais recente para a mais antiga. """
+    with _trava:
+        return list(reversed(_lentas))
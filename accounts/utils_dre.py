@@ -0,0 +1,116 @@
+# accounts/utils_dre.py
+"""
+Motor de cálculo da DRE gerencial.
+
+Busca todos os componentes da DRE em UMA consulta agrupada sobre o rollup
+diário (ResumoDiario), usando agregação condicional por mês x área DRE x
+tipo de custo, e devolve a mesma estrutura mensal usada pelos dashboards
+(receita_bruta, impostos, ebitda, ponto_equilibrio, etc.).
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import ResumoDiario
+
+# Componentes base da DRE: nome -> condição sobre as linhas do rollup
+COMPONENTES_DRE = OrderedDict([
+    ('receita_bruta', Q(tipo='RECEIVABLE', dre_area='BRUTA')),
+    ('impostos', Q(tipo='PAYABLE', dre_area='DEDUCAO')),
+    ('custos', Q(tipo='PAYABLE', dre_area='CUSTOS')),
+    ('despesas_operacionais', Q(tipo='PAYABLE', dre_area='OPERACIONAL')),
+    ('depreciacao', Q(tipo='PAYABLE', dre_area='DEPRECIACAO')),
+    ('nao_operacionais', Q(tipo='PAYABLE', dre_area='NAO_OPERACIONAL')),
+    ('tributacao', Q(tipo='PAYABLE', dre_area='TRIBUTACAO')),
+    ('distribuicao_lucro', Q(tipo='PAYABLE', dre_area='DISTRIBUICAO')),
+    ('custos_variaveis', Q(tipo='PAYABLE', dre_area='CUSTOS', cost_type='VARIAVEL')),
+    ('custos_fixos', Q(tipo='PAYABLE', cost_type='FIXO') & ~Q(dre_area='NAO_CONSTAR')),
+    ('entradas', Q(tipo='RECEIVABLE') & ~Q(dre_area='NAO_CONSTAR')),
+    ('saidas', Q(tipo='PAYABLE') & ~Q(dre_area='NAO_CONSTAR')),
+])
+
+
+def calcular_ponto_equilibrio(receita_liquida, custos_variaveis, custos_fixos):
+    """ Ponto de equilíbrio = custos fixos / % de margem de contribuição. """
+    margem_contribuicao = receita_liquida - custos_variaveis
+    if margem_contribuicao > 0 and receita_liquida > 0:
+        margem_contribuicao_percentual = margem_contribuicao / receita_liquida
+        if margem_contribuicao_percentual > 0:
+            return custos_fixos / margem_contribuicao_percentual
+    return Decimal('0')
+
+
+def _derivar(valores):
+    """ Completa um dicionário de componentes base com as linhas calculadas da DRE. """
+    d = {nome: valores.get(nome) or Decimal('0') for nome in COMPONENTES_DRE}
+    d['receita_liquida'] = d['receita_bruta'] - d['impostos']
+    d['lucro_bruto'] = d['receita_liquida'] - d['custos']
+    d['ebitda'] = d['lucro_bruto'] - d['despesas_operacionais']
+    d['ebit'] = d['ebitda'] - d['depreciacao']
+    d['lair'] = d['ebit'] - d['nao_operacionais']
+    d['lucro_liquido'] = d['lair'] - d['tributacao']
+    d['resultado_final'] = d['lucro_liquido'] - d['distribuicao_lucro']
+    d['margem_contribuicao'] = d['receita_liquida'] - d['custos_variaveis']
+    d['ponto_equilibrio'] = calcular_ponto_equilibrio(d['receita_liquida'], d['custos_variaveis'], d['custos_fixos'])
+    return d
+
+
+def _base_queryset(user, inicio, fim, regime):
+    qs = ResumoDiario.objects.filter(user=user, dia__range=[inicio, fim])
+    if regime == 'caixa':
+        qs = qs.filter(liquidado=True)
+    return qs
+
+
+def _agregados():
+    return {nome: Sum('total', filter=condicao) for nome, condicao in COMPONENTES_DRE.items()}
+
+
+def calcular_dre_mensal(user, inicio, fim, regime='caixa'):
+    """
+    Retorna um OrderedDict {date(ano, mes, 1): dre_do_mes} com TODOS os meses
+    entre `inicio` e `fim` (meses sem movimento vêm zerados).
+    regime: 'caixa' (apenas liquidados) ou 'competencia' (tudo que vence no período).
+    """
+    linhas = (
+        _base_queryset(user, inicio, fim, regime)
+        .annotate(mes=TruncMonth('dia'))
+        .values('mes')
+        .annotate(**_agregados())
+        .order_by('mes')
+    )
+    por_mes = {linha['mes']: linha for linha in linhas}
+
+    resultado = OrderedDict()
+    mes = inicio.replace(day=1)
+    while mes <= fim:
+        resultado[mes] = _derivar(por_mes.get(mes, {}))
+        mes += relativedelta(months=1)
+    return resultado
+
+
+def calcular_dre_periodo(user, inicio, fim, regime='caixa'):
+    """ DRE consolidada do período (uma única consulta agregada). """
+    return _derivar(_base_queryset(user, inicio, fim, regime).aggregate(**_agregados()))
+
+
+def indicadores_dre(d):
+    """ Indicadores percentuais (sobre a receita líquida) usados nos gráficos de KPIs. """
+    receita_liquida = d['receita_liquida']
+
+    def perc(valor):
+        return (valor / receita_liquida * 100) if receita_liquida else 0
+
+    return {
+        'margem_bruta_percentual': perc(d['lucro_bruto']),
+        'ebitda_percentual': perc(d['ebitda']),
+        'margem_liquida_percentual': perc(d['lucro_liquido']),
+        'custos': d['custos'],
+        'custos_percentual': perc(d['custos']),
+        'margem_contribuicao': d['margem_contribuicao'],
+        'margem_contribuicao_percentual': perc(d['margem_contribuicao']),
+        'ponto_equilibrio': d['ponto_equilibrio'],
+    }
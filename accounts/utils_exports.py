@@ -1,90 +1,173 @@
 
 
+import csv
+from decimal import Decimal
+
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 from django.utils import timezone
-from datetime import datetime
+from datetime import date, datetime
 
-def gerar_excel_generic(queryset, tipo_relatorio, data_inicio=None, data_fim=None):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    filename = f"relatorio_{tipo_relatorio}_{timezone.now().strftime('%d_%m_%Y')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+# Tamanho dos lotes lidos do banco nas exportações (memória constante)
+TAMANHO_LOTE_EXPORTACAO = 2000
 
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Relatório"
+# Acima disso, Excel/PDF de contas são gerados em segundo plano (tarefa exportar_contas)
+LIMITE_EXPORTACAO_NA_REQUISICAO = 5000
 
-    
-    # Tenta buscar o perfil da empresa através do usuário da primeira conta
-    perfil = queryset.first().user.company_profile if queryset.exists() else None
-    nome_exibir = perfil.nome_empresa if perfil else "Relatório Financeiro"
-    
-    ws.merge_cells('A1:D1')
-    ws['A1'] = f"Empresa: {nome_exibir}"
-    ws['A1'].font = Font(bold=True, size=12)
-    if data_inicio and data_fim:
-        try:
-            d_ini = datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')
-            d_fim = datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')
-            ws.merge_cells('A2:D2')
-            ws['A2'] = f"Período: {d_ini} à {d_fim}"
-        except:
-            pass
-    ws.append([]) # Linha em branco para separar do cabeçalho
-    
 
-    # AJUSTE CIRÚRGICO: Cabeçalhos condicionais
+def _preparar_exportacao(queryset, tipo_relatorio):
+    """ Traz categoria, banco e centro de custo no mesmo SELECT e lê em lotes. """
+    relacionados = ['category', 'bank_account']
     if tipo_relatorio == 'pagar':
-        headers = ['Nome', 'Descrição', 'Vencimento', 'Valor', 'Status', 'Categoria', 'Área-DRE', 'Centro de Custo', 'Banco', 'Forma Pag.']
-    else: # receber
-        # Removido 'Centro de Custo' desta lista
-        headers = ['Nome', 'Descrição', 'Vencimento', 'Valor', 'Status', 'Categoria', 'Área-DRE', 'Banco', 'Forma Pag.']
+        relacionados.append('centro_custo')
+    return queryset.select_related(*relacionados).iterator(chunk_size=TAMANHO_LOTE_EXPORTACAO)
+
+
+def _cabecalho_exportacao(queryset):
+    """ Nome da empresa (perfil do dono das contas) para o topo dos relatórios. """
+    conta = queryset.select_related('user__company_profile').first()
+    perfil = getattr(conta.user, 'company_profile', None) if conta else None
+    return perfil.nome_empresa if perfil else "Relatório Financeiro"
 
-    ws.append(headers)
-    
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
 
-    for conta in queryset:
+def _colunas_exportacao(tipo_relatorio):
+    if tipo_relatorio == 'pagar':
+        return ['Nome', 'Descrição', 'Vencimento', 'Valor', 'Status', 'Categoria', 'Área-DRE', 'Centro de Custo', 'Banco', 'Forma Pag.']
+    # receber: sem 'Centro de Custo'
+    return ['Nome', 'Descrição', 'Vencimento', 'Valor', 'Status', 'Categoria', 'Área-DRE', 'Banco', 'Forma Pag.']
+
+
+def _linhas_exportacao(queryset, tipo_relatorio):
+    """ Gera as linhas (listas) das contas, na ordem de _colunas_exportacao. """
+    for conta in _preparar_exportacao(queryset, tipo_relatorio):
         status_text = "Pago" if tipo_relatorio == 'pagar' and conta.is_paid else \
                       "Recebido" if tipo_relatorio != 'pagar' and conta.is_received else "Aberto"
 
-        banco = str(conta.bank_account) if conta.bank_account else "-"
-        categoria = str(conta.category.name) if conta.category else "-"
-        forma_pag = conta.get_payment_method_display() if hasattr(conta, 'get_payment_method_display') else conta.payment_method
-        dre_area = conta.get_dre_area_display() if hasattr(conta, 'get_dre_area_display') else "-"
-        
-        # AJUSTE CIRÚRGICO: Montagem da linha dinâmica
         row = [
             conta.name,
             conta.description,
             conta.due_date,
             conta.amount,
             status_text,
-            categoria,
-            dre_area,
+            str(conta.category.name) if conta.category else "-",
+            conta.get_dre_area_display(),
         ]
-
-        # Adiciona Centro de Custo APENAS se não for 'receber'
+        # Centro de Custo APENAS se não for 'receber'
         if tipo_relatorio != 'receber':
-            c_custo = str(conta.centro_custo.nome) if hasattr(conta, 'centro_custo') and conta.centro_custo else "-"
-            row.append(c_custo)
+            row.append(str(conta.centro_custo.nome) if conta.centro_custo else "-")
+
+        row.extend([
+            str(conta.bank_account) if conta.bank_account else "-",
+            conta.get_payment_method_display(),
+        ])
+        yield row
 
-        row.extend([banco, forma_pag])
+
+def _titulo_periodo(data_inicio, data_fim):
+    if not (data_inicio and data_fim):
+        return None
+    try:
+        d_ini = datetime.strptime(data_inicio, '%Y-%m-%d').strftime('%d/%m/%Y')
+        d_fim = datetime.strptime(data_fim, '%Y-%m-%d').strftime('%d/%m/%Y')
+    except (TypeError, ValueError):
+        return None
+    return f"Período: {d_ini} à {d_fim}"
+
+
+def gerar_excel_generic(queryset, tipo_relatorio, data_inicio=None, data_fim=None):
+    """
+    Excel de contas a pagar/receber em modo write-only do openpyxl: as linhas
+    vão direto para o arquivo temporário, sem manter a planilha em memória.
+    """
+    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    filename = f"relatorio_{tipo_relatorio}_{timezone.now().strftime('%d_%m_%Y')}.xlsx"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Relatório")
+
+    titulo = WriteOnlyCell(ws, value=f"Empresa: {_cabecalho_exportacao(queryset)}")
+    titulo.font = Font(bold=True, size=12)
+    ws.append([titulo])
+    periodo = _titulo_periodo(data_inicio, data_fim)
+    if periodo:
+        ws.append([periodo])
+    ws.append([]) # Linha em branco para separar do cabeçalho
+
+    cabecalho = []
+    for coluna in _colunas_exportacao(tipo_relatorio):
+        cell = WriteOnlyCell(ws, value=coluna)
+        cell.font = Font(bold=True)
+        cabecalho.append(cell)
+    ws.append(cabecalho)
+
+    for row in _linhas_exportacao(queryset, tipo_relatorio):
+        # Coluna 'Valor' (D) no padrão contábil brasileiro
+        valor = WriteOnlyCell(ws, value=row[3])
+        valor.number_format = '#,##0.00'
+        row[3] = valor
         ws.append(row)
-        # Formata a coluna 'Valor' (coluna D, índice 4) para padrão contábil brasileiro
-        cell_valor = ws.cell(row=ws.max_row, column=4)
-        cell_valor.number_format = '#,##0.00' 
-        # ------------------------------------------------
 
     wb.save(response)
     return response
 
+
+def resposta_excel_write_only(nome_arquivo, titulo_aba, colunas, linhas):
+    """ Excel simples (cabeçalho + linhas) em modo write-only, para qualquer iterável de linhas. """
+    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(titulo_aba)
+    ws.append(colunas)
+    for row in linhas:
+        ws.append(row)
+    wb.save(response)
+    return response
+
+
+class _Eco:
+    """ Pseudo-arquivo para o csv.writer: devolve a linha em vez de guardá-la. """
+    def write(self, value):
+        return value
+
+
+def _formatar_csv(valor):
+    if isinstance(valor, Decimal):
+        return f"{valor:.2f}".replace('.', ',')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    return valor
+
+
+def linhas_csv(colunas, linhas):
+    """ Gera o CSV (';' e BOM UTF-8, como o Excel brasileiro espera) linha a linha. """
+    writer = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + writer.writerow(colunas)
+    for row in linhas:
+        yield writer.writerow([_formatar_csv(v) for v in row])
+
+
+def resposta_csv_streaming(nome_arquivo, colunas, linhas):
+    """ StreamingHttpResponse em CSV: o download começa antes de a consulta terminar. """
+    response = StreamingHttpResponse(linhas_csv(colunas, linhas), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return response
+
+
+def gerar_csv_generic(queryset, tipo_relatorio):
+    """ CSV de contas a pagar/receber com memória constante (mesmas colunas do Excel). """
+    filename = f"relatorio_{tipo_relatorio}_{timezone.now().strftime('%d_%m_%Y')}.csv"
+    return resposta_csv_streaming(
+        filename, _colunas_exportacao(tipo_relatorio), _linhas_exportacao(queryset, tipo_relatorio)
+    )
+
 def gerar_pdf_generic(queryset, tipo_relatorio, data_inicio=None, data_fim=None):
     response = HttpResponse(content_type='application/pdf')
     filename = f"relatorio_{tipo_relatorio}_{timezone.now().strftime('%d_%m_%Y')}.pdf"
@@ -109,8 +192,7 @@ def gerar_pdf_generic(queryset, tipo_relatorio, data_inicio=None, data_fim=None)
     estilo_info.alignment = 0 # 0 = Alinhado à Esquerda
 
     # Busca o perfil da empresa
-    perfil = queryset.first().user.company_profile if queryset.exists() else None
-    nome_exibir = perfil.nome_empresa if perfil else "Relatório Financeiro"
+    nome_exibir = _cabecalho_exportacao(queryset)
     
     # 1. Nome da Empresa (Negrito)
     elements.append(Paragraph(f"<b>Empresa:</b> {nome_exibir}", estilo_info))
@@ -142,7 +224,7 @@ def gerar_pdf_generic(queryset, tipo_relatorio, data_inicio=None, data_fim=None)
     data = [headers]
     total = 0
 
-    for conta in queryset:
+    for conta in _preparar_exportacao(queryset, tipo_relatorio):
         status_text = "Pago" if tipo_relatorio == 'pagar' and conta.is_paid else \
                       "Recebido" if tipo_relatorio != 'pagar' and conta.is_received else "Aberto"
         
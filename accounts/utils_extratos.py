@@ -0,0 +1,584 @@
+# accounts/utils_extratos.py
+"""
+Sincronização dos extratos bancários via API (Inter, Mercado Pago, Asaas,
+Cora e Sicredi). Antes ficava dentro de importar_ofx_view; agora roda como
+tarefa em segundo plano (accounts/utils_tarefas.py). Cada função devolve a
+lista de mensagens [(nível, texto)] que a tela mostra ao final.
+
+Os adaptadores de cada banco só normalizam as transações da API em itens
+{'external_id', 'tipo', 'date', 'amount', 'name', 'description', 'classificar'}.
+O motor único (ingerir_extrato) faz o resto com poucas consultas: IDs já
+importados numa consulta por modelo, contas em aberto da janela inteira numa
+consulta, conciliação em memória e gravação com bulk_create/bulk_update.
+"""
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import BankAccount, Category, PayableAccount, ReceivableAccount
+from .utils_asaas import buscar_extrato_asaas
+from .utils_classificacao import classificador_do_usuario
+from .utils_cora import buscar_extrato_cora
+from .utils_inter import buscar_extrato_inter
+from .utils_mercadopago import buscar_extrato_mercadopago
+from .utils_resumo import atualizar_resumo
+from .utils_saldos import ajustar_saldos, contribuicao
+from .utils_sicredi import buscar_extrato_sicredi
+
+# Janela de dias (antes e depois) para procurar a conta manual correspondente
+DATE_WINDOW_DAYS = 3
+
+MODELOS_EXTRATO = {
+    'PAYABLE': (PayableAccount, 'is_paid'),
+    'RECEIVABLE': (ReceivableAccount, 'is_received'),
+}
+
+# Valores padrão das contas criadas a partir do extrato (cada banco pode sobrescrever)
+PADROES_EXTRATO = {
+    'PAYABLE': {'dre_area': 'OPERACIONAL', 'payment_method': 'DEBITO_CONTA'},
+    'RECEIVABLE': {'dre_area': 'BRUTA', 'payment_method': 'PIX'},
+}
+
+
+class ColetorMensagens:
+    """ Mesma interface do django.contrib.messages, mas guarda as mensagens numa lista. """
+
+    def __init__(self):
+        self.itens = []
+
+    def _adicionar(self, nivel, texto):
+        self.itens.append((nivel, str(texto)))
+
+    def success(self, texto):
+        self._adicionar('success', texto)
+
+    def info(self, texto):
+        self._adicionar('info', texto)
+
+    def warning(self, texto):
+        self._adicionar('warning', texto)
+
+    def error(self, texto):
+        self._adicionar('error', texto)
+
+
+def _data_movimento(data_str, padrao):
+    try:
+        return datetime.strptime(data_str, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return padrao
+
+
+def _plural(quantidade, singular, plural):
+    return singular if quantidade == 1 else plural
+
+
+def _categorias_padrao_usuario(user):
+    """ Categorias usadas quando nenhuma regra classifica a transação (Cora/Sicredi). """
+    categorias = Category.objects.filter(user=user)
+    return {
+        'PAYABLE': (
+            categorias.filter(category_type='PAYABLE', name__icontains='Gerais').first()
+            or categorias.filter(category_type='PAYABLE').first()
+        ),
+        'RECEIVABLE': (
+            categorias.filter(category_type='RECEIVABLE', name__icontains='Vendas').first()
+            or categorias.filter(category_type='RECEIVABLE').first()
+        ),
+    }
+
+
+def _candidatos_abertos(modelo, campo_liquidado, user, valores, inicio, fim):
+    """ Contas em aberto da janela inteira com os valores do extrato, agrupadas por valor. """
+    contas = modelo.objects.filter(
+        user=user, amount__in=valores, due_date__range=[inicio, fim], **{campo_liquidado: False}
+    ).order_by('due_date', 'id')
+
+    por_valor = defaultdict(list)
+    for conta in contas:
+        por_valor[conta.amount].append(conta)
+    return por_valor
+
+
+def ingerir_extrato(user, banco, itens, rotulo, conciliar=False, categorias_padrao=None,
+                    padroes=None, usar_banco_da_regra=False):
+    """
+    Motor único de importação dos extratos via API.
+
+    - Anti-duplicação pelo external_id (uma consulta por modelo).
+    - `conciliar`: baixa a conta em aberto de mesmo valor com vencimento a até
+      DATE_WINDOW_DAYS dias, em vez de criar outra.
+    - `categorias_padrao`: {'PAYABLE': Category, 'RECEIVABLE': Category} quando a regra não classifica.
+    - `padroes`: campos extras por tipo, somados a PADROES_EXTRATO.
+    - `usar_banco_da_regra`: a conta bancária da regra de classificação tem prioridade sobre `banco`.
+
+    Retorna {'importados': n, 'duplicados': n, 'conciliados': n}.
+    """
+    contadores = {'importados': 0, 'duplicados': 0, 'conciliados': 0}
+    if not itens:
+        return contadores
+
+    categorias_padrao = categorias_padrao or {}
+    padroes = {tipo: {**PADROES_EXTRATO[tipo], **(padroes or {}).get(tipo, {})} for tipo in MODELOS_EXTRATO}
+    classificador = classificador_do_usuario(user)
+    janela = timedelta(days=DATE_WINDOW_DAYS)
+
+    # 1. Uma consulta por modelo: IDs já importados e, se for conciliar, contas em aberto da janela
+    por_tipo = defaultdict(list)
+    for item in itens:
+        por_tipo[item['tipo']].append(item)
+
+    existentes = {}
+    candidatos = {}
+    for tipo, lista in por_tipo.items():
+        modelo, campo_liquidado = MODELOS_EXTRATO[tipo]
+        existentes[tipo] = set(
+            modelo.objects.filter(user=user, external_id__in={i['external_id'] for i in lista})
+            .values_list('external_id', flat=True)
+        )
+        if conciliar:
+            candidatos[tipo] = _candidatos_abertos(
+                modelo, campo_liquidado, user,
+                {i['amount'] for i in lista},
+                min(i['date'] for i in lista) - janela,
+                max(i['date'] for i in lista) + janela,
+            )
+
+    novos = defaultdict(list)
+    conciliados = defaultdict(list)
+
+    # 2. Concilia/classifica em memória, na ordem do extrato
+    for item in itens:
+        tipo, external_id, valor, data = item['tipo'], item['external_id'], item['amount'], item['date']
+        modelo, campo_liquidado = MODELOS_EXTRATO[tipo]
+
+        if external_id in existentes[tipo]:
+            contadores['duplicados'] += 1
+            continue
+        existentes[tipo].add(external_id)
+
+        cat_prevista, dre_prevista, banco_previsto, centro_previsto = classificador.prever(
+            item['classificar'], tipo, banco
+        )
+
+        match = None
+        if conciliar:
+            lista = candidatos[tipo].get(valor, [])
+            na_janela = [c for c in lista if data - janela <= c.due_date <= data + janela]
+            if na_janela:
+                # Vencimento mais próximo da data do movimento
+                match = min(na_janela, key=lambda c: (abs((c.due_date - data).days), c.id))
+                lista.remove(match)  # já liquidada: não serve para as próximas transações
+
+        if match:
+            setattr(match, campo_liquidado, True)
+            match.payment_date = data
+            match.bank_account = banco
+            match.external_id = external_id
+            match.description += f" (Conciliado {rotulo})"
+            if tipo == 'PAYABLE' and not match.centro_custo_id:
+                match.centro_custo = centro_previsto
+            conciliados[tipo].append(match)
+            contadores['conciliados'] += 1
+            continue
+
+        campos = dict(
+            user=user, name=item['name'], description=item['description'], due_date=data, amount=valor,
+            category=cat_prevista or categorias_padrao.get(tipo), occurrence='AVULSO', payment_date=data,
+            bank_account=(banco_previsto if usar_banco_da_regra else None) or banco,
+            external_id=external_id, **{campo_liquidado: True},
+        )
+        campos.update(padroes[tipo])
+        campos['dre_area'] = dre_prevista or campos['dre_area']
+        if tipo == 'PAYABLE':
+            campos['centro_custo'] = centro_previsto
+        novos[tipo].append(modelo(**campos))
+        contadores['importados'] += 1
+
+    # 3. Grava tudo de uma vez
+    campos_conciliacao = ['payment_date', 'bank_account', 'external_id', 'description']
+    with transaction.atomic():
+        for tipo, (modelo, campo_liquidado) in MODELOS_EXTRATO.items():
+            if novos[tipo]:
+                modelo.objects.bulk_create(novos[tipo], batch_size=500)
+            if conciliados[tipo]:
+                extras = [campo_liquidado] + (['centro_custo'] if tipo == 'PAYABLE' else [])
+                modelo.objects.bulk_update(conciliados[tipo], campos_conciliacao + extras, batch_size=500)
+
+        # bulk_create/bulk_update não disparam signals: rollup e saldos atualizados aqui.
+        # As contas conciliadas estavam em aberto, então antes não contavam no saldo.
+        deltas = defaultdict(Decimal)
+        dias = set()
+        for tipo in MODELOS_EXTRATO:
+            for conta in novos[tipo] + conciliados[tipo]:
+                dias.add(conta.due_date)
+                efeito = contribuicao(tipo, conta.bank_account_id, conta.amount, True)
+                if efeito:
+                    deltas[efeito[0]] += efeito[1]
+        ajustar_saldos(dict(deltas))
+        atualizar_resumo(user.id, dias)
+
+    return contadores
+
+
+def _id_sintetico_inter(tipo_operacao, data, valor, descricao):
+    """ A API do Inter não devolve ID da transação: usa data + valor + descrição. """
+    resumo = hashlib.md5(f"{tipo_operacao}|{data}|{valor}|{descricao}".encode()).hexdigest()
+    return f"inter:{resumo}"
+
+
+def sincronizar_extrato_inter(user):
+    """ Extrato do Banco Inter (últimos 7 dias), com conciliação de contas abertas. """
+    mensagens = ColetorMensagens()
+    # 1. Define o período (últimos 7 dias)
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=7)
+
+    # 2. Chama a API
+    resultado = buscar_extrato_inter(user, start_date, end_date)
+
+    if 'erro' in resultado:
+        mensagens.error(f"Erro na integração Inter: {resultado['erro']}")
+        return mensagens.itens
+
+    transacoes = resultado.get('transacoes', [])
+
+    # Tenta localizar a conta bancária 'Inter' no seu sistema para vincular
+    banco_inter = BankAccount.objects.filter(user=user, bank_name__icontains='Inter').first()
+
+    itens = []
+    for transacao in transacoes:
+        data_movimento = _data_movimento(transacao.get('dataEntrada') or transacao.get('dataLancamento'), end_date)
+        valor = Decimal(str(transacao.get('valor', 0)))
+        descricao = transacao.get('descricao') or transacao.get('historico') or "Transação API Inter"
+        tipo_operacao = transacao.get('tipoOperacao')
+        itens.append({
+            'external_id': _id_sintetico_inter(tipo_operacao, data_movimento, valor, descricao),
+            'tipo': 'PAYABLE' if tipo_operacao == 'D' else 'RECEIVABLE',
+            'date': data_movimento,
+            'amount': valor,
+            'name': descricao[:100],
+            'description': f"Importado via API Inter - {descricao}",
+            'classificar': descricao,
+        })
+
+    # Lançamentos importados antes do ID sintético: mesma descrição, valor e data
+    legado = 0
+    if itens:
+        chaves_legado = set()
+        for tipo, (modelo, _) in MODELOS_EXTRATO.items():
+            chaves_legado.update(
+                (tipo,) + chave for chave in modelo.objects.filter(
+                    user=user, external_id__isnull=True,
+                    description__in={i['description'] for i in itens if i['tipo'] == tipo},
+                ).values_list('amount', 'payment_date', 'description')
+            )
+        restantes = [i for i in itens if (i['tipo'], i['amount'], i['date'], i['description']) not in chaves_legado]
+        legado = len(itens) - len(restantes)
+        itens = restantes
+
+    contadores = ingerir_extrato(
+        user, banco_inter, itens, 'Inter', conciliar=True,
+        padroes={'PAYABLE': {'cost_type': 'VARIAVEL'}, 'RECEIVABLE': {'payment_method': 'DEBITO_CONTA'}},
+    )
+    count_importados = contadores['importados']
+    count_duplicados = contadores['duplicados'] + legado
+
+    # Feedback ao usuário
+    if count_importados > 0:
+        mensagens.success(f"Sincronização concluída! {count_importados} novos lançamentos importados.")
+
+    if contadores['conciliados'] > 0:
+        mensagens.info(f"Inter: {contadores['conciliados']} contas existentes foram conciliadas automaticamente.")
+
+    if count_duplicados > 0:
+        mensagens.info(f"{count_duplicados} lançamentos já existiam e foram ignorados.")
+
+    if not transacoes:
+        mensagens.warning("Nenhuma transação encontrada no período.")
+    elif count_importados == 0 and contadores['conciliados'] == 0:
+        mensagens.info("Conexão realizada, mas nenhuma transação nova encontrada no período.")
+
+    return mensagens.itens
+
+
+def sincronizar_extrato_mercadopago(user):
+    """ Vendas do Mercado Pago (últimos 7 dias) como contas recebidas. """
+    mensagens = ColetorMensagens()
+    # 1. Define o período (últimos 7 dias, igual ao Inter)
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=7)
+
+    # 2. Chama a API
+    resultado = buscar_extrato_mercadopago(user, start_date, end_date)
+
+    if 'erro' in resultado:
+        mensagens.error(f"Erro na integração Mercado Pago: {resultado['erro']}")
+        return mensagens.itens
+
+    transacoes = resultado.get('transacoes', [])
+
+    # Tenta localizar ou criar uma conta bancária para o MP
+    banco_mp = BankAccount.objects.filter(user=user, bank_name__icontains='Mercado Pago').first()
+    if not banco_mp:
+        # Cria um banco virtual se não existir, para vincular os lançamentos
+        banco_mp = BankAccount.objects.create(
+            user=user,
+            bank_name='Mercado Pago',
+            agency='0001',
+            account_number='DIGITAL',
+            initial_balance=0
+        )
+
+    itens = []
+    for transacao in transacoes:
+        descricao_origem = transacao['descricao']
+        id_mp = transacao['id_mp']
+        itens.append({
+            'external_id': id_mp,
+            'tipo': 'RECEIVABLE',
+            'date': _data_movimento(transacao['data'], end_date),
+            'amount': Decimal(str(transacao['valor'])),  # Valor Bruto
+            'name': descricao_origem[:100],
+            'description': f"Venda MP - {descricao_origem} (ID: {id_mp})",
+            'classificar': descricao_origem,
+        })
+
+    categorias_padrao = {}
+    if itens:
+        # Categoria padrão caso a regra não encontre
+        categorias_padrao['RECEIVABLE'], _ = Category.objects.get_or_create(
+            user=user, name='Receitas de Vendas', category_type='RECEIVABLE'
+        )
+
+    contadores = ingerir_extrato(
+        user, banco_mp, itens, 'Mercado Pago', categorias_padrao=categorias_padrao,
+        padroes={'RECEIVABLE': {'payment_method': 'CREDITO'}},  # Assume Crédito/Digital
+    )
+
+    # Feedback
+    if contadores['importados'] > 0:
+        mensagens.success(f"Mercado Pago: {contadores['importados']} vendas importadas com sucesso!")
+    elif contadores['duplicados'] > 0:
+        mensagens.info("Mercado Pago: Nenhuma venda nova. Transações já importadas.")
+    else:
+        mensagens.warning("Mercado Pago: Nenhuma transação encontrada nos últimos 7 dias.")
+
+    return mensagens.itens
+
+
+def sincronizar_extrato_asaas(user, dias=30):
+    """ Movimentações do Asaas nos últimos `dias` (7, 15, 30 ou 90). """
+    mensagens = ColetorMensagens()
+
+    # 1. Define o período escolhido (fallback: 30 dias)
+    try:
+        asaas_days = int(dias)
+        # Saneamento simples: restringe a opções esperadas (7, 15, 30, 90)
+        if asaas_days not in (7, 15, 30, 90):
+            asaas_days = 30
+    except (TypeError, ValueError):
+        asaas_days = 30
+
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=asaas_days)
+
+    # 2. Chama a API
+    resultado = buscar_extrato_asaas(user, start_date, end_date)
+
+    if 'erro' in resultado:
+        mensagens.error(f"Erro na integração Asaas: {resultado['erro']}")
+        return mensagens.itens
+
+    transacoes = resultado.get('transacoes', [])
+
+    # Cria/Busca banco virtual Asaas
+    banco_asaas, _ = BankAccount.objects.get_or_create(
+        user=user,
+        bank_name='Asaas IP S.A.',
+        defaults={'agency': '0001', 'account_number': 'DIGITAL', 'initial_balance': 0}
+    )
+
+    itens = []
+    for transacao in transacoes:
+        tipo_op = transacao['tipo']  # 'C' ou 'D'
+        if tipo_op not in ('C', 'D'):
+            continue
+        descricao_origem = transacao['descricao']
+        id_asaas = transacao['id_asaas']
+        itens.append({
+            'external_id': id_asaas,
+            # Saídas: taxas de boleto, transferências, saques
+            'tipo': 'RECEIVABLE' if tipo_op == 'C' else 'PAYABLE',
+            'date': _data_movimento(transacao['data'], end_date),
+            'amount': Decimal(str(transacao['valor'])),
+            'name': descricao_origem[:100],
+            'description': f"Asaas - {descricao_origem} (ID: {id_asaas})",
+            'classificar': descricao_origem,
+        })
+
+    categorias_padrao = {}
+    tipos = {item['tipo'] for item in itens}
+    if 'RECEIVABLE' in tipos:
+        categorias_padrao['RECEIVABLE'], _ = Category.objects.get_or_create(
+            user=user, name='Receitas Asaas', category_type='RECEIVABLE'
+        )
+    if 'PAYABLE' in tipos:
+        categorias_padrao['PAYABLE'], _ = Category.objects.get_or_create(
+            user=user, name='Taxas Bancárias', category_type='PAYABLE'
+        )
+
+    contadores = ingerir_extrato(
+        user, banco_asaas, itens, 'Asaas', categorias_padrao=categorias_padrao,
+        padroes={'PAYABLE': {'cost_type': 'VARIAVEL'}, 'RECEIVABLE': {'payment_method': 'BOLETO'}},  # Padrão Asaas
+    )
+    count_importados = contadores['importados']
+    count_duplicados = contadores['duplicados']
+
+    # Mensageria com detalhamento de duplicados
+    movimentacoes = f"movimentaçõe{_plural(count_importados, '', 's')} importada{_plural(count_importados, '', 's')}"
+    ignoradas = f"{count_duplicados} ignorada{_plural(count_duplicados, '', 's')} por duplicidade"
+    if count_importados > 0:
+        if count_duplicados > 0:
+            mensagens.success(f"Asaas: {count_importados} {movimentacoes} com sucesso ({ignoradas}).")
+        else:
+            mensagens.success(f"Asaas: {count_importados} {movimentacoes} com sucesso!")
+    elif count_duplicados > 0:
+        # Nenhuma nova, apenas duplicadas
+        mensagens.info(f"Asaas: Nenhuma movimentação nova ({ignoradas}).")
+    else:
+        # Realmente não veio nada do período consultado
+        mensagens.warning("Asaas: Nenhuma transação encontrada no período.")
+
+    return mensagens.itens
+
+
+def sincronizar_extrato_cora(user, opcao=None):
+    """ Extrato do Banco Cora. `opcao`: número de dias, "mes_atual" ou "mes_anterior". """
+    mensagens = ColetorMensagens()
+    today = datetime.now().date()
+
+    # === LÓGICA DINÂMICA DE DATAS (RODRIGO ABREU) ===
+    if opcao == 'mes_anterior':
+        primeiro_dia_mes_atual = today.replace(day=1)
+        end_date = primeiro_dia_mes_atual - timedelta(days=1)
+        start_date = end_date.replace(day=1)
+        label_periodo = f"do mês anterior ({start_date.strftime('%d/%m')} a {end_date.strftime('%d/%m')})"
+    elif opcao == 'mes_atual':
+        start_date = today.replace(day=1)
+        end_date = today
+        label_periodo = "do mês atual"
+    else:
+        try:
+            dias_para_sincronizar = int(opcao)
+        except (ValueError, TypeError):
+            dias_para_sincronizar = 7
+        end_date = today
+        start_date = end_date - timedelta(days=dias_para_sincronizar)
+        label_periodo = f"dos últimos {dias_para_sincronizar} dias"
+
+    # Chama o utils (Passando as datas dinâmicas)
+    resultado = buscar_extrato_cora(user, start_date, end_date)
+
+    if 'erro' in resultado:
+        mensagens.error(f"Erro na integração Cora: {resultado['erro']}")
+        return mensagens.itens
+
+    transacoes = resultado.get('transacoes', [])
+
+    banco_cora = BankAccount.objects.filter(user=user, bank_name__icontains='Cora').first()
+    if not banco_cora:
+        banco_cora = BankAccount.objects.create(user=user, bank_name='Banco Cora', agency='0001', account_number='DIGITAL', initial_balance=0)
+
+    itens = []
+    for transacao in transacoes:
+        nome_parte = transacao.get('nome_parte') or ''
+        itens.append({
+            'external_id': transacao.get('id_cora'),
+            'tipo': 'PAYABLE' if transacao.get('tipo') == 'D' else 'RECEIVABLE',
+            'date': _data_movimento(transacao.get('data'), end_date),
+            'amount': Decimal(str(transacao.get('valor', 0))),
+            'name': nome_parte[:200],
+            'description': f"{nome_parte} (Ref: {transacao.get('descricao')})",
+            'classificar': nome_parte,
+        })
+
+    contadores = ingerir_extrato(
+        user, banco_cora, itens, 'Cora', conciliar=True,
+        categorias_padrao=_categorias_padrao_usuario(user) if itens else None,
+    )
+
+    # === BLOCO DE FEEDBACK ===
+    if contadores['importados'] > 0:
+        mensagens.success(f"Cora: {contadores['importados']} novos lançamentos importados {label_periodo}.")
+
+    if contadores['conciliados'] > 0:
+        mensagens.info(f"Cora: {contadores['conciliados']} contas existentes foram conciliadas automaticamente.")
+
+    # Aviso de duplicados ignorados
+    if contadores['duplicados'] > 0:
+        mensagens.warning(f"Cora: {contadores['duplicados']} transações foram ignoradas por já existirem no sistema.")
+
+    if contadores['importados'] == 0 and contadores['conciliados'] == 0:
+        mensagens.info(f"Cora: Nenhuma transação nova encontrada {label_periodo}.")
+
+    return mensagens.itens
+
+
+def sincronizar_extrato_sicredi(user):
+    """ Extrato do Sicredi (últimos 7 dias), com conciliação de contas abertas. """
+    mensagens = ColetorMensagens()
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=7)
+
+    # Chama o utils (seguindo o padrão de retorno que definimos)
+    resultado = buscar_extrato_sicredi(user, start_date, end_date)
+
+    if 'erro' in resultado:
+        mensagens.error(f"Erro na integração Sicredi: {resultado['erro']}")
+        return mensagens.itens
+
+    transacoes = resultado.get('transacoes', [])
+
+    banco_sicredi = BankAccount.objects.filter(user=user, bank_name__icontains='Sicredi').first()
+    if not banco_sicredi:
+        banco_sicredi = BankAccount.objects.create(user=user, bank_name='Sicredi', agency='0001', account_number='DIGITAL', initial_balance=0)
+
+    itens = []
+    for transacao in transacoes:
+        nome_parte = transacao.get('nome_parte') or ''
+        itens.append({
+            'external_id': transacao.get('id_sicredi'),  # ID único da transação no Sicredi
+            'tipo': 'PAYABLE' if transacao.get('tipo') == 'D' else 'RECEIVABLE',
+            'date': _data_movimento(transacao.get('data'), end_date),
+            'amount': Decimal(str(transacao.get('valor', 0))),
+            'name': nome_parte[:200],
+            'description': f"{nome_parte} (Sicredi: {transacao.get('descricao')})",
+            'classificar': nome_parte,
+        })
+
+    # Banco da regra de classificação tem prioridade sobre o banco Sicredi
+    contadores = ingerir_extrato(
+        user, banco_sicredi, itens, 'Sicredi', conciliar=True,
+        categorias_padrao=_categorias_padrao_usuario(user) if itens else None,
+        usar_banco_da_regra=True,
+    )
+
+    if contadores['importados'] > 0: mensagens.success(f"Sicredi: {contadores['importados']} importados.")
+    if contadores['conciliados'] > 0: mensagens.info(f"Sicredi: {contadores['conciliados']} conciliados.")
+    if contadores['importados'] == 0 and contadores['conciliados'] == 0: mensagens.info("Sicredi: Nada novo.")
+
+    return mensagens.itens
+
+
+# Chave usada no POST/tarefa -> função de sincronização
+SINCRONIZADORES_EXTRATO = {
+    'inter': sincronizar_extrato_inter,
+    'mercadopago': sincronizar_extrato_mercadopago,
+    'asaas': sincronizar_extrato_asaas,
+    'cora': sincronizar_extrato_cora,
+    'sicredi': sincronizar_extrato_sicredi,
+}
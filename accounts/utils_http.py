@@ -0,0 +1,137 @@
+# accounts/utils_http.py
+"""
+Cliente HTTP compartilhado pelas integrações externas (ERPs, bancos, Asaas, Focus).
+
+Cada provedor tem uma requests.Session por processo, com pool de conexões e
+keep-alive: sincronizações paginadas reaproveitam a mesma conexão TLS em vez de
+abrir uma nova por página. Todas as chamadas passam por `requisitar`, que
+aplica timeouts de conexão/leitura padrão, repete com backoff exponencial e
+jitter em 429/5xx e registra a latência de cada tentativa no log.
+
+Só 429 (a requisição foi recusada, não processada) é repetido para qualquer
+método; 5xx e falhas de conexão só são repetidos em métodos idempotentes ou
+quando o chamador informa `idempotente=True` (ex: APIs de consulta via POST,
+como Omie e Tiny). Uploads (`files=`) nunca são repetidos.
+"""
+import logging
+import random
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .utils_desempenho import registrar_http
+
+logger = logging.getLogger(__name__)
+
+# provedor -> (timeout de conexão, timeout de leitura) em segundos
+TIMEOUTS = {
+    'omie': (5, 60),
+    'tiny': (5, 60),
+    'nibo': (5, 30),
+    'conta_azul': (5, 30),
+    'inter': (5, 30),
+    'cora': (5, 30),
+    'sicredi': (5, 30),
+    'mercadopago': (5, 30),
+    'asaas': (5, 30),
+    'focus': (5, 60),
+}
+TIMEOUT_PADRAO = (5, 30)
+
+STATUS_REPETIVEIS = {429, 500, 502, 503, 504}
+METODOS_IDEMPOTENTES = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+MAX_TENTATIVAS = 3
+BACKOFF_BASE = 0.5    # segundos; dobra a cada tentativa
+BACKOFF_MAXIMO = 10
+
+# Conexões mantidas por host (sincronizações concorrentes usam várias)
+TAMANHO_POOL = 10
+
+_sessoes = {}
+_trava = threading.Lock()
+
+
+def sessao(provedor):
+    """ Session do provedor (criada na primeira chamada e reutilizada pelo processo). """
+    existente = _sessoes.get(provedor)
+    if existente is not None:
+        return existente
+
+    with _trava:
+        if provedor not in _sessoes:
+            nova = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=TAMANHO_POOL, pool_maxsize=TAMANHO_POOL)
+            nova.mount('https://', adaptador)
+            nova.mount('http://', adaptador)
+            # A sessão é compartilhada entre tenants: nenhum cookie é guardado entre chamadas
+            nova.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _sessoes[provedor] = nova
+        return _sessoes[provedor]
+
+
+def _espera(tentativa, resposta=None):
+    """ Backoff exponencial com jitter total; respeita Retry-After (em segundos) quando vier. """
+    if resposta is not None:
+        retry_after = resposta.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(int(retry_after), BACKOFF_MAXIMO)
+    return random.uniform(0, min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** (tentativa - 1)))
+
+
+def requisitar(provedor, metodo, url, idempotente=None, tentativas=MAX_TENTATIVAS, ao_tentar=None, **kwargs):
+    """
+    Executa a requisição pela sessão do provedor. Aceita os mesmos argumentos
+    de requests (params, json, data, headers, auth, cert, files, timeout...)
+    e devolve a Response; exceções de rede são as de requests.
+
+    `ao_tentar(tentativa, status)` é chamado a cada tentativa feita, inclusive
+    as repetidas aqui dentro (status None em falha de conexão), para quem
+    contabiliza requisições e 429 recebidos.
+    """
+    metodo = metodo.upper()
+    kwargs.setdefault('timeout', TIMEOUTS.get(provedor, TIMEOUT_PADRAO))
+    if idempotente is None:
+        idempotente = metodo in METODOS_IDEMPOTENTES
+    if 'files' in kwargs:
+        tentativas = 1
+
+    cliente = sessao(provedor)
+    endereco = url.split('?')[0]  # não registra tokens de query string
+    for tentativa in range(1, tentativas + 1):
+        inicio = time.monotonic()
+        try:
+            resposta = cliente.request(metodo, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as erro:
+            duracao = (time.monotonic() - inicio) * 1000
+            registrar_http(duracao)
+            if ao_tentar:
+                ao_tentar(tentativa, None)
+            logger.warning(
+                'http %s %s %s falhou em %.0fms (tentativa %d/%d): %s',
+                provedor, metodo, endereco, duracao, tentativa, tentativas, erro,
+            )
+            if not idempotente or tentativa == tentativas:
+                raise
+            time.sleep(_espera(tentativa))
+            continue
+
+        duracao = (time.monotonic() - inicio) * 1000
+        registrar_http(duracao)
+        if ao_tentar:
+            ao_tentar(tentativa, resposta.status_code)
+        logger.info(
+            'http %s %s %s -> %s em %.0fms (tentativa %d/%d)',
+            provedor, metodo, endereco, resposta.status_code, duracao, tentativa, tentativas,
+        )
+
+        repetir = resposta.status_code == 429 or (idempotente and resposta.status_code in STATUS_REPETIVEIS)
+        if not repetir or tentativa == tentativas:
+            return resposta
+        espera = _espera(tentativa, resposta)
+        resposta.close()
+        time.sleep(espera)
+
@@ -0,0 +1,518 @@
+# accounts/utils_importacao.py
+"""
+Importação de contas a pagar/receber por planilha (ação import_excel) e do
+catálogo de produtos/serviços (importar_planilha em comercial_cadastros_view).
+
+Em vez de percorrer a planilha linha a linha com consultas e create() em cada
+uma, as colunas são normalizadas de uma vez com pandas (datas, valores, área
+DRE, status), categorias/centros de custo/bancos são resolvidos com uma
+consulta cada (mais um bulk_create dos que faltam), a duplicidade é checada
+contra um conjunto de chaves carregado previamente e as contas são gravadas
+com bulk_create. Os erros continuam sendo reportados por linha: cada conta
+passa por full_clean() antes de entrar no lote, para que um valor fora das
+opções ou do tamanho do campo não derrube o bulk_create inteiro.
+"""
+import unicodedata
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+import pandas as pd
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import transaction
+
+from .models import (
+    PAYMENT_METHODS, BankAccount, Category, CentroCusto, PayableAccount, ProdutoServico, ReceivableAccount,
+)
+from .utils_classificacao import classificador_do_usuario
+from .utils_resumo import atualizar_resumo
+from .utils_saldos import ajustar_saldos, contribuicao
+
+TAMANHO_LOTE_IMPORTACAO = 1000
+
+# Linhas do catálogo processadas (lidas do CSV e gravadas) por vez
+TAMANHO_BLOCO_CATALOGO = 2000
+
+# Cabeçalho da planilha (minúsculo) -> campo interno, por tipo de conta
+COLUNAS_PLANILHA = {
+    'PAYABLE': {
+        # Básicos
+        'nome': 'name', 'cliente': 'name', 'fornecedor': 'name', 'favorecido': 'name',
+        'vencimento': 'due_date', 'data de vencimento': 'due_date', 'data vencimento': 'due_date',
+        'valor': 'amount', 'valor total': 'amount', 'pagamento': 'amount',
+
+        # Opcionais
+        'descrição': 'description', 'histórico': 'description', 'observação': 'description',
+        'categoria': 'category', 'plano de contas': 'category',
+        'centro de custo': 'centro_custo', 'centro custo': 'centro_custo',
+        'conta bancária': 'bank_account', 'banco': 'bank_account',
+        'forma de pagamento': 'payment_method', 'forma pgto': 'payment_method', 'forma pag.': 'payment_method',
+        'custo': 'cost_type', 'tipo de custo': 'cost_type',
+
+        # Coluna DRE
+        'área dre': 'dre_area', 'area dre': 'dre_area', 'área-dre': 'dre_area', 'dre': 'dre_area',
+
+        # Status e Baixa
+        'status': 'status_check', 'situação': 'status_check', 'ações': 'status_check', 'pago?': 'status_check',
+        'data do pagamento': 'payment_date_real', 'data pagamento': 'payment_date_real', 'data baixa': 'payment_date_real'
+    },
+    'RECEIVABLE': {
+        'nome': 'name', 'cliente': 'name', 'pagador': 'name',
+        'vencimento': 'due_date', 'data de vencimento': 'due_date',
+        'valor': 'amount', 'valor total': 'amount', 'recebimento': 'amount',
+
+        'descrição': 'description', 'histórico': 'description',
+        'categoria': 'category', 'plano de contas': 'category',
+        'conta bancária': 'bank_account', 'banco': 'bank_account',
+        'forma de pagamento': 'payment_method', 'forma pag.': 'payment_method',
+
+        # Coluna DRE
+        'área dre': 'dre_area', 'area dre': 'dre_area', 'área-dre': 'dre_area', 'dre': 'dre_area',
+
+        # Status e Baixa
+        'status': 'status_check', 'situação': 'status_check', 'ações': 'status_check', 'recebido?': 'status_check',
+        'data do recebimento': 'payment_date_real', 'data recebimento': 'payment_date_real', 'data baixa': 'payment_date_real'
+    },
+}
+
+NOMES_AMIGAVEIS = {
+    'PAYABLE': {
+        'name': "'Nome', 'Fornecedor' ou 'Favorecido'",
+        'due_date': "'Vencimento' ou 'Data de Vencimento'",
+        'amount': "'Valor' ou 'Valor Total'"
+    },
+    'RECEIVABLE': {
+        'name': "'Nome', 'Cliente' ou 'Pagador'",
+        'due_date': "'Vencimento' ou 'Data de Vencimento'",
+        'amount': "'Valor' ou 'Valor Recebido'"
+    },
+}
+
+# tipo -> (modelo, campo de liquidação, categoria padrão, DRE padrão)
+CONFIG_IMPORTACAO = {
+    'PAYABLE': (PayableAccount, 'is_paid', 'Despesas Gerais', 'OPERACIONAL'),
+    'RECEIVABLE': (ReceivableAccount, 'is_received', 'Receitas Gerais', 'BRUTA'),
+}
+
+STATUS_LIQUIDADO = ('pago', 'quitado', 'baixado', 'sim', 'ok', 'recebido', 'liquidado')
+
+CENTAVOS = Decimal('0.01')
+
+
+def _sem_acento(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().upper()
+
+
+# Forma de pagamento da planilha (código ou rótulo, com ou sem acento) -> código interno
+FORMAS_PAGAMENTO = {
+    **{_sem_acento(rotulo): codigo for codigo, rotulo in PAYMENT_METHODS},
+    **{codigo: codigo for codigo, _ in PAYMENT_METHODS},
+}
+
+
+def normalizar_dre_area(valor, tipo='PAYABLE'):
+    """
+    Converte o texto vindo da planilha para o código interno do campo dre_area.
+    Aceita tanto o código puro (ex: OPERACIONAL) quanto o rótulo amigável
+    (ex: Despesas Operacionais (-)).
+    """
+    if valor is None:
+        return None
+
+    valor_str = str(valor).strip()
+    if not valor_str:
+        return None
+
+    valor_upper = valor_str.upper()
+
+    # 1. Se já veio no código interno, retorna direto
+    codigos_validos = {
+        'NAO_CONSTAR',
+        'BRUTA',
+        'DEDUCAO',
+        'CUSTOS',
+        'OPERACIONAL',
+        'DEPRECIACAO',
+        'NAO_OPERACIONAL',
+        'RETIRADA_SOCIOS',
+        'APORTE_SOCIOS',
+        'OUTRAS_RECEITAS',
+        'TRIBUTACAO',
+        'DISTRIBUICAO',
+    }
+    if valor_upper in codigos_validos:
+        return valor_upper
+
+    # 2. Normaliza texto amigável da planilha
+    texto = (
+        valor_upper
+        .replace('Á', 'A')
+        .replace('À', 'A')
+        .replace('Ã', 'A')
+        .replace('Â', 'A')
+        .replace('É', 'E')
+        .replace('Ê', 'E')
+        .replace('Í', 'I')
+        .replace('Ó', 'O')
+        .replace('Ô', 'O')
+        .replace('Õ', 'O')
+        .replace('Ú', 'U')
+        .replace('Ç', 'C')
+    )
+
+    mapa = {
+        'NAO CONSTAR DRE': 'NAO_CONSTAR',
+        'NAO CONSTAR': 'NAO_CONSTAR',
+
+        'RECEITAS BRUTAS (+)': 'BRUTA',
+        'RECEITAS BRUTAS': 'BRUTA',
+        'RECEITA BRUTA': 'BRUTA',
+        'BRUTA': 'BRUTA',
+
+        'DEDUCAO DA RECEITA BRUTA (-)': 'DEDUCAO',
+        'DEDUCAO DA RECEITA BRUTA': 'DEDUCAO',
+        'DEDUCAO': 'DEDUCAO',
+
+        'CUSTOS CSP/CMV (-)': 'CUSTOS',
+        'CUSTOS CSP/CMV': 'CUSTOS',
+        'CUSTOS': 'CUSTOS',
+
+        'DESPESAS OPERACIONAIS (-)': 'OPERACIONAL',
+        'DESPESAS OPERACIONAIS': 'OPERACIONAL',
+        'OPERACIONAL': 'OPERACIONAL',
+
+        'DEPRECIACAO E AMORTIZACAO (-)': 'DEPRECIACAO',
+        'DEPRECIACAO E AMORTIZACAO': 'DEPRECIACAO',
+        'DEPRECIACAO': 'DEPRECIACAO',
+
+        'DESPESAS NAO OPERACIONAIS (-)': 'NAO_OPERACIONAL',
+        'DESPESAS NAO OPERACIONAIS': 'NAO_OPERACIONAL',
+        'NAO OPERACIONAL': 'NAO_OPERACIONAL',
+
+        'RETIRADA DE SOCIOS (-)': 'RETIRADA_SOCIOS',
+        'RETIRADA DE SOCIOS': 'RETIRADA_SOCIOS',
+        'RETIRADA SOCIOS': 'RETIRADA_SOCIOS',
+
+        'APORTE FINANCEIRO (+)': 'APORTE_SOCIOS',
+        'APORTE FINANCEIRO': 'APORTE_SOCIOS',
+        'APORTE SOCIOS': 'APORTE_SOCIOS',
+
+        'OUTRAS RECEITAS (+)': 'OUTRAS_RECEITAS',
+        'OUTRAS RECEITAS': 'OUTRAS_RECEITAS',
+
+        'IRPJ E CSLL (TRIBUTACAO) (-)': 'TRIBUTACAO',
+        'IRPJ E CSLL (TRIBUTACAO)': 'TRIBUTACAO',
+        'TRIBUTACAO': 'TRIBUTACAO',
+
+        'DISTRIBUICAO DE LUCRO SOCIOS (-)': 'DISTRIBUICAO',
+        'DISTRIBUICAO DE LUCRO SOCIOS': 'DISTRIBUICAO',
+        'DISTRIBUICAO': 'DISTRIBUICAO',
+    }
+
+    dre = mapa.get(texto)
+    if dre:
+        return dre
+
+    # 3. Se não reconheceu, aplica padrão seguro por tipo
+    return 'OPERACIONAL' if tipo == 'PAYABLE' else 'BRUTA'
+
+
+def ler_planilha_contas(df, tipo):
+    """
+    Renomeia as colunas da planilha para os campos internos (descarta as
+    desconhecidas). Levanta ValueError se faltar uma coluna obrigatória.
+    """
+    mapa = COLUNAS_PLANILHA[tipo]
+    df = df.rename(columns={col: mapa.get(str(col).strip().lower()) for col in df.columns})
+    df = df.loc[:, [col is not None for col in df.columns]]
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    for internal_name in ('name', 'due_date', 'amount'):
+        if internal_name not in df.columns:
+            raise ValueError(f"A coluna obrigatória {NOMES_AMIGAVEIS[tipo][internal_name]} não foi encontrada.")
+    return df.reset_index(drop=True)
+
+
+def _coluna_texto(df, coluna, limite=None):
+    """ Coluna como texto sem espaços nas pontas; células vazias (ou coluna ausente) viram None. """
+    if coluna not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    serie = df[coluna]
+    texto = serie.astype(str).str.strip()
+    if limite:
+        texto = texto.str.slice(0, limite)
+    return texto.astype(object).where(serie.notna() & (texto != ''), None)
+
+
+def _coluna_data(df, coluna):
+    if coluna not in df.columns:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    return pd.to_datetime(df[coluna], errors='coerce', dayfirst=True, format='mixed')
+
+
+def _resolver_por_nome(modelo, campo_nome, user, nomes, **filtros):
+    """ {nome: objeto} do usuário com uma consulta; os que faltam são criados num único bulk_create. """
+    encontrados = {}
+    if not nomes:
+        return encontrados
+    for objeto in modelo.objects.filter(user=user, **{f'{campo_nome}__in': nomes}, **filtros).order_by('id'):
+        encontrados.setdefault(getattr(objeto, campo_nome), objeto)
+
+    faltando = [modelo(user=user, **{campo_nome: nome}, **filtros) for nome in nomes if nome not in encontrados]
+    if faltando:
+        for objeto in modelo.objects.bulk_create(faltando):
+            encontrados[getattr(objeto, campo_nome)] = objeto
+    return encontrados
+
+
+def _resolver_bancos(user, nomes):
+    """ Mesmo critério do antigo bank_name__icontains + first(), com uma única consulta. """
+    bancos = list(BankAccount.objects.filter(user=user).order_by('id'))
+    resolvidos = {}
+    for nome in nomes:
+        nome_lower = nome.lower()
+        resolvidos[nome] = next((b for b in bancos if nome_lower in (b.bank_name or '').lower()), None)
+    return resolvidos
+
+
+def _erro_de_validacao(conta):
+    """
+    Primeiro erro de full_clean() da conta, como 'Campo: mensagem' (None se válida).
+    As chaves estrangeiras ficam de fora: já vêm resolvidas do banco e validá-las
+    faria uma consulta por linha.
+    """
+    relacoes = [campo.name for campo in conta._meta.fields if campo.is_relation]
+    try:
+        conta.full_clean(exclude=relacoes, validate_unique=False, validate_constraints=False)
+    except ValidationError as erro:
+        campo, mensagens = next(iter(erro.message_dict.items()))
+        if campo == NON_FIELD_ERRORS:
+            return mensagens[0]
+        return f"{conta._meta.get_field(campo).verbose_name.capitalize()}: {mensagens[0]}"
+    return None
+
+
+def importar_contas_planilha(user, df, tipo):
+    """
+    Importa as linhas de uma planilha já passada por ler_planilha_contas.
+    Retorna {'importados': n, 'duplicados': n, 'falhas': ['Linha 3: ...', ...]}.
+    """
+    modelo, campo_liquidado, categoria_padrao, dre_padrao = CONFIG_IMPORTACAO[tipo]
+    resultado = {'importados': 0, 'duplicados': 0, 'falhas': []}
+    if df.empty:
+        return resultado
+
+    # 1. Normalização vetorizada das colunas
+    nomes = _coluna_texto(df, 'name', limite=200)
+    descricoes = _coluna_texto(df, 'description').fillna('Importado via Excel')
+    vencimentos = _coluna_data(df, 'due_date')
+    valores = pd.to_numeric(df['amount'].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+
+    # Prioriza a forma de pagamento da planilha; se vazia usa BOLETO (as não reconhecidas
+    # seguem como vieram e são recusadas na validação da linha)
+    formas_pagamento = _coluna_texto(df, 'payment_method').map(
+        lambda forma: FORMAS_PAGAMENTO.get(_sem_acento(forma), forma), na_action='ignore'
+    ).fillna('BOLETO')
+    tipos_custo = _coluna_texto(df, 'cost_type').str.upper()
+    tipos_custo = tipos_custo.where(tipos_custo.isin(['FIXO', 'VARIAVEL']), 'FIXO')
+
+    liquidados = _coluna_texto(df, 'status_check').str.lower().isin(STATUS_LIQUIDADO)
+    datas_pagamento = _coluna_data(df, 'payment_date_real').fillna(vencimentos).where(liquidados)
+
+    dre_planilha = _coluna_texto(df, 'dre_area')
+    dre_planilha = dre_planilha.map({v: normalizar_dre_area(v, tipo) for v in dre_planilha.dropna().unique()})
+
+    categorias = _coluna_texto(df, 'category', limite=100)
+    centros = _coluna_texto(df, 'centro_custo', limite=100) if tipo == 'PAYABLE' else None
+    bancos = _coluna_texto(df, 'bank_account')
+
+    # 2. Erros por linha (a última regra aplicada prevalece)
+    erros = pd.Series(None, index=df.index, dtype=object)
+    erros = erros.mask(nomes.isna(), 'Nome em branco.')
+    erros = erros.mask(valores.isna() | (valores.abs() >= 10 ** 8), 'Valor inválido.')
+    erros = erros.mask(vencimentos.isna(), 'Formato de data de vencimento inválido.')
+    validas = erros.isna()
+    resultado['falhas'] = [f"Linha {indice + 2}: {erro}" for indice, erro in erros[~validas].items()]
+    if not validas.any():
+        return resultado
+
+    # 3. Classificação automática uma vez por nome distinto
+    classificador = classificador_do_usuario(user)
+    previsoes = {nome: classificador.prever(nome, tipo) for nome in nomes[validas].unique()}
+
+    # 4. Categorias, centros de custo e bancos: uma consulta cada (+ um bulk_create dos que faltam)
+    nomes_categoria = set(categorias[validas].dropna())
+    if any(cat is None and previsoes[nome][0] is None for nome, cat in zip(nomes[validas], categorias[validas])):
+        nomes_categoria.add(categoria_padrao)
+    mapa_categorias = _resolver_por_nome(Category, 'name', user, nomes_categoria, category_type=tipo)
+    mapa_centros = _resolver_por_nome(CentroCusto, 'nome', user, set(centros[validas].dropna())) if centros is not None else {}
+    mapa_bancos = _resolver_bancos(user, set(bancos[validas].dropna()))
+
+    # 5. Anti-duplicidade (nome + vencimento + valor) contra as contas já existentes no período
+    datas_vencimento = vencimentos.dt.date
+    existentes = set(
+        modelo.objects.filter(
+            user=user, due_date__range=[datas_vencimento[validas].min(), datas_vencimento[validas].max()]
+        ).values_list('name', 'due_date', 'amount')
+    )
+
+    # Linhas válidas já normalizadas; itertuples evita o acesso elemento a elemento das Series
+    linhas = pd.DataFrame({
+        'numero': df.index + 2, 'name': nomes, 'description': descricoes, 'due_date': datas_vencimento,
+        'amount': valores, 'payment_method': formas_pagamento, 'cost_type': tipos_custo,
+        'liquidado': liquidados, 'payment_date': datas_pagamento.dt.date, 'dre_area': dre_planilha,
+        'category': categorias, 'centro_custo': centros, 'bank_account': bancos,
+    })[validas]
+
+    novas = []
+    for linha in linhas.itertuples(index=False):
+        try:
+            amount = Decimal(str(linha.amount)).quantize(CENTAVOS)
+        except InvalidOperation:
+            resultado['falhas'].append(f"Linha {linha.numero}: Valor inválido.")
+            continue
+
+        chave = (linha.name, linha.due_date, amount)
+        if chave in existentes:
+            resultado['duplicados'] += 1
+            continue
+
+        cat_smart, dre_smart, bank_smart, _ = previsoes[linha.name]
+        dre_smart_normalizada = normalizar_dre_area(dre_smart, tipo) if dre_smart else None
+
+        campos = dict(
+            user=user, name=linha.name, description=linha.description,
+            due_date=linha.due_date, amount=amount,
+            category=mapa_categorias[linha.category] if linha.category else (cat_smart or mapa_categorias[categoria_padrao]),
+            bank_account=(mapa_bancos.get(linha.bank_account) if linha.bank_account else None) or bank_smart,
+            dre_area=linha.dre_area if pd.notna(linha.dre_area) else (dre_smart_normalizada or dre_padrao),
+            payment_method=linha.payment_method, occurrence='AVULSO',
+            payment_date=linha.payment_date if linha.liquidado else None,
+            **{campo_liquidado: bool(linha.liquidado)},
+        )
+        if tipo == 'PAYABLE':
+            campos['cost_type'] = linha.cost_type
+            campos['centro_custo'] = mapa_centros.get(linha.centro_custo) if linha.centro_custo else None
+        conta = modelo(**campos)
+
+        erro = _erro_de_validacao(conta)
+        if erro:
+            resultado['falhas'].append(f"Linha {linha.numero}: {erro}")
+            continue
+        existentes.add(chave)
+        novas.append(conta)
+
+    # 6. Gravação em lote; rollup e saldos atualizados aqui porque bulk_create não dispara signals
+    with transaction.atomic():
+        modelo.objects.bulk_create(novas, batch_size=TAMANHO_LOTE_IMPORTACAO)
+
+        deltas = defaultdict(Decimal)
+        for conta in novas:
+            efeito = contribuicao(tipo, conta.bank_account_id, conta.amount, getattr(conta, campo_liquidado))
+            if efeito:
+                deltas[efeito[0]] += efeito[1]
+        ajustar_saldos(dict(deltas))
+        atualizar_resumo(user.id, {conta.due_date for conta in novas})
+
+    resultado['importados'] = len(novas)
+    return resultado
+
+
+# --- Catálogo de produtos/serviços ---
+
+CAMPOS_ATUALIZADOS_CATALOGO = [
+    'nome', 'descricao', 'tipo', 'preco_custo', 'preco_venda', 'estoque_atual',
+    'ncm', 'codigo_servico', 'unidade_medida', 'origem',
+]
+
+
+def _blocos_catalogo(arquivo, tamanho=TAMANHO_BLOCO_CATALOGO):
+    """
+    DataFrames de até `tamanho` linhas, tudo como texto (preserva zeros à
+    esquerda de código e NCM). O CSV é lido em blocos, sem carregar o arquivo inteiro.
+    """
+    if arquivo.name.lower().endswith('.csv'):
+        yield from pd.read_csv(arquivo, dtype=str, chunksize=tamanho)
+        return
+    df = pd.read_excel(arquivo, dtype=str)
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+
+def _preco_catalogo(df, coluna):
+    """ (valores, inválidos): vazio vale 0; texto que não é número marca a linha como inválida. """
+    texto = _coluna_texto(df, coluna)
+    numeros = pd.to_numeric(texto.str.replace(',', '.', regex=False), errors='coerce')
+    return numeros.fillna(0).round(2), texto.notna() & numeros.isna()
+
+
+def _produtos_do_bloco(user, df):
+    """ (produtos, nº de linhas ignoradas) de um bloco da planilha do catálogo. """
+    df = df.rename(columns=lambda c: str(c).lower().strip())
+
+    codigos = _coluna_texto(df, 'codigo', limite=50)
+    nomes = _coluna_texto(df, 'nome', limite=200)
+    # Ajuste do tipo para bater com TIPO_CHOICES
+    tipos = _coluna_texto(df, 'tipo').str.upper().isin(['S', 'SERVICO', 'SERVIÇO']).map({True: 'SERVICO', False: 'PRODUTO'})
+
+    preco_custo, custo_invalido = _preco_catalogo(df, 'preco_custo')
+    preco_venda, venda_invalido = _preco_catalogo(df, 'preco_venda')
+    estoque = pd.to_numeric(_coluna_texto(df, 'estoque').str.replace(',', '.', regex=False), errors='coerce')
+    estoque = estoque.fillna(0).astype('int64').where(tipos == 'PRODUTO', 0)
+
+    # NCM só com dígitos (aceita 8471.60.52); unidade/origem com padrão quando vazias
+    ncm = _coluna_texto(df, 'ncm').str.replace(r'\D', '', regex=True).str.slice(0, 8).fillna('')
+    unidade = _coluna_texto(df, 'unidade', limite=6).str.upper().fillna('UN')
+    origem = _coluna_texto(df, 'origem', limite=1).fillna('0')
+    codigo_servico = _coluna_texto(df, 'cod_servico', limite=20).fillna('')
+    descricao = _coluna_texto(df, 'descricao').fillna('')
+
+    validas = codigos.notna() & nomes.notna() & ~custo_invalido & ~venda_invalido
+    validas &= (preco_custo.abs() < 10 ** 8) & (preco_venda.abs() < 10 ** 8)
+    # O mesmo código repetido no bloco: vale a última linha (um ON CONFLICT não pode tocar a mesma linha duas vezes)
+    validas &= ~codigos.where(validas).duplicated(keep='last')
+
+    colunas = zip(
+        codigos[validas], nomes[validas], descricao[validas], tipos[validas], preco_custo[validas],
+        preco_venda[validas], estoque[validas], ncm[validas], codigo_servico[validas],
+        unidade[validas], origem[validas],
+    )
+    produtos = [
+        ProdutoServico(
+            user=user, codigo=codigo, nome=nome, descricao=desc, tipo=tipo,
+            preco_custo=Decimal(str(custo)), preco_venda=Decimal(str(venda)), estoque_atual=int(qtd),
+            ncm=cod_ncm, codigo_servico=servico, unidade_medida=und, origem=orig,
+        )
+        for codigo, nome, desc, tipo, custo, venda, qtd, cod_ncm, servico, und, orig in colunas
+    ]
+    return produtos, int((~validas).sum())
+
+
+def importar_catalogo_planilha(user, arquivo):
+    """
+    Upsert em lote do catálogo pela restrição única (user, codigo).
+    Retorna {'inseridos': n, 'atualizados': n, 'ignorados': n}.
+    """
+    resultado = {'inseridos': 0, 'atualizados': 0, 'ignorados': 0}
+
+    for bloco in _blocos_catalogo(arquivo):
+        produtos, ignorados = _produtos_do_bloco(user, bloco)
+        resultado['ignorados'] += ignorados
+        if not produtos:
+            continue
+
+        codigos = [produto.codigo for produto in produtos]
+        existentes = set(
+            ProdutoServico.objects.filter(user=user, codigo__in=codigos).values_list('codigo', flat=True)
+        )
+        with transaction.atomic():
+            ProdutoServico.objects.bulk_create(
+                produtos,
+                batch_size=TAMANHO_LOTE_IMPORTACAO,
+                update_conflicts=True,
+                unique_fields=['user', 'codigo'],
+                update_fields=CAMPOS_ATUALIZADOS_CATALOGO,
+            )
+        resultado['atualizados'] += len(existentes)
+        resultado['inseridos'] += len(produtos) - len(existentes)
+
+    return resultado
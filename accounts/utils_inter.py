@@ -1,4 +1,4 @@
-import requests
+from .utils_http import requisitar
 import os
 import tempfile
 from contextlib import contextmanager
@@ -74,7 +74,8 @@ def get_inter_token(user):
     # 3. Cria temporários e faz a requisição
     try:
         with arquivos_temporarios(crt_content, key_content) as (crt_path, key_path):
-            response = requests.post(
+            response = requisitar(
+                'inter', 'POST',
                 url, 
                 data=payload,
                 cert=(crt_path, key_path),
@@ -123,7 +124,8 @@ def buscar_extrato_inter(user, start_date, end_date):
         # ---------------------------------------------------------------
         
         with arquivos_temporarios(crt_content, key_content) as (crt_path, key_path):
-            response = requests.get(
+            response = requisitar(
+                'inter', 'GET',
                 url,
                 headers=headers,
                 params=params,
@@ -169,7 +171,8 @@ def buscar_saldo_inter(user):
         
         # Cria temporários e chama a API
         with arquivos_temporarios(crt_content, key_content) as (crt_path, key_path):
-            response = requests.get(
+            response = requisitar(
+                'inter', 'GET',
                 url,
                 headers=headers,
                 cert=(crt_path, key_path)
@@ -143,7 +143,7 @@
 #             erro_msg += f" | Detalhe MP: {response.text}"
 #         return {'erro': erro_msg}
 
-import requests
+from .utils_http import requisitar
 from datetime import datetime, timedelta
 from .models import MercadoPagoCredentials
 
@@ -174,7 +174,7 @@ def get_mp_user_id(headers):
     """
     url = f"{MP_API_URL}/users/me"
     try:
-        response = requests.get(url, headers=headers)
+        response = requisitar('mercadopago', 'GET', url, headers=headers)
         response.raise_for_status()
         return response.json().get('id')
     except Exception as e:
@@ -197,7 +197,7 @@ def buscar_saldo_mercadopago(user):
     url = f"{MP_API_URL}/users/{user_id}/mercadopago_account/balance"
     
     try:
-        response = requests.get(url, headers=headers)
+        response = requisitar('mercadopago', 'GET', url, headers=headers)
         response.raise_for_status()
         data = response.json()
         
@@ -244,7 +244,7 @@ def buscar_extrato_mercadopago(user, start_date, end_date):
         }
 
         try:
-            response = requests.get(url, headers=headers, params=params)
+            response = requisitar('mercadopago', 'GET', url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             
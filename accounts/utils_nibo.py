@@ -610,19 +610,25 @@
 #         'erros': res_pagar['erros'] + res_receber['erros']
 #     }
 
-import requests
+from .utils_http import requisitar
 import json
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.conf import settings
 from .models import (
     NiboCredentials, PayableAccount, ReceivableAccount, 
-    Category, BankAccount, ClassificacaoAutomatica
+    Category, BankAccount
 )
+from .utils_classificacao import classificador_do_usuario
+from .utils_coleta import ErroColeta, coletar_paginas, contas_existentes, sincronizar_com_marca
+from .utils_resumo import resumo_em_lote
 
 # URL Base da API V1 do Nibo
 NIBO_API_URL = "https://api.nibo.com.br/companies/v1"
 
+# Tamanho da página nas listagens ($top); página menor que isso é a última
+ITENS_POR_PAGINA_NIBO = 500
+
 def get_mock_nibo_data(endpoint, user_id=None):
     """
     Gera dados falsos para teste local.
@@ -695,7 +701,7 @@ def nibo_request(endpoint, method, creds, params=None):
     # Adicionamos 'settings.DEBUG'. Assim, no Render (onde DEBUG é False),
     # essa linha será ignorada, mesmo que alguém digite "TESTE".
     if settings.DEBUG and creds.api_token == "TESTE":
-        return get_mock_nibo_data(endpoint, user_id=creds.user.id)
+        return get_mock_nibo_data(endpoint, user_id=creds.user_id)
     # ----------------------------
 
     if params is None:
@@ -710,37 +716,42 @@ def nibo_request(endpoint, method, creds, params=None):
     
     try:
         if method == 'GET':
-            response = requests.get(url, headers=headers, params=params)
+            response = requisitar('nibo', 'GET', url, headers=headers, params=params)
         elif method == 'POST':
-            response = requests.post(url, headers=headers, json=params)
+            response = requisitar('nibo', 'POST', url, headers=headers, json=params)
             
         response.raise_for_status()
         return response.json()
     except Exception as e:
         return {'erro': f"Erro na requisição Nibo ({endpoint}): {str(e)}"}
 
+def buscador_nibo(endpoint, creds, desde=None):
+    """
+    Busca paginada (OData $top/$skip) de um endpoint de listagem do Nibo,
+    para coletar_paginas: cada página devolve a lista de itens.
+    Com `desde`, só os agendamentos alterados a partir dessa data/hora.
+    """
+    def buscar_pagina(pagina):
+        params = {'$top': ITENS_POR_PAGINA_NIBO, '$skip': (pagina - 1) * ITENS_POR_PAGINA_NIBO}
+        if desde is not None:
+            params['$filter'] = f"updateDate ge {desde.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+        data = nibo_request(endpoint, "GET", creds, params)
+        if 'erro' in data:
+            raise ErroColeta(data['erro'])
+        registros = data.get('items', data) if isinstance(data, dict) else data
+        return registros if isinstance(registros, list) else []
+    return buscar_pagina
+
 # --- O RESTANTE DO ARQUIVO PERMANECE IDÊNTICO AO ANTERIOR ---
-# Apenas a função prever_classificacao_local e processadores abaixo
+# Apenas os processadores abaixo (a classificação vem de utils_classificacao)
 # (Copie o restante do arquivo anterior se necessário, ou mantenha o que já tem)
 
-def prever_classificacao_local(user, descricao, tipo):
-    """
-    Réplica local da lógica de previsão.
-    Retorna 4 valores: (Categoria, DRE, Banco, Centro de Custo).
-    """
-    regras = ClassificacaoAutomatica.objects.filter(user=user, tipo=tipo)
-    descricao_lower = descricao.lower()
-    for regra in regras:
-        if regra.termo.lower() in descricao_lower:
-            # Retorna os 4 valores necessários para o desempacotamento
-            return regra.categoria, regra.dre_area, regra.bank_account, None
-    # Retorno padrão de fallback com 4 valores
-    return None, None, None, None
-
-def processar_contas_pagar_nibo(user, creds):
+def processar_contas_pagar_nibo(user, creds, desde=None):
     novos = 0
     atualizados = 0
     erros = []
+    # Regras de classificação compiladas uma vez para todas as páginas
+    classificador = classificador_do_usuario(user)
 
     banco_nibo, _ = BankAccount.objects.get_or_create(
         user=user, bank_name='Integração Nibo',
@@ -749,73 +760,84 @@ def processar_contas_pagar_nibo(user, creds):
     cat_padrao, _ = Category.objects.get_or_create(user=user, name='Despesas Gerais (Nibo)', category_type='PAYABLE')
 
     endpoint = f"schedules/debit" 
-    data = nibo_request(endpoint, "GET", creds)
-    
-    if 'erro' in data: return {'erro': data['erro']}
-
-    registros = data.get('items', data) if isinstance(data, dict) else data
-    if not isinstance(registros, list): registros = []
 
-    for reg in registros:
-        try:
-            id_nibo = str(reg.get('id') or reg.get('scheduleId'))
-            descricao = reg.get('description') or reg.get('stakeholderName') or "Conta Nibo"
-            observacao = reg.get('notes') or ""
-            valor = Decimal(str(reg.get('value', 0)))
-            
-            dt_venc_str = reg.get('dueDate') 
+    def processar_pagina(registros):
+        nonlocal novos, atualizados
+        existentes = contas_existentes(PayableAccount, user, [str(reg.get('id') or reg.get('scheduleId')) for reg in registros])
+        for reg in registros:
             try:
-                clean_date = dt_venc_str.split('.')[0].replace('Z', '')
-                due_date = datetime.fromisoformat(clean_date).date()
-            except:
-                due_date = datetime.now().date()
+                id_nibo = str(reg.get('id') or reg.get('scheduleId'))
+                descricao = reg.get('description') or reg.get('stakeholderName') or "Conta Nibo"
+                observacao = reg.get('notes') or ""
+                valor = Decimal(str(reg.get('value', 0)))
             
-            status_nibo = reg.get('status') 
-            is_paid = (status_nibo == 'paid' or status_nibo == 'settled')
-            payment_date = None
-            if is_paid:
-                dt_pgto = reg.get('paymentDate') or reg.get('accrualDate')
-                if dt_pgto:
-                    try:
-                        clean_pgto = dt_pgto.split('.')[0].replace('Z', '')
-                        payment_date = datetime.fromisoformat(clean_pgto).date()
-                    except:
+                dt_venc_str = reg.get('dueDate') 
+                try:
+                    clean_date = dt_venc_str.split('.')[0].replace('Z', '')
+                    due_date = datetime.fromisoformat(clean_date).date()
+                except:
+                    due_date = datetime.now().date()
+            
+                status_nibo = reg.get('status') 
+                is_paid = (status_nibo == 'paid' or status_nibo == 'settled')
+                payment_date = None
+                if is_paid:
+                    dt_pgto = reg.get('paymentDate') or reg.get('accrualDate')
+                    if dt_pgto:
+                        try:
+                            clean_pgto = dt_pgto.split('.')[0].replace('Z', '')
+                            payment_date = datetime.fromisoformat(clean_pgto).date()
+                        except:
+                            payment_date = due_date
+                    else:
                         payment_date = due_date
+
+                conta_existente = existentes.get(id_nibo)
+
+                if conta_existente:
+                    conta_existente.amount = valor
+                    conta_existente.due_date = due_date
+                    conta_existente.is_paid = is_paid
+                    conta_existente.payment_date = payment_date
+                    if "Importado" in conta_existente.description:
+                        conta_existente.description = f"{descricao} - {observacao}"
+                    conta_existente.save()
+                    atualizados += 1
                 else:
-                    payment_date = due_date
-
-            conta_existente = PayableAccount.objects.filter(user=user, external_id=id_nibo).first()
-
-            if conta_existente:
-                conta_existente.amount = valor
-                conta_existente.due_date = due_date
-                conta_existente.is_paid = is_paid
-                conta_existente.payment_date = payment_date
-                if "Importado" in conta_existente.description:
-                    conta_existente.description = f"{descricao} - {observacao}"
-                conta_existente.save()
-                atualizados += 1
-            else:
-                # Adicionado o "_" para receber o 4º valor (Centro de Custo)
-                cat_prevista, dre_prevista, bank_previsto, _ = prever_classificacao_local(user, descricao, 'PAYABLE')
-                PayableAccount.objects.create(
-                    user=user, external_id=id_nibo, name=descricao[:200],
-                    description=f"{descricao} {observacao} (Nibo)", due_date=due_date, amount=valor,
-                    is_paid=is_paid, payment_date=payment_date,
-                    category=cat_prevista if cat_prevista else cat_padrao,
-                    dre_area=dre_prevista if dre_prevista else 'OPERACIONAL',
-                    bank_account=bank_previsto if bank_previsto else banco_nibo,
-                    payment_method='BOLETO', occurrence='AVULSO', cost_type='VARIAVEL'
-                )
-                novos += 1
-        except Exception as e:
-            erros.append(f"Erro ID Nibo {id_nibo}: {str(e)}")
+                    # Adicionado o "_" para receber o 4º valor (Centro de Custo)
+                    cat_prevista, dre_prevista, bank_previsto, _ = classificador.prever(descricao, 'PAYABLE')
+                    PayableAccount.objects.create(
+                        user=user, external_id=id_nibo, name=descricao[:200],
+                        description=f"{descricao} {observacao} (Nibo)", due_date=due_date, amount=valor,
+                        is_paid=is_paid, payment_date=payment_date,
+                        category=cat_prevista if cat_prevista else cat_padrao,
+                        dre_area=dre_prevista if dre_prevista else 'OPERACIONAL',
+                        bank_account=bank_previsto if bank_previsto else banco_nibo,
+                        payment_method='BOLETO', occurrence='AVULSO', cost_type='VARIAVEL'
+                    )
+                    novos += 1
+            except Exception as e:
+                erros.append(f"Erro ID Nibo {id_nibo}: {str(e)}")
+
+    # Páginas seguintes buscadas à frente, em paralelo, até uma vir incompleta
+    # Rollup, saldos e cache do ledger são atualizados uma vez por coleta (resumo_em_lote)
+    try:
+        with resumo_em_lote():
+            coletar_paginas(
+                'nibo', buscador_nibo(endpoint, creds, desde), processar_pagina,
+                ultima_pagina=lambda registros: len(registros) < ITENS_POR_PAGINA_NIBO
+            )
+    except ErroColeta as e:
+        return {'erro': str(e)}
+
     return {'novos': novos, 'atualizados': atualizados, 'erros': erros}
 
-def processar_contas_receber_nibo(user, creds):
+def processar_contas_receber_nibo(user, creds, desde=None):
     novos = 0
     atualizados = 0
     erros = []
+    # Regras de classificação compiladas uma vez para todas as páginas
+    classificador = classificador_do_usuario(user)
 
     banco_nibo, _ = BankAccount.objects.get_or_create(
         user=user, bank_name='Integração Nibo',
@@ -824,83 +846,95 @@ def processar_contas_receber_nibo(user, creds):
     cat_padrao, _ = Category.objects.get_or_create(user=user, name='Receitas de Vendas (Nibo)', category_type='RECEIVABLE')
 
     endpoint = f"schedules/credit" 
-    data = nibo_request(endpoint, "GET", creds)
-    
-    if 'erro' in data: return {'erro': data['erro']}
-
-    registros = data.get('items', data) if isinstance(data, dict) else data
-    if not isinstance(registros, list): registros = []
 
-    for reg in registros:
-        try:
-            id_nibo = str(reg.get('id') or reg.get('scheduleId'))
-            descricao = reg.get('description') or reg.get('stakeholderName') or "Recebimento Nibo"
-            observacao = reg.get('notes') or ""
-            valor = Decimal(str(reg.get('value', 0)))
-            
-            dt_venc_str = reg.get('dueDate')
+    def processar_pagina(registros):
+        nonlocal novos, atualizados
+        existentes = contas_existentes(ReceivableAccount, user, [str(reg.get('id') or reg.get('scheduleId')) for reg in registros])
+        for reg in registros:
             try:
-                clean_date = dt_venc_str.split('.')[0].replace('Z', '')
-                due_date = datetime.fromisoformat(clean_date).date()
-            except:
-                due_date = datetime.now().date()
+                id_nibo = str(reg.get('id') or reg.get('scheduleId'))
+                descricao = reg.get('description') or reg.get('stakeholderName') or "Recebimento Nibo"
+                observacao = reg.get('notes') or ""
+                valor = Decimal(str(reg.get('value', 0)))
+            
+                dt_venc_str = reg.get('dueDate')
+                try:
+                    clean_date = dt_venc_str.split('.')[0].replace('Z', '')
+                    due_date = datetime.fromisoformat(clean_date).date()
+                except:
+                    due_date = datetime.now().date()
             
-            status_nibo = reg.get('status')
-            is_received = (status_nibo == 'received' or status_nibo == 'settled')
-            payment_date = None
-            if is_received:
-                dt_pgto = reg.get('paymentDate') or reg.get('accrualDate')
-                if dt_pgto:
-                    try:
-                        clean_pgto = dt_pgto.split('.')[0].replace('Z', '')
-                        payment_date = datetime.fromisoformat(clean_pgto).date()
-                    except:
+                status_nibo = reg.get('status')
+                is_received = (status_nibo == 'received' or status_nibo == 'settled')
+                payment_date = None
+                if is_received:
+                    dt_pgto = reg.get('paymentDate') or reg.get('accrualDate')
+                    if dt_pgto:
+                        try:
+                            clean_pgto = dt_pgto.split('.')[0].replace('Z', '')
+                            payment_date = datetime.fromisoformat(clean_pgto).date()
+                        except:
+                            payment_date = due_date
+                    else:
                         payment_date = due_date
+
+                conta_existente = existentes.get(id_nibo)
+
+                if conta_existente:
+                    conta_existente.amount = valor
+                    conta_existente.due_date = due_date
+                    conta_existente.is_received = is_received
+                    conta_existente.payment_date = payment_date
+                    conta_existente.save()
+                    atualizados += 1
                 else:
-                    payment_date = due_date
-
-            conta_existente = ReceivableAccount.objects.filter(user=user, external_id=id_nibo).first()
-
-            if conta_existente:
-                conta_existente.amount = valor
-                conta_existente.due_date = due_date
-                conta_existente.is_received = is_received
-                conta_existente.payment_date = payment_date
-                conta_existente.save()
-                atualizados += 1
-            else:
-                # Adicionado o "_" para receber o 4º valor (Centro de Custo)
-                cat_prevista, dre_prevista, bank_previsto, _ = prever_classificacao_local(user, descricao, 'RECEIVABLE')
-                ReceivableAccount.objects.create(
-                    user=user, external_id=id_nibo, name=descricao[:200],
-                    description=f"{observacao} (Integrado Nibo)", due_date=due_date, amount=valor,
-                    is_received=is_received, payment_date=payment_date,
-                    category=cat_prevista if cat_prevista else cat_padrao,
-                    dre_area=dre_prevista if dre_prevista else 'BRUTA',
-                    bank_account=bank_previsto if bank_previsto else banco_nibo,
-                    payment_method='BOLETO', occurrence='AVULSO'
-                )
-                novos += 1
-        except Exception as e:
-            erros.append(f"Erro ID Nibo {id_nibo}: {str(e)}")
+                    # Adicionado o "_" para receber o 4º valor (Centro de Custo)
+                    cat_prevista, dre_prevista, bank_previsto, _ = classificador.prever(descricao, 'RECEIVABLE')
+                    ReceivableAccount.objects.create(
+                        user=user, external_id=id_nibo, name=descricao[:200],
+                        description=f"{observacao} (Integrado Nibo)", due_date=due_date, amount=valor,
+                        is_received=is_received, payment_date=payment_date,
+                        category=cat_prevista if cat_prevista else cat_padrao,
+                        dre_area=dre_prevista if dre_prevista else 'BRUTA',
+                        bank_account=bank_previsto if bank_previsto else banco_nibo,
+                        payment_method='BOLETO', occurrence='AVULSO'
+                    )
+                    novos += 1
+            except Exception as e:
+                erros.append(f"Erro ID Nibo {id_nibo}: {str(e)}")
+
+    # Páginas seguintes buscadas à frente, em paralelo, até uma vir incompleta
+    # Rollup, saldos e cache do ledger são atualizados uma vez por coleta (resumo_em_lote)
+    try:
+        with resumo_em_lote():
+            coletar_paginas(
+                'nibo', buscador_nibo(endpoint, creds, desde), processar_pagina,
+                ultima_pagina=lambda registros: len(registros) < ITENS_POR_PAGINA_NIBO
+            )
+    except ErroColeta as e:
+        return {'erro': str(e)}
+
     return {'novos': novos, 'atualizados': atualizados, 'erros': erros}
 
-def sincronizar_nibo_completo(user):
+def sincronizar_nibo_completo(user, forcar_completa=False):
     try:
         creds = user.nibo_creds
     except NiboCredentials.DoesNotExist:
         return {'erro': 'Credenciais Nibo não encontradas.'}
 
-    res_pagar = processar_contas_pagar_nibo(user, creds)
-    if 'erro' in res_pagar: return res_pagar
+    def executar(desde):
+        res_pagar = processar_contas_pagar_nibo(user, creds, desde)
+        if 'erro' in res_pagar: return res_pagar
 
-    res_receber = processar_contas_receber_nibo(user, creds)
-    if 'erro' in res_receber: return res_receber
+        res_receber = processar_contas_receber_nibo(user, creds, desde)
+        if 'erro' in res_receber: return res_receber
+
+        return {
+            'pagar_novos': res_pagar['novos'],
+            'pagar_atualizados': res_pagar['atualizados'],
+            'receber_novos': res_receber['novos'],
+            'receber_atualizados': res_receber['atualizados'],
+            'erros': res_pagar['erros'] + res_receber['erros']
+        }
 
-    return {
-        'pagar_novos': res_pagar['novos'],
-        'pagar_atualizados': res_pagar['atualizados'],
-        'receber_novos': res_receber['novos'],
-        'receber_atualizados': res_receber['atualizados'],
-        'erros': res_pagar['erros'] + res_receber['erros']
-    }
\ No newline at end of file
+    return sincronizar_com_marca(creds, executar, forcar_completa)
@@ -1,12 +1,16 @@
-import requests
+from .utils_http import requisitar
 import json
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.conf import settings
+from django.utils import timezone
 from .models import (
     OmieCredentials, PayableAccount, ReceivableAccount, 
-    Category, BankAccount, ClassificacaoAutomatica
+    Category, BankAccount
 )
+from .utils_classificacao import classificador_do_usuario
+from .utils_coleta import ErroColeta, coletar_paginas, contas_existentes, sincronizar_com_marca
+from .utils_resumo import resumo_em_lote
 
 OMIE_API_URL = "https://app.omie.com.br/api/v1"
 
@@ -83,40 +87,37 @@ def omie_request(endpoint, call, creds, params=None):
     headers = {'Content-Type': 'application/json'}
     
     try:
-        response = requests.post(f"{OMIE_API_URL}/{endpoint}", json=payload, headers=headers)
+        # Chamadas de consulta (Listar/Consultar) podem ser repetidas com segurança em 5xx
+        response = requisitar(
+            'omie', 'POST', f"{OMIE_API_URL}/{endpoint}", json=payload, headers=headers,
+            idempotente=call.startswith(('Listar', 'Consultar'))
+        )
         response.raise_for_status()
         return response.json()
     except Exception as e:
         return {'erro': f"Erro na requisição Omie ({call}): {str(e)}"}
 
-def prever_classificacao_local(user, descricao, tipo):
-    """
-    Réplica local da lógica de previsão para evitar importação circular com views.py.
-    Retorna 4 valores: (Categoria, DRE, Banco, Centro de Custo).
-    """
-    if not descricao:
-        return None, None, None, None
+def filtro_alteracao_omie(desde):
+    """ Filtro de inclusão/alteração da listagem (incremental); vazio na sincronização completa. """
+    if desde is None:
+        return {}
+    return {"filtrar_por_data_de": timezone.localtime(desde).strftime("%d/%m/%Y")}
 
-    regras = ClassificacaoAutomatica.objects.filter(user=user, tipo=tipo)
-    descricao_lower = descricao.lower()
-    
-    for regra in regras:
-        if regra.termo.lower() in descricao_lower:
-            # Retorna os 3 valores da regra + None para o Centro de Custo (4 valores)
-            return regra.categoria, regra.dre_area, regra.bank_account, None
-            
-    # Retorno padrão caso nenhuma regra seja encontrada (4 valores)
-    return None, None, None, None
-
-def processar_contas_pagar_omie(user, creds):
+def dados_omie(data):
+    """ Resposta de omie_request pronta para a coleta (erro vira ErroColeta). """
+    if 'erro' in data:
+        raise ErroColeta(data['erro'])
+    return data
+
+def processar_contas_pagar_omie(user, creds, desde=None):
     """
     Busca e sincroniza contas a pagar.
     """
-    pagina = 1
-    total_paginas = 1
     novos = 0
     atualizados = 0
     erros = []
+    # Regras de classificação compiladas uma vez para todas as páginas
+    classificador = classificador_do_usuario(user)
 
     # Cria ou pega um banco virtual para vincular
     banco_omie, _ = BankAccount.objects.get_or_create(
@@ -128,21 +129,20 @@ def processar_contas_pagar_omie(user, creds):
     # Categoria Padrão de Fallback
     cat_padrao, _ = Category.objects.get_or_create(user=user, name='Despesas Gerais (Omie)', category_type='PAYABLE')
 
-    while pagina <= total_paginas:
+    def buscar_pagina(pagina):
         # Parâmetros de filtro (pode adicionar data se quiser limitar o período)
         params = [{
             "pagina": pagina,
             "registros_por_pagina": 50,
-            "apenas_importado_api": "N"
+            "apenas_importado_api": "N",
+            **filtro_alteracao_omie(desde)
         }]
+        return dados_omie(omie_request("financas/contapagar/", "ListarContasPagar", creds, params))
 
-        data = omie_request("financas/contapagar/", "ListarContasPagar", creds, params)
-        
-        if 'erro' in data:
-            return {'erro': data['erro']}
-
-        total_paginas = data.get('total_de_paginas', 1)
+    def processar_pagina(data):
+        nonlocal novos, atualizados
         registros = data.get('conta_pagar_cadastro', [])
+        existentes = contas_existentes(PayableAccount, user, [str(reg.get('codigo_lancamento_omie')) for reg in registros])
 
         for reg in registros:
             try:
@@ -167,7 +167,7 @@ def processar_contas_pagar_omie(user, creds):
                 # --- LÓGICA DE BLINDAGEM ---
                 
                 # 1. Tenta buscar o registro existente pelo ID externo (Omie ID)
-                conta_existente = PayableAccount.objects.filter(user=user, external_id=id_omie).first()
+                conta_existente = existentes.get(id_omie)
 
                 if conta_existente:
                     # >>> CENÁRIO: ATUALIZAÇÃO (Blindado) <<<
@@ -187,7 +187,7 @@ def processar_contas_pagar_omie(user, creds):
                 else:
                     # >>> CENÁRIO: NOVO REGISTRO (Inteligente) <<<
                     # Tenta prever a classificação
-                    cat_prevista, dre_prevista, bank_previsto, _ = prever_classificacao_local(user, descricao, 'PAYABLE')
+                    cat_prevista, dre_prevista, bank_previsto, _ = classificador.prever(descricao, 'PAYABLE')
                     
                     PayableAccount.objects.create(
                         user=user,
@@ -212,20 +212,26 @@ def processar_contas_pagar_omie(user, creds):
 
             except Exception as e:
                 erros.append(f"Erro ID {id_omie}: {str(e)}")
-        
-        pagina += 1
+
+    # Páginas 2..N buscadas em paralelo assim que a primeira informa o total
+    # Rollup, saldos e cache do ledger são atualizados uma vez por coleta (resumo_em_lote)
+    try:
+        with resumo_em_lote():
+            coletar_paginas('omie', buscar_pagina, processar_pagina, total_paginas=lambda data: data.get('total_de_paginas', 1))
+    except ErroColeta as e:
+        return {'erro': str(e)}
 
     return {'novos': novos, 'atualizados': atualizados, 'erros': erros}
 
-def processar_contas_receber_omie(user, creds):
+def processar_contas_receber_omie(user, creds, desde=None):
     """
     Busca e sincroniza contas a receber.
     """
-    pagina = 1
-    total_paginas = 1
     novos = 0
     atualizados = 0
     erros = []
+    # Regras de classificação compiladas uma vez para todas as páginas
+    classificador = classificador_do_usuario(user)
 
     banco_omie, _ = BankAccount.objects.get_or_create(
         user=user, 
@@ -235,20 +241,19 @@ def processar_contas_receber_omie(user, creds):
 
     cat_padrao, _ = Category.objects.get_or_create(user=user, name='Receitas de Vendas (Omie)', category_type='RECEIVABLE')
 
-    while pagina <= total_paginas:
+    def buscar_pagina(pagina):
         params = [{
             "pagina": pagina,
             "registros_por_pagina": 50,
-            "apenas_importado_api": "N"
+            "apenas_importado_api": "N",
+            **filtro_alteracao_omie(desde)
         }]
+        return dados_omie(omie_request("financas/contareceber/", "ListarContasReceber", creds, params))
 
-        data = omie_request("financas/contareceber/", "ListarContasReceber", creds, params)
-        
-        if 'erro' in data:
-            return {'erro': data['erro']}
-
-        total_paginas = data.get('total_de_paginas', 1)
+    def processar_pagina(data):
+        nonlocal novos, atualizados
         registros = data.get('conta_receber_cadastro', [])
+        existentes = contas_existentes(ReceivableAccount, user, [str(reg.get('codigo_lancamento_omie')) for reg in registros])
 
         for reg in registros:
             try:
@@ -269,7 +274,7 @@ def processar_contas_receber_omie(user, creds):
                     payment_date = datetime.strptime(reg.get('data_pagamento'), "%d/%m/%Y").date()
 
                 # --- BLINDAGEM ---
-                conta_existente = ReceivableAccount.objects.filter(user=user, external_id=id_omie).first()
+                conta_existente = existentes.get(id_omie)
 
                 if conta_existente:
                     conta_existente.amount = valor
@@ -279,7 +284,7 @@ def processar_contas_receber_omie(user, creds):
                     conta_existente.save()
                     atualizados += 1
                 else:
-                    cat_prevista, dre_prevista, bank_previsto, _ = prever_classificacao_local(user, descricao, 'RECEIVABLE')
+                    cat_prevista, dre_prevista, bank_previsto, _ = classificador.prever(descricao, 'RECEIVABLE')
                     
                     ReceivableAccount.objects.create(
                         user=user,
@@ -302,12 +307,18 @@ def processar_contas_receber_omie(user, creds):
 
             except Exception as e:
                 erros.append(f"Erro ID {id_omie}: {str(e)}")
-        
-        pagina += 1
+
+    # Páginas 2..N buscadas em paralelo assim que a primeira informa o total
+    # Rollup, saldos e cache do ledger são atualizados uma vez por coleta (resumo_em_lote)
+    try:
+        with resumo_em_lote():
+            coletar_paginas('omie', buscar_pagina, processar_pagina, total_paginas=lambda data: data.get('total_de_paginas', 1))
+    except ErroColeta as e:
+        return {'erro': str(e)}
 
     return {'novos': novos, 'atualizados': atualizados, 'erros': erros}
 
-def sincronizar_omie_completo(user):
+def sincronizar_omie_completo(user, forcar_completa=False):
     """
     Função principal chamada pela View.
     """
@@ -316,18 +327,22 @@ def sincronizar_omie_completo(user):
     except OmieCredentials.DoesNotExist:
         return {'erro': 'Credenciais não encontradas.'}
 
-    # Sincroniza Pagar
-    res_pagar = processar_contas_pagar_omie(user, creds)
-    if 'erro' in res_pagar: return res_pagar
-
-    # Sincroniza Receber
-    res_receber = processar_contas_receber_omie(user, creds)
-    if 'erro' in res_receber: return res_receber
-
-    return {
-        'pagar_novos': res_pagar['novos'],
-        'pagar_atualizados': res_pagar['atualizados'],
-        'receber_novos': res_receber['novos'],
-        'receber_atualizados': res_receber['atualizados'],
-        'erros': res_pagar['erros'] + res_receber['erros']
-    }
\ No newline at end of file
+    def executar(desde):
+        # Sincroniza Pagar
+        res_pagar = processar_contas_pagar_omie(user, creds, desde)
+        if 'erro' in res_pagar: return res_pagar
+
+        # Sincroniza Receber
+        res_receber = processar_contas_receber_omie(user, creds, desde)
+        if 'erro' in res_receber: return res_receber
+
+        return {
+            'pagar_novos': res_pagar['novos'],
+            'pagar_atualizados': res_pagar['atualizados'],
+            'receber_novos': res_receber['novos'],
+            'receber_atualizados': res_receber['atualizados'],
+            'erros': res_pagar['erros'] + res_receber['erros']
+        }
+
+    # Só o que mudou desde a última sincronização (com reconciliação completa periódica)
+    return sincronizar_com_marca(creds, executar, forcar_completa)
\ No newline at end of file
@@ -0,0 +1,140 @@
+# accounts/utils_paginacao.py
+"""
+Paginação por cursor (keyset) das listagens de contas a pagar/receber.
+
+Em vez de OFFSET, cada página continua a partir do último (due_date, id) da
+página anterior, então o custo não cresce com a profundidade. O total em R$ e
+a quantidade de registros vêm de uma única agregação, em cache por filtro.
+"""
+import base64
+from datetime import date
+from decimal import Decimal
+
+from django.core.paginator import Paginator
+from django.db.models import Count, Q, Sum
+
+from .utils_busca import ordenar_por_relevancia
+from .utils_cache import parametros_get, valor_em_cache
+
+# Parâmetros que mudam a página, mas não o conjunto filtrado (ficam fora da chave dos totais)
+PARAMETROS_NAVEGACAO = ('cursor', 'page', 'edit', 'per_page')
+
+PROXIMA, ANTERIOR, ULTIMA = 'p', 'a', 'u'
+
+
+def codificar_cursor(direcao, due_date=None, pk=None):
+    """ Cursor opaco: direção + posição (vencimento, id) codificados em base64 url-safe. """
+    bruto = f"{direcao}|{due_date.isoformat() if due_date else ''}|{pk or ''}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """ Retorna (direcao, due_date, pk) ou None se o cursor for inválido. """
+    if not cursor:
+        return None
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direcao, dia, pk = bruto.split('|')
+        if direcao == ULTIMA:
+            return direcao, None, None
+        if direcao not in (PROXIMA, ANTERIOR):
+            return None
+        return direcao, date.fromisoformat(dia), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class PaginaKeyset:
+    """ Página de resultados com a mesma interface usada pelos templates (iteração, has_next...). """
+    is_keyset = True
+
+    def __init__(self, object_list, has_previous, has_next, total_registros, cursor_atual=''):
+        self.object_list = object_list
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.total_registros = total_registros
+        self.cursor_atual = cursor_atual or ''
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    def has_other_pages(self):
+        return self._has_previous or self._has_next
+
+    @property
+    def cursor_anterior(self):
+        if not self.object_list:
+            return ''
+        primeiro = self.object_list[0]
+        return codificar_cursor(ANTERIOR, primeiro.due_date, primeiro.pk)
+
+    @property
+    def cursor_proximo(self):
+        if not self.object_list:
+            return ''
+        ultimo = self.object_list[-1]
+        return codificar_cursor(PROXIMA, ultimo.due_date, ultimo.pk)
+
+    @property
+    def cursor_ultima(self):
+        return codificar_cursor(ULTIMA)
+
+
+def paginar_keyset(queryset, cursor, por_pagina, total_registros):
+    """ Busca uma página de `queryset` ordenado por (due_date, id) a partir do cursor. """
+    posicao = decodificar_cursor(cursor)
+    crescente = queryset.order_by('due_date', 'id')
+    decrescente = queryset.order_by('-due_date', '-id')
+
+    if posicao is None:
+        linhas = list(crescente[:por_pagina + 1])
+        return PaginaKeyset(linhas[:por_pagina], False, len(linhas) > por_pagina, total_registros)
+
+    direcao, dia, pk = posicao
+    if direcao == PROXIMA:
+        linhas = list(crescente.filter(Q(due_date__gt=dia) | Q(due_date=dia, id__gt=pk))[:por_pagina + 1])
+        return PaginaKeyset(linhas[:por_pagina], True, len(linhas) > por_pagina, total_registros, cursor)
+
+    if direcao == ANTERIOR:
+        linhas = list(decrescente.filter(Q(due_date__lt=dia) | Q(due_date=dia, id__lt=pk))[:por_pagina + 1])
+        pagina = linhas[:por_pagina][::-1]
+        return PaginaKeyset(pagina, len(linhas) > por_pagina, True, total_registros, cursor)
+
+    # ULTIMA
+    pagina = list(decrescente[:por_pagina])[::-1]
+    return PaginaKeyset(pagina, total_registros > por_pagina, False, total_registros, cursor)
+
+
+def paginar_lancamentos(request, queryset, nome, por_pagina):
+    """
+    Pagina uma listagem de contas. Retorna (pagina, total_amount).
+    Com ?page=N (links antigos) ou com busca (ordem por relevância) usa o
+    Paginator por número de página; caso contrário usa cursor. Em ambos a contagem não dispara um COUNT(*) extra.
+    """
+    por_pagina = max(por_pagina, 1)
+    totais = valor_em_cache(
+        request.user.id, f'{nome}_totais',
+        parametros_get(request, ignorar=PARAMETROS_NAVEGACAO),
+        lambda: queryset.aggregate(total=Sum('amount'), quantidade=Count('id')),
+    )
+    total_amount = totais['total'] or Decimal('0.00')
+
+    busca = request.GET.get('search_query', '').strip()
+    if request.GET.get('page') or busca:
+        # Com busca, a ordem é por relevância: paginação por número de página. Sem ela, o id
+        # desempata os vencimentos iguais (senão registros podem repetir ou sumir entre páginas)
+        queryset = ordenar_por_relevancia(queryset, busca) if busca else queryset.order_by('due_date', 'id')
+        paginator = Paginator(queryset, por_pagina)
+        paginator.count = totais['quantidade']
+        return paginator.get_page(request.GET.get('page')), total_amount
+
+    return paginar_keyset(queryset, request.GET.get('cursor'), por_pagina, totais['quantidade']), total_amount
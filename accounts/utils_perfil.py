@@ -0,0 +1,120 @@
+# accounts/utils_perfil.py
+"""
+Profiler sob demanda para superusuários (usado por PerfilMiddleware).
+
+Quando um superusuário — inclusive gerenciando um cliente pelo modo BPO —
+acessa uma página com ?_perfil=1 ou o cabeçalho X-Perfil, a requisição roda
+sob cProfile e todas as consultas SQL são registradas (texto, parâmetros e
+duração). O arquivo .prof vai para o storage padrão e as consultas ficam no
+PerfilRequisicao; a resposta traz o link de download no cabeçalho X-Perfil-Url
+e os perfis ficam listados em admin-tools/perfis/. Assim dá para perfilar os
+dados reais de um tenant sem acesso ao shell de produção.
+
+Para analisar: python -m pstats arquivo.prof (ou snakeviz arquivo.prof).
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.urls import reverse
+
+from .models import PerfilRequisicao
+from .utils_desempenho import nome_da_view
+
+PARAMETRO = '_perfil'
+CABECALHO = 'X-Perfil'
+
+# Consultas guardadas por perfil (as demais só entram na contagem e no tempo)
+MAX_CONSULTAS = 2000
+# Linhas do resumo em texto (funções mais caras pelo tempo cumulativo)
+LINHAS_RESUMO = 40
+# Perfis mantidos; os mais antigos são apagados (com o arquivo) ao gravar um novo
+MAX_PERFIS = 100
+
+
+def deve_perfilar(request):
+    """ Pedido explícito (parâmetro ou cabeçalho) de um superusuário logado. """
+    if request.GET.get(PARAMETRO) != '1' and not request.headers.get(CABECALHO):
+        return False
+    real_user = getattr(request, 'real_user', None)
+    return bool(real_user and real_user.is_authenticated and real_user.is_superuser)
+
+
+@contextmanager
+def capturar_sql():
+    """ Lista (preenchida ao longo do bloco) com {'sql', 'params', 'ms'} de cada consulta. """
+    consultas = []
+
+    def registrar(execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            consultas.append({
+                'sql': sql,
+                'params': repr(params),
+                'ms': round((time.perf_counter() - inicio) * 1000, 3),
+                'many': many,
+            })
+
+    with ExitStack() as pilha:
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(registrar))
+        yield consultas
+
+
+def _resumo(profiler):
+    saida = io.StringIO()
+    pstats.Stats(profiler, stream=saida).sort_stats('cumulative').print_stats(LINHAS_RESUMO)
+    return saida.getvalue()
+
+
+def perfilar(request, get_response):
+    """ Executa a requisição sob cProfile, grava o PerfilRequisicao e devolve a resposta. """
+    profiler = cProfile.Profile()
+    with capturar_sql() as consultas:
+        inicio = time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+    # Mesmo formato de Profile.dump_stats (lido por pstats/snakeviz); serializado antes
+    # do resumo, pois pstats.Stats(profiler) esvazia profiler.stats
+    profiler.create_stats()
+    conteudo = marshal.dumps(profiler.stats)
+    perfil = PerfilRequisicao(
+        solicitante=request.real_user,
+        tenant=request.user if request.user.is_authenticated else None,
+        metodo=request.method,
+        caminho=request.get_full_path()[:500],
+        view=nome_da_view(request)[:200],
+        status=response.status_code,
+        duracao_ms=duracao_ms,
+        total_consultas=len(consultas),
+        sql_ms=sum(c['ms'] for c in consultas),
+        consultas=consultas[:MAX_CONSULTAS],
+        resumo=_resumo(profiler),
+    )
+    nome = f"{perfil.view or 'requisicao'}_{time.strftime('%Y%m%d_%H%M%S')}.prof".replace(':', '_')
+    perfil.arquivo.save(nome, ContentFile(conteudo), save=False)
+    perfil.save()
+    _apagar_antigos()
+
+    response['X-Perfil-Url'] = request.build_absolute_uri(reverse('perfil_download', args=[perfil.pk]))
+    return response
+
+
+def _apagar_antigos():
+    antigos = PerfilRequisicao.objects.order_by('-criado_em', '-pk')[MAX_PERFIS:]
+    for perfil in antigos:
+        if perfil.arquivo:
+            perfil.arquivo.delete(save=False)
+        perfil.delete()
@@ -0,0 +1,125 @@
+# accounts/utils_recorrencia.py
+"""
+Séries de lançamentos recorrentes (contas a pagar/receber e parcelas de contrato).
+
+A série inteira é montada em memória (datas com relativedelta a partir da
+primeira parcela, mesmo valor em todas) e gravada com um único bulk_create.
+Edições "desta e das próximas" viram um único UPDATE filtrado por
+recurrence_group_id e recurrence_index. Como bulk_create e
+update() não disparam signals, o rollup diário é atualizado explicitamente;
+parcelas futuras nascem e permanecem em aberto, então não afetam saldos.
+"""
+import uuid
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+
+from .models import PayableAccount, ReceivableAccount
+from .utils_resumo import atualizar_resumo
+
+# Campos copiados da primeira parcela para as demais
+CAMPOS_SERIE = {
+    PayableAccount: [
+        'user_id', 'name', 'description', 'category_id', 'centro_custo_id', 'dre_area',
+        'payment_method', 'cost_type', 'bank_account_id',
+    ],
+    ReceivableAccount: [
+        'user_id', 'name', 'description', 'category_id', 'dre_area', 'payment_method', 'bank_account_id',
+    ],
+}
+
+# Campos propagados para as parcelas seguintes em aberto (edit_mode == 'future')
+CAMPOS_PROPAGADOS = {
+    PayableAccount: ['name', 'amount', 'category', 'centro_custo', 'dre_area', 'bank_account'],
+    ReceivableAccount: ['name', 'amount', 'category', 'dre_area', 'bank_account'],
+}
+
+CAMPO_LIQUIDADO = {PayableAccount: 'is_paid', ReceivableAccount: 'is_received'}
+
+
+def datas_serie(inicio, quantidade, dia=None):
+    """
+    Vencimentos mensais a partir de `inicio`. Sempre calculados a partir da
+    data inicial (não acumulam o ajuste de fim de mês); com `dia`, fixa o dia
+    do vencimento e usa o último dia do mês quando ele não existe (ex: 31/02).
+    """
+    ajuste = relativedelta(day=dia) if dia else relativedelta()
+    return [inicio + relativedelta(months=i) + ajuste for i in range(quantidade)]
+
+
+def montar_serie(conta, quantidade):
+    """
+    Transforma `conta` (já salva) na parcela 1 de uma nova série e devolve as
+    parcelas 2..N em memória, sem gravar.
+    """
+    modelo = type(conta)
+    conta.recurrence_group_id = uuid.uuid4()
+    conta.recurrence_index = 1
+    conta.recurrence_count = quantidade
+
+    comuns = {campo: getattr(conta, campo) for campo in CAMPOS_SERIE[modelo]}
+    return [
+        modelo(
+            due_date=vencimento,
+            amount=conta.amount,
+            occurrence='RECORRENTE',
+            recurrence_count=quantidade,
+            recurrence_index=indice,
+            recurrence_group_id=conta.recurrence_group_id,
+            **comuns
+        )
+        for indice, vencimento in enumerate(datas_serie(conta.due_date, quantidade)[1:], start=2)
+    ]
+
+
+def criar_serie(conta, quantidade):
+    """
+    Gera as parcelas seguintes de `conta` com um único bulk_create.
+    O número de consultas não depende da quantidade de parcelas.
+    """
+    if not quantidade or quantidade < 1:
+        return []
+
+    modelo = type(conta)
+    parcelas = montar_serie(conta, quantidade)
+    with transaction.atomic():
+        # A primeira parcela já existe e só ganha os campos da série, que não entram
+        # no rollup nem nos saldos: o update() sem signals não deixa nada desatualizado
+        modelo.objects.filter(pk=conta.pk).update(
+            recurrence_group_id=conta.recurrence_group_id,
+            recurrence_index=1,
+            recurrence_count=quantidade,
+        )
+        modelo.objects.bulk_create(parcelas, batch_size=500)
+        atualizar_resumo(conta.user_id, {p.due_date for p in parcelas})
+    return parcelas
+
+
+def propagar_para_futuras(conta):
+    """
+    Aplica os dados de `conta` às parcelas seguintes em aberto da mesma série
+    com um único UPDATE. Retorna a quantidade de parcelas alteradas.
+    """
+    if not conta.recurrence_group_id:
+        return 0
+
+    modelo = type(conta)
+    futuras = modelo.objects.filter(
+        user_id=conta.user_id,
+        recurrence_group_id=conta.recurrence_group_id,
+        **{CAMPO_LIQUIDADO[modelo]: False}
+    )
+    if conta.recurrence_index:
+        futuras = futuras.filter(recurrence_index__gt=conta.recurrence_index)
+    else:
+        futuras = futuras.filter(due_date__gt=conta.due_date)
+
+    with transaction.atomic():
+        # update() não dispara signals: os vencimentos não mudam, então os dias
+        # do rollup a recalcular são lidos antes do UPDATE
+        dias = set(futuras.values_list('due_date', flat=True))
+        if not dias:
+            return 0
+        alteradas = futuras.update(**{campo: getattr(conta, campo) for campo in CAMPOS_PROPAGADOS[modelo]})
+        atualizar_resumo(conta.user_id, dias)
+    return alteradas
@@ -0,0 +1,121 @@
+# accounts/utils_resumo.py
+"""
+Manutenção do rollup diário (ResumoDiario) das contas a pagar/receber.
+
+Sempre que uma conta é criada, alterada ou excluída, os dias afetados do
+usuário são recalculados a partir das tabelas originais. Assim as telas
+financeiras somam poucas linhas por dia em vez de todos os lançamentos.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import PayableAccount, ReceivableAccount, ResumoDiario
+from .utils_cache import invalidar_ledger
+from .utils_saldos import saldos_em_lote
+
+# tipo -> (modelo, campo que indica se a conta foi liquidada)
+MODELOS_RESUMO = {
+    'PAYABLE': (PayableAccount, 'is_paid'),
+    'RECEIVABLE': (ReceivableAccount, 'is_received'),
+}
+
+# Quantidade máxima de datas por cláusula IN (limite de parâmetros do SQLite)
+TAMANHO_LOTE_DIAS = 500
+
+_estado = threading.local()
+
+
+def _linhas_resumo(tipo, **filtros):
+    """ Agrupa as contas do tipo informado e devolve os objetos ResumoDiario (sem salvar). """
+    model, campo_liquidado = MODELOS_RESUMO[tipo]
+    campos = ['user_id', 'due_date', 'dre_area', 'category_id', 'bank_account_id', campo_liquidado]
+    if tipo == 'PAYABLE':
+        campos.append('cost_type')
+
+    grupos = (
+        model.objects.filter(**filtros)
+        .values(*campos)
+        .annotate(total=Sum('amount'), quantidade=Count('id'))
+        .order_by()
+    )
+    return [
+        ResumoDiario(
+            user_id=g['user_id'],
+            tipo=tipo,
+            dia=g['due_date'],
+            dre_area=g['dre_area'],
+            category_id=g['category_id'],
+            bank_account_id=g['bank_account_id'],
+            cost_type=g.get('cost_type') or '',
+            liquidado=g[campo_liquidado],
+            total=g['total'] or 0,
+            quantidade=g['quantidade'],
+        )
+        for g in grupos
+    ]
+
+
+def atualizar_resumo(user_id, dias):
+    """
+    Recalcula o rollup de um usuário para os dias informados e invalida
+    os resultados em cache dos dashboards desse usuário.
+    Dentro de um bloco `resumo_em_lote()` apenas acumula os dias pendentes.
+    """
+    dias = {d for d in dias if d}
+    if not user_id or not dias:
+        return
+
+    pendentes = getattr(_estado, 'pendentes', None)
+    if pendentes is not None:
+        pendentes.setdefault(user_id, set()).update(dias)
+        return
+
+    dias = sorted(dias)
+    with transaction.atomic():
+        for i in range(0, len(dias), TAMANHO_LOTE_DIAS):
+            lote = dias[i:i + TAMANHO_LOTE_DIAS]
+            ResumoDiario.objects.filter(user_id=user_id, dia__in=lote).delete()
+            linhas = []
+            for tipo in MODELOS_RESUMO:
+                linhas += _linhas_resumo(tipo, user_id=user_id, due_date__in=lote)
+            ResumoDiario.objects.bulk_create(linhas, batch_size=1000)
+    invalidar_ledger(user_id)
+
+
+def reconstruir_resumo(user_id=None):
+    """ Apaga e refaz o rollup de um usuário (ou de todos, se user_id for None). Retorna o nº de linhas. """
+    filtros = {'user_id': user_id} if user_id else {}
+    with transaction.atomic():
+        ResumoDiario.objects.filter(**filtros).delete()
+        linhas = []
+        for tipo in MODELOS_RESUMO:
+            linhas += _linhas_resumo(tipo, **filtros)
+        ResumoDiario.objects.bulk_create(linhas, batch_size=1000)
+    if user_id:
+        invalidar_ledger(user_id)
+    return len(linhas)
+
+
+@contextmanager
+def resumo_em_lote():
+    """
+    Adia a atualização do rollup (e dos saldos bancários) até o fim do bloco.
+    Use em caminhos que gravam muitas contas de uma vez (importações, bulk_create, update()).
+    """
+    if getattr(_estado, 'pendentes', None) is not None:
+        # Bloco aninhado: quem abriu o primeiro bloco faz a atualização
+        yield
+        return
+
+    _estado.pendentes = {}
+    try:
+        with saldos_em_lote():
+            yield
+    finally:
+        pendentes = _estado.pendentes
+        _estado.pendentes = None
+        for user_id, dias in pendentes.items():
+            atualizar_resumo(user_id, dias)
@@ -0,0 +1,98 @@
+# accounts/utils_saldos.py
+"""
+Saldo persistido por conta bancária (SaldoBancario).
+
+Cada conta a pagar/receber liquidada contribui com +valor (recebimento) ou
+-valor (pagamento) para o banco vinculado. Os signals aplicam apenas a
+diferença entre o estado antigo e o novo da conta, com UPDATE atômico (F()),
+e o comando recompute_bank_balances refaz tudo a partir das contas.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import BankAccount, PayableAccount, ReceivableAccount, SaldoBancario
+
+# tipo -> (modelo, campo que indica liquidação, sinal no saldo)
+MODELOS_SALDO = {
+    'PAYABLE': (PayableAccount, 'is_paid', -1),
+    'RECEIVABLE': (ReceivableAccount, 'is_received', 1),
+}
+
+_estado = threading.local()
+
+
+def contribuicao(tipo, bank_account_id, amount, liquidado):
+    """ Retorna (banco, valor) com o efeito da conta no saldo, ou None se não afeta saldo. """
+    if not bank_account_id or not liquidado or not amount:
+        return None
+    return bank_account_id, Decimal(str(amount)) * MODELOS_SALDO[tipo][2]
+
+
+def ajustar_saldos(deltas):
+    """ Soma os deltas {bank_account_id: valor} aos saldos persistidos. """
+    deltas = {banco: valor for banco, valor in deltas.items() if banco and valor}
+    if not deltas:
+        return
+
+    pendentes = getattr(_estado, 'pendentes', None)
+    if pendentes is not None:
+        for banco, valor in deltas.items():
+            pendentes[banco] += valor
+        return
+
+    with transaction.atomic():
+        sem_saldo = []
+        for banco, valor in deltas.items():
+            atualizados = SaldoBancario.objects.filter(bank_account_id=banco).update(movimentos=F('movimentos') + valor)
+            if not atualizados:
+                sem_saldo.append(banco)
+        if sem_saldo:
+            # Primeira movimentação do banco: calcula o saldo completo (já inclui a conta atual)
+            recalcular_saldos(bank_account_ids=sem_saldo)
+
+
+def recalcular_saldos(bank_account_ids=None, user_id=None):
+    """ Recalcula do zero os saldos dos bancos informados (ou de todos). Retorna o nº de bancos. """
+    bancos = BankAccount.objects.all()
+    if bank_account_ids is not None:
+        bancos = bancos.filter(id__in=bank_account_ids)
+    if user_id:
+        bancos = bancos.filter(user_id=user_id)
+
+    movimentos = defaultdict(Decimal)
+    for model, campo_liquidado, sinal in MODELOS_SALDO.values():
+        totais = (
+            model.objects.filter(bank_account__in=bancos, **{campo_liquidado: True})
+            .values('bank_account_id')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+        for item in totais:
+            movimentos[item['bank_account_id']] += (item['total'] or 0) * sinal
+
+    bancos = list(bancos.values_list('id', flat=True))
+    with transaction.atomic():
+        for banco in bancos:
+            SaldoBancario.objects.update_or_create(bank_account_id=banco, defaults={'movimentos': movimentos[banco]})
+    return len(bancos)
+
+
+@contextmanager
+def saldos_em_lote():
+    """ Acumula os ajustes de saldo e grava um UPDATE por banco no fim do bloco. """
+    if getattr(_estado, 'pendentes', None) is not None:
+        yield
+        return
+
+    _estado.pendentes = defaultdict(Decimal)
+    try:
+        yield
+    finally:
+        pendentes = _estado.pendentes
+        _estado.pendentes = None
+        ajustar_saldos(pendentes)
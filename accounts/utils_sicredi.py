@@ -1,4 +1,4 @@
-import requests
+from .utils_http import requisitar
 import base64
 from datetime import timedelta
 from django.utils import timezone
@@ -102,7 +102,7 @@ def get_sicredi_config(user):
         payload = {'grant_type': 'client_credentials', 'scope': 'extrato'}
 
         try:
-            response = requests.post(auth_url, data=payload, headers=headers_auth, timeout=30)
+            response = requisitar('sicredi', 'POST', auth_url, data=payload, headers=headers_auth, timeout=30)
             
             if response.status_code not in [200, 201]:
                 return {'erro': f"Erro Login Sicredi ({response.status_code}): {response.text}"}
@@ -138,7 +138,7 @@ def testar_conexao_sicredi(user):
     url = f"{config['base_url']}/beneficiarios"
     
     try:
-        response = requests.get(url, headers=config['headers'], timeout=15)
+        response = requisitar('sicredi', 'GET', url, headers=config['headers'], timeout=15)
         
         if response.status_code == 200:
             return {'sucesso': True}
@@ -161,7 +161,7 @@ def buscar_saldo_sicredi(user):
     url = f"{config['base_url']}/saldo" # Endpoint correto de saldo
     
     try:
-        response = requests.get(url, headers=config['headers'], timeout=15)
+        response = requisitar('sicredi', 'GET', url, headers=config['headers'], timeout=15)
         if response.status_code == 200:
             dados = response.json()
             # O Sicredi costuma retornar 'saldoDisponivel'
@@ -185,7 +185,7 @@ def buscar_extrato_sicredi(user, start_date, end_date):
     }
 
     try:
-        response = requests.get(url, headers=config['headers'], params=params, timeout=20)
+        response = requisitar('sicredi', 'GET', url, headers=config['headers'], params=params, timeout=20)
         if response.status_code != 200:
             return {'erro': f"Erro Extrato: {response.text}"}
 
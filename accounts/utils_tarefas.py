@@ -0,0 +1,315 @@
+# accounts/utils_tarefas.py
+"""
+Fila de tarefas em segundo plano, guardada no próprio banco (TarefaSegundoPlano).
+
+As views enfileiram com `enfileirar(user, tipo, **parametros)` e respondem na
+hora; o comando `run_task_worker` reserva as tarefas (no máximo
+TAREFAS_POR_TENANT ao mesmo tempo por cliente), executa a função registrada
+com @tarefa, guarda resultado/arquivo e, em caso de erro, reagenda com
+backoff exponencial até `max_tentativas`. A tela acompanha pelo endpoint
+de status (tarefa_status_view).
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import TarefaSegundoPlano
+
+logger = logging.getLogger(__name__)
+
+# tipo -> (função, máximo de tentativas)
+REGISTRO_TAREFAS = {}
+
+STATUS_ATIVOS = ('PENDENTE', 'EXECUTANDO')
+
+
+class ErroDefinitivo(Exception):
+    """ Falha que não adianta repetir (credenciais ausentes, parâmetros inválidos...). """
+
+
+def tarefa(tipo, max_tentativas=3):
+    """ Registra a função que executa as tarefas do `tipo`: func(tarefa, **parametros) -> dict. """
+    def registrar(func):
+        REGISTRO_TAREFAS[tipo] = (func, max_tentativas)
+        return func
+    return registrar
+
+
+def identificador_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enfileirar(user, tipo, **parametros):
+    """
+    Cria a tarefa para o tenant. Se já houver uma igual (mesmo tipo e
+    parâmetros) pendente ou executando, devolve a existente em vez de duplicar.
+    """
+    if tipo not in REGISTRO_TAREFAS:
+        raise ValueError(f"Tipo de tarefa desconhecido: {tipo}")
+
+    existente = TarefaSegundoPlano.objects.filter(
+        user=user, tipo=tipo, parametros=parametros, status__in=STATUS_ATIVOS
+    ).first()
+    if existente:
+        return existente
+
+    nova = TarefaSegundoPlano.objects.create(
+        user=user, tipo=tipo, parametros=parametros,
+        max_tentativas=REGISTRO_TAREFAS[tipo][1],
+    )
+    if settings.TAREFAS_EXECUTAR_NA_HORA:
+        # Desenvolvimento sem worker: executa já, depois do commit da requisição
+        transaction.on_commit(lambda: executar_tarefa(nova, identificador_worker()))
+    return nova
+
+
+def reportar_progresso(tarefa_atual, percentual, mensagem=''):
+    """ Atualiza progresso (0-100) e mensagem; também serve de heartbeat. """
+    tarefa_atual.progresso = max(0, min(100, int(percentual)))
+    tarefa_atual.mensagem = mensagem[:255]
+    TarefaSegundoPlano.objects.filter(pk=tarefa_atual.pk).update(
+        progresso=tarefa_atual.progresso, mensagem=tarefa_atual.mensagem, heartbeat_em=timezone.now(),
+    )
+
+
+def salvar_arquivo(tarefa_atual, nome, conteudo):
+    """ Guarda o arquivo gerado (exportações) no storage padrão, para download posterior. """
+    tarefa_atual.arquivo.save(nome, ContentFile(conteudo), save=False)
+    TarefaSegundoPlano.objects.filter(pk=tarefa_atual.pk).update(arquivo=tarefa_atual.arquivo.name)
+
+
+def calcular_backoff(tentativa):
+    """ Espera antes da próxima tentativa: base * 2^(n-1) com jitter. """
+    base = settings.TAREFAS_BACKOFF_BASE
+    return timedelta(seconds=base * 2 ** (tentativa - 1) + random.uniform(0, base))
+
+
+def worker_vivo(worker):
+    """
+    O processo do worker ("host:pid") ainda existe? Só dá para verificar no
+    mesmo host; de outro host, devolve None (resta a idade do heartbeat).
+    """
+    host, _, pid = worker.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, mas é de outro usuário do sistema
+    return True
+
+
+def recuperar_travadas():
+    """
+    Tarefas 'executando' sem heartbeat há mais de TAREFAS_TIMEOUT voltam para a
+    fila, desde que o worker não esteja comprovadamente vivo (no mesmo host, o
+    processo é verificado; uma tarefa lenta de um worker vivo não é duplicada).
+    """
+    limite = timezone.now() - timedelta(seconds=settings.TAREFAS_TIMEOUT)
+    travadas = TarefaSegundoPlano.objects.filter(status='EXECUTANDO', heartbeat_em__lt=limite)
+    mortas = [pk for pk, worker in travadas.values_list('pk', 'worker') if not worker_vivo(worker)]
+    if not mortas:
+        return 0
+    # heartbeat_em__lt de novo: um heartbeat que chegou entre as duas consultas mantém a tarefa
+    return travadas.filter(pk__in=mortas).update(status='PENDENTE', worker='', executar_apos=timezone.now())
+
+
+def reservar_proxima(worker):
+    """
+    Reserva a próxima tarefa pronta respeitando o limite por tenant.
+    No PostgreSQL usa SELECT ... FOR UPDATE SKIP LOCKED, e a linha do usuário
+    é travada durante a contagem para dois workers não passarem do limite.
+    """
+    limite = settings.TAREFAS_POR_TENANT
+    agora = timezone.now()
+
+    with transaction.atomic():
+        ocupados = (
+            TarefaSegundoPlano.objects.filter(status='EXECUTANDO')
+            .values('user_id').annotate(total=Count('id')).filter(total__gte=limite)
+            .values('user_id')
+        )
+        candidatas = (
+            TarefaSegundoPlano.objects.filter(status='PENDENTE', executar_apos__lte=agora)
+            .exclude(user_id__in=ocupados)
+            .order_by('executar_apos', 'id')
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            candidatas = candidatas.select_for_update(skip_locked=True, of=('self',))
+
+        for candidata in candidatas[:20]:
+            if connection.features.has_select_for_update:
+                list(User.objects.select_for_update().filter(pk=candidata.user_id).values_list('pk', flat=True))
+            executando = TarefaSegundoPlano.objects.filter(user_id=candidata.user_id, status='EXECUTANDO').count()
+            if executando >= limite:
+                continue
+
+            candidata.status = 'EXECUTANDO'
+            candidata.worker = worker
+            candidata.tentativas += 1
+            candidata.iniciado_em = candidata.heartbeat_em = timezone.now()
+            candidata.save(update_fields=['status', 'worker', 'tentativas', 'iniciado_em', 'heartbeat_em'])
+            return candidata
+    return None
+
+
+def executar_tarefa(tarefa_atual, worker):
+    """ Executa uma tarefa (já reservada ou recém-criada) e registra o desfecho. """
+    if tarefa_atual.status != 'EXECUTANDO':
+        tarefa_atual.status = 'EXECUTANDO'
+        tarefa_atual.worker = worker
+        tarefa_atual.tentativas += 1
+        tarefa_atual.iniciado_em = tarefa_atual.heartbeat_em = timezone.now()
+        tarefa_atual.save(update_fields=['status', 'worker', 'tentativas', 'iniciado_em', 'heartbeat_em'])
+
+    func, _ = REGISTRO_TAREFAS.get(tarefa_atual.tipo, (None, 0))
+    inicio = timezone.now()
+    try:
+        if func is None:
+            raise ErroDefinitivo(f"Tipo de tarefa desconhecido: {tarefa_atual.tipo}")
+        resultado = func(tarefa_atual, **tarefa_atual.parametros)
+    except Exception as e:
+        definitivo = isinstance(e, ErroDefinitivo) or tarefa_atual.tentativas >= tarefa_atual.max_tentativas
+        tarefa_atual.erro = str(e) if isinstance(e, ErroDefinitivo) else traceback.format_exc()
+        tarefa_atual.worker = ''
+        if definitivo:
+            tarefa_atual.status = 'FALHOU'
+            tarefa_atual.concluido_em = timezone.now()
+            tarefa_atual.mensagem = str(e)[:255]
+        else:
+            tarefa_atual.status = 'PENDENTE'
+            tarefa_atual.executar_apos = timezone.now() + calcular_backoff(tarefa_atual.tentativas)
+            tarefa_atual.mensagem = f"Tentativa {tarefa_atual.tentativas} falhou; nova tentativa agendada."
+        tarefa_atual.save(update_fields=['status', 'erro', 'worker', 'concluido_em', 'executar_apos', 'mensagem'])
+        logger.warning(
+            "Tarefa %s #%s falhou (tentativa %s/%s): %s",
+            tarefa_atual.tipo, tarefa_atual.pk, tarefa_atual.tentativas, tarefa_atual.max_tentativas, e,
+        )
+        return tarefa_atual
+
+    tarefa_atual.status = 'CONCLUIDA'
+    tarefa_atual.resultado = resultado or {}
+    tarefa_atual.progresso = 100
+    tarefa_atual.erro = tarefa_atual.mensagem = ''
+    tarefa_atual.concluido_em = timezone.now()
+    tarefa_atual.save(update_fields=['status', 'resultado', 'progresso', 'erro', 'mensagem', 'concluido_em'])
+    logger.info(
+        "Tarefa %s #%s concluída em %.1fs",
+        tarefa_atual.tipo, tarefa_atual.pk, (tarefa_atual.concluido_em - inicio).total_seconds(),
+    )
+    return tarefa_atual
+
+
+# ==============================================================================
+# TAREFAS REGISTRADAS
+# ==============================================================================
+
+def _mensagens_sincronizacao_erp(nome, resultado):
+    """ Mesmo feedback que a tela de importação mostrava ao sincronizar Omie/Nibo/Tiny. """
+    total_novos = resultado['pagar_novos'] + resultado['receber_novos']
+    total_atualizados = resultado['pagar_atualizados'] + resultado['receber_atualizados']
+
+    if total_novos > 0 or total_atualizados > 0:
+        mensagens = [('success', f"{nome} Sincronizado: {total_novos} novos lançamentos e {total_atualizados} atualizados.")]
+    else:
+        mensagens = [('info', f"{nome} conectado, mas não houve alterações nos dados.")]
+
+    if resultado.get('erros'):
+        # Mostra os 3 primeiros erros para não poluir a tela
+        mensagens.append(('warning', f"Alguns itens tiveram erro: {resultado['erros'][:3]}..."))
+    return mensagens
+
+
+def _sincronizar_erp(tarefa_atual, nome, sincronizar, forcar_completa=False):
+    from .utils_coleta import acompanhar_paginas
+
+    reportar_progresso(tarefa_atual, 5, f"Sincronizando {nome}...")
+
+    def pagina_gravada(paginas):
+        # Sem total conhecido de antemão: avança devagar até 90%; serve de heartbeat por página
+        reportar_progresso(tarefa_atual, min(90, 5 + paginas), f"Sincronizando {nome}... ({paginas} páginas)")
+
+    with acompanhar_paginas(pagina_gravada):
+        resultado = sincronizar(tarefa_atual.user, forcar_completa=forcar_completa)
+    if 'erro' in resultado:
+        raise ErroDefinitivo(f"Erro na integração {nome}: {resultado['erro']}")
+    return {
+        'mensagens': _mensagens_sincronizacao_erp(nome, resultado),
+        'contadores': {k: v for k, v in resultado.items() if isinstance(v, int)},
+        'modo': resultado.get('modo'),
+    }
+
+
+@tarefa('sync_omie')
+def tarefa_sync_omie(tarefa_atual, forcar_completa=False):
+    from .utils_omie import sincronizar_omie_completo
+    return _sincronizar_erp(tarefa_atual, 'Omie', sincronizar_omie_completo, forcar_completa)
+
+
+@tarefa('sync_nibo')
+def tarefa_sync_nibo(tarefa_atual, forcar_completa=False):
+    from .utils_nibo import sincronizar_nibo_completo
+    return _sincronizar_erp(tarefa_atual, 'Nibo', sincronizar_nibo_completo, forcar_completa)
+
+
+@tarefa('sync_tiny')
+def tarefa_sync_tiny(tarefa_atual, forcar_completa=False):
+    from .utils_tiny import sincronizar_tiny_completo
+    return _sincronizar_erp(tarefa_atual, 'Tiny', sincronizar_tiny_completo, forcar_completa)
+
+
+@tarefa('sync_extrato')
+def tarefa_sync_extrato(tarefa_atual, banco, **opcoes):
+    from .utils_extratos import SINCRONIZADORES_EXTRATO
+    if banco not in SINCRONIZADORES_EXTRATO:
+        raise ErroDefinitivo(f"Banco sem sincronização de extrato: {banco}")
+    reportar_progresso(tarefa_atual, 5, "Buscando extrato...")
+    return {'mensagens': SINCRONIZADORES_EXTRATO[banco](tarefa_atual.user, **opcoes)}
+
+
+@tarefa('exportar_contas', max_tentativas=2)
+def tarefa_exportar_contas(tarefa_atual, tipo_conta, formato, status='all', start_date=None, end_date=None):
+    """ Exportação grande de contas a pagar/receber (Excel/PDF) gerada fora da requisição. """
+    from django.utils.dateparse import parse_date
+
+    from .models import PayableAccount, ReceivableAccount
+    from .utils_exports import gerar_csv_generic, gerar_excel_generic, gerar_pdf_generic
+
+    if tipo_conta == 'pagar':
+        contas = PayableAccount.objects.filter(user=tarefa_atual.user).order_by('due_date')
+        if status == 'open': contas = contas.filter(is_paid=False)
+        elif status == 'paid': contas = contas.filter(is_paid=True)
+    else:
+        contas = ReceivableAccount.objects.filter(user=tarefa_atual.user).order_by('due_date')
+        if status == 'open': contas = contas.filter(is_received=False)
+        elif status == 'received': contas = contas.filter(is_received=True)
+    if start_date: contas = contas.filter(due_date__gte=parse_date(start_date))
+    if end_date: contas = contas.filter(due_date__lte=parse_date(end_date))
+
+    reportar_progresso(tarefa_atual, 10, "Gerando arquivo...")
+    if formato == 'pdf':
+        response = gerar_pdf_generic(contas, tipo_conta, data_inicio=start_date, data_fim=end_date)
+        extensao = 'pdf'
+    elif formato == 'csv':
+        response = gerar_csv_generic(contas, tipo_conta)
+        extensao = 'csv'
+    else:
+        response = gerar_excel_generic(contas, tipo_conta, data_inicio=start_date, data_fim=end_date)
+        extensao = 'xlsx'
+    conteudo = b''.join(response.streaming_content) if response.streaming else response.content
+
+    reportar_progresso(tarefa_atual, 90, "Salvando arquivo...")
+    salvar_arquivo(tarefa_atual, f"relatorio_{tipo_conta}_{timezone.now().strftime('%d_%m_%Y')}.{extensao}", conteudo)
+    return {'mensagens': [('success', "Relatório pronto para download.")]}
@@ -0,0 +1,120 @@
+# accounts/utils_tenant.py
+"""
+Contexto do tenant de cada requisição (usado por BPOManagementMiddleware).
+
+Resolver quem é o usuário efetivo custava de 3 a 5 consultas por requisição
+(usuários da sessão BPO ou vínculo de funcionário, depois a assinatura do
+dono nos decorators). O resultado da resolução — usuário real, usuário
+efetivo, vínculo de funcionário com as permissões e assinatura — fica no
+cache compartilhado e é reaproveitado enquanto as versões dos usuários
+envolvidos não mudarem. Vínculos de funcionário, assinaturas, vínculos BPO e
+os próprios usuários incrementam a versão ao serem salvos ou excluídos.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .models import BPOClientLink, CompanyUserLink, Subscription
+from .utils_cache import incrementar_versao, versao_da_chave
+
+CHAVE_VERSAO_TENANT = 'tenant_versao:{user_id}'
+CHAVE_CONTEXTO = 'tenant_contexto:{real_user_id}:{managed_user_id}'
+
+# Limite de segurança; a invalidação normal é pela versão dos usuários
+TIMEOUT_CONTEXTO = 60 * 60
+
+
+class ContextoTenant:
+    """ Resultado da resolução do tenant de uma requisição. """
+
+    def __init__(self, real_user, user, company_link=None, is_managing=False, subscription=None):
+        self.real_user = real_user          # Quem está logado (BPO, funcionário ou dono)
+        self.user = user                    # Dono dos dados (cliente gerenciado ou dono da licença)
+        self.company_link = company_link    # Vínculo do funcionário (com as permissões), se houver
+        self.is_managing = is_managing      # BPO gerenciando um cliente?
+        self.subscription = subscription    # Assinatura do dono dos dados (None se não houver)
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        # O usuário logado já vem carregado pelo AuthenticationMiddleware: só o id vai para o cache
+        estado['real_user'] = None
+        estado['real_user_id'] = self.real_user.pk
+        return estado
+
+
+def invalidar_tenant(*user_ids):
+    """ Nova versão dos usuários: os contextos que dependem deles são refeitos na próxima requisição. """
+    for user_id in user_ids:
+        if user_id:
+            incrementar_versao(CHAVE_VERSAO_TENANT.format(user_id=user_id))
+
+
+def _versoes(user_ids):
+    return {user_id: versao_da_chave(CHAVE_VERSAO_TENANT.format(user_id=user_id)) for user_id in user_ids}
+
+
+def _assinatura(user):
+    try:
+        return Subscription.objects.get(user=user)
+    except Subscription.DoesNotExist:
+        return None
+
+
+def _resolver(real_user, managed_user_id):
+    """ Consulta o banco; devolve None se a sessão BPO não for mais válida. """
+    if managed_user_id:
+        link = BPOClientLink.objects.select_related('client').filter(
+            bpo_admin=real_user, client_id=managed_user_id
+        ).first()
+        if link is None:
+            return None
+        cliente = link.client
+        return ContextoTenant(real_user, cliente, is_managing=True, subscription=_assinatura(cliente))
+
+    link = CompanyUserLink.objects.select_related('owner').filter(employee=real_user, is_active=True).first()
+    if link:
+        return ContextoTenant(real_user, link.owner, company_link=link, subscription=_assinatura(link.owner))
+    return ContextoTenant(real_user, real_user, subscription=_assinatura(real_user))
+
+
+def contexto_do_tenant(real_user, managed_user_id=None):
+    """
+    Contexto do tenant para o usuário logado (e o cliente que ele gerencia,
+    se for um BPO). Sem consultas ao banco quando está em cache e válido.
+    Devolve None quando a sessão BPO aponta para um cliente que ele não gerencia mais.
+    """
+    chave = CHAVE_CONTEXTO.format(real_user_id=real_user.pk, managed_user_id=managed_user_id or 0)
+
+    em_cache = cache.get(chave)
+    if em_cache is not None:
+        contexto, versoes = em_cache
+        if _versoes(versoes) == versoes:
+            contexto.real_user = real_user
+            if contexto.user.pk == real_user.pk:
+                contexto.user = real_user
+            return contexto
+
+    # As versões são lidas antes da consulta: uma alteração no meio do caminho invalida o que
+    # for gravado (a do dono, que só se conhece depois da consulta, é lida logo em seguida)
+    dependencias = {real_user.pk, managed_user_id} - {None}
+    versoes = _versoes(dependencias)
+    contexto = _resolver(real_user, managed_user_id)
+    if contexto is None:
+        return None
+    if contexto.user.pk not in versoes:
+        versoes.update(_versoes([contexto.user.pk]))
+    cache.set(chave, (contexto, versoes), TIMEOUT_CONTEXTO)
+    return contexto
+
+
+def aplicar_contexto(request, contexto):
+    """ Preenche os atributos que as views e os decorators esperam na requisição. """
+    # Assinatura já resolvida: user.subscription não consulta o banco de novo
+    User.subscription.related.set_cached_value(contexto.user, contexto.subscription)
+    if contexto.company_link is not None:
+        contexto.company_link.owner = contexto.user
+
+    request.tenant = contexto
+    request.real_user = contexto.real_user
+    request.user = contexto.user
+    request.company_link = contexto.company_link
+    request.is_managing = contexto.is_managing
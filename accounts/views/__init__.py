@@ -0,0 +1,91 @@
+# accounts/views/__init__.py
+"""
+Views do app accounts, separadas por área (financeiro, comercial, integracoes,
+assinatura, relatorios, conta). Os módulos só importam bibliotecas pesadas
+(pandas, openpyxl, reportlab, ofxparse, stripe, clientes de APIs) dentro das
+views que as usam, para não pesar no boot de cada worker.
+"""
+from .conta import (
+    company_profile_view,
+    login_view,
+    bpo_dashboard_view,
+    switch_to_client_view,
+    stop_managing_view,
+    logout_view,
+    search_cities,
+    chat_room_view,
+    register_view,
+    manage_users_view,
+    smart_redirect_view,
+    bpo_add_client_view,
+    landing_page,
+    editar_funcionario_view,
+)
+from .financeiro import (
+    home,
+    dre_view,
+    fornecedor_view,
+    clientes,
+    cadastrar_bancos_view,
+    contas_pagar,
+    contas_receber,
+    dashboards,
+    orcamento_anual_view,
+    listar_categorias_json,
+    criar_categoria_json,
+    deletar_categoria_json,
+    centro_custo_json,
+    centro_custo_criar,
+    centro_custo_deletar,
+)
+from .comercial import (
+    faturamento_dashboard_view,
+    comercial_cadastros_view,
+    editar_produto_view,
+    editar_vendedor_view,
+    vendas_view,
+    cadastrar_cliente_rapido,
+    metas_comerciais_view,
+    precificacao_view,
+    salvar_e_atualizar_precificacao_view,
+    orcamentos_venda_view,
+    converter_orcamento_venda_view,
+    gerenciamento_contratos_view,
+    editar_cliente_view,
+    gerar_financeiro_contrato,
+)
+from .integracoes import (
+    importar_ofx_view,
+    contaazul_auth_redirect,
+    contaazul_callback,
+    configurar_inter_view,
+    configurar_mercadopago_view,
+    configurar_asaas_view,
+    configurar_omie_view,
+    configurar_cora_view,
+    configurar_nibo_view,
+    configurar_tiny_view,
+    cora_webhook,
+    configurar_sicredi_view,
+    baixar_guia_sicredi_view,
+)
+from .assinatura import (
+    assinatura_view,
+    create_checkout_session,
+    assinatura_sucesso,
+    assinatura_cancelado,
+    stripe_webhook,
+    cancelar_assinatura_manual,
+)
+from .relatorios import (
+    gerar_laudo_financeiro,
+    gerar_laudo_comercial,
+    relatorios_view,
+    cache_stats_view,
+    requisicoes_lentas_view,
+    perfis_view,
+    perfil_download_view,
+    perfil_sql_view,
+    tarefa_status_view,
+    tarefa_download_view,
+)
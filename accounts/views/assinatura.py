@@ -0,0 +1,257 @@
+# accounts/views/assinatura.py
+"""
+Assinatura: planos, checkout e webhook do Stripe, cancelamento.
+"""
+
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.shortcuts import render, redirect
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from ..decorators import owner_required
+from ..models import Subscription
+
+
+@owner_required
+@login_required
+def assinatura_view(request):
+    subscription, created = Subscription.objects.get_or_create(user=request.user)
+    context = {
+        'subscription': subscription
+    }
+    return render(request, 'accounts/assinatura.html', context)    
+
+
+@login_required
+def create_checkout_session(request, plan_type):
+    """
+    Cria uma sessão de Checkout no Stripe para o plano escolhido.
+    Corrigido: Define mode='subscription' e remove trial do Stripe (cobrança imediata).
+    """
+    import stripe
+
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+
+    # 1. Identifica qual ID de preço usar
+    price_id = settings.STRIPE_PRICE_IDS.get(plan_type)
+    
+    if not price_id:
+        messages.error(request, "Plano inválido selecionado.")
+        return redirect('assinatura')
+
+    try:
+        # 2. Busca ou Cria o Cliente no Stripe
+        subscription = getattr(request.user, 'subscription', None)
+        stripe_customer_id = subscription.stripe_customer_id if subscription else None
+
+        if not stripe_customer_id:
+            # Cria um novo cliente no Stripe com o email do usuário
+            customer = stripe.Customer.create(
+                email=request.user.email,
+                name=request.user.get_full_name() or request.user.username,
+                metadata={'user_id': request.user.id} 
+            )
+            stripe_customer_id = customer.id
+            
+            # Salva o ID no banco
+            if subscription:
+                subscription.stripe_customer_id = stripe_customer_id
+                subscription.save()
+
+        # 3. Cria a Sessão de Checkout
+        checkout_session = stripe.checkout.Session.create(
+            customer=stripe_customer_id,
+            payment_method_types=['card', 'boleto'], 
+            line_items=[
+                {
+                    'price': price_id,
+                    'quantity': 1,
+                },
+            ],
+            # --- CORREÇÃO AQUI ---
+            mode='subscription',  # <--- REMOVI O '#' (AGORA ESTÁ ATIVO)
+            
+            # subscription_data={
+            #     'trial_period_days': 7, 
+            # }, 
+            # Mantivemos o trial comentado acima ^ 
+            # O cliente paga na hora, pois já usou o trial do seu sistema.
+            
+            success_url=settings.DOMAIN_URL + '/assinatura/sucesso/',
+            cancel_url=settings.DOMAIN_URL + '/assinatura/cancelado/',
+            metadata={
+                'user_id': request.user.id,
+                'plan_type': plan_type
+            }
+        )
+
+        # 4. Redireciona
+        return redirect(checkout_session.url, code=303)
+
+    except Exception as e:
+        # Adicionei um print para ajudar no debug se der erro de novo
+        print(f"Erro Stripe: {str(e)}") 
+        messages.error(request, f"Erro ao conectar com Stripe: {str(e)}")
+        return redirect('assinatura')
+
+
+# Views simples de retorno (só para não dar erro 404)
+@login_required
+def assinatura_sucesso(request):
+    messages.success(request, "Pagamento recebido! Sua assinatura será ativada em instantes.")
+    return redirect('home')
+
+
+@login_required
+def assinatura_cancelado(request):
+    messages.warning(request, "A assinatura não foi completada. Você não foi cobrado.")
+    return redirect('assinatura')
+
+
+@csrf_exempt
+def stripe_webhook(request):
+    import stripe
+
+    payload = request.body
+    sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
+    event = None
+
+    try:
+        event = stripe.Webhook.construct_event(
+            payload, sig_header, settings.STRIPE_WEBHOOK_SECRET
+        )
+    except ValueError as e:
+        return HttpResponse(status=400)
+    except stripe.error.SignatureVerificationError as e:
+        return HttpResponse(status=400)
+
+    # --- EVENTO 1: CLIENTE PAGOU A 1ª VEZ (Fim do Trial -> Ativo) ---
+    if event['type'] == 'checkout.session.completed':
+        session = event['data']['object']
+        
+        # Recupera dados
+        user_id = session.get('metadata', {}).get('user_id')
+        plan_type = session.get('metadata', {}).get('plan_type') # 'financeiro', 'comercial' ou 'fiscal'
+        stripe_subscription_id = session.get('subscription')
+
+        if user_id:
+            try:
+                user = User.objects.get(id=user_id)
+                sub = user.subscription 
+                
+                # 1. Atualiza IDs e Status
+                sub.stripe_subscription_id = stripe_subscription_id
+                sub.status = 'active' 
+                
+                # 2. Sincroniza a data de validade com o Stripe
+                stripe_sub = stripe.Subscription.retrieve(stripe_subscription_id)
+                current_period_end = stripe_sub['current_period_end']
+                sub.valid_until = datetime.fromtimestamp(current_period_end).date()
+
+                # 3. Lógica de Permissões (ATUALIZADA PARA 3 PLANOS)
+                print(f"Processando plano tipo: {plan_type}") # Log para debug
+
+                if plan_type == 'financeiro':
+                    sub.has_financial_module = True
+                    sub.has_commercial_module = False
+                    sub.has_fiscal_module = False
+                    sub.employee_limit = 2
+
+                elif plan_type == 'comercial': # Antigo 'completo' (R$ 189)
+                    sub.has_financial_module = True
+                    sub.has_commercial_module = True
+                    sub.has_fiscal_module = False # Comercial não emite nota
+                    sub.employee_limit = 4
+
+                elif plan_type == 'fiscal': # NOVO (R$ 249)
+                    sub.has_financial_module = True
+                    sub.has_commercial_module = True
+                    sub.has_fiscal_module = True  # Libera NFe/NFSe
+                    sub.employee_limit = 6
+
+                sub.save()
+                print(f"✅ SUCESSO: Usuário {user.username} ativado no plano {plan_type}!")
+                
+            except User.DoesNotExist:
+                print(f"❌ ERRO: Usuário ID {user_id} não encontrado.")
+            except Exception as e:
+                print(f"❌ ERRO CRÍTICO NO WEBHOOK: {str(e)}")
+
+    # --- EVENTO 2: RENOVAÇÃO MENSAL ---
+    elif event['type'] == 'invoice.payment_succeeded':
+        invoice = event['data']['object']
+        stripe_subscription_id = invoice.get('subscription')
+
+        if stripe_subscription_id:
+            try:
+                sub = Subscription.objects.get(stripe_subscription_id=stripe_subscription_id)
+                sub.status = 'active'
+                
+                lines = invoice.get('lines', {}).get('data', [])
+                if lines:
+                    period_end = lines[0]['period']['end']
+                    sub.valid_until = datetime.fromtimestamp(period_end).date()
+                
+                sub.save()
+                print(f"Renovação processada para {stripe_subscription_id}")
+                
+            except Subscription.DoesNotExist:
+                pass
+
+    # --- EVENTO 3: CANCELAMENTO ---
+    elif event['type'] == 'customer.subscription.deleted':
+        subscription_data = event['data']['object']
+        stripe_subscription_id = subscription_data.get('id')
+        
+        try:
+            sub = Subscription.objects.get(stripe_subscription_id=stripe_subscription_id)
+            sub.status = 'canceled'
+            sub.save()
+        except Subscription.DoesNotExist:
+            pass
+
+    return HttpResponse(status=200)
+
+
+@login_required
+@require_POST
+def cancelar_assinatura_manual(request):
+    import stripe
+
+    try:
+        subscription = Subscription.objects.get(user=request.user)
+        
+        if subscription.stripe_subscription_id:
+            stripe.api_key = settings.STRIPE_SECRET_KEY
+            
+            # 1. Avisa ao Stripe: "Não cobre mais, mas deixe rodar até o fim"
+            stripe.Subscription.modify(
+                subscription.stripe_subscription_id,
+                cancel_at_period_end=True
+            )
+            
+            # --- CORREÇÃO AQUI ---
+            # NÃO mudamos o status para 'canceled' agora.
+            # O usuário pagou, ele tem direito de usar até o fim.
+            # subscription.status = 'canceled'  <-- REMOVA OU COMENTE ESSA LINHA
+            
+            # Apenas salvamos se tivermos alterado algum outro campo (opcional aqui)
+            # subscription.save() 
+            
+            messages.success(request, f"Renovação automática cancelada. Seu acesso continua garantido até {subscription.valid_until.strftime('%d/%m/%Y')}.")
+        else:
+            # Se for assinatura manual (sem Stripe), aí sim cancelamos na hora ou definimos a lógica que você preferir
+            subscription.status = 'canceled'
+            subscription.save()
+            messages.warning(request, "Assinatura manual cancelada.")
+            
+    except Exception as e:
+        messages.error(request, f"Erro ao cancelar: {str(e)}")
+        
+    return redirect('assinatura')
@@ -0,0 +1,2498 @@
+# accounts/views/comercial.py
+"""
+Módulo comercial: faturamento, cadastros, vendas, metas, precificação,
+orçamentos de venda e contratos.
+"""
+
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+import io
+import json
+import locale
+import logging
+
+from dateutil.relativedelta import relativedelta
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, Min, ExpressionWrapper, fields, Avg
+from django.db.models.functions import TruncMonth
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ..decorators import subscription_required, check_employee_permission, module_access_required
+from ..forms import MetaFaturamentoForm, ContractForm, ProdutoServicoForm, VendedorForm, ClienteForm
+from ..models import (
+    ReceivableAccount, Category, MetaFaturamento, Contract, Cliente, Venda, ItemVenda, ProdutoServico,
+    Vendedor, PagamentoVenda, PAYMENT_METHODS, Precificacao, OrcamentoVenda, ItemOrcamento, ResumoDiario,
+)
+from ..utils_cache import resultado_em_cache
+from ..utils_recorrencia import datas_serie
+from ..utils_resumo import atualizar_resumo
+
+logger = logging.getLogger(__name__)
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_painel_vendas')
+def faturamento_dashboard_view(request):
+    context = resultado_em_cache(request, 'faturamento_dashboard_view', lambda: _contexto_faturamento_dashboard_view(request))
+    return render(request, 'accounts/faturamento_dashboard.html', context)
+
+
+def _contexto_faturamento_dashboard_view(request):
+    """ Calcula o contexto de faturamento_dashboard_view (resultado guardado em cache por tenant/versão do ledger). """
+    import pandas as pd
+
+    # --- CORREÇÃO: Define o idioma para Português do Brasil para formatação de datas ---
+    try:
+        # Tenta configurar o locale, mas não quebra a aplicação se falhar
+        locale.setlocale(locale.LC_TIME, 'pt_BR.UTF-8')
+    except locale.Error:
+        # Se falhar, apenas imprime um aviso no log e continua
+        print("Aviso: locale 'pt_BR.UTF-8' não encontrado. Usando o padrão do sistema.")
+        pass
+
+
+    df = pd.DataFrame()
+    # --- BASE DE DADOS ---
+    # `all_sales` é usado para gráficos que mostram o histórico completo (Ex: Vendas por Mês/Ano)
+    all_sales = Venda.objects.filter(user=request.user)
+    
+    # --- LÓGICA PARA O GRÁFICO DE FATURAMENTO E INSIGHTS (TOPO) ---
+    faturamento_periodo = request.GET.get('faturamento_periodo', 'semanal')
+    today = timezone.now().date()
+    
+    if faturamento_periodo == 'mensal':
+        period_days = 30
+        period_text = "últimos 30 dias"
+        prev_period_text = "30 dias anteriores"
+        current_start_date = today - timedelta(days=period_days - 1)
+        prev_end_date = current_start_date - timedelta(days=1)
+        prev_start_date = prev_end_date - timedelta(days=period_days - 1)
+        
+        chart_sales_query = all_sales.filter(data_venda__date__gte=current_start_date).values('data_venda__date').annotate(total=Sum('valor_total_liquido')).order_by('data_venda__date')
+        sales_by_day = {item['data_venda__date']: float(item['total']) for item in chart_sales_query}
+        faturamento_chart_labels = [(current_start_date + timedelta(days=i)).strftime('%d/%m') for i in range(period_days)]
+        faturamento_chart_data = [sales_by_day.get(current_start_date + timedelta(days=i), 0) for i in range(period_days)]
+
+    elif faturamento_periodo == 'anual':
+        period_text = "ano corrente"
+        ano_anterior = today.year - 1
+        prev_period_text = f"ano de {ano_anterior}"
+        
+        # Define o período atual como o ano corrente
+        ano_corrente = today.year
+        current_start_date = today.replace(year=ano_corrente, month=1, day=1)
+        
+        # Define o período anterior como o ano anterior completo
+        prev_start_date = current_start_date - relativedelta(years=1)
+        prev_end_date = current_start_date - timedelta(days=1)
+        
+        # 1. Cria os rótulos de Jan a Dez do ano corrente
+        faturamento_chart_labels = [datetime(ano_corrente, i, 1).strftime('%b/%Y') for i in range(1, 13)]
+        
+        # 2. Busca as vendas do ano corrente
+        chart_sales_query = all_sales.filter(data_venda__year=ano_corrente).annotate(
+            month=TruncMonth('data_venda')
+        ).values('month').annotate(total=Sum('valor_total_liquido')).order_by('month')
+        
+        # 3. Mapeia os resultados
+        sales_by_month = {v['month'].strftime('%b/%Y'): float(v['total']) for v in chart_sales_query}
+        
+        # 4. Gera os dados finais, preenchendo com 0 os meses sem vendas
+        faturamento_chart_data = [sales_by_month.get(label, 0) for label in faturamento_chart_labels]
+
+
+    else: # Default para 'semanal'
+        faturamento_periodo = 'semanal'
+        period_days = 7
+        period_text = "últimos 7 dias"
+        prev_period_text = "7 dias anteriores"
+        current_start_date = today - timedelta(days=period_days - 1)
+        prev_end_date = current_start_date - timedelta(days=1)
+        prev_start_date = prev_end_date - timedelta(days=period_days - 1)
+
+        dias_semana_pt = { 0: 'Segunda', 1: 'Terça', 2: 'Quarta', 3: 'Quinta', 4: 'Sexta', 5: 'Sábado', 6: 'Domingo' }
+        chart_sales_query = all_sales.filter(data_venda__date__gte=current_start_date).values('data_venda__date').annotate(total=Sum('valor_total_liquido')).order_by('data_venda__date')
+        sales_by_day = {item['data_venda__date']: float(item['total']) for item in chart_sales_query}
+        faturamento_chart_labels = [dias_semana_pt[(current_start_date + timedelta(days=i)).weekday()] for i in range(period_days)]
+        faturamento_chart_data = [sales_by_day.get(current_start_date + timedelta(days=i), 0) for i in range(period_days)]
+
+    current_period_sales = all_sales.filter(data_venda__date__gte=current_start_date, data_venda__date__lte=today).aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+    previous_period_sales = all_sales.filter(data_venda__date__range=[prev_start_date, prev_end_date]).aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+    sales_variation = ((current_period_sales - previous_period_sales) / previous_period_sales * 100) if previous_period_sales > 0 else 0
+    faturamento_chart_json = json.dumps({'labels': faturamento_chart_labels, 'data': faturamento_chart_data})
+    
+    # --- LÓGICA DO FILTRO DE PERÍODO PRINCIPAL (CORRIGIDA) ---
+    period = request.GET.get('period', 'all')
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+    
+    # Inicializa as datas
+    start_date, end_date = None, None
+    today = timezone.now().date()
+
+    vendas_concluidas = Venda.objects.filter(user=request.user)
+
+    if period == 'custom':
+        start_date = parse_date(start_date_str)
+        end_date = parse_date(end_date_str)
+    elif period.isdigit():
+        days = int(period)
+        end_date = today
+        start_date = end_date - timedelta(days=days)
+    # Se for 'all', start_date e end_date permanecem None e o filtro não é aplicado
+
+    # Aplica o filtro de data se as datas forem válidas
+    if start_date and end_date:
+        vendas_concluidas = vendas_concluidas.filter(data_venda__date__range=[start_date, end_date])
+
+    # Coloque este bloco dentro de faturamento_dashboard_view, após a linha que define 'vendas_concluidas'
+
+    # --- CÁLCULOS PARA OS NOVOS CARDS DE INFORMAÇÃO ---
+    melhor_mes_valor = pior_mes_valor = None
+    melhor_mes_qtd = pior_mes_qtd = None
+    melhor_mes_ticket = pior_mes_ticket = None
+    melhor_mes_prazo = pior_mes_prazo = None
+    prazo_medio_recebimento = 0
+
+    # Agrupa as vendas do período por mês para análise de melhor/pior
+    vendas_por_mes = vendas_concluidas.annotate(mes=TruncMonth('data_venda')) \
+        .values('mes') \
+        .annotate(
+            valor_total=Sum('valor_total_liquido'),
+            qtd_total=Count('id')
+        ).order_by('mes')
+
+    if vendas_por_mes:
+        # Análise de Valor
+        vendas_ordenadas_valor = sorted(vendas_por_mes, key=lambda v: v['valor_total'])
+        pior_mes_valor = {'mes': vendas_ordenadas_valor[0]['mes'].strftime('%b/%Y'), 'valor': vendas_ordenadas_valor[0]['valor_total']}
+        melhor_mes_valor = {'mes': vendas_ordenadas_valor[-1]['mes'].strftime('%b/%Y'), 'valor': vendas_ordenadas_valor[-1]['valor_total']}
+
+        # Análise de Quantidade
+        vendas_ordenadas_qtd = sorted(vendas_por_mes, key=lambda v: v['qtd_total'])
+        pior_mes_qtd = {'mes': vendas_ordenadas_qtd[0]['mes'].strftime('%b/%Y'), 'qtd': vendas_ordenadas_qtd[0]['qtd_total']}
+        melhor_mes_qtd = {'mes': vendas_ordenadas_qtd[-1]['mes'].strftime('%b/%Y'), 'qtd': vendas_ordenadas_qtd[-1]['qtd_total']}
+
+        # Análise de Ticket Médio
+        tickets_por_mes = [
+            {'mes': v['mes'].strftime('%b/%Y'), 'ticket': v['valor_total'] / v['qtd_total'] if v['qtd_total'] > 0 else 0}
+            for v in vendas_por_mes
+        ]
+        tickets_ordenados = sorted(tickets_por_mes, key=lambda t: t['ticket'])
+        pior_mes_ticket = tickets_ordenados[0]
+        melhor_mes_ticket = tickets_ordenados[-1]
+
+    # --- INÍCIO DA CORREÇÃO PARA VENDA INEXISTENTE ---
+    # 1. Tenta buscar a data da primeira venda de forma segura
+    try:
+        earliest_sale_date = all_sales.earliest('data_venda').data_venda.date()
+    except Venda.DoesNotExist:
+        earliest_sale_date = timezone.now().date() # Se não houver vendas, usa a data de hoje como padrão
+
+    # 2. Define o range de datas
+    date_range = [start_date, end_date] if period != 'all' else [earliest_sale_date, timezone.now().date()]
+
+    # 3. Aplica o range de datas na consulta
+    contas_recebidas_periodo = ReceivableAccount.objects.filter(
+        user=request.user, 
+        is_received=True, 
+        payment_date__isnull=False,
+        payment_date__range=date_range
+    )
+    # --- FIM DA CORREÇÃO ---
+
+    if contas_recebidas_periodo.exists():
+        duracao_media = contas_recebidas_periodo.aggregate(
+            media=Avg(ExpressionWrapper(F('payment_date') - F('due_date'), output_field=fields.DurationField()))
+        )['media']
+        prazo_medio_recebimento = duracao_media.days if duracao_media else 0
+
+        # Análise de Melhor/Pior mês para PMR
+        pmr_por_mes = contas_recebidas_periodo.annotate(mes=TruncMonth('payment_date')) \
+            .values('mes') \
+            .annotate(media_prazo=Avg(ExpressionWrapper(F('payment_date') - F('due_date'), output_field=fields.DurationField()))) \
+            .order_by('mes')
+        
+        if pmr_por_mes:
+            pmr_ordenado = sorted(pmr_por_mes, key=lambda p: p['media_prazo'])
+            # Melhor prazo é o menor (mais rápido para receber)
+            melhor_mes_prazo = {'mes': pmr_ordenado[0]['mes'].strftime('%b/%Y'), 'dias': pmr_ordenado[0]['media_prazo'].days}
+            # Pior prazo é o maior (mais demorado para receber)
+            pior_mes_prazo = {'mes': pmr_ordenado[-1]['mes'].strftime('%b/%Y'), 'dias': pmr_ordenado[-1]['media_prazo'].days}
+
+
+    # --- INÍCIO DO NOVO CÓDIGO ---
+    # 1. Busca dados para o gráfico de Vendas por Cliente
+    vendas_por_cliente = vendas_concluidas.values('cliente__nome') \
+        .annotate(valor_total=Sum('valor_total_liquido')) \
+        .order_by('-valor_total')
+    vendas_por_cliente_json = json.dumps({
+        'labels': [item['cliente__nome'] for item in vendas_por_cliente],
+        'data': [float(item['valor_total']) for item in vendas_por_cliente]
+    })
+
+    # 2. Busca dados para o gráfico de Vendas por Produto/Serviço
+    vendas_por_produto_servico = ItemVenda.objects.filter(venda__in=vendas_concluidas) \
+        .values('produto__nome') \
+        .annotate(valor=Sum(F('quantidade') * F('preco_unitario'))) \
+        .order_by('-valor')
+    vendas_por_produto_servico_json = json.dumps({
+        'labels': [item['produto__nome'] for item in vendas_por_produto_servico],
+        'data': [float(item['valor']) for item in vendas_por_produto_servico]
+    })
+    # --- FIM DO NOVO CÓDIGO ---
+
+
+    # --- NOVO: Lógica para o gráfico Top 5 Cidades ---
+    # CÓDIGO CORRIGIDO
+    top_5_cidades = vendas_concluidas.exclude(cidade__isnull=True).exclude(cidade__exact='') \
+                                    .values('cidade') \
+                                    .annotate(total_vendido=Sum('valor_total_liquido')) \
+                                    .order_by('-total_vendido')[:5]
+
+    top_cidades_labels = [item['cidade'] for item in top_5_cidades]
+    top_cidades_data = [float(item['total_vendido']) for item in top_5_cidades]
+    top_cidades_json = json.dumps({
+        'labels': top_cidades_labels,
+        'data': top_cidades_data
+    })
+    # --- FIM DO NOVO CÓDIGO ---    
+
+    # --- CÁLCULOS PARA OS CARDS SUPERIORES ---
+    # --- NOVOS CÁLCULOS PARA OS CARDS DE ANÁLISE DE CLIENTES ---
+    
+    # Card 1: Total de clientes cadastrados na base de dados.
+    total_clientes_base = Cliente.objects.filter(user=request.user).count()
+
+    # Card 2: Contagem de clientes únicos que realizaram compras no período filtrado.
+    clientes_no_periodo = vendas_concluidas.values('cliente').distinct().count()
+
+    # Card 3: Contagem de clientes que fizeram mais de uma compra no período.
+    clientes_recorrentes = vendas_concluidas.values('cliente').annotate(num_compras=Count('id')).filter(num_compras__gt=1).count()
+
+    # Card 4: Percentual de clientes da base que compraram no período.
+    cobertura_carteira = (clientes_no_periodo / total_clientes_base * 100) if total_clientes_base > 0 else 0
+
+    # Mantemos estes cálculos pois são usados em outras partes do dashboard
+    total_vendido = vendas_concluidas.aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+    qtd_vendas = vendas_concluidas.count()
+    ticket_medio = total_vendido / qtd_vendas if qtd_vendas > 0 else Decimal('0')
+
+    # --- CORREÇÃO DEFINITIVA: Gráfico Vendas por Mês/Ano (Mostra todos os 12 meses do ano) ---
+    ano_corrente = timezone.now().year
+    labels_meses = [datetime(ano_corrente, i, 1).strftime('%b/%Y') for i in range(1, 13)]
+    vendas_por_mes_query = all_sales.filter(data_venda__year=ano_corrente).annotate(
+        mes=TruncMonth('data_venda')
+    ).values('mes').annotate(total=Sum('valor_total_liquido')).order_by('mes')
+    vendas_por_mes_dict = {v['mes'].strftime('%b/%Y'): float(v['total']) for v in vendas_por_mes_query}
+    data_meses = [vendas_por_mes_dict.get(label, 0) for label in labels_meses]
+    vendas_por_mes_json = json.dumps({'labels': labels_meses, 'data': data_meses})
+    
+    # --- NOVO: Lógica para o mapa do Brasil (Usa vendas_concluidas para respeitar o filtro) ---
+    vendas_por_estado = vendas_concluidas.values('estado').annotate(total=Sum('valor_total_liquido')).order_by('-total')
+    vendas_por_estado_data = [['Estado', 'Valor Vendido']]
+    for venda in vendas_por_estado:
+        if venda['estado'] and len(venda['estado']) == 2:
+            estado_code = f"BR-{venda['estado'].upper()}"
+            vendas_por_estado_data.append([estado_code, float(venda['total'])])
+    vendas_por_estado_json = json.dumps(vendas_por_estado_data)
+
+    # --- LÓGICA EXISTENTE PARA OS DEMAIS COMPONENTES DO DASHBOARD ---
+    itens_vendidos_agrupados = (ItemVenda.objects.filter(venda__in=vendas_concluidas).values('produto__nome').annotate(valor=Sum(F('quantidade') * F('preco_unitario'))).order_by('-valor'))
+    abc_data = []
+    abc_chart_data = {'labels': [], 'data_valor': [], 'data_acumulado': []}
+    if itens_vendidos_agrupados:
+        df = pd.DataFrame(list(itens_vendidos_agrupados))
+        df.rename(columns={'produto__nome': 'produto'}, inplace=True)
+        total_geral_vendas_abc = df['valor'].sum()
+        if total_geral_vendas_abc > 0:
+            df['acumulado'] = df['valor'].cumsum()
+            df['acumulado_percentual'] = 100 * df['acumulado'] / total_geral_vendas_abc
+            df['classe'] = df['acumulado_percentual'].apply(lambda p: 'A' if p <= 80 else ('B' if p <= 95 else 'C'))
+            abc_data = df.to_dict('records')
+            abc_chart_data['labels'] = df['produto'].tolist()
+            abc_chart_data['data_valor'] = [float(v) for v in df['valor'].tolist()]
+            abc_chart_data['data_acumulado'] = [round(float(p), 2) for p in df['acumulado_percentual'].tolist()]
+    abc_chart_json = json.dumps(abc_chart_data)
+    # --- INÍCIO DO NOVO CÓDIGO: Resumo para os cards ABC ---
+    abc_summary = {
+        'A': {'count': 0, 'value': Decimal('0.0'), 'percentage': Decimal('0.0')},
+        'B': {'count': 0, 'value': Decimal('0.0'), 'percentage': Decimal('0.0')},
+        'C': {'count': 0, 'value': Decimal('0.0'), 'percentage': Decimal('0.0')}
+    }
+
+    if not df.empty and total_geral_vendas_abc > 0:
+        summary_df = df.groupby('classe')['valor'].agg(['count', 'sum'])
+        for classe, data in summary_df.iterrows():
+            abc_summary[classe] = {
+                'count': data['count'],
+                'value': data['sum'],
+                'percentage': (data['sum'] / total_geral_vendas_abc) * 100
+            }
+    # --- FIM DO NOVO CÓDIGO ---
+    total_itens_vendidos = int(ItemVenda.objects.filter(venda__in=vendas_concluidas).aggregate(total=Sum('quantidade'))['total'] or 0)
+    
+    # --- LÓGICA CORRIGIDA PARA O GRÁFICO "ANÁLISE DE VENDAS" COM MESES FIXOS ---
+    # Usaremos `all_sales` aqui para ignorar o filtro de período principal.
+    
+    # --- LÓGICA CORRIGIDA PARA O GRÁFICO "ANÁLISE DE VENDAS" COM MESES FIXOS (JANEIRO A DEZEMBRO) ---
+    
+    meses_fixos = OrderedDict()
+    ano_corrente = timezone.now().year
+    
+    # 1. Cria a estrutura com os 12 meses do ano corrente, todos com valor zero.
+    for i in range(1, 13):
+        mes_chave = datetime(ano_corrente, i, 1).strftime('%b/%Y')
+        meses_fixos[mes_chave] = {'valor_vendas': 0.0, 'qtd_vendas': 0, 'itens_vendidos': 0}
+        
+    # 2. Busca os dados reais do ano corrente no banco de dados.
+    vendas_do_ano_corrente = all_sales.filter(data_venda__year=ano_corrente)
+
+    vendas_agrupadas = vendas_do_ano_corrente.annotate(mes=TruncMonth('data_venda')).values('mes').annotate(
+        valor_total=Sum('valor_total_liquido'),
+        qtd_total=Count('id')
+    ).order_by('mes')
+
+    itens_agrupados = ItemVenda.objects.filter(venda__in=vendas_do_ano_corrente).annotate(mes=TruncMonth('venda__data_venda')).values('mes').annotate(
+        itens_total=Sum('quantidade')
+    ).order_by('mes')
+
+    # 3. Preenche a estrutura com os dados reais encontrados.
+    for v in vendas_agrupadas:
+        mes_chave = v['mes'].strftime('%b/%Y')
+        if mes_chave in meses_fixos:
+            meses_fixos[mes_chave]['valor_vendas'] = float(v['valor_total'])
+            meses_fixos[mes_chave]['qtd_vendas'] = v['qtd_total']
+            
+    for i in itens_agrupados:
+        mes_chave = i['mes'].strftime('%b/%Y')
+        if mes_chave in meses_fixos:
+            meses_fixos[mes_chave]['itens_vendidos'] = float(i['itens_total'])
+
+    # 4. Monta o dicionário final para o template.
+    indicadores_data = {
+        'labels': list(meses_fixos.keys()),
+        'datasets': {
+            'valor_vendas': [d['valor_vendas'] for d in meses_fixos.values()],
+            'qtd_vendas': [d['qtd_vendas'] for d in meses_fixos.values()],
+            'ticket_medio': [(d['valor_vendas'] / d['qtd_vendas'] if d.get('qtd_vendas', 0) > 0 else 0) for d in meses_fixos.values()],
+            'itens_vendidos': [d['itens_vendidos'] for d in meses_fixos.values()],
+            'valor_medio_item': [(d['valor_vendas'] / d['itens_vendidos'] if d.get('itens_vendidos', 0) > 0 else 0) for d in meses_fixos.values()],
+        }
+    }
+
+    # 3. Preenche a estrutura com os dados reais encontrados.
+    for v in vendas_agrupadas:
+        mes_chave = v['mes'].strftime('%b/%Y')
+        if mes_chave in meses_fixos:
+            meses_fixos[mes_chave]['valor_vendas'] = float(v['valor_total'])
+            meses_fixos[mes_chave]['qtd_vendas'] = v['qtd_total']
+            
+    for i in itens_agrupados:
+        mes_chave = i['mes'].strftime('%b/%Y')
+        if mes_chave in meses_fixos:
+            meses_fixos[mes_chave]['itens_vendidos'] = float(i['itens_total'])
+
+    # 4. Monta o dicionário final para o template.
+    indicadores_data = {
+        'labels': list(meses_fixos.keys()),
+        'datasets': {
+            'valor_vendas': [d['valor_vendas'] for d in meses_fixos.values()],
+            'qtd_vendas': [d['qtd_vendas'] for d in meses_fixos.values()],
+            'ticket_medio': [(d['valor_vendas'] / d['qtd_vendas'] if d.get('qtd_vendas', 0) > 0 else 0) for d in meses_fixos.values()],
+            'itens_vendidos': [d['itens_vendidos'] for d in meses_fixos.values()],
+            'valor_medio_item': [(d['valor_vendas'] / d['itens_vendidos'] if d.get('itens_vendidos', 0) > 0 else 0) for d in meses_fixos.values()],
+        }
+    }
+    
+    top_produtos_desc = list(itens_vendidos_agrupados[:10])
+    top_produtos_servicos_chart_json = json.dumps({'labels': [item['produto__nome'] for item in top_produtos_desc], 'data': [float(item['valor']) for item in top_produtos_desc]})
+    
+    top_clientes_desc = list(vendas_concluidas.values('cliente__nome').annotate(valor_total=Sum('valor_total_liquido')).order_by('-valor_total')[:10])
+    top_clientes_chart_json = json.dumps({'labels': [item['cliente__nome'] for item in top_clientes_desc], 'data': [float(item['valor_total']) for item in top_clientes_desc]})
+    
+    vendas_produtos_desc = list(ItemVenda.objects.filter(venda__in=vendas_concluidas, produto__tipo='PRODUTO').values('produto__nome').annotate(valor=Sum(F('quantidade') * F('preco_unitario'))).order_by('-valor')[:10])
+    vendas_por_produto_data_json = json.dumps({'labels': [item['produto__nome'] for item in vendas_produtos_desc], 'data': [float(item['valor']) for item in vendas_produtos_desc]})
+    
+    vendas_servicos_desc = list(ItemVenda.objects.filter(venda__in=vendas_concluidas, produto__tipo='SERVICO').values('produto__nome').annotate(valor=Sum(F('quantidade') * F('preco_unitario'))).order_by('-valor')[:10])
+    vendas_por_servico_data_json = json.dumps({'labels': [item['produto__nome'] for item in vendas_servicos_desc], 'data': [float(item['valor']) for item in vendas_servicos_desc]})
+    
+    top_clientes_valor = list(vendas_concluidas.values('cliente__nome').annotate(total=Sum('valor_total_liquido')).order_by('-total')[:8])
+    top_clientes_qtd = list(vendas_concluidas.values('cliente__nome').annotate(total=Count('id')).order_by('-total')[:8])
+    top_clientes_ticket = list(vendas_concluidas.values('cliente__nome').annotate(total=Avg('valor_total_liquido')).order_by('-total')[:8])
+    top_clientes_itens = list(ItemVenda.objects.filter(venda__in=vendas_concluidas).values('venda__cliente__nome').annotate(total=Sum('quantidade')).order_by('-total')[:8])
+    top_clientes_valor_medio_item = list(ItemVenda.objects.filter(venda__in=vendas_concluidas).values('venda__cliente__nome').annotate(valor_total=Sum(F('quantidade') * F('preco_unitario')), itens_totais=Sum('quantidade')).annotate(total=F('valor_total') / F('itens_totais')).order_by('-total')[:8])
+    
+    analise_cliente_data = {
+        'valor_vendas': {'labels': [c['cliente__nome'] for c in top_clientes_valor], 'data': [float(c['total']) for c in top_clientes_valor]},
+        'qtd_vendas': {'labels': [c['cliente__nome'] for c in top_clientes_qtd], 'data': [int(c['total']) for c in top_clientes_qtd]},
+        'ticket_medio': {'labels': [c['cliente__nome'] for c in top_clientes_ticket], 'data': [float(c['total']) for c in top_clientes_ticket]},
+        'itens_vendidos': {'labels': [c['venda__cliente__nome'] for c in top_clientes_itens], 'data': [float(c['total']) for c in top_clientes_itens]},
+        'valor_medio_produto': {'labels': [c['venda__cliente__nome'] for c in top_clientes_valor_medio_item], 'data': [float(c['total']) for c in top_clientes_valor_medio_item]}
+    }
+    analise_cliente_json = json.dumps(analise_cliente_data)
+    
+    vendas_com_vendedor = vendas_concluidas.filter(vendedor__isnull=False)
+    analise_vendedores_query = vendas_com_vendedor.values('vendedor__nome').annotate(valor_vendas=Sum('valor_total_liquido'), qtd_vendas=Count('id'), ticket_medio=Avg('valor_total_liquido'), total_clientes=Count('cliente', distinct=True)).order_by('-valor_vendas')
+    # --- INÍCIO: LÓGICA PARA FILTRO DE METAS BATIDAS ---
+    metas_dict = {}
+    # Se houver um filtro de data aplicado, busca as metas do período
+    if start_date and end_date:
+        # Soma as metas mensais que se encaixam no período para cada vendedor
+        metas_periodo = MetaFaturamento.objects.filter(
+            user=request.user,
+            vendedor__isnull=False,
+            mes_ano__gte=start_date,
+            mes_ano__lte=end_date
+        ).values('vendedor__nome').annotate(total_meta=Sum('valor_meta'))
+        metas_dict = {item['vendedor__nome']: item['total_meta'] for item in metas_periodo}
+
+    vendedores_meta_batida = []
+    vendedores_meta_nao_batida = []
+
+    # Itera sobre os vendedores que tiveram vendas para comparar com suas metas
+    for vendedor_data in analise_vendedores_query:
+        nome = vendedor_data['vendedor__nome']
+        valor_vendas = vendedor_data.get('valor_vendas', Decimal('0'))
+        meta = metas_dict.get(nome) # Pega a meta do vendedor
+
+        # Se a meta existe e foi batida, adiciona à lista de sucesso
+        if meta is not None and valor_vendas >= meta:
+            vendedores_meta_batida.append(vendedor_data)
+        else:
+            vendedor_data['meta'] = meta if meta is not None else Decimal('0')
+            # Se a meta não foi batida ou não existe, adiciona à outra lista
+            vendedores_meta_nao_batida.append(vendedor_data)
+    # --- FIM: LÓGICA PARA FILTRO DE METAS BATIDAS ---
+    top_3_vendedores = list(analise_vendedores_query[:3])
+    valor_vendido_top_3 = sum(v.get('valor_vendas', 0) or 0 for v in top_3_vendedores)
+    qtd_vendas_top_3 = sum(v.get('qtd_vendas', 0) for v in top_3_vendedores)
+    if len(top_3_vendedores) >= 1: top_3_vendedores[0]['rank'] = 1
+    if len(top_3_vendedores) >= 2: top_3_vendedores[1]['rank'] = 2
+    if len(top_3_vendedores) >= 3: top_3_vendedores[2]['rank'] = 3
+    
+    vendedores_data_table = list(analise_vendedores_query[:10])
+    total_geral_vendas_vendedores = vendas_com_vendedor.aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('1')
+    for v in vendedores_data_table: v['percentual_valor'] = (v.get('valor_vendas', 0) / total_geral_vendas_vendedores) * 100
+        
+    # Em views.py, na função faturamento_dashboard_view, substitua o bloco de análise de vendedor por este:
+
+    # --- INÍCIO DO NOVO CÓDIGO CORRIGIDO PARA O GRÁFICO DINÂMICO ---
+
+    # 1. Query principal de vendedores, agora buscando também a comissão de cada um
+    analise_vendedores_query = vendas_com_vendedor.values(
+        'vendedor__nome', 
+        'vendedor__comissao_percentual'  # <-- Buscando o % de comissão do modelo Vendedor
+    ).annotate(
+        valor_vendas=Sum('valor_total_liquido'),
+        qtd_vendas=Count('id'),
+        ticket_medio=Avg('valor_total_liquido'),
+        total_clientes=Count('cliente', distinct=True)
+    ).order_by('-valor_vendas')
+
+    vendedores_data_table = list(analise_vendedores_query) # Remove o slice para usar a query completa abaixo
+
+    # 2. Prepara os dados para o gráfico, calculando o valor da comissão
+    valor_vendas_data = {
+        'labels': [],
+        'data': [],
+        'comissoes_valor': [],
+        'comissoes_percentual': []
+    }
+    # Itera sobre a lista de vendedores para popular os dados do gráfico
+    for v in vendedores_data_table:
+        valor_vendas_data['labels'].append(v['vendedor__nome'])
+        valor_vendas_data['data'].append(float(v.get('valor_vendas', 0)))
+        
+        # Pega a comissão do vendedor (ou 0 se não estiver definida)
+        comissao_percent = v.get('vendedor__comissao_percentual', 0) or 0
+        # Calcula o valor da comissão
+        valor_comissao = float(v.get('valor_vendas', 0) or 0) * (float(comissao_percent) / 100.0)
+        
+        valor_vendas_data['comissoes_valor'].append(valor_comissao)
+        valor_vendas_data['comissoes_percentual'].append(float(comissao_percent))
+        # ▼▼▼ ADICIONE ESTA LINHA QUE ESTAVA FALTANDO ▼▼▼
+        # Calcula o % do valor para a TABELA
+        v['percentual_valor'] = (v.get('valor_vendas', 0) / total_geral_vendas_vendedores) * 100 if total_geral_vendas_vendedores else 0
+    vendedores_nao_batida_sorted = sorted(vendedores_meta_nao_batida, key=lambda x: x.get('valor_vendas', 0), reverse=True)
+    # 3. Monta o dicionário final para o template
+    analise_vendedor_chart_data = {
+        'valor_vendas': valor_vendas_data,
+        'qtd_vendas': {
+            'labels': [v['vendedor__nome'] for v in sorted(vendedores_data_table, key=lambda x: x.get('qtd_vendas', 0), reverse=True)],
+            'data': [v.get('qtd_vendas', 0) for v in sorted(vendedores_data_table, key=lambda x: x.get('qtd_vendas', 0), reverse=True)]
+        },
+        'ticket_medio': {
+            'labels': [v['vendedor__nome'] for v in sorted(vendedores_data_table, key=lambda x: x.get('ticket_medio', 0), reverse=True)],
+            'data': [float(v.get('ticket_medio', 0)) for v in sorted(vendedores_data_table, key=lambda x: x.get('ticket_medio', 0), reverse=True)]
+        },
+        'metas_batidas': {
+            'labels': [v['vendedor__nome'] for v in sorted(vendedores_meta_batida, key=lambda x: x.get('valor_vendas', 0), reverse=True)],
+            'data': [float(v.get('valor_vendas', 0)) for v in sorted(vendedores_meta_batida, key=lambda x: x.get('valor_vendas', 0), reverse=True)]
+        },
+        'metas_nao_batidas': {
+            'labels': [v['vendedor__nome'] for v in vendedores_nao_batida_sorted],
+            'data': [float(v.get('valor_vendas', 0)) for v in vendedores_nao_batida_sorted],
+            'metas': [float(v.get('meta', 0)) for v in vendedores_nao_batida_sorted]
+        },
+    }
+    analise_vendedor_chart_json = json.dumps(analise_vendedor_chart_data)
+    # --- FIM DO NOVO CÓDIGO CORRIGIDO ---
+
+
+
+    doze_meses_atras = timezone.now().date() - relativedelta(months=11)
+    vendas_periodo = (vendas_com_vendedor.filter(data_venda__date__gte=doze_meses_atras).annotate(mes=TruncMonth('data_venda')).values('mes').annotate(total=Sum('valor_total_liquido')).order_by('mes'))
+    vendas_periodo_json = json.dumps({'labels': [v['mes'].strftime('%b/%Y') for v in vendas_periodo], 'data': [float(v['total']) for v in vendas_periodo]})
+    
+    resumo_vendedores = vendas_com_vendedor.aggregate(valor_total=Sum('valor_total_liquido'), qtd_total=Count('id'))
+    resumo_valor_vendido = resumo_vendedores['valor_total'] or Decimal('0')
+    resumo_qtd_vendas = resumo_vendedores['qtd_total'] or 0
+    resumo_ticket_medio = (resumo_valor_vendido / resumo_qtd_vendas) if resumo_qtd_vendas > 0 else Decimal('0')
+
+    # --- INÍCIO DA NOVA LÓGICA ---
+    # Card 4: Cobertura da carteira pelos vendedores
+    total_clientes_base = Cliente.objects.filter(user=request.user).count()
+    clientes_atendidos_por_vendedores = vendas_com_vendedor.values('cliente').distinct().count()
+    resumo_cobertura_carteira = (clientes_atendidos_por_vendedores / total_clientes_base * 100) if total_clientes_base > 0 else 0
+    # --- FIM DA NOVA LÓGICA ---
+
+    percentual_valor_top_3 = (valor_vendido_top_3 / resumo_valor_vendido * 100) if resumo_valor_vendido > 0 else 0
+
+    # --- INÍCIO DO NOVO CÓDIGO PARA O RODAPÉ DA TABELA ---
+    vendedor_table_totals = {
+        'total_valor': Decimal('0'),
+        'total_qtd': 0,
+        'total_ticket_medio': Decimal('0'),
+        'total_clientes': 0
+    }
+    # Usa a mesma query da tabela para garantir que os totais correspondam aos dados filtrados
+    if analise_vendedores_query.exists():
+        totais_agregados = analise_vendedores_query.aggregate(
+            total_valor=Sum('valor_vendas'),
+            total_qtd=Sum('qtd_vendas')
+        )
+        vendedor_table_totals['total_valor'] = totais_agregados.get('total_valor', Decimal('0'))
+        vendedor_table_totals['total_qtd'] = totais_agregados.get('total_qtd', 0)
+        
+        # O total de clientes é a contagem de clientes únicos atendidos por todos os vendedores
+        vendedor_table_totals['total_clientes'] = vendas_com_vendedor.values('cliente').distinct().count()
+        
+        # O Ticket Médio geral é o valor total dividido pela quantidade total
+        if vendedor_table_totals['total_qtd'] > 0:
+            vendedor_table_totals['total_ticket_medio'] = vendedor_table_totals['total_valor'] / vendedor_table_totals['total_qtd']
+    # --- FIM DO NOVO CÓDIGO ---
+
+    
+
+    # 1. Define os períodos de tempo de forma robusta, considerando timezones
+    now = timezone.now()
+    # Para "Hoje", criamos um range do início ao fim do dia atual
+    start_of_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_today = start_of_today + timedelta(days=1)
+    
+    # Para "Neste Mês", criamos um range do primeiro dia do mês até agora
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    all_sales = Venda.objects.filter(user=request.user)
+
+    # Filtra as vendas para os períodos de uma só vez para otimizar
+    sales_today = all_sales.filter(data_venda__gte=start_of_today, data_venda__lt=end_of_today)
+    sales_this_month = all_sales.filter(data_venda__gte=start_of_month)
+
+    # Card 1: Valor Vendido
+    valor_vendido_hoje = sales_today.aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+    valor_vendido_mes = sales_this_month.aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+
+    # Card 2: Quantidade de Vendas
+    qtd_vendas_hoje = sales_today.count()
+    qtd_vendas_mes = sales_this_month.count()
+
+    # Card 3 e 4: Lógica final e simplificada para Clientes Novos e Recorrentes
+    
+    # --- Lógica para "Hoje" ---
+    # Pega os IDs de clientes únicos que compraram hoje
+    clientes_que_compraram_hoje_ids = sales_today.values_list('cliente_id', flat=True).distinct()
+    # Anota o número total de vendas para cada um desses clientes
+    clientes_hoje_com_contagem = Cliente.objects.filter(id__in=clientes_que_compraram_hoje_ids).annotate(
+        num_vendas=Count('venda')
+    )
+    # É NOVO se o total de vendas da sua vida é exatamente 1
+    novos_clientes_hoje = clientes_hoje_com_contagem.filter(num_vendas=1).count()
+    # É RECORRENTE se o total de vendas da sua vida é maior que 1
+    clientes_recorrentes_hoje = clientes_hoje_com_contagem.filter(num_vendas__gt=1).count()
+    
+    # --- Lógica para "Neste Mês" ---
+    # Pega os IDs de clientes únicos que compraram neste mês
+    clientes_que_compraram_no_mes_ids = sales_this_month.values_list('cliente_id', flat=True).distinct()
+    # Anota o número total de vendas para cada um desses clientes
+    clientes_mes_com_contagem = Cliente.objects.filter(id__in=clientes_que_compraram_no_mes_ids).annotate(
+        num_vendas=Count('venda')
+    )
+    # É NOVO se o total de vendas da sua vida é exatamente 1
+    novos_clientes_mes = clientes_mes_com_contagem.filter(num_vendas=1).count()
+    # É RECORRENTE se o total de vendas da sua vida é maior que 1
+    clientes_recorrentes_mes = clientes_mes_com_contagem.filter(num_vendas__gt=1).count()
+
+    # Em views.py, dentro de faturamento_dashboard_view, ANTES da definição do context
+
+    # NOVO CÓDIGO CORRIGIDO
+    # --- INÍCIO: NOVOS CÁLCULOS PARA A SEÇÃO "ANÁLISE POR CLIENTE" ---
+
+    # 1. Dados para a tabela e gráfico de evolução mensal (Janeiro a Dezembro do ano corrente)
+    dados_evolucao_cliente = []
+    current_year = timezone.now().year
+
+    # Anota a data da primeira compra em cada cliente (consulta feita uma vez fora do loop)
+    clientes_com_primeira_compra = Cliente.objects.filter(user=request.user).annotate(
+        primeira_compra=Min('venda__data_venda__date')
+    )
+
+    # Loop de 1 (Janeiro) a 12 (Dezembro)
+    for month_num in range(1, 13):
+        # Define o início e o fim de cada mês do loop
+        inicio_mes = datetime(current_year, month_num, 1).date()
+        fim_mes = (inicio_mes + relativedelta(months=1)) - timedelta(days=1)
+
+        # Filtra as vendas apenas para o mês atual do loop
+        vendas_no_mes = all_sales.filter(data_venda__date__range=[inicio_mes, fim_mes])
+
+        # a. Qtd. de Clientes que compraram no mês
+        clientes_compra_mes = vendas_no_mes.values('cliente').distinct().count()
+
+        # b. Clientes Recorrentes (que compraram mais de uma vez no mês)
+        recorrentes_na_tabela = vendas_no_mes.values('cliente').annotate(
+            num_compras=Count('id')
+        ).filter(num_compras__gt=1).count()
+
+        # c. Clientes Novos (cuja primeira compra foi neste mês)
+        clientes_novos_mes = clientes_com_primeira_compra.filter(
+            primeira_compra__range=[inicio_mes, fim_mes]
+        ).count()
+
+        dados_evolucao_cliente.append({
+            'mes_ano': inicio_mes.strftime('%B/%Y').capitalize(),
+            'qtd_clientes_compra': clientes_compra_mes,
+            'clientes_recorrentes_mes': recorrentes_na_tabela,
+            'clientes_novos_mes': clientes_novos_mes,
+        })
+
+    # A lista já está em ordem cronológica, então a inversão não é mais necessária.
+
+    # 2. Prepara os dados para o gráfico de linha em formato JSON
+    evolucao_clientes_chart_json = json.dumps({
+        'labels': [d['mes_ano'] for d in dados_evolucao_cliente],
+        'data': [d['qtd_clientes_compra'] for d in dados_evolucao_cliente]
+    })
+    # --- FIM DOS NOVOS CÁLCULOS ---
+
+    # --- INÍCIO DA LÓGICA ATUALIZADA (METAS E VELOCÍMETRO) ---
+
+    # Pega o filtro da URL, o padrão é 'ano'
+    meta_periodo = request.GET.get('meta_periodo', 'ano')
+    today = timezone.now().date()
+    current_year = today.year
+    current_month = today.month
+
+    # Variáveis genéricas para armazenar os resultados
+    valor_acumulado = Decimal('0')
+    valor_meta_atual = Decimal('0')
+
+    if meta_periodo == 'mes':
+        # LÓGICA PARA O FILTRO "MÊS"
+        meta_obj = MetaFaturamento.objects.filter(
+            user=request.user, vendedor__isnull=True, mes_ano__year=current_year, mes_ano__month=current_month
+        ).first()
+        valor_meta_atual = meta_obj.valor_meta if meta_obj else Decimal('0')
+
+        valor_acumulado = Venda.objects.filter(
+            user=request.user, data_venda__year=current_year, data_venda__month=current_month
+        ).aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+
+    else: # LÓGICA PARA O FILTRO "ANO" (comportamento padrão)
+        valor_acumulado = Venda.objects.filter(
+            user=request.user, data_venda__year=current_year, data_venda__month__lte=current_month
+        ).aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+
+        valor_meta_atual = MetaFaturamento.objects.filter(
+            user=request.user, vendedor__isnull=True, mes_ano__year=current_year, mes_ano__month__lte=current_month
+        ).aggregate(total=Sum('valor_meta'))['total'] or Decimal('0')
+
+    # Cálculos que servem para ambos os filtros
+    diferenca_meta_valor = valor_acumulado - valor_meta_atual
+    # VVVV--- ADICIONE ESTE BLOCO DE CÓDIGO ABAIXO ---VVVV
+
+    diferenca_meta_percentual = 0  # Inicia com 0
+    if valor_meta_atual > 0:
+        # Calcula o percentual apenas se a meta for maior que zero
+        diferenca_meta_percentual = (diferenca_meta_valor / valor_meta_atual) * 100
+
+    # ^^^^--- FIM DO BLOCO DE CÓDIGO A SER ADICIONADO ---^^^^
+    atingimento_percentual = (valor_acumulado / valor_meta_atual * 100) if valor_meta_atual > 0 else 0
+    # --- INÍCIO DA NOVA LÓGICA PARA O RODAPÉ ---
+    # Cria o texto para o rodapé do card de metas
+    if meta_periodo == 'mes':
+        # Formata a data para "Mês/Ano", ex: "Setembro/2025"
+        data_mes_atual = today.replace(day=1)
+        # Usa o locale 'pt_BR.UTF-8' já configurado no início da view
+        texto_rodape_meta = data_mes_atual.strftime('%B/%Y').capitalize()
+    else: # meta_periodo == 'ano'
+        # Formata a data para "Ano/Ano", ex: "Ano/2025"
+        texto_rodape_meta = f"Ano/{current_year}"
+    # --- FIM DA NOVA LÓGICA PARA O RODAPÉ ---
+    # A lógica para o gráfico de barras de metas ao lado continua a mesma (anual)
+    MESES_PT = { 1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril', 5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto', 9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro' }
+    metas_ano_corrente = MetaFaturamento.objects.filter(user=request.user, vendedor__isnull=True, mes_ano__year=current_year)
+    vendas_ano_corrente = Venda.objects.filter(user=request.user, data_venda__year=current_year).annotate(mes=TruncMonth('data_venda__date')).values('mes').annotate(total=Sum('valor_total_liquido')).order_by('mes')
+    metas_por_mes = {m.mes_ano.month: float(m.valor_meta) for m in metas_ano_corrente}
+    vendas_por_mes = {v['mes'].month: float(v['total']) for v in vendas_ano_corrente}
+    labels_meses_meta = list(MESES_PT.values())
+    metas_data_final = [metas_por_mes.get(i, 0) for i in range(1, 13)]
+    faturamento_data_meta = [vendas_por_mes.get(i, 0) for i in range(1, 13)]
+    # --- LÓGICA PARA A SETA E TEXTO DO VELOCÍMETRO ---
+    velocimetro_rotacao = 0
+    # velocimetro_status_texto = "Abaixo da Meta"
+    # cor_status = "#dc3545" # Vermelho
+
+    # A rotação vai de 0 (extrema esquerda) a 180 (extrema direita)
+    # O cálculo converte o percentual (0-100+) para o ângulo (0-180)
+    # Limitamos o percentual a 100 para o cálculo do ângulo, para a seta não passar do verde
+    percentual_para_rotacao = min(float(atingimento_percentual), 100.0)
+    velocimetro_rotacao = ((percentual_para_rotacao / 100.0) * 180) - 90
+
+    # if atingimento_percentual >= 95:
+    #     velocimetro_status_texto = "Meta Atingida"
+    #     cor_status = "#28a745" # Verde
+    # elif atingimento_percentual >= 70:
+    #     velocimetro_status_texto = "Na Média da Meta"
+    #     cor_status = "#ffc107" # Amarelo
+        # --- CONTEXTO FINAL 100% COMPLETO ---
+
+    
+
+    context = {
+        'faturamento_periodo': faturamento_periodo, 'faturamento_chart_json': faturamento_chart_json,
+        'current_period_sales': current_period_sales, 'previous_period_sales': previous_period_sales,
+        'sales_variation': sales_variation, 'period_text': period_text, 'prev_period_text': prev_period_text,
+        'valor_vendido_hoje': valor_vendido_hoje,
+        'valor_vendido_mes': valor_vendido_mes,
+        'qtd_vendas_hoje': qtd_vendas_hoje,
+        'qtd_vendas_mes': qtd_vendas_mes,
+        'novos_clientes_hoje': novos_clientes_hoje,
+        'novos_clientes_mes': novos_clientes_mes,
+        'clientes_recorrentes_hoje': clientes_recorrentes_hoje,
+        'clientes_recorrentes_mes': clientes_recorrentes_mes,
+        # Variáveis antigas mantidas para outras seções
+        'total_vendido': total_vendido, 'qtd_vendas': qtd_vendas,
+        'ticket_medio': ticket_medio, 
+        
+        # NOVAS VARIÁVEIS PARA OS CARDS DE ANÁLISE DE CLIENTES
+        'card_total_clientes': total_clientes_base,
+        'card_clientes_periodo': clientes_no_periodo,
+        'card_clientes_recorrentes': clientes_recorrentes,
+        'card_cobertura_carteira': cobertura_carteira,
+        'vendas_por_mes_json': vendas_por_mes_json,
+        'vendas_por_estado_json': vendas_por_estado_json,
+        'abc_data': abc_data, 'abc_chart_json': abc_chart_json,
+        'novo_dash_total_vendido': total_vendido, 'novo_dash_qtd_vendas': qtd_vendas,
+        'novo_dash_ticket_medio': ticket_medio, 'novo_dash_itens_vendidos': total_itens_vendidos,
+        'indicadores_mensais_json': json.dumps(indicadores_data),
+        'top_produtos_servicos_chart_json': top_produtos_servicos_chart_json,
+        'top_clientes_chart_json': top_clientes_chart_json,
+        'vendas_por_produto_data_json': vendas_por_produto_data_json,
+        'vendas_por_servico_data_json': vendas_por_servico_data_json,
+        'analise_cliente_json': analise_cliente_json,
+        'top_3_vendedores': top_3_vendedores, 'valor_vendido_top_3': valor_vendido_top_3,
+        'qtd_vendas_top_3': qtd_vendas_top_3, 'vendedores_data_table': vendedores_data_table,
+        'vendas_periodo_json': vendas_periodo_json, 'resumo_valor_vendido': resumo_valor_vendido,
+        'resumo_qtd_vendas': resumo_qtd_vendas, 'resumo_ticket_medio': resumo_ticket_medio,
+        'resumo_ticket_medio': resumo_ticket_medio, 'resumo_cobertura_carteira': resumo_cobertura_carteira,
+        'analise_vendedor_chart_json': analise_vendedor_chart_json,
+        'vendedor_table_totals': vendedor_table_totals,
+        'abc_summary': abc_summary,
+        'top_cidades_json': top_cidades_json,
+        'prazo_medio_recebimento': prazo_medio_recebimento,
+        'melhor_mes_valor': melhor_mes_valor,
+        'pior_mes_valor': pior_mes_valor,
+        'melhor_mes_qtd': melhor_mes_qtd,
+        'pior_mes_qtd': pior_mes_qtd,
+        'melhor_mes_ticket': melhor_mes_ticket,
+        'pior_mes_ticket': pior_mes_ticket,
+        'melhor_mes_prazo': melhor_mes_prazo,
+        'pior_mes_prazo': pior_mes_prazo,
+        'vendas_por_cliente_json': vendas_por_cliente_json,
+        'vendas_por_produto_servico_json': vendas_por_produto_servico_json,
+        'dados_evolucao_cliente': dados_evolucao_cliente,
+        'evolucao_clientes_chart_json': evolucao_clientes_chart_json,
+        'start_date': start_date.strftime('%Y-%m-%d') if start_date else '',
+        'end_date': end_date.strftime('%Y-%m-%d') if end_date else '',
+        # --- ADICIONE ESTAS 3 LINHAS AO FINAL DO SEU CONTEXTO ---
+        'labels_meses_meta_json': json.dumps(labels_meses_meta),
+        'faturamento_data_meta_json': json.dumps(faturamento_data_meta),
+        'metas_data_final_json': json.dumps(metas_data_final),
+        # NOVAS Variáveis do Card Velocímetro
+        'valor_acumulado': valor_acumulado,
+        'valor_meta_atual': valor_meta_atual,
+        'meta_periodo': meta_periodo,
+        'diferenca_meta_valor': diferenca_meta_valor,
+        'diferenca_meta_percentual': diferenca_meta_percentual,
+        'atingimento_percentual': float(atingimento_percentual),
+        'velocimetro_rotacao': str(velocimetro_rotacao).replace(',', '.'),
+        'percentual_valor_top_3': percentual_valor_top_3,
+        'texto_rodape_meta': texto_rodape_meta,
+        
+    }
+    return context
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_cadastros_comercial')
+def comercial_cadastros_view(request):
+    from ..utils_importacao import importar_catalogo_planilha
+
+    # --- GERADOR DINÂMICO DE PLANILHA MODELO COMPLETA ---
+    if request.GET.get('download_modelo'):
+        import pandas as pd
+        from django.http import HttpResponse
+        
+        # Lista completa de colunas baseada no seu Models.py
+        colunas = [
+            'nome', 'codigo', 'descricao', 'tipo', 
+            'preco_custo', 'preco_venda', 'estoque', 
+            'ncm', 'cod_servico', 'unidade', 'origem'
+        ]
+        
+        df_modelo = pd.DataFrame(columns=colunas)
+        
+        # Adiciona exemplos claros para o cliente (Um Produto e Um Serviço)
+        df_modelo.loc[0] = [
+            'Teclado Mecânico RGB', 'KBD-001', 'Teclado switch azul ABNT2', 'PRODUTO', 
+            '120.00', '350.00', '50', '84716052', '', 'UN', '0'
+        ]
+        df_modelo.loc[1] = [
+            'Consultoria BPO Financeiro', 'SERV-001', 'Assessoria mensal completa', 'SERVICO', 
+            '0.00', '1500.00', '0', '', '17.06', 'MES', '0'
+        ]
+        
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = 'attachment; filename=modelo_importacao_sistemclass.xlsx'
+        
+        # O Pandas gera o arquivo na hora com as novas colunas
+        df_modelo.to_excel(response, index=False)
+        return response
+    # Inicializa os formulários antes de qualquer lógica
+    produto_form = ProdutoServicoForm()
+    vendedor_form = VendedorForm()
+
+    if request.method == 'POST':
+        # 1. Checa se a ação é de excluir produtos
+        if 'delete_selected_products' in request.POST:
+            product_ids = request.POST.getlist('product_ids')
+            if product_ids:
+                produtos_para_excluir = ProdutoServico.objects.filter(id__in=product_ids, user=request.user)
+                excluidos_count, protegidos = 0, []
+                for produto in produtos_para_excluir:
+                    if produto.itemvenda_set.exists():
+                        protegidos.append(produto.nome)
+                    else:
+                        produto.delete()
+                        excluidos_count += 1
+                if excluidos_count > 0:
+                    messages.success(request, f'{excluidos_count} produto(s) foram excluídos com sucesso.')
+                if protegidos:
+                    messages.warning(request, f'Os seguintes produtos não puderam ser excluídos pois estão associados a vendas: {", ".join(protegidos)}.')
+            return redirect('comercial_cadastros')
+
+        # 2. Checa se a ação é de excluir vendedores
+        elif 'delete_selected_sellers' in request.POST:
+            seller_ids = request.POST.getlist('seller_ids')
+            if seller_ids:
+                Vendedor.objects.filter(id__in=seller_ids, user=request.user).delete()
+                messages.success(request, f'{len(seller_ids)} vendedor(es) selecionado(s) foram excluídos.')
+            return redirect('comercial_cadastros')
+        
+        # 5. Checa se a ação é de excluir clientes (NOVO)
+        elif 'delete_selected_clients' in request.POST:
+            client_ids = request.POST.getlist('client_ids')
+            if client_ids:
+                # Proteção: Não excluir se tiver vendas
+                clientes_para_excluir = Cliente.objects.filter(id__in=client_ids, user=request.user)
+                excluidos_count = 0
+                protegidos = []
+                for cli in clientes_para_excluir:
+                    if cli.venda_set.exists(): # Verifica se tem vendas
+                        protegidos.append(cli.nome)
+                    else:
+                        cli.delete()
+                        excluidos_count += 1
+                
+                if excluidos_count > 0:
+                    messages.success(request, f'{excluidos_count} cliente(s) excluídos.')
+                if protegidos:
+                    messages.warning(request, f'Clientes com vendas não podem ser excluídos: {", ".join(protegidos)}.')
+            return redirect('comercial_cadastros')
+        
+        # 6. Importação Profissional de Planilha (SaaS Ready)
+        elif request.POST.get('form_type') == 'importar_planilha':
+            arquivo = request.FILES.get('arquivo_planilha')
+            
+            if not arquivo:
+                messages.error(request, "Selecione um arquivo.")
+                return redirect('comercial_cadastros')
+
+            try:
+                # Upsert em lote por (user, codigo), em blocos (accounts/utils_importacao.py)
+                resultado = importar_catalogo_planilha(request.user, arquivo)
+                messages.success(request, f"Sucesso! {resultado['inseridos']} novos e {resultado['atualizados']} atualizados.")
+                if resultado['ignorados']:
+                    messages.warning(
+                        request,
+                        f"{resultado['ignorados']} linha(s) ignorada(s): sem código/nome, com preço inválido ou código repetido."
+                    )
+            except Exception as e:
+                messages.error(request, f'Erro técnico: {str(e)}')
+            
+            return redirect('comercial_cadastros')
+
+        # 3. Checa se a ação é de criar um produto
+        elif request.POST.get('form_type') == 'produto':
+            # ADICIONAMOS user=request.user AQUI
+            produto_form = ProdutoServicoForm(request.POST, user=request.user) 
+            
+            if produto_form.is_valid():
+                produto = produto_form.save(commit=False)
+                produto.user = request.user
+                produto.save()
+                messages.success(request, 'Produto/Serviço cadastrado com sucesso!')
+                return redirect('comercial_cadastros')
+
+        # 4. Checa se a ação é de criar um vendedor
+        elif request.POST.get('form_type') == 'vendedor':
+            vendedor_form = VendedorForm(request.POST) # Repopula o formulário com os dados enviados
+            if vendedor_form.is_valid():
+                vendedor = vendedor_form.save(commit=False)
+                vendedor.user = request.user
+                vendedor.save()
+                messages.success(request, 'Vendedor cadastrado com sucesso!')
+                return redirect('comercial_cadastros')
+            # Se o formulário for inválido, a função continuará e renderizará a página com os erros
+
+    # Lógica GET (executada em carregamento normal da página ou quando um formulário POST é inválido)
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    search_product = request.GET.get('search_product', '')
+
+    produtos_list = ProdutoServico.objects.filter(user=request.user).order_by('-created_at')
+    if start_date:
+        produtos_list = produtos_list.filter(created_at__date__gte=start_date)
+    if end_date:
+        produtos_list = produtos_list.filter(created_at__date__lte=end_date)
+    if search_product:
+        produtos_list = produtos_list.filter(Q(nome__icontains=search_product) | Q(codigo__icontains=search_product))
+    
+    produto_paginator = Paginator(produtos_list, 10)
+    produto_page_number = request.GET.get('produto_page')
+    produtos_page_obj = produto_paginator.get_page(produto_page_number)
+    
+    vendedores_list = Vendedor.objects.filter(user=request.user).order_by('-created_at')
+    # O filtro de data não se aplica a vendedores se estiver buscando produtos
+    if start_date and not search_product:
+        vendedores_list = vendedores_list.filter(created_at__date__gte=start_date)
+    if end_date and not search_product:
+        vendedores_list = vendedores_list.filter(created_at__date__lte=end_date)
+
+    vendedor_paginator = Paginator(vendedores_list, 10)
+    vendedor_page_number = request.GET.get('vendedor_page')
+    vendedores_page_obj = vendedor_paginator.get_page(vendedor_page_number)
+
+    # --- LÓGICA DE CLIENTES (NOVO) ---
+    search_client = request.GET.get('search_client', '')
+    clientes_list = Cliente.objects.filter(user=request.user).order_by('nome')
+    
+    if search_client:
+        clientes_list = clientes_list.filter(
+            Q(nome__icontains=search_client) | 
+            Q(cpf_cnpj__icontains=search_client) |
+            Q(email__icontains=search_client)
+        )
+
+    cliente_paginator = Paginator(clientes_list, 10)
+    cliente_page_number = request.GET.get('cliente_page')
+    clientes_page_obj = cliente_paginator.get_page(cliente_page_number)
+    # ---------------------------------
+    
+    context = {
+        'produto_form': produto_form, 
+        'vendedor_form': vendedor_form,
+        'produtos': produtos_page_obj, 
+        'vendedores': vendedores_page_obj,
+        'clientes': clientes_page_obj,
+        'start_date': start_date, 
+        'end_date': end_date,
+        'search_product': search_product,
+        'search_client': search_client,
+    }
+    return render(request, 'accounts/comercial_cadastros.html', context)
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_cadastros_comercial')
+def editar_produto_view(request, pk):
+    # Busca o produto garantindo que pertence ao usuário logado
+    produto = get_object_or_404(ProdutoServico, pk=pk, user=request.user)
+    
+    if request.method == 'POST':
+        # Lógica ao SALVAR (Envia o user=request.user)
+        form = ProdutoServicoForm(request.POST, instance=produto, user=request.user)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Produto atualizado com sucesso!')
+            return redirect('comercial_cadastros')
+    else:
+        # Lógica ao ABRIR A TELA (GET) - Aqui estava faltando o user=request.user provavelmente
+        form = ProdutoServicoForm(instance=produto, user=request.user)
+    
+    context = {
+        'form': form,
+        'item_name': produto.nome
+    }
+    return render(request, 'accounts/editar_item.html', context)
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_cadastros_comercial')
+def editar_vendedor_view(request, pk):
+    vendedor = get_object_or_404(Vendedor, pk=pk, user=request.user)
+    if request.method == 'POST':
+        form = VendedorForm(request.POST, instance=vendedor)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Vendedor atualizado com sucesso!')
+            return redirect('comercial_cadastros')
+    else:
+        form = VendedorForm(instance=vendedor)
+
+    context = {
+        'form': form,
+        'item_name': vendedor.nome
+    }
+    return render(request, 'accounts/editar_item.html', context)
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_vendas')
+def vendas_view(request):
+    import openpyxl
+    from openpyxl.styles import Font, Alignment
+
+    # --- ADIÇÃO 1: Lógica GET para buscar dados de uma venda para edição ---
+    if 'fetch_sale_data' in request.GET:
+        sale_id = request.GET.get('fetch_sale_data')
+        try:
+            venda = Venda.objects.select_related(
+                'cliente', 'vendedor'
+            ).prefetch_related(
+                'itens__produto' # Carrega itens e produtos juntos
+            ).get(id=sale_id, user=request.user)
+
+            # Prepara a lista de itens no formato que o JavaScript espera
+            itens_list = []
+            for item in venda.itens.all():
+                itens_list.append({
+                    'id': item.produto.id,
+                    'nome': item.produto.nome,
+                    'quantidade': float(item.quantidade),
+                    'preco': float(item.preco_unitario),
+                    'desconto': float(item.desconto_item),
+                    'estoque': item.produto.estoque_atual if item.produto.tipo == 'PRODUTO' else None,
+                    'tipo': item.produto.tipo
+                })
+
+            # Monta o dicionário com os dados
+            sale_data = {
+                'venda_id': venda.id,
+                'cliente_id': venda.cliente.id,
+                'vendedor_id': venda.vendedor.id if venda.vendedor else None,
+                'cidade': venda.cidade,
+                'estado': venda.estado,
+                'itens': itens_list,
+                'cliente_details': {
+                    'cpf_cnpj': venda.cliente.cpf_cnpj or '',
+                    'email': venda.cliente.email or '',
+                    'telefone': venda.cliente.telefone or '',
+                    'endereco': venda.cliente.endereco or ''
+                }
+            }
+            # O return DEVE estar dentro do try
+            return JsonResponse({'status': 'success', 'sale_data': sale_data}) 
+            
+        except Venda.DoesNotExist:
+            return JsonResponse({'status': 'error', 'message': 'Venda não encontrada.'}, status=404)
+        except Exception as e:
+            # Este bloco é que está enviando o erro para você
+            return JsonResponse({'status': 'error', 'message': f'Erro interno no Python: {str(e)}'}, status=500)
+    # --- FIM DA ADIÇÃO 1 ---
+    if request.method == 'POST':
+        # --- ADIÇÃO 2: Lógica POST para exclusão individual ---
+        if 'action_delete_sale' in request.POST:
+            sale_id = request.POST.get('action_delete_sale')
+            venda = get_object_or_404(Venda, id=sale_id, user=request.user)
+            try:
+                with transaction.atomic():
+                    # Restaura o estoque
+                    for item in venda.itens.all():
+                        if item.produto.tipo == 'PRODUTO':
+                            item.produto.estoque_atual += item.quantidade
+                            item.produto.save()
+                    # Exclui a venda (isso também excluirá ItemVenda e PagamentoVenda associados)
+                    venda.delete()
+                    # Tenta excluir a conta a receber associada (se existir)
+                    # Ajuste 'name' se o nome da conta a receber for diferente
+                    ReceivableAccount.objects.filter(user=request.user, name=f"Ref. Venda #{sale_id}").delete()
+                    messages.success(request, f'Venda #{sale_id} excluída com sucesso e estoque restaurado.')
+            except Exception as e:
+                messages.error(request, f'Erro ao excluir a venda #{sale_id}: {str(e)}')
+            return redirect('vendas')
+        # --- FIM DA ADIÇÃO 2 ---
+        # --- INÍCIO: LÓGICA DE EXCLUSÃO DE VENDAS ---
+        if 'delete_selected_sales' in request.POST:
+            sale_ids = request.POST.getlist('sale_ids')
+            if sale_ids:
+                vendas_para_excluir = Venda.objects.filter(id__in=sale_ids, user=request.user)
+                
+                with transaction.atomic():
+                    # Restaura o estoque dos produtos
+                    for venda in vendas_para_excluir:
+                        for item in venda.itens.all():
+                            if item.produto.tipo == 'PRODUTO':
+                                item.produto.estoque_atual += item.quantidade
+                                item.produto.save()
+                    
+                    # Exclui as vendas
+                    count, _ = vendas_para_excluir.delete()
+                    messages.success(request, f'{count} venda(s) selecionada(s) foram excluídas e o estoque foi restaurado.')
+            
+            return redirect('vendas')
+        # --- FIM: LÓGICA DE EXCLUSÃO DE VENDAS ---
+
+        # Lógica de criação de venda via AJAX
+        try:
+            data = json.loads(request.body)
+            original_sale_id = data.get('editing_sale_id')
+            # Em accounts/views.py, substitua o bloco with transaction.atomic(): dentro da vendas_view
+
+            with transaction.atomic():
+                # Coleta de todos os dados do request
+                cliente_id = data.get('cliente')
+                vendedor_id = data.get('vendedor')
+                cidade = data.get('cidade')
+                estado = data.get('estado')
+                itens_venda = data.get('itens', [])
+                pagamentos_venda = data.get('pagamentos', [])
+                due_date_str = data.get('due_date')
+                
+                # Validação
+                if not all([cliente_id, itens_venda, pagamentos_venda, due_date_str, cidade, estado]):
+                    return JsonResponse({'status': 'error', 'message': 'Dados incompletos. Cliente, Itens, Pagamento, Data, Cidade e Estado são obrigatórios.'}, status=400)
+
+                cliente = get_object_or_404(Cliente, id=cliente_id, user=request.user)
+                vendedor = get_object_or_404(Vendedor, id=vendedor_id, user=request.user) if vendedor_id else None
+
+                # --- INÍCIO DA NOVA LÓGICA DE EDIÇÃO (UPDATE) ---
+                if original_sale_id:
+                    # Se estamos editando, ATUALIZAMOS a venda
+                    venda = get_object_or_404(Venda, id=original_sale_id, user=request.user)
+                    
+                    # 1. Restaura o estoque antigo
+                    for item in venda.itens.all():
+                        if item.produto.tipo == 'PRODUTO':
+                            item.produto.estoque_atual += item.quantidade
+                            item.produto.save()
+                    
+                    # 2. Exclui itens, pagamentos e contas a receber antigas
+                    venda.itens.all().delete()
+                    venda.pagamentos.all().delete()
+                    # Graças ao Passo 1, agora podemos encontrar a conta a receber antiga pelo ID da venda
+                    ReceivableAccount.objects.filter(
+                        user=request.user,
+                        description__startswith=f"Ref. Venda #{venda.id}:"
+                    ).delete()
+                    
+                    # 3. Atualiza os dados da Venda existente
+                    venda.cliente = cliente
+                    venda.vendedor = vendedor
+                    venda.cidade = cidade
+                    venda.estado = estado
+                    venda.valor_total_bruto = data.get('total_bruto', 0)
+                    venda.desconto_geral = data.get('desconto_total', 0)
+                    venda.valor_total_liquido = data.get('total_liquido', 0)
+                    venda.status = 'FINALIZADA' # Atualiza o status
+                    venda.data_venda = timezone.now() # Atualiza a data para a da finalização
+                    venda.save()
+                    
+                    # Define a 'nova_venda' como a venda que acabamos de atualizar
+                    nova_venda = venda
+                    success_message = f'Venda #{nova_venda.id} (originada do orçamento) foi atualizada e finalizada com sucesso!'
+                
+                else:
+                    # Se não estamos editando, CRIAMOS uma nova venda (lógica original)
+                    nova_venda = Venda.objects.create(
+                        user=request.user,
+                        cliente=cliente,
+                        vendedor=vendedor,
+                        data_venda=timezone.now(),
+                        cidade=cidade,
+                        estado=estado,
+                        valor_total_bruto=data.get('total_bruto', 0),
+                        desconto_geral=data.get('desconto_total', 0),
+                        valor_total_liquido=data.get('total_liquido', 0),
+                        status='FINALIZADA'
+                    )
+                    success_message = f'Venda #{nova_venda.id} finalizada e enviada para Contas a Receber!'
+                # --- FIM DA NOVA LÓGICA DE EDIÇÃO (UPDATE) ---
+
+                # O restante da lógica para criar Itens, Pagamentos e Contas a Receber
+                # agora se aplica tanto à Venda nova quanto à Venda atualizada.
+                
+                description_parts = []
+                tipos_de_item = set()
+                
+                for item_data in itens_venda:
+                    produto = get_object_or_404(ProdutoServico, id=item_data['id'], user=request.user)
+                    quantidade = Decimal(item_data['quantidade'])
+                    description_parts.append(f"{quantidade}x {produto.nome}")
+                    tipos_de_item.add(produto.tipo)
+                    
+                    if produto.tipo == 'PRODUTO' and produto.estoque_atual < quantidade:
+                        raise Exception(f'Estoque insuficiente para {produto.nome}.')
+                        
+                    ItemVenda.objects.create(
+                        venda=nova_venda,
+                        produto=produto,
+                        quantidade=quantidade,
+                        preco_unitario=item_data['preco'],
+                        desconto_item=item_data.get('desconto', 0)
+                    )
+                    if produto.tipo == 'PRODUTO':
+                        produto.estoque_atual -= quantidade
+                        produto.save()
+                        
+                for pag_data in pagamentos_venda:
+                    PagamentoVenda.objects.create(
+                        venda=nova_venda,
+                        forma_pagamento=pag_data['forma'],
+                        valor=pag_data['valor'],
+                        parcelas=pag_data.get('parcelas', 1)
+                    )
+                    
+                category_name = "Venda"
+                if len(tipos_de_item) > 1: category_name = "Venda de Produtos e Serviços"
+                elif 'PRODUTO' in tipos_de_item: category_name = "Venda de Produtos"
+                elif 'SERVICO' in tipos_de_item: category_name = "Venda de Serviços"
+
+                # --- [INÍCIO DO AJUSTE CIRÚRGICO] ---
+                # Usamos filter().first() com o user logado para evitar o erro de duplicidade
+                venda_category = Category.objects.filter(user=request.user, name=category_name).first()
+                
+                # Se não existir para este usuário, criamos a categoria vinculada a ele
+                if not venda_category:
+                    venda_category = Category.objects.create(
+                        user=request.user, 
+                        name=category_name, 
+                        category_type='RECEIVABLE'
+                    )
+                # --- [FIM DO AJUSTE CIRÚRGICO] ---
+                # A descrição da conta a receber AGORA USA o ID da venda (seja ela nova ou atualizada)
+                receivable_description = f"Ref. Venda #{nova_venda.id}: " + ", ".join(description_parts)
+                
+                # ▼▼▼ Lógica de criação de Contas a Receber (sem alterações) ▼▼▼
+                parcelas = data.get('parcelas', 1)
+                payment_method = pagamentos_venda[0]['forma'] if pagamentos_venda else 'DINHEIRO'
+
+                if payment_method == 'BOLETO' and parcelas > 1:
+                    valor_total = Decimal(str(data.get('total_liquido', '0.0')))
+                    valor_parcela = Decimal(round(valor_total / parcelas, 2))
+                    primeira_data_vencimento = parse_date(due_date_str)
+                    total_alocado = Decimal('0.00')
+
+                    for i in range(parcelas):
+                        if i == parcelas - 1:
+                            valor_da_parcela_atual = valor_total - total_alocado
+                        else:
+                            valor_da_parcela_atual = valor_parcela
+                            total_alocado += valor_parcela
+                        data_vencimento_parcela = primeira_data_vencimento + relativedelta(months=i)
+                        description_parcela = f"Parcela {i+1}/{parcelas} - {receivable_description}" # Usa a descrição base
+
+                        ReceivableAccount.objects.create(
+                            user=request.user, name=cliente.nome, description=description_parcela,
+                            due_date=data_vencimento_parcela, amount=valor_da_parcela_atual,
+                            category=venda_category, dre_area='BRUTA',
+                            payment_method=payment_method, occurrence='AVULSO', is_received=False
+                        )
+                else:
+                    ReceivableAccount.objects.create(
+                        user=request.user, name=cliente.nome, description=receivable_description,
+                        due_date=due_date_str, amount=nova_venda.valor_total_liquido,
+                        category=venda_category, dre_area='BRUTA',
+                        payment_method=payment_method, occurrence='AVULSO', is_received=False
+                    )
+                # ▲▲▲ Fim da Lógica de Contas a Receber ▲▲▲
+                
+            # --- INTEGRAÇÃO ASAAS: Sincronização automática ao finalizar venda ---
+            try:
+                from accounts.services_asaas import AsaasMarketplaceService
+                asaas_service = AsaasMarketplaceService()
+                perfil = request.user.company_profile
+
+                # 1. Garante que o cliente existe no Asaas (Opção B que criamos)
+                asaas_cust_id = asaas_service.get_or_create_asaas_customer(perfil, cliente)
+                
+                if asaas_cust_id:
+                    # Salva o ID no seu banco para não precisar buscar de novo
+                    cliente.asaas_customer_id = asaas_cust_id
+                    cliente.save()
+                    
+                    # 2. Se for uma venda finalizada, já podemos deixar a nota "engatilhada"
+                    # Aqui você pode decidir se quer emitir na hora ou apenas 
+                    # deixar o ID do cliente pronto para o app de Notas Fiscais.
+                    print(f"✅ Cliente {cliente.nome} sincronizado com Asaas ID: {asaas_cust_id}")
+            
+            except Exception as asaas_err:
+                # Não travamos a venda se o Asaas falhar, apenas logamos o erro
+                print(f"⚠️ Falha na sincronização Asaas: {asaas_err}")
+            # --- FIM DA INTEGRAÇÃO ASAAS ---
+
+            messages.success(request, success_message)
+            return JsonResponse({'status':'success','redirect_url':request.path})
+        except (json.JSONDecodeError, AttributeError):
+             messages.error(request, 'Ocorreu um erro inesperado.')
+             return redirect('vendas')
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    # ▼▼▼ ADICIONE O BLOCO DE CÓDIGO DE EXPORTAÇÃO AQUI ▼▼▼
+    # ▼▼▼ SUBSTITUA O BLOCO DE EXPORTAÇÃO ANTIGO POR ESTE NOVO BLOCO COMPLETO ▼▼▼
+    if 'export_excel' in request.GET:
+        start_date_str = request.GET.get('start_date')
+        end_date_str = request.GET.get('end_date')
+
+        vendas_list = Venda.objects.filter(user=request.user).exclude(status='SUBSTITUIDA').order_by('-data_venda')
+        if start_date_str:
+            vendas_list = vendas_list.filter(data_venda__date__gte=start_date_str)
+        if end_date_str:
+            vendas_list = vendas_list.filter(data_venda__date__lte=end_date_str)
+
+        # --- NOVO: Calcular os totais antes de criar a planilha ---
+        totals = vendas_list.aggregate(
+            total_bruto=Sum('valor_total_bruto'),
+            total_desconto=Sum('desconto_geral'),
+            total_liquido=Sum('valor_total_liquido')
+        )
+        total_bruto_sum = totals.get('total_bruto') or 0
+        total_desconto_sum = totals.get('total_desconto') or 0
+        total_liquido_sum = totals.get('total_liquido') or 0
+
+        # Lógica para criar o arquivo Excel
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = 'attachment; filename="vendas_realizadas.xlsx"'
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Vendas Realizadas"
+
+        
+
+        # Cabeçalhos
+        headers = ['#ID', 'Cliente', 'Vendedor', 'Data', 'Itens da Venda', 'Valor Bruto', 'Descontos', 'Valor Líquido', 'Status']
+        ws.append(headers)
+
+        # Aplica negrito ao cabeçalho
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+
+        # Dados
+        for venda in vendas_list:
+            itens_str = "\n".join([
+                f"{item.quantidade}x {item.produto.nome}" for item in venda.itens.all()
+            ])
+            
+            ws.append([
+                venda.id,
+                venda.cliente.nome,
+                venda.vendedor.nome if venda.vendedor else '-',
+                timezone.localtime(venda.data_venda).strftime('%d/%m/%Y %H:%M'),
+                itens_str,
+                venda.valor_total_bruto,
+                venda.desconto_geral,
+                venda.valor_total_liquido,
+                venda.get_status_display()
+            ])
+        
+        # --- NOVO: Adicionar uma linha em branco e a linha de totais ---
+        ws.append([]) # Linha em branco para espaçamento
+        
+        total_row_data = ['', '', '', '', 'TOTAIS:', total_bruto_sum, total_desconto_sum, total_liquido_sum, '']
+        ws.append(total_row_data)
+
+        # Aplica negrito à linha de totais
+        last_row_index = ws.max_row
+        for cell in ws[last_row_index]:
+            cell.font = Font(bold=True)
+            if cell.column_letter in ['E']: # Alinha o texto "TOTAIS:" à direita
+                 cell.alignment = Alignment(horizontal='right')
+
+        # --- CÓDIGO CORRIGIDO: Formatar CÉLULAS como moeda e ajustar largura ---
+        currency_format = '"R$ "#,##0.00'
+
+        # Itera da linha 2 (após o cabeçalho) até a última linha (incluindo os totais)
+        # e aplica o formato de moeda em cada célula das colunas F, G e H.
+        for row_index in range(2, ws.max_row + 1):
+            for col_letter in ['F', 'G', 'H']:
+                ws[f'{col_letter}{row_index}'].number_format = currency_format
+
+        # Ajusta a largura das colunas (esta parte continua igual)
+        ws.column_dimensions['B'].width = 35 # Cliente
+        ws.column_dimensions['C'].width = 35 # Vendedor
+        ws.column_dimensions['D'].width = 20 # Data
+        ws.column_dimensions['E'].width = 45 # Itens da Venda
+        ws.column_dimensions['F'].width = 18 # Valor Bruto
+        ws.column_dimensions['G'].width = 18 # Descontos
+        ws.column_dimensions['H'].width = 18 # Valor Líquido
+        
+        # Ajusta a altura da linha para o texto com quebra de linha
+        for row in ws.iter_rows(min_row=2, max_row=ws.max_row - 2): # Exclui a linha de total
+            for cell in row:
+                if cell.value and isinstance(cell.value, str) and "\n" in cell.value:
+                    cell.alignment = Alignment(wrap_text=True, vertical='top')
+
+        wb.save(response)
+        return response
+    # ▲▲▲ FIM DO BLOCO DE SUBSTITUIÇÃO ▲▲▲
+    # --- INÍCIO DA LÓGICA GET CORRIGIDA E MELHORADA ---
+    
+    # Pega as datas do formulário
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+
+    # Define um período padrão (últimos 30 dias) se nenhuma data for fornecida
+    if not start_date_str and not end_date_str:
+        end_date = timezone.now().date()
+        start_date = end_date - timedelta(days=30)
+        # Converte para string para preencher o formulário
+        start_date_str = start_date.strftime('%Y-%m-%d')
+        end_date_str = end_date.strftime('%Y-%m-%d')
+    
+    # Filtra a lista de vendas
+    vendas_list = Venda.objects.filter(user=request.user).order_by('-data_venda')
+    if start_date_str:
+        vendas_list = vendas_list.filter(data_venda__date__gte=start_date_str)
+    if end_date_str:
+        vendas_list = vendas_list.filter(data_venda__date__lte=end_date_str)
+    # ▼▼▼ ADICIONE O CÁLCULO DO TOTAL AQUI ▼▼▼
+    total_valor_liquido_periodo = vendas_list.aggregate(
+        total=Sum('valor_total_liquido')
+    )['total'] or Decimal('0.00')
+    # Lógica de paginação (sem alterações)
+    paginator = Paginator(vendas_list, 10)
+    page_number = request.GET.get('page')
+    vendas_page_obj = paginator.get_page(page_number)
+
+    # Lógica para carregar dados para o formulário de nova venda (sem alterações)
+    clientes = Cliente.objects.filter(user=request.user)
+    vendedores = Vendedor.objects.filter(user=request.user)
+    produtos = ProdutoServico.objects.filter(user=request.user)
+    produtos_json = json.dumps([{'id':p.id,'nome':p.nome,'codigo':p.codigo,'preco':float(p.preco_venda),'estoque':p.estoque_atual,'tipo':p.tipo} for p in produtos])
+
+    # Contexto final para o template
+    context = {
+        'clientes': clientes,
+        'vendedores': vendedores,
+        'produtos_json': produtos_json,
+        'payment_methods': PAYMENT_METHODS,
+        'vendas': vendas_page_obj,
+        'start_date': start_date_str, # Passa as strings para preencher o form
+        'end_date': end_date_str,   # Passa as strings para preencher o form
+        'total_valor_liquido_periodo': total_valor_liquido_periodo,
+    }
+    return render(request, 'accounts/vendas.html', context)
+
+
+def cadastrar_cliente_rapido(request):
+    if request.method == 'POST':
+        form = ClienteForm(request.POST, user=request.user)
+        if form.is_valid():
+            # 1. Cria o objeto na memória, mas NÃO salva no banco ainda (commit=False)
+            cliente = form.save(commit=False)
+            
+            # 2. Preenche manualmente quem é o dono desse cliente (o usuário logado)
+            cliente.user = request.user 
+            
+            # 3. Agora sim, salva no banco de dados com o ID do usuário preenchido
+            cliente.save()
+
+            # --- O restante da função continua igual ---
+            endereco_visual = f"{cliente.logradouro}, {cliente.numero} - {cliente.bairro}"
+            if cliente.cidade:
+                endereco_visual += f" - {cliente.cidade}/{cliente.uf}"
+
+            return JsonResponse({
+                'status': 'success',
+                'cliente': {
+                    'id': cliente.id,
+                    'nome': cliente.nome,
+                    'cpf_cnpj': cliente.cpf_cnpj or '',
+                    'email': cliente.email or '',
+                    'telefone': cliente.telefone or '',
+                    'endereco': endereco_visual
+                }
+            })
+        else:
+            return JsonResponse({'status': 'error', 'errors': form.errors})
+    return JsonResponse({'status': 'error', 'message': 'Método inválido'})
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_metas_comerciais')
+def metas_comerciais_view(request):
+    form = MetaFaturamentoForm(user=request.user)
+    
+    if request.method == 'POST':
+        post_data = request.POST.copy()
+        mes_ano_str = post_data.get('mes_ano')
+        if mes_ano_str:
+            post_data['mes_ano'] = f"{mes_ano_str}-01"
+        
+        form = MetaFaturamentoForm(post_data, user=request.user)
+        
+        if form.is_valid():
+            alvo_id = form.cleaned_data['alvo']
+            mes_ano_completo = form.cleaned_data['mes_ano']
+            valor_meta = form.cleaned_data['valor_meta']
+            vendedor_instance = None
+            if alvo_id != 'empresa':
+                vendedor_instance = get_object_or_404(Vendedor, id=alvo_id, user=request.user)
+            
+            MetaFaturamento.objects.update_or_create(
+                user=request.user,
+                vendedor=vendedor_instance,
+                mes_ano=mes_ano_completo,
+                defaults={'valor_meta': valor_meta}
+            )
+            messages.success(request, 'Meta salva com sucesso!')
+            ano_selecionado = request.GET.get('ano', timezone.now().year)
+            return redirect(f"{request.path}?ano={ano_selecionado}")
+
+    # --- INÍCIO DAS CORREÇÕES NA LÓGICA GET ---
+    
+    # 1. Lógica do Filtro de Ano (CORRIGIDO)
+    # --- INÍCIO DA CORREÇÃO DA LÓGICA GET ---
+    
+    # 1. Lógica do Filtro de Ano (VERSÃO CORRIGIDA)
+    # Primeiro, buscamos os objetos de data do banco de dados.
+    anos_queryset = MetaFaturamento.objects.filter(user=request.user).dates('mes_ano', 'year', order='DESC')
+    # AGORA, A CORREÇÃO: convertemos os objetos de data em uma lista de números inteiros.
+    anos_disponiveis = [data.year for data in anos_queryset]
+    
+    # Adiciona o ano corrente à lista se ele ainda não existir
+    ano_corrente = timezone.now().year
+    if ano_corrente not in anos_disponiveis:
+        anos_disponiveis.insert(0, ano_corrente)
+        
+    # Pega o ano selecionado e garante que ele seja um número inteiro
+    ano_selecionado_str = request.GET.get('ano', str(ano_corrente))
+    ano_selecionado = int(ano_selecionado_str)
+    
+    # 2. Filtra as metas pelo ano selecionado
+    metas = MetaFaturamento.objects.filter(user=request.user, mes_ano__year=ano_selecionado)
+
+    # 3. Calcula o valor acumulado
+    total_anual_empresa = metas.filter(vendedor__isnull=True).aggregate(
+        total=Sum('valor_meta')
+    )['total'] or Decimal('0.00')
+
+    # 4. Agrupa metas e calcula percentuais com meses em Português (CORRIGIDO)
+    
+    # Dicionário para traduzir os meses
+    MESES_PT = {
+        1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril', 5: 'Maio', 6: 'Junho',
+        7: 'Julho', 8: 'Agosto', 9: 'Setembro', 10: 'Outubro', 11: 'Novembro', 12: 'Dezembro'
+    }
+
+    metas_agrupadas = defaultdict(lambda: {'empresa': None, 'vendedores': []})
+    
+    for meta in metas.order_by('mes_ano'):
+        # Formata o mês manualmente usando o dicionário
+        mes_nome = MESES_PT[meta.mes_ano.month]
+        mes_str = f"{mes_nome}/{meta.mes_ano.year}"
+        
+        if meta.vendedor:
+            metas_agrupadas[mes_str]['vendedores'].append(meta)
+        else:
+            metas_agrupadas[mes_str]['empresa'] = meta
+
+    for mes, dados_meta in metas_agrupadas.items():
+        meta_empresa = dados_meta.get('empresa')
+        if meta_empresa and meta_empresa.valor_meta > 0:
+            for meta_vendedor in dados_meta['vendedores']:
+                percentual = (meta_vendedor.valor_meta / meta_empresa.valor_meta) * 100
+                meta_vendedor.percentual = f"{percentual:.2f}%"
+        else:
+            for meta_vendedor in dados_meta['vendedores']:
+                meta_vendedor.percentual = "N/A"
+    # --- FIM DAS CORREÇÕES ---
+
+    # --- INÍCIO DA LÓGICA PARA O NOVO GRÁFICO ANUAL ---
+    
+    # 1. Busca as metas da empresa para o ano selecionado
+    metas_anuais_query = MetaFaturamento.objects.filter(
+        user=request.user,
+        vendedor__isnull=True,
+        mes_ano__year=ano_selecionado
+    )
+    
+    # 2. Cria um dicionário para mapear mês -> valor da meta
+    metas_por_mes = {meta.mes_ano.month: float(meta.valor_meta) for meta in metas_anuais_query}
+    
+    # 3. Prepara as listas para o Chart.js, garantindo 12 meses
+    labels_grafico_anual = list(MESES_PT.values()) # Usa o dicionário de meses em português
+    data_grafico_anual = []
+    for i in range(1, 13):
+        # Adiciona o valor da meta do mês, ou 0 se não houver meta cadastrada
+        data_grafico_anual.append(metas_por_mes.get(i, 0))
+
+    # --- FIM DA LÓGICA PARA O NOVO GRÁFICO ANUAL ---
+            
+    context = {
+        'form': form,
+        'metas_agrupadas': dict(metas_agrupadas),
+        'anos_disponiveis': anos_disponiveis,
+        'ano_selecionado': ano_selecionado,
+        'total_anual_empresa': total_anual_empresa,
+        'labels_grafico_anual_json': json.dumps(labels_grafico_anual),
+        'data_grafico_anual_json': json.dumps(data_grafico_anual),
+    }
+    return render(request, 'accounts/metas_comerciais.html', context)
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_precificacao')
+def precificacao_view(request):
+    # --- Lógica POST (sem alterações) ---
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            produto_id = data.get('produto_id')
+            if not produto_id:
+                return JsonResponse({'status': 'error', 'message': 'Produto não selecionado.'}, status=400)
+            produto = ProdutoServico.objects.get(id=produto_id, user=request.user)
+            Precificacao.objects.create(
+                user=request.user,
+                produto=produto,
+                preco_custo=Decimal(data.get('preco_custo', 0)),
+                perc_despesas_fixas=Decimal(data.get('perc_despesas_fixas', 0)),
+                perc_comissao=Decimal(data.get('perc_comissao', 0)),
+                perc_impostos=Decimal(data.get('perc_impostos', 0)),
+                perc_lucro=Decimal(data.get('perc_lucro', 0)),
+                preco_venda_sugerido=Decimal(data.get('preco_venda_sugerido', 0)),
+                is_price_updated=False
+            )
+            return JsonResponse({'status': 'success', 'message': 'Precificação salva com sucesso!'})
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    # --- Lógica GET (ATUALIZADA) ---
+    end_date = timezone.now().date()
+    start_date = end_date - timedelta(days=90)
+
+    # ... (cálculos de sugestões, sem alterações) ...
+    sugestoes = ResumoDiario.objects.filter(
+        user=request.user, dia__range=[start_date, end_date]
+    ).aggregate(
+        receita_bruta=Sum('total', filter=Q(tipo='RECEIVABLE')),
+        impostos=Sum('total', filter=Q(tipo='PAYABLE', dre_area='DEDUCAO')),
+        despesas_fixas=Sum('total', filter=Q(tipo='PAYABLE', cost_type='FIXO') & ~Q(dre_area='NAO_CONSTAR')),
+    )
+    receita_bruta = sugestoes['receita_bruta'] or Decimal('0')
+    impostos_sobre_receita = sugestoes['impostos'] or Decimal('0')
+    receita_liquida = receita_bruta - impostos_sobre_receita
+    despesas_fixas_totais = sugestoes['despesas_fixas'] or Decimal('0')
+    suggested_fixed_cost_perc = (despesas_fixas_totais / receita_liquida * 100) if receita_liquida > 0 else Decimal('0')
+    suggested_tax_perc = (impostos_sobre_receita / receita_bruta * 100) if receita_bruta > 0 else Decimal('0')
+    
+    produtos = ProdutoServico.objects.filter(user=request.user).order_by('nome')
+    vendedores = Vendedor.objects.filter(user=request.user).order_by('nome')
+    
+    # --- INÍCIO DAS NOVAS LÓGICAS DE HISTÓRICO ---
+    
+    # 1. Busca o termo da pesquisa na URL
+    search_query = request.GET.get('q', '')
+    
+    # 2. Busca o histórico e usa select_related('produto') para CORRIGIR o nome do produto
+    historico_list = Precificacao.objects.filter(user=request.user).select_related('produto')
+    
+    # 3. Se houver uma busca, filtra a lista pelo nome do produto
+    if search_query:
+        historico_list = historico_list.filter(produto__nome__icontains=search_query)
+
+    # 4. Aplica a paginação na lista (filtrada ou não)
+    paginator = Paginator(historico_list, 10) # 10 itens por página
+    page_number = request.GET.get('page')
+    historico_page_obj = paginator.get_page(page_number)
+    
+    # --- FIM DAS NOVAS LÓGICAS ---
+
+    produtos_json = json.dumps([
+        {'id': p.id, 'nome': p.nome, 'preco_custo': float(p.preco_custo), 'preco_venda_atual': float(p.preco_venda)} 
+        for p in produtos
+    ])
+    vendedores_json = json.dumps([
+        {'id': v.id, 'nome': v.nome, 'comissao': float(v.comissao_percentual)}
+        for v in vendedores
+    ])
+
+    context = {
+        'produtos': produtos,
+        'vendedores': vendedores,
+        'produtos_json': produtos_json,
+        'vendedores_json': vendedores_json,
+        'suggested_fixed_cost_perc': f"{suggested_fixed_cost_perc:.2f}".replace(',', '.'),
+        'suggested_tax_perc': f"{suggested_tax_perc:.2f}".replace(',', '.'),
+        
+        # --- VARIÁVEIS ATUALIZADAS PARA O TEMPLATE ---
+        'historico_page_obj': historico_page_obj,
+        'search_query': search_query,
+    }
+    return render(request, 'accounts/precificacao.html', context)
+
+
+# Adicione esta nova view ao seu arquivo
+@login_required
+def salvar_e_atualizar_precificacao_view(request):
+    if request.method == 'POST':
+        try:
+            # Garante que as duas operações (salvar histórico e atualizar produto)
+            # aconteçam juntas. Se uma falhar, a outra é desfeita.
+            with transaction.atomic():
+                data = json.loads(request.body)
+                produto_id = data.get('produto_id')
+
+                if not produto_id:
+                    return JsonResponse({'status': 'error', 'message': 'Produto não selecionado.'}, status=400)
+
+                # --- Ação 1: Encontrar o produto ---
+                produto = get_object_or_404(ProdutoServico, id=produto_id, user=request.user)
+
+                # --- Ação 2: Salvar o registro no histórico de precificação ---
+                Precificacao.objects.create(
+                    user=request.user,
+                    produto=produto,
+                    preco_custo=Decimal(data.get('preco_custo', 0)),
+                    perc_despesas_fixas=Decimal(data.get('perc_despesas_fixas', 0)),
+                    perc_comissao=Decimal(data.get('perc_comissao', 0)),
+                    perc_impostos=Decimal(data.get('perc_impostos', 0)),
+                    perc_lucro=Decimal(data.get('perc_lucro', 0)),
+                    preco_venda_sugerido=Decimal(data.get('preco_venda_sugerido', 0)),
+                    is_price_updated=True 
+                    
+                )
+
+                # --- Ação 3: Atualizar o preço de venda do produto no cadastro ---
+                novo_preco = Decimal(data.get('preco_venda_sugerido', 0))
+                if novo_preco > 0:
+                    produto.preco_venda = novo_preco
+                    produto.save()
+
+                return JsonResponse({'status': 'success', 'message': 'Precificação salva e preço do produto atualizado com sucesso!'})
+
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    # Se não for POST, redireciona para a página principal da precificação
+    return redirect('precificacao')
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_orcamentos_venda')
+def orcamentos_venda_view(request):
+    import openpyxl
+    from openpyxl.styles import Font
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    # --- INÍCIO: LÓGICA AJAX GET PARA BUSCAR DETALHES (NOVO) ---
+    if 'fetch_orcamento_data' in request.GET:
+        orcamento_id = request.GET.get('fetch_orcamento_data')
+        try:
+            orcamento = OrcamentoVenda.objects.select_related(
+                'cliente', 'vendedor'
+            ).prefetch_related(
+                'itens__produto'
+            ).get(pk=orcamento_id, user=request.user)
+
+            itens_list = []
+            for item in orcamento.itens.all():
+                itens_list.append({
+                    'id': item.produto.id,
+                    'nome': item.produto.nome,
+                    'quantidade': float(item.quantidade),
+                    'preco': float(item.preco_unitario)
+                })
+
+            orcamento_data = {
+                'id': orcamento.id,
+                'cliente_id': orcamento.cliente.id,
+                'vendedor_id': orcamento.vendedor.id if orcamento.vendedor else None,
+                'data_validade': orcamento.data_validade.strftime('%Y-%m-%d'),
+                'observacoes': orcamento.observacoes or '',
+                'valor_total': float(orcamento.valor_total),
+                'itens': itens_list
+            }
+            return JsonResponse({'status': 'success', 'orcamento': orcamento_data})
+
+        except OrcamentoVenda.DoesNotExist:
+            return JsonResponse({'status': 'error', 'message': 'Orçamento não encontrado.'}, status=404)
+        except Exception as e:
+            logger.error(f"Erro ao buscar detalhes do orçamento {orcamento_id} via GET: {str(e)}")
+            return JsonResponse({'status': 'error', 'message': f'Erro interno: {str(e)}'}, status=500)
+    # --- FIM: LÓGICA AJAX GET ---
+
+    # --- LÓGICA POST (MODIFICADA para Atualizar/Criar) ---
+    if request.method == 'POST':
+        # (Lógica de action_delete e action_change_status continua igual)
+        if 'action_delete' in request.POST:
+            orcamento_id = request.POST.get('action_delete')
+            orcamento = get_object_or_404(OrcamentoVenda, id=orcamento_id, user=request.user)
+            orcamento.delete()
+            messages.success(request, f'Orçamento #{orcamento.id} foi excluído com sucesso.')
+            return redirect('orcamentos_venda')
+        elif 'action_change_status' in request.POST:
+            combined_value = request.POST.get('action_change_status')
+            novo_status, orcamento_id = combined_value.split('-')
+            orcamento = get_object_or_404(OrcamentoVenda, id=orcamento_id, user=request.user)
+            orcamento.status = novo_status
+            orcamento.save()
+            messages.success(request, f'Status do Orçamento #{orcamento.id} alterado para "{orcamento.get_status_display()}".')
+            return redirect('orcamentos_venda')
+        
+        # LÓGICA PARA SALVAR (CRIAR OU ATUALIZAR) VIA AJAX POST
+        try:
+            data = json.loads(request.body)
+            orcamento_id = data.get('orcamento_id') # Pega o ID enviado pelo JS
+
+            with transaction.atomic():
+                cliente = get_object_or_404(Cliente, id=data.get('cliente_id'), user=request.user)
+                vendedor = get_object_or_404(Vendedor, id=data.get('vendedor_id'), user=request.user) if data.get('vendedor_id') else None
+                
+                if orcamento_id: # Se tem ID, ATUALIZA
+                    orcamento = get_object_or_404(OrcamentoVenda, id=orcamento_id, user=request.user)
+                    orcamento.cliente = cliente
+                    orcamento.vendedor = vendedor
+                    orcamento.data_validade = data.get('data_validade')
+                    orcamento.valor_total = Decimal(data.get('valor_total', '0'))
+                    orcamento.observacoes = data.get('observacoes', '')
+                    # Considerar voltar o status para PENDENTE ao editar?
+                    # orcamento.status = 'PENDENTE' 
+                    orcamento.save() 
+                    orcamento.itens.all().delete() # Remove itens antigos
+                    success_message = f'Orçamento #{orcamento.id} atualizado com sucesso!'
+                else: # Se não tem ID, CRIA
+                    orcamento = OrcamentoVenda.objects.create(
+                        user=request.user,
+                        cliente=cliente,
+                        vendedor=vendedor,
+                        data_validade=data.get('data_validade'),
+                        valor_total=Decimal(data.get('valor_total', '0')),
+                        observacoes=data.get('observacoes', '')
+                        # Status PENDENTE é o default
+                    )
+                    success_message = f'Orçamento #{orcamento.id} criado com sucesso!'
+
+                # (Re)Cria os itens
+                for item_data in data.get('itens', []):
+                    produto = get_object_or_404(ProdutoServico, id=item_data['id'], user=request.user)
+                    ItemOrcamento.objects.create(
+                        orcamento=orcamento,
+                        produto=produto,
+                        quantidade=Decimal(item_data['quantidade']),
+                        preco_unitario=Decimal(item_data['preco'])
+                    )
+                
+                messages.success(request, success_message) 
+                return JsonResponse({'status': 'success', 'redirect_url': request.path}) # AJAX redireciona
+        except Exception as e:
+            logger.error(f"Erro ao salvar/atualizar orçamento via POST AJAX: {str(e)}") 
+            return JsonResponse({'status': 'error', 'message': f'Erro interno: {str(e)}'}, status=400)
+
+    # --- LÓGICA GET (Listagem e Filtros - Sem alterações) ---
+    status_filter = request.GET.get('status', '')
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+
+    orcamentos_list = OrcamentoVenda.objects.filter(user=request.user).select_related('cliente')
+    
+    if status_filter:
+        orcamentos_list = orcamentos_list.filter(status=status_filter)
+    if start_date:
+        orcamentos_list = orcamentos_list.filter(data_criacao__date__gte=start_date)
+    if end_date:
+        orcamentos_list = orcamentos_list.filter(data_criacao__date__lte=parse_date(end_date))
+
+    # ▼▼▼ INÍCIO DA LÓGICA DE EXPORTAÇÃO (ORÇAMENTOS) ▼▼▼
+    
+    # 1. Exportação Excel
+    if 'export_excel' in request.GET:
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = f'attachment; filename="orcamentos_{datetime.now().strftime("%Y%m%d")}.xlsx"'
+
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = "Orçamentos"
+
+        # Cabeçalhos
+        headers = ['ID', 'Cliente', 'Vendedor', 'Data Criação', 'Validade', 'Itens', 'Observações', 'Valor Total', 'Status']
+        ws.append(headers)
+
+        # Estilo do cabeçalho
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+
+        # Dados
+        for orc in orcamentos_list:
+            # Formata a lista de itens em uma string única
+            itens_str = " | ".join([f"{item.quantidade}x {item.produto.nome}" for item in orc.itens.all()])
+            
+            # Formata datas
+            data_criacao = orc.data_criacao.strftime('%d/%m/%Y') if orc.data_criacao else '-'
+            data_validade = orc.data_validade.strftime('%d/%m/%Y') if orc.data_validade else '-'
+
+            ws.append([
+                orc.id,
+                orc.cliente.nome,
+                orc.vendedor.nome if orc.vendedor else '-',
+                data_criacao,
+                data_validade,
+                itens_str,
+                orc.observacoes or '',
+                orc.valor_total,
+                orc.get_status_display()
+            ])
+
+        # Formatação de Moeda na coluna "Valor Total" (Coluna H -> índice 8)
+        currency_format = '"R$ "#,##0.00'
+        for row in range(2, ws.max_row + 1):
+            ws[f'H{row}'].number_format = currency_format
+
+        # Ajuste de largura das colunas
+        ws.column_dimensions['B'].width = 30 # Cliente
+        ws.column_dimensions['F'].width = 50 # Itens
+        ws.column_dimensions['G'].width = 30 # Observações
+        
+        wb.save(response)
+        return response
+
+    # 2. Exportação PDF
+    if 'export_pdf' in request.GET:
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
+        elements = []
+        styles = getSampleStyleSheet()
+
+        # Título
+        elements.append(Paragraph(f"Relatório de Orçamentos", styles['Title']))
+        elements.append(Spacer(1, 12))
+
+        # Cabeçalho da Tabela
+        data = [['ID', 'Cliente', 'Data', 'Validade', 'Valor Total', 'Status']]
+
+        # Dados da Tabela
+        for orc in orcamentos_list:
+            data_criacao = orc.data_criacao.strftime('%d/%m/%Y') if orc.data_criacao else '-'
+            data_validade = orc.data_validade.strftime('%d/%m/%Y') if orc.data_validade else '-'
+            valor_fmt = f"R$ {orc.valor_total:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            
+            data.append([
+                str(orc.id),
+                orc.cliente.nome[:25], 
+                data_criacao,
+                data_validade,
+                valor_fmt,
+                orc.get_status_display()
+            ])
+
+        # Estilo da Tabela
+        table = Table(data, colWidths=[1.5*cm, 8*cm, 3*cm, 3*cm, 4*cm, 4*cm])
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]))
+        
+        elements.append(table)
+        doc.build(elements)
+        
+        buffer.seek(0)
+        return HttpResponse(buffer, content_type='application/pdf')
+    # ▲▲▲ FIM DA LÓGICA DE EXPORTAÇÃO ▲▲▲
+        
+    paginator = Paginator(orcamentos_list, 10)
+    page_number = request.GET.get('page')
+    orcamentos_page_obj = paginator.get_page(page_number)
+    
+    # Dados para o formulário de criação
+    clientes = Cliente.objects.filter(user=request.user).order_by('nome')
+    vendedores = Vendedor.objects.filter(user=request.user).order_by('nome')
+    produtos = ProdutoServico.objects.filter(user=request.user)
+    produtos_json = json.dumps([{'id': p.id, 'nome': p.nome, 'codigo': p.codigo, 'preco': float(p.preco_venda)} for p in produtos])
+    clientes_json = json.dumps([{'id': c.id, 'nome': c.nome, 'cpf_cnpj': c.cpf_cnpj or '', 'email': c.email or '', 'telefone': c.telefone or ''} for c in clientes])
+
+    context = {
+        'orcamentos': orcamentos_page_obj,
+        'clientes': clientes,
+        'vendedores': vendedores,
+        'produtos_json': produtos_json,
+        'clientes_json': clientes_json, 
+        'status_choices': OrcamentoVenda.STATUS_CHOICES,
+        'status_filter': status_filter,
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+    return render(request, 'accounts/orcamentos_venda.html', context)
+
+
+# --- NOVA VIEW PARA CONVERTER ORÇAMENTO EM VENDA ---
+@login_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_orcamentos_venda')
+def converter_orcamento_venda_view(request, pk):
+    orcamento = get_object_or_404(OrcamentoVenda, pk=pk, user=request.user)
+    
+    if orcamento.status != 'ACEITO':
+        messages.error(request, "Apenas orçamentos com status 'Aceito' podem ser convertidos em venda.")
+        return redirect('orcamentos_venda')
+        
+    try:
+        with transaction.atomic():
+            # 1. Cria a Venda
+            nova_venda = Venda.objects.create(
+                user=request.user,
+                cliente=orcamento.cliente,
+                vendedor=orcamento.vendedor,
+                data_venda=timezone.now(),
+                valor_total_liquido=orcamento.valor_total,
+                status='EM_ANDAMENTO'
+                # Outros campos como cidade/estado podem ser adicionados aqui se necessário
+            )
+
+            description_parts = []
+            # 2. Cria os Itens da Venda e ajusta o estoque
+            for item_orcamento in orcamento.itens.all():
+                ItemVenda.objects.create(
+                    venda=nova_venda,
+                    produto=item_orcamento.produto,
+                    quantidade=item_orcamento.quantidade,
+                    preco_unitario=item_orcamento.preco_unitario
+                )
+                if item_orcamento.produto.tipo == 'PRODUTO':
+                    item_orcamento.produto.estoque_atual -= item_orcamento.quantidade
+                    item_orcamento.produto.save()
+                description_parts.append(f"{item_orcamento.quantidade}x {item_orcamento.produto.nome}")
+
+            # 3. Cria a Conta a Receber
+            venda_category, _ = Category.objects.get_or_create(name="Venda via Orçamento")
+            # --- Bloco Corrigido ---
+            # Cria a Conta a Receber com uma descrição rastreável
+            ReceivableAccount.objects.create(
+                user=request.user,
+                name=f"Venda do Orçamento #{orcamento.id}",
+                # A LINHA MAIS IMPORTANTE:
+                description=f"Ref. Venda #{nova_venda.id}: " + ", ".join(description_parts),
+                due_date=orcamento.data_validade, # Usa a data de validade como vencimento
+                amount=nova_venda.valor_total_liquido,
+                category=venda_category,
+                dre_area='BRUTA',
+                is_received=False
+            )
+            # --- Fim do Bloco Corrigido ---
+            
+            # 4. Atualiza o status do orçamento para evitar dupla conversão (opcional)
+            # orcamento.status = 'CONVERTIDO' # Você pode adicionar um novo status se quiser
+            # orcamento.save()
+            # --- ADICIONE AS DUAS LINHAS ABAIXO ---
+            orcamento.status = 'CONVERTIDO' # Muda o status
+            orcamento.save()                # Salva a alteração
+            # --- FIM DAS LINHAS ADICIONADAS ---
+            messages.success(request, f'Orçamento #{orcamento.id} convertido na Venda #{nova_venda.id} com sucesso!')
+            return redirect('vendas')
+
+    except Exception as e:
+        messages.error(request, f'Ocorreu um erro ao converter o orçamento: {str(e)}')
+        return redirect('orcamentos_venda')    
+
+
+# ▼▼▼ SUBSTITUA sua função existente por este bloco de código ▼▼▼
+@login_required
+@subscription_required
+@module_access_required('fiscal')
+@check_employee_permission('can_access_contratos')
+def gerenciamento_contratos_view(request):
+    edit_id = request.GET.get('edit')
+    instance = None
+    if edit_id:
+        instance = get_object_or_404(Contract, id=edit_id, user=request.user)
+
+    # Inicializa o form aqui - usado no GET ou se o POST for inválido
+    form = ContractForm(instance=instance, user=request.user)
+
+    if request.method == 'POST':
+        redirect_url = request.META.get('HTTP_REFERER', 'gerenciamento_contratos')
+
+        # --- Tratamento das Ações (Excluir, Anexar) ---
+        # NENHUMA ALTERAÇÃO necessária nestes blocos de ação
+        if 'action_delete_contract' in request.POST:
+            contract_id = request.POST.get('action_delete_contract')
+            contract = get_object_or_404(Contract, id=contract_id, user=request.user)
+            contract.delete()
+            messages.success(request, f'Contrato "{contract.title}" excluído com sucesso.')
+            return redirect(redirect_url)
+
+            
+
+        elif 'delete_selected_contracts' in request.POST:
+            contract_ids = request.POST.getlist('contract_ids')
+            if contract_ids:
+                count, _ = Contract.objects.filter(id__in=contract_ids, user=request.user).delete()
+                messages.success(request, f'{count} contrato(s) selecionado(s) foram excluídos.')
+            return redirect(redirect_url)
+
+        elif 'action_attach' in request.POST and 'file' in request.FILES:
+            contract_id = request.POST.get('attach_contract_id')
+            contract = get_object_or_404(Contract, id=contract_id, user=request.user)
+            contract.document = request.FILES['file']
+            contract.save()
+            messages.success(request, 'Documento anexado ao contrato com sucesso.')
+            return redirect(redirect_url)
+        
+        elif 'action_renew' in request.POST:
+            import calendar # Importação necessária para lidar com os meses corretamente
+            
+            contract_id = request.POST.get('renew_contract_id')
+            contrato_antigo = get_object_or_404(Contract, id=contract_id, user=request.user)
+            
+            # A. Calcula o Novo Valor com Reajuste
+            percentual = contrato_antigo.reajuste_percentual or 0
+            novo_valor = contrato_antigo.value + (contrato_antigo.value * (percentual / 100))
+            
+            # B. Lógica Inteligente de Datas
+            # Verifica se é um contrato mensal para usar a lógica de parcelas
+            frequencia_str = str(contrato_antigo.frequencia_pagamento).lower()
+            eh_mensal = any(x in frequencia_str for x in ['mensal', '30'])
+            
+            if eh_mensal and contrato_antigo.quantidade_parcelas:
+                # Se for mensal, calculamos o novo início somando as parcelas à data de início original.
+                # Ex: Início 01/02 + 4 parcelas = Novo Início 01/06.
+                # Isso evita a duplicação do mês 5, pois ignora a data fim "curta" de 30/04.
+                
+                meses_para_adicionar = int(contrato_antigo.quantidade_parcelas)
+                novo_mes = (contrato_antigo.start_date.month - 1 + meses_para_adicionar) % 12 + 1
+                adicional_ano = (contrato_antigo.start_date.month - 1 + meses_para_adicionar) // 12
+                novo_ano = contrato_antigo.start_date.year + adicional_ano
+                
+                # Garante que o dia existe no novo mês (ex: evita 31 de fevereiro)
+                ultimo_dia_mes = calendar.monthrange(novo_ano, novo_mes)[1]
+                novo_dia = min(contrato_antigo.start_date.day, ultimo_dia_mes)
+                
+                nova_data_inicio = contrato_antigo.start_date.replace(year=novo_ano, month=novo_mes, day=novo_dia)
+            
+            elif contrato_antigo.end_date:
+                # Fallback para a lógica simples (Data Fim + 1 dia) se não for mensal
+                nova_data_inicio = contrato_antigo.end_date + timedelta(days=1)
+            else:
+                nova_data_inicio = timezone.now().date()
+
+            # Calcula a nova data fim mantendo a mesma DURAÇÃO (em dias) do contrato anterior
+            duracao = contrato_antigo.end_date - contrato_antigo.start_date
+            nova_data_fim = nova_data_inicio + duracao
+            
+            # C. Cria o NOVO Contrato (Renovado)
+            novo_contrato = Contract.objects.create(
+                user=request.user,
+                title=f"{contrato_antigo.title} (Renovado {timezone.now().year})",
+                client=contrato_antigo.client,
+                start_date=nova_data_inicio,
+                end_date=nova_data_fim,
+                value=novo_valor, 
+                status='ATIVO',   
+                reajuste_percentual=contrato_antigo.reajuste_percentual,
+                frequencia_pagamento=contrato_antigo.frequencia_pagamento,
+                quantidade_parcelas=contrato_antigo.quantidade_parcelas,
+                dia_vencimento=contrato_antigo.dia_vencimento,
+                document=None, 
+                financeiro_gerado=False 
+            )
+            
+            # D. Gera o Financeiro e Vendas
+            try:
+                with transaction.atomic():
+                    gerar_financeiro_contrato(novo_contrato, request.user)
+                messages.success(request, f'Contrato renovado com sucesso! Início em {nova_data_inicio.strftime("%d/%m/%Y")}')
+            except Exception as e:
+                messages.warning(request, f'Contrato renovado, mas erro no financeiro: {e}')
+                
+            return redirect(redirect_url)
+
+        # --- Processamento do Formulário Principal (Criar/Editar) ---
+        else:
+            # Determina a instância para edição baseado nos dados do POST
+            post_instance_id = request.POST.get('contract_id')
+            if post_instance_id:
+                instance = get_object_or_404(Contract, id=post_instance_id, user=request.user)
+            else:
+                instance = None # Garante que instance é None para criação
+
+            # **SUBSTITUIR**: Instancia o form COM os dados do POST
+            form = ContractForm(request.POST, request.FILES, instance=instance, user=request.user)
+
+            if form.is_valid(): # Se o formulário FOR válido
+                form.instance.user = request.user
+                contrato_salvo = form.save() # <--- Capture o objeto salvo numa variável
+
+                # ▼▼▼▼▼ INÍCIO DA ADIÇÃO (Lógica Financeira) ▼▼▼▼▼
+                try:
+                    # Só gera se o status for ATIVO e ainda NÃO tiver sido gerado
+                    if contrato_salvo.status == 'ATIVO' and not contrato_salvo.financeiro_gerado:
+                        with transaction.atomic(): # Garante que ou faz tudo ou não faz nada
+                            gerar_financeiro_contrato(contrato_salvo, request.user)
+                        messages.success(request, 'Contrato salvo e financeiro/vendas gerados com sucesso!')
+                    else:
+                        messages.success(request, 'Contrato salvo com sucesso.')
+                except Exception as e:
+                    # Se der erro no financeiro, o contrato salva, mas avisa o erro
+                    messages.warning(request, f'Contrato salvo, mas erro ao gerar financeiro: {e}')
+                # ▲▲▲▲▲ FIM DA ADIÇÃO ▲▲▲▲▲
+
+                return redirect('gerenciamento_contratos')
+            else: # Se o formulário FOR INVÁLIDO
+                # **SUBSTITUIR**: Loga o erro e define a mensagem, MAS NÃO RODA a lógica GET aqui
+                logger.error(f"Erro no formulário de Contrato: {form.errors.as_json()}")
+                messages.error(request, f'Erro no formulário. Verifique os dados.')
+                # A variável 'form' inválida será usada na renderização abaixo
+
+    # --- Lógica GET (Roda na requisição GET inicial OU após um POST inválido) ---
+
+    # **ADICIONAR**: Lê todos os filtros da requisição GET
+    filter_status = request.GET.get('status', 'all')
+    start_date_str = request.GET.get('start_date') # Usar sufixo _str
+    end_date_str = request.GET.get('end_date')     # Usar sufixo _str
+    search_term = request.GET.get('search_term', '') # <<< ADICIONAR termo de busca
+
+    # REMOVER: Nenhuma filtragem de data padrão é necessária aqui
+
+    # Query base
+    contracts_query = Contract.objects.filter(user=request.user).select_related('client').order_by('-start_date')
+
+    # **ADICIONAR**: Aplica o filtro de busca PRIMEIRO se search_term existir
+    if search_term:
+        contracts_query = contracts_query.filter(
+            Q(title__icontains=search_term) |        # Busca no título OU
+            Q(client__nome__icontains=search_term) # Busca no nome do cliente
+        )
+
+    # Aplica outros filtros SOMENTE se eles existirem na URL
+    if filter_status != 'all' and filter_status:
+        contracts_query = contracts_query.filter(status=filter_status)
+    if start_date_str: # Verifica a versão _str
+        try: # Adiciona try-except para parse robusto da data
+             start_date_obj = parse_date(start_date_str)
+             if start_date_obj:
+                 contracts_query = contracts_query.filter(start_date__gte=start_date_obj)
+        except ValueError:
+             messages.warning(request, "Formato de data inicial inválido.")
+    if end_date_str: # Verifica a versão _str
+        try: # Adiciona try-except para parse robusto da data
+             end_date_obj = parse_date(end_date_str)
+             if end_date_obj:
+                  contracts_query = contracts_query.filter(end_date__lte=end_date_obj) # Usa end_date para verificação <=
+        except ValueError:
+             messages.warning(request, "Formato de data final inválido.")
+
+    # Calcula o total
+    total_value = contracts_query.aggregate(total=Sum('value'))['total'] or Decimal('0.00')
+
+    # Paginação
+    paginator = Paginator(contracts_query, 10)
+    page_number = request.GET.get('page')
+    contracts_page_obj = paginator.get_page(page_number)
+
+    # Prepara o contexto
+    context = {
+        'form': form, # Este é ou o form limpo do GET ou o form inválido do POST
+        'contracts': contracts_page_obj,
+        'filter_status': filter_status,
+        'start_date': start_date_str if start_date_str else '', # Passa a string de volta para o template
+        'end_date': end_date_str if end_date_str else '',       # Passa a string de volta para o template
+        'search_term': search_term, # <<< ADICIONAR termo de busca ao contexto
+        'total_value': total_value,
+        'status_choices': Contract.STATUS_CHOICES,
+    }
+    return render(request, 'accounts/gerenciamento_contratos.html', context)
+
+
+@login_required
+@subscription_required
+@module_access_required('commercial')
+@check_employee_permission('can_access_cadastros_comercial')
+def editar_cliente_view(request, pk):
+    cliente = get_object_or_404(Cliente, pk=pk, user=request.user)
+    
+    if request.method == 'POST':
+        # Passamos o user no __init__ para a validação de CPF funcionar
+        form = ClienteForm(request.POST, instance=cliente, user=request.user)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Cliente atualizado com sucesso!')
+            return redirect('comercial_cadastros')
+    else:
+        form = ClienteForm(instance=cliente, user=request.user)
+
+    context = {
+        'form': form,
+        'item_name': cliente.nome,
+        'is_cliente_edit': True # Flag opcional para o template saber
+    }
+    # Vamos reutilizar o template genérico de edição
+    return render(request, 'accounts/editar_item.html', context)
+
+
+def gerar_financeiro_contrato(contrato, user):
+    """
+    Gera automaticamente Contas a Receber e Vendas (para NF-e) 
+    baseado nas regras do contrato.
+    """
+    if contrato.financeiro_gerado:
+        return
+
+    # 1. Configuração de Datas
+    data_base = contrato.start_date
+    dia_vencimento = contrato.dia_vencimento
+    qtd_parcelas = contrato.quantidade_parcelas if contrato.frequencia_pagamento == 'MENSAL' else 1
+    
+    # 2. CORREÇÃO DA CATEGORIA: Busca ou cria "Receitas de Vendas"
+    # Tenta achar exatamente pelo nome limpo
+    categoria_padrao = Category.objects.filter(user=user, name="Receitas de Vendas", category_type='RECEIVABLE').first()
+    
+    # Se não existir, cria ela
+    if not categoria_padrao:
+        categoria_padrao = Category.objects.create(
+            user=user,
+            name="Receitas de Vendas",
+            category_type='RECEIVABLE'
+        )
+    
+    # 3. Produto/Serviço Padrão
+    produto_servico, _ = ProdutoServico.objects.get_or_create(
+        user=user,
+        nome="Serviço de Contrato (Automático)",
+        defaults={
+            'tipo': 'SERVICO',
+            'preco_venda': contrato.value,
+            'preco_custo': 0,
+            'descricao': 'Gerado automaticamente pelo módulo de Contratos'
+        }
+    )
+
+    # 4. Monta todas as parcelas em memória (dia de vencimento fixo; se o dia
+    # não existe no mês, ex: 31 em fevereiro, usa o último dia do mês)
+    cidade_cli = contrato.client.cidade or "Não Informada"
+    uf_cli = contrato.client.uf or "MG"
+    end_cli = contrato.client.endereco or ""
+
+    registros_receber = []
+    vendas = []
+    datas_venda = []
+    for i, data_vencimento in enumerate(datas_serie(data_base, qtd_parcelas, dia=dia_vencimento)):
+        descricao_parcela = f"Ref. Contrato {contrato.title} - Parc. {i+1}/{qtd_parcelas}"
+
+        # A. CONTA A RECEBER
+        registros_receber.append(ReceivableAccount(
+            user=user,
+            name=f"{contrato.client.nome} - {i+1}/{qtd_parcelas}",
+            description=descricao_parcela,
+            due_date=data_vencimento,
+            amount=contrato.value,
+            category=categoria_padrao, # Agora usa a categoria corrigida
+            dre_area='BRUTA', 
+            payment_method='BOLETO', 
+            occurrence='AVULSO',
+            is_received=False
+        ))
+
+        # B. VENDA (Para emissão de NF-e), datada no vencimento às 09:00
+        vendas.append(Venda(
+            user=user,
+            cliente=contrato.client,
+            vendedor=None,
+            status='FINALIZADA',
+            valor_total_bruto=contrato.value,
+            valor_total_liquido=contrato.value,
+            desconto_geral=0,
+            cidade=cidade_cli,
+            estado=uf_cli,
+            endereco=end_cli
+        ))
+        datas_venda.append(datetime.combine(data_vencimento, datetime.min.time().replace(hour=9)))
+
+    # 5. Grava tudo em lote: o número de consultas não depende da quantidade de parcelas.
+    # bulk_create não dispara signals: rollup e cache do ledger atualizados aqui.
+    with transaction.atomic():
+        ReceivableAccount.objects.bulk_create(registros_receber)
+
+        Venda.objects.bulk_create(vendas)
+        # data_venda é auto_now_add (o bulk_create grava "agora"): força a data do vencimento
+        for venda, data_hora_venda in zip(vendas, datas_venda):
+            venda.data_venda = data_hora_venda
+        Venda.objects.bulk_update(vendas, ['data_venda'])
+
+        ItemVenda.objects.bulk_create([
+            ItemVenda(venda=venda, produto=produto_servico, quantidade=1, preco_unitario=contrato.value, desconto_item=0)
+            for venda in vendas
+        ])
+        PagamentoVenda.objects.bulk_create([
+            PagamentoVenda(venda=venda, forma_pagamento='BOLETO', valor=contrato.value, parcelas=1)
+            for venda in vendas
+        ])
+        atualizar_resumo(user.id, {c.due_date for c in registros_receber})
+
+    contrato.financeiro_gerado = True
+    contrato.save()
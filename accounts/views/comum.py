@@ -0,0 +1,32 @@
+# accounts/views/comum.py
+"""
+Utilitários compartilhados pelas views do app.
+"""
+
+from django.contrib import messages
+from django.shortcuts import redirect
+from django.urls import reverse
+
+from ..models import TarefaSegundoPlano
+from ..utils_tarefas import enfileirar
+
+
+MESES_ABREVIADOS = {
+    1: 'Jan', 2: 'Fev', 3: 'Mar', 4: 'Abr', 5: 'Mai', 6: 'Jun',
+    7: 'Jul', 8: 'Ago', 9: 'Set', 10: 'Out', 11: 'Nov', 12: 'Dez'
+}
+
+
+def _enfileirar_tarefa(request, tipo, destino='importar_ofx', **parametros):
+    """ Enfileira a tarefa em segundo plano e volta para a tela, que acompanha o progresso. """
+    tarefa = enfileirar(request.user, tipo, **parametros)
+    messages.info(request, "Processamento iniciado em segundo plano. Você pode continuar usando o sistema.")
+    return redirect(f"{reverse(destino)}?tarefa={tarefa.pk}")
+
+
+def _tarefa_acompanhada(request):
+    """ Tarefa do tenant indicada em ?tarefa= (ignora valores inválidos ou de outro usuário). """
+    tarefa_id = request.GET.get('tarefa', '')
+    if not tarefa_id.isdigit():
+        return None
+    return TarefaSegundoPlano.objects.filter(pk=int(tarefa_id), user=request.user).first()
@@ -0,0 +1,612 @@
+# accounts/views/conta.py
+"""
+Conta e acesso: login/cadastro, perfil da empresa, BPO e usuários da empresa.
+"""
+
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from django.contrib import messages
+from django.contrib.auth import authenticate, login, logout, update_session_auth_hash
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.forms import PasswordChangeForm
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.utils import timezone
+
+from ..decorators import subscription_required, owner_required
+from ..forms import (
+    CustomUserCreationForm, EmployeeCreationForm, CompanyProfileForm, CompanyDocumentForm, BPOAddClientForm,
+    EmployeePermissionsForm,
+)
+from ..models import Subscription, BPOClientLink, CompanyUserLink, CompanyProfile, CompanyDocument, Cidade
+
+
+@login_required
+@owner_required
+@subscription_required
+def company_profile_view(request):
+    profile, created = CompanyProfile.objects.get_or_create(user=request.user)
+    documents = CompanyDocument.objects.filter(user=request.user)
+
+    profile_form = CompanyProfileForm(instance=profile)
+    doc_form = CompanyDocumentForm()
+
+    if request.method == 'POST':
+        if 'save_profile' in request.POST:
+            print("\n🔵 [DEBUG] Botão 'Salvar Alterações' clicado.")
+            profile_form = CompanyProfileForm(request.POST, request.FILES, instance=profile)
+
+            if profile_form.is_valid():
+                # A. Salva no Banco Local
+                profile = profile_form.save(commit=False)
+                if not profile.inscricao_estadual:
+                    profile.inscricao_estadual = "0000000000000"
+                profile.save()
+                print("✅ [DEBUG] Dados locais atualizados.")
+
+                # B. INTEGRAÇÃO ASAAS
+                from ..services_asaas import AsaasMarketplaceService
+                asaas_service = AsaasMarketplaceService()
+
+                # PASSO 1: Criar ou Sincronizar Subconta
+                if profile.cnpj:
+                    # Se não tem ID, cria/busca. Se já tem ID mas não tem API Key, 
+                    # precisamos rodar para tentar recuperar a Key.
+                    if not profile.asaas_subaccount_id or not profile.asaas_api_key:
+                        print(f"🚀 [DEBUG] Verificando subconta para CNPJ: {profile.cnpj}")
+                        resultado = asaas_service.criar_subconta(profile)
+                        if resultado["success"]:
+                            # Atualizamos a instância local com os dados novos
+                            profile.asaas_subaccount_id = resultado["id"]
+                            profile.asaas_api_key = resultado.get("apiKey")
+                            profile.save()
+                            print(f"✅ [DEBUG] ID/Key sincronizados: {profile.asaas_subaccount_id}")
+
+                # PASSO 2: Enviar Certificado
+                arquivo_cert = profile_form.cleaned_data.get('certificado_digital')
+                
+                # IMPORTANTE: Removi o "not profile.asaas_subaccount_id" da trava acima 
+                # para garantir que este bloco abaixo sempre tenha um ID válido.
+                if profile.asaas_subaccount_id and arquivo_cert:
+                    print(f"📦 [DEBUG] Certificado detectado. Iniciando envio fiscal...")
+                    try:
+                        arquivo_cert.seek(0)
+                        conteudo_binario = arquivo_cert.read()
+                        
+                        if len(conteudo_binario) > 0:
+                            # TENTATIVA DE ENVIO
+                            res_fiscal = asaas_service.configurar_dados_fiscais(profile, conteudo_binario)
+                            
+                            if res_fiscal["success"]:
+                                messages.success(request, 'Certificado configurado com sucesso no Asaas!')
+                            else:
+                                # Aqui ele vai te dizer o erro real (ex: senha errada)
+                                messages.error(request, f'Erro no Asaas Fiscal: {res_fiscal.get("error")}')
+                    except Exception as e:
+                        print(f"💥 [DEBUG] Erro ao ler arquivo: {str(e)}")
+
+                messages.success(request, 'Perfil atualizado com sucesso!')
+                return redirect('company_profile')
+            else:
+                messages.error(request, 'Erro ao validar formulário. Verifique os campos.')
+
+        # Lógica de upload de documentos extras
+        elif 'upload_document' in request.POST:
+            doc_form = CompanyDocumentForm(request.POST, request.FILES)
+            if doc_form.is_valid():
+                documento = doc_form.save(commit=False)
+                documento.user = request.user
+                documento.save()
+                messages.success(request, 'Documento anexado!')
+                return redirect('company_profile')
+
+        # Lógica de exclusão
+        elif 'delete_document' in request.POST:
+            doc_id = request.POST.get('document_id')
+            CompanyDocument.objects.filter(id=doc_id, user=request.user).delete()
+            return redirect('company_profile')
+
+    context = {
+        'profile_form': profile_form,
+        'doc_form': doc_form,
+        'documents': documents,
+    }
+    return render(request, 'accounts/company_profile.html', context)
+
+
+def login_view(request):
+    # Obtém o parâmetro 'next' da URL (GET) ou do formulário (POST)
+    redirect_to = request.POST.get('next', request.GET.get('next', ''))
+
+    if request.method == 'POST':
+        username = request.POST.get('username') # Use .get() para evitar erros
+        password = request.POST.get('password')
+        
+        # Validação básica (opcional, mas boa prática)
+        if not username or not password:
+             return render(request, 'accounts/login.html', {
+                 'error': 'Usuário e senha são obrigatórios.', 
+                 'next': redirect_to # Mantenha o 'next' no contexto
+             })
+
+        user = authenticate(request, username=username, password=password)
+        if user is not None:
+            login(request, user)
+            # ▼▼▼ ADICIONE ESTAS 4 LINHAS ABAIXO ▼▼▼
+            # Se o usuário for um superusuário, ele não tem 'Subscription'
+            # e não pode usar o app normal. Redireciona para o /admin
+            if user.is_superuser:
+                return redirect('/admin/')
+            # --- FIM DAS LINHAS A SEREM ADICIONADAS ---
+
+            # --- INÍCIO DA CORREÇÃO ---
+            # Verificação de segurança para evitar redirecionamento para sites maliciosos
+            url_is_safe = False
+            if redirect_to:
+                # Analisa a URL do 'next'
+                url_parts = urlparse(redirect_to)
+                # Permite apenas URLs relativas (ex: /contaazul/auth/)
+                # OU URLs absolutas no seu próprio domínio (sistemclass.com.br)
+                # Nota: a verificação de ALLOWED_HOSTS pode precisar de ajustes dependendo da sua config
+                if (not url_parts.netloc or url_parts.netloc == request.get_host()):
+                      # Garante que começa com / mas não com // (evita protocolo relativo)
+                      if redirect_to.startswith('/') and not redirect_to.startswith('//'):
+                          url_is_safe = True
+                      # Permite o host exato da requisição
+                      elif url_parts.netloc == request.get_host():
+                          url_is_safe = True
+
+
+            # --- INÍCIO DA MODIFICAÇÃO BPO ---
+            # Verifica se o usuário é um BPO Admin
+            is_bpo_admin = False
+            try:
+                if user.subscription.user_type == 'BPO':
+                    is_bpo_admin = True
+            except Subscription.DoesNotExist:
+                pass # Deixa como Falso, é um usuário normal
+
+            # Limpa qualquer sessão de gerenciamento antiga
+            if 'real_user_id' in request.session:
+                del request.session['real_user_id']
+            if 'managed_user_id' in request.session:
+                del request.session['managed_user_id']
+
+            if url_is_safe:
+                return redirect(redirect_to)
+            elif is_bpo_admin:
+                # Se for BPO, redireciona para o dashboard de seleção de clientes
+                return redirect('bpo_dashboard')
+            else:
+                # Se for Cliente Final, redireciona para a home normal
+                return redirect('smart_redirect')
+            # --- FIM DA MODIFICAÇÃO BPO ---
+            # --- FIM DA CORREÇÃO ---
+        else:
+            # Se a autenticação falhar, renderiza o login novamente com a mensagem de erro
+            # e mantém o parâmetro 'next' para a próxima tentativa
+            return render(request, 'accounts/login.html', {
+                'error': 'Usuário ou senha inválidos', 
+                'next': redirect_to
+            })
+
+    # Para a requisição GET inicial, apenas renderiza o formulário
+    # passando o 'next' para o template
+    return render(request, 'accounts/login.html', {'next': redirect_to})
+
+
+@login_required
+def bpo_dashboard_view(request):
+    """
+    Dashboard principal para o BPO Admin selecionar qual cliente gerenciar.
+    """
+    # 1. SEGURANÇA: Garante que não está 'impersonando' ninguém agora
+    if request.is_managing:
+        return redirect('stop_managing')
+
+    # 2. SEGURANÇA: Verifica se é realmente um BPO
+    try:
+        if request.user.subscription.user_type != 'BPO':
+            return redirect('home')
+    except Subscription.DoesNotExist:
+        return redirect('home')
+
+    # 3. BUSCA NO BANCO: Pega todos os clientes vinculados
+    client_links = BPOClientLink.objects.filter(bpo_admin=request.user).select_related('client', 'client__subscription')
+
+    # --- [NOVO BLOCO] CÁLCULO DE LIMITES ---
+    current_count = client_links.count()
+    limit = request.user.subscription.client_limit
+    can_add = current_count < limit
+    # ---------------------------------------
+
+    # 4. PREPARA A LISTA PARA EXIBIR NA TABELA
+    clients_data = []
+    for link in client_links:
+        # --- CORREÇÃO AQUI ---
+        # 1. Tenta pegar o nome que foi salvo no cadastro (first_name)
+        nome_exibicao = link.client.first_name
+        
+        # 2. Se por acaso o first_name estiver vazio, tenta o profile (se existir)
+        if not nome_exibicao and hasattr(link.client, 'company_profile'):
+             nome_exibicao = link.client.company_profile.nome_empresa
+        
+        # 3. Se ainda assim estiver vazio, usa o email/username
+        if not nome_exibicao:
+            nome_exibicao = link.client.username
+
+        clients_data.append({
+            'user_id': link.client.id,
+            'username': nome_exibicao, # Agora a chave 'username' vai carregar o nome correto "Escritório TM"
+            'email': link.client.email,
+            'subscription_status': link.client.subscription.status if hasattr(link.client, 'subscription') else 'N/A'
+        })
+
+    # 5. CONTEXTO FINAL (Com as novas variáveis)
+    context = {
+        'clients': clients_data,
+        'is_bpo_dashboard': True, # Para o template saber onde está
+        
+        # Novas variáveis para o botão "+ Adicionar Cliente"
+        'current_count': current_count,
+        'limit': limit,
+        'can_add': can_add,
+    }
+    return render(request, 'accounts/bpo_dashboard.html', context)
+
+
+@login_required
+def switch_to_client_view(request, client_id):
+    """
+    Troca a sessão para a do cliente selecionado.
+    """
+    # Garante que o usuário logado é um BPO Admin
+    try:
+        if request.user.subscription.user_type != 'BPO':
+            messages.error(request, "Acesso não autorizado.")
+            return redirect('home')
+    except Subscription.DoesNotExist:
+        messages.error(request, "Acesso não autorizado.")
+        return redirect('home')
+
+    # Verifica se o BPO Admin tem permissão para gerenciar este cliente
+    try:
+        link = BPOClientLink.objects.get(bpo_admin=request.user, client_id=client_id)
+
+        # Define as variáveis de sessão que o middleware irá ler
+        request.session['real_user_id'] = request.user.id
+        request.session['managed_user_id'] = link.client.id
+
+        messages.success(request, f"Você agora está gerenciando: {link.client.username}")
+        # Redireciona para a 'home' (que agora será a home do cliente)
+        return redirect('home')
+
+    except BPOClientLink.DoesNotExist:
+        messages.error(request, "Você não tem permissão para gerenciar este cliente.")
+        return redirect('bpo_dashboard')
+    except User.DoesNotExist:
+        messages.error(request, "Cliente não encontrado.")
+        return redirect('bpo_dashboard')
+
+
+@login_required
+def stop_managing_view(request):
+    """
+    Limpa a sessão de gerenciamento e retorna o BPO ao seu dashboard.
+    """
+    if 'real_user_id' in request.session:
+        del request.session['real_user_id']
+    if 'managed_user_id' in request.session:
+        del request.session['managed_user_id']
+
+    messages.info(request, "Você voltou para sua conta principal.")
+    return redirect('bpo_dashboard')
+
+
+def logout_view(request):
+    logout(request)
+    return redirect('login')
+
+
+def search_cities(request):
+    query = request.GET.get('term', '')
+    cidades = []
+    if len(query) > 2: # Começa a buscar a partir de 3 caracteres
+        cidades_qs = Cidade.objects.filter(nome__istartswith=query).select_related('estado')[:10] # Limita a 10 resultados
+        for cidade in cidades_qs:
+            cidades.append({
+                'label': f"{cidade.nome}, {cidade.estado.uf}", # Texto que aparece na sugestão
+                'value': cidade.nome, # Valor que vai para o input de cidade
+                'estado': cidade.estado.uf # Valor que vai para o input de estado
+            })
+    return JsonResponse(cidades, safe=False)
+
+
+@login_required
+def chat_room_view(request, room_name):
+    return render(request, 'accounts/chat.html', {
+        'room_name': room_name
+    })
+
+
+def register_view(request):
+    if request.method == 'POST':
+        form = CustomUserCreationForm(request.POST)
+        if form.is_valid():
+            # 1. Salva o usuário
+            user = form.save()
+            
+            # 2. Configura o TRIAL de 7 dias
+            # O signal 'create_subscription_for_new_user' já criou a assinatura
+            # Agora nós a atualizamos para o modo Trial
+            if hasattr(user, 'subscription'):
+                sub = user.subscription
+                sub.status = 'trial'  # Define como teste
+                # Define a validade para hoje + 7 dias
+                sub.valid_until = timezone.now().date() + timedelta(days=7)
+                sub.save()
+            
+            # 3. Loga o usuário
+            login(request, user)
+            
+            messages.success(request, 'Cadastro realizado! Aproveite seus 7 dias de teste grátis.')
+            
+            # 4. MUDANÇA ESTRATÉGICA: Redireciona direto para o sistema
+            # Antes era: return redirect('assinatura')
+            return redirect('smart_redirect') 
+            
+    else:
+        form = CustomUserCreationForm()
+        
+    return render(request, 'accounts/register.html', {'form': form})
+
+
+@login_required
+@owner_required
+@subscription_required  # Garante que o dono tenha uma assinatura ativa
+def manage_users_view(request):
+    owner = request.user
+    try:
+        # Usa request.active_subscription (do decorador)
+        subscription = request.active_subscription
+        employee_limit = subscription.employee_limit
+    except (Subscription.DoesNotExist, AttributeError):
+        messages.error(request, "Assinatura principal não encontrada.")
+        return redirect('home')
+
+    current_employees_links = CompanyUserLink.objects.filter(owner=owner)
+    current_employee_count = current_employees_links.count()
+    can_add_more = current_employee_count < employee_limit
+
+    password_form = PasswordChangeForm(owner)
+    employee_form = EmployeeCreationForm()
+
+    if request.method == 'POST':
+        if 'change_password' in request.POST:
+            password_form = PasswordChangeForm(owner, request.POST)
+            if password_form.is_valid():
+                user = password_form.save()
+                update_session_auth_hash(request, user)
+                messages.success(request, 'Sua senha foi alterada com sucesso!')
+                return redirect('manage_users')
+            else:
+                messages.error(request, 'Erro ao alterar a senha. Verifique os campos.')
+
+        elif 'add_employee' in request.POST:
+            if not can_add_more:
+                messages.error(request, f"Limite de {employee_limit} funcionários adicionais atingido.")
+                return redirect('manage_users')
+
+            employee_form = EmployeeCreationForm(request.POST)
+            if employee_form.is_valid():
+                try:
+                    new_employee = User.objects.create_user(
+                        username=employee_form.cleaned_data['email'],
+                        email=employee_form.cleaned_data['email'],
+                        password=employee_form.cleaned_data['password'],
+                        first_name=employee_form.cleaned_data['first_name']
+                    )
+                    # Pega os dados de permissão do formulário
+                    CompanyUserLink.objects.create(
+                        owner=owner, 
+                        employee=new_employee,
+                        can_access_home = employee_form.cleaned_data.get('can_access_home', True),
+
+                        # Permissões Módulo Financeiro
+                        can_access_contas_pagar = employee_form.cleaned_data.get('can_access_contas_pagar', False),
+                        can_access_contas_receber = employee_form.cleaned_data.get('can_access_contas_receber', False),
+                        can_access_tarefas = employee_form.cleaned_data.get('can_access_tarefas', False),
+                        can_access_orcamento_anual = employee_form.cleaned_data.get('can_access_orcamento_anual', False),
+                        can_access_painel_financeiro = employee_form.cleaned_data.get('can_access_painel_financeiro', False),
+                        can_access_fornecedores = employee_form.cleaned_data.get('can_access_fornecedores', False),
+                        can_access_clientes_financeiro = employee_form.cleaned_data.get('can_access_clientes_financeiro', False),
+
+                        # Permissões Módulo Comercial
+                        can_access_painel_vendas = employee_form.cleaned_data.get('can_access_painel_vendas', False),
+                        can_access_notas_fiscais = employee_form.cleaned_data.get('can_access_notas_fiscais', False),
+                        can_access_orcamentos_venda = employee_form.cleaned_data.get('can_access_orcamentos_venda', False),
+                        can_access_contratos = employee_form.cleaned_data.get('can_access_contratos', False),
+                        can_access_cadastros_comercial = employee_form.cleaned_data.get('can_access_cadastros_comercial', False),
+                        can_access_vendas = employee_form.cleaned_data.get('can_access_vendas', False),
+                        can_access_metas_comerciais = employee_form.cleaned_data.get('can_access_metas_comerciais', False),
+                        can_access_precificacao = employee_form.cleaned_data.get('can_access_precificacao', False),
+                        can_access_pdv = employee_form.cleaned_data.get('can_access_pdv', False)
+                    )
+                    messages.success(request, f"Funcionário '{new_employee.first_name}' adicionado com sucesso!")
+                    # ▲▲▲ FIM DA SUBSTITUIÇÃO ▲▲▲
+                except Exception as e:
+                    messages.error(request, f"Erro ao criar funcionário: {e}")
+
+                return redirect('manage_users')
+            else:
+                messages.error(request, 'Erro ao adicionar funcionário. Verifique os campos.')
+
+        elif 'delete_employee' in request.POST:
+            employee_link_id = request.POST.get('employee_link_id')
+            link_to_delete = get_object_or_404(CompanyUserLink, id=employee_link_id, owner=owner)
+            employee_user = link_to_delete.employee
+            try:
+                link_to_delete.delete()
+                employee_user.delete()
+                messages.success(request, f"Funcionário '{employee_user.first_name}' excluído com sucesso.")
+            except Exception as e:
+                messages.error(request, f"Erro ao excluir funcionário: {e}")
+            return redirect('manage_users')
+
+    context = {
+        'password_form': password_form,
+        'employee_form': employee_form,
+        'current_employees': current_employees_links.select_related('employee'),
+        'employee_limit': employee_limit,
+        'current_employee_count': current_employee_count,
+        'can_add_more': can_add_more,
+    }
+    return render(request, 'accounts/manage_users.html', context)
+
+
+@login_required
+def smart_redirect_view(request):
+    """
+    Redireciona o usuário para a página correta após o login,
+    usando 'request.company_link' do middleware.
+    """
+    link = getattr(request, 'company_link', None)
+
+    # Se for o dono da conta (link é None) ou superuser, vai para a home.
+    if link is None or request.user.is_superuser:
+        return redirect('home')
+
+    # --- ORDEM DE PRIORIDADE DE REDIRECIONAMENTO (para Funcionário) ---
+
+    if link.can_access_home:
+        return redirect('home')
+
+    # Prioridade Financeira
+    if link.can_access_painel_financeiro:
+        return redirect('dashboards')
+    if link.can_access_contas_pagar:
+        return redirect('contas_pagar')
+    if link.can_access_contas_receber:
+        return redirect('contas_receber')
+
+    # Prioridade Comercial
+    if link.can_access_painel_vendas:
+        return redirect('faturamento_dashboard')
+    if link.can_access_vendas:
+        return redirect('vendas')
+
+    # Fallback (copie todas as suas permissões)
+    if link.can_access_tarefas:
+        return redirect('tarefas_home')
+    if link.can_access_orcamento_anual:
+        return redirect('orcamento_anual')
+    if link.can_access_fornecedores:
+        return redirect('fornecedores')
+    if link.can_access_clientes_financeiro:
+        return redirect('clientes')
+    if link.can_access_notas_fiscais:
+        return redirect('lista_notas_fiscais')
+    if link.can_access_orcamentos_venda:
+        return redirect('orcamentos_venda')
+    if link.can_access_contratos:
+        return redirect('gerenciamento_contratos')
+    if link.can_access_cadastros_comercial:
+        return redirect('comercial_cadastros')
+    if link.can_access_metas_comerciais:
+        return redirect('metas_comerciais')
+    if link.can_access_precificacao:
+        return redirect('precificacao')
+
+    # Se o funcionário não tiver NENHUMA permissão
+    messages.warning(request, 'Sua conta não possui permissão para acessar nenhuma página. Fale com o administrador.')
+    return redirect('logout')
+
+
+@login_required
+def bpo_add_client_view(request):
+    # 1. Verifica se é BPO
+    try:
+        sub = request.user.subscription
+        if sub.user_type != 'BPO':
+            messages.error(request, "Acesso negado. Apenas contas BPO podem adicionar clientes.")
+            return redirect('home')
+    except Subscription.DoesNotExist:
+        return redirect('home')
+
+    # 2. Verifica o Limite (AQUI ESTÁ A MÁGICA)
+    current_clients_count = BPOClientLink.objects.filter(bpo_admin=request.user).count()
+    limit = sub.client_limit
+
+    if current_clients_count >= limit:
+        messages.error(request, f"Você atingiu seu limite de {limit} clientes. Faça um upgrade para adicionar mais.")
+        return redirect('bpo_dashboard')
+
+    if request.method == 'POST':
+        form = BPOAddClientForm(request.POST)
+        if form.is_valid():
+            with transaction.atomic():
+                # A. Cria o Usuário do Cliente
+                new_client_user = User.objects.create_user(
+                    username=form.cleaned_data['email'],
+                    email=form.cleaned_data['email'],
+                    password=form.cleaned_data['password'],
+                    first_name=form.cleaned_data['first_name']
+                )
+
+                # B. Atualiza a Assinatura do Cliente (que já foi criada pelo signal post_save)
+                # Usamos get_or_create por segurança, caso o signal falhe ou seja removido
+                client_sub, created = Subscription.objects.get_or_create(user=new_client_user)
+                
+                client_sub.status = 'active'
+                client_sub.user_type = 'CLIENTE'
+                client_sub.valid_until = datetime.today().date() + timedelta(days=3650) # Validade longa
+                client_sub.has_financial_module = True
+                client_sub.has_commercial_module = sub.has_commercial_module # Herda do BPO
+                client_sub.save()
+
+                # C. Cria o Vínculo (Link)
+                BPOClientLink.objects.create(
+                    bpo_admin=request.user,
+                    client=new_client_user
+                )
+
+                messages.success(request, f"Cliente '{new_client_user.first_name}' criado e vinculado com sucesso!")
+                return redirect('bpo_dashboard')
+    else:
+        form = BPOAddClientForm()
+
+    return render(request, 'accounts/bpo_add_client.html', {'form': form, 'limit': limit, 'current': current_clients_count})
+
+
+def landing_page(request):
+    if request.user.is_authenticated:
+        return redirect('smart_redirect') # Se já logado, vai pro sistema
+    return render(request, 'landing_page.html')
+
+
+# 2. Adicione esta função em algum lugar do arquivo views.py
+@login_required
+@owner_required
+@subscription_required
+def editar_funcionario_view(request, pk):
+    # Busca o vínculo do funcionário (garantindo que pertence ao dono logado)
+    link = get_object_or_404(CompanyUserLink, pk=pk, owner=request.user)
+    
+    if request.method == 'POST':
+        form = EmployeePermissionsForm(request.POST, instance=link)
+        if form.is_valid():
+            form.save()
+            messages.success(request, f'Permissões de {link.employee.first_name} atualizadas com sucesso!')
+            return redirect('manage_users')
+    else:
+        form = EmployeePermissionsForm(instance=link)
+
+    context = {
+        'form': form,
+        'item_name': f"Permissões de {link.employee.first_name}",
+    }
+    # Reutiliza o template genérico de edição
+    return render(request, 'accounts/editar_item.html', context)
@@ -0,0 +1,685 @@
+# accounts/views/integracoes.py
+"""
+Integrações: importação de OFX/planilhas/ERPs, credenciais de bancos e ERPs,
+Conta Azul (OAuth) e webhook da Cora.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import json
+import logging
+import os
+import re
+import unicodedata
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
+from django.shortcuts import render, redirect
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+from ..decorators import subscription_required, owner_required, module_access_required
+from ..forms import (
+    OFXImportForm, SicrediCredentialsForm, AsaasCredentialsForm, OmieCredentialsForm, CoraCredentialsForm,
+    NiboCredentialsForm, TinyCredentialsForm, InterCredentialsForm, MercadoPagoCredentialsForm,
+)
+from ..models import (
+    Category, ContaAzulCredentials, SicrediCredentials, AsaasCredentials, OmieCredentials, CoraCredentials,
+    NiboCredentials, TinyCredentials, InterCredentials, MercadoPagoCredentials,
+)
+from ..utils_conciliacao_ofx import conciliar_extrato_ofx
+from .comum import _enfileirar_tarefa, _tarefa_acompanhada
+
+logger = logging.getLogger(__name__)
+
+
+def _parametros_sync_erp(request):
+    """ "Sincronização completa" marcada: ignora a marca d'água e busca toda a janela do ERP. """
+    return {'forcar_completa': True} if request.POST.get('forcar_completa') else {}
+
+
+@login_required
+@owner_required
+@subscription_required
+@module_access_required('financial')
+def importar_ofx_view(request):
+    from ofxparse import OfxParser
+    from ..utils_asaas import buscar_saldo_asaas
+    from ..utils_cora import buscar_saldo_cora
+    from ..utils_inter import buscar_saldo_inter
+    from ..utils_mercadopago import buscar_saldo_mercadopago
+    
+    if request.method == 'POST':
+        # --- [INÍCIO] COLAR O CÓDIGO AQUI ---
+        if 'sync_inter' in request.POST:
+            return _enfileirar_tarefa(request, 'sync_extrato', banco='inter')
+        # --- [FIM] COLAR O CÓDIGO AQUI ---
+
+        # ▼▼▼ [INÍCIO] NOVO BLOCO MERCADO PAGO ▼▼▼
+        elif 'sync_mp' in request.POST:
+            return _enfileirar_tarefa(request, 'sync_extrato', banco='mercadopago')
+        # ▲▲▲ [FIM] NOVO BLOCO MERCADO PAGO ▲▲▲
+
+        # ▼▼▼ [INÍCIO] NOVO BLOCO ASAAS ▼▼▼
+        elif 'sync_asaas' in request.POST:
+            return _enfileirar_tarefa(
+                request, 'sync_extrato', banco='asaas', dias=request.POST.get('asaas_days', '30')
+            )
+        
+        elif 'sync_cora' in request.POST:
+            return _enfileirar_tarefa(request, 'sync_extrato', banco='cora', opcao=request.POST.get('dias_cora'))
+
+        # ▼▼▼ [INÍCIO] NOVO BLOCO SICREDI ▼▼▼
+        elif 'sync_sicredi' in request.POST:
+            return _enfileirar_tarefa(request, 'sync_extrato', banco='sicredi')
+        # ▲▲▲ [FIM] NOVO BLOCO SICREDI ▲▲▲
+
+        # ▼▼▼ [INÍCIO] NOVO BLOCO OMIE ▼▼▼
+        elif 'sync_omie' in request.POST:
+            return _enfileirar_tarefa(request, 'sync_omie', **_parametros_sync_erp(request))
+        # ▲▲▲ [FIM] NOVO BLOCO OMIE ▲▲▲
+        # ▼▼▼ [INÍCIO] NOVO BLOCO NIBO ▼▼▼
+        elif 'sync_nibo' in request.POST:
+            return _enfileirar_tarefa(request, 'sync_nibo', **_parametros_sync_erp(request))
+        # ▲▲▲ [FIM] NOVO BLOCO NIBO ▲▲▲
+
+        # ▼▼▼ [INÍCIO] NOVO BLOCO TINY ERP ▼▼▼
+        elif 'sync_tiny' in request.POST:
+            return _enfileirar_tarefa(request, 'sync_tiny', **_parametros_sync_erp(request))
+        # ▲▲▲ [FIM] NOVO BLOCO TINY ERP ▲▲▲
+
+
+        form = OFXImportForm(request.POST, request.FILES, user=request.user)
+        if form.is_valid():
+            ofx_import = form.save(commit=False)
+            ofx_import.user = request.user
+            ofx_import.bank_name = ofx_import.bank_account.bank_name
+            ofx_import.save()
+            try:
+                ofx_file = ofx_import.file
+                ofx_file.seek(0)
+                # ... (bloco de decodificação do OFX continua igual) ...
+                raw_content = ofx_file.read()
+                content = None
+                encodings = ['utf-8', 'cp1252', 'iso-8859-1', 'latin-1']
+                for encoding in encodings:
+                    try:
+                        content = raw_content.decode(encoding)
+                        break
+                    except UnicodeDecodeError:
+                        continue
+                if content is None:
+                    content = raw_content.decode('utf-8', errors='replace')
+
+                # ▼▼▼▼▼▼▼▼▼▼ INÍCIO DA CORREÇÃO ▼▼▼▼▼▼▼▼▼▼
+                # Corrige erro "Empty transaction name" preenchendo tags vazias
+                content = re.sub(r'<NAME>\s*</NAME>', '<NAME>Nao Informado</NAME>', content, flags=re.IGNORECASE)
+                # ▲▲▲▲▲▲▲▲▲▲ FIM DA CORREÇÃO ▲▲▲▲▲▲▲▲▲▲    
+                # --- CORREÇÃO ESPECÍFICA PARA PAGBANK (SALDO COM R$) ---
+                # Esta função limpa o valor dentro da tag <BALAMT> para o OfxParser não falhar
+                def limpar_valor_pagbank(match):
+                    v = match.group(1)
+                    # Remove R$, espaços em branco e acerta a vírgula decimal
+                    v = v.replace('R$', '').replace(' ', '').replace('\xa0', '').replace(',', '.')
+                    return f'<BALAMT>{v.strip()}</BALAMT>'
+
+                content = re.sub(r'<BALAMT>(.*?)</BALAMT>', limpar_valor_pagbank, content, flags=re.IGNORECASE | re.DOTALL)
+                # -------------------------------------------------------
+                # 3. NOVO: Corrige o formato da data DTASOF
+                def corrigir_data_pagbank(match):
+                    data_str = match.group(1).strip()
+                    if '/' in data_str:
+                        try:
+                            d, m, y = data_str.split('/')
+                            return f'<DTASOF>{y}{m}{d}</DTASOF>'
+                        except:
+                            return match.group(0)
+                    return match.group(0)
+                content = re.sub(r'<DTASOF>(.*?)</DTASOF>', corrigir_data_pagbank, content, flags=re.IGNORECASE | re.DOTALL)
+
+                if 'OFXHEADER:' in content[:300]:
+                    content = re.sub(r'^.*?(?=<OFX>)', '', content, flags=re.MULTILINE | re.DOTALL)
+
+                content = content.strip()
+
+                if not content.startswith('<OFX'):
+                    raise ValueError("Arquivo OFX inválido: estrutura <OFX> não encontrada após limpeza do cabeçalho.")
+                content = unicodedata.normalize('NFKD', content).encode('ascii', 'ignore').decode('ascii')
+                ofx_file_content = StringIO(content)
+                ofx = OfxParser.parse(ofx_file_content)
+                if not hasattr(ofx, 'account'):
+                    raise ValueError("O arquivo OFX não contém informações de conta válidas.")
+                
+                bank_account = ofx_import.bank_account
+
+                # --- INÍCIO DA LÓGICA DE RECONCILIAÇÃO ---
+
+                # --- INÍCIO DA LÓGICA DE RECONCILIAÇÃO (CORRIGIDA) ---
+                
+                # Solução para o erro "returned more than one Category":
+                # Usamos .filter().first() em vez de get() para evitar quebra se houver duplicatas.
+                # Também adicionamos o filtro user=request.user para garantir segurança dos dados.
+
+                # 1. Define categoria padrão para PAGAR
+                payable_category = Category.objects.filter(
+                    user=request.user, 
+                    name="Despesas Administrativas"
+                ).first()
+                
+                if not payable_category:
+                    payable_category = Category.objects.create(
+                        user=request.user, 
+                        name="Despesas Administrativas", 
+                        category_type='PAYABLE'
+                    )
+
+                # 2. Define categoria padrão para RECEBER
+                receivable_category = Category.objects.filter(
+                    user=request.user, 
+                    name="Receitas sobre Vendas"
+                ).first()
+                
+                if not receivable_category:
+                    receivable_category = Category.objects.create(
+                        user=request.user, 
+                        name="Receitas sobre Vendas", 
+                        category_type='RECEIVABLE'
+                    )
+                
+                # payable_category, _ = Category.objects.get_or_create(name="Despesas Administrativas")
+                # receivable_category, _ = Category.objects.get_or_create(name="Receitas sobre Vendas")
+
+                # Conciliação em lote: regras e candidatos carregados uma vez, gravação com bulk
+                # (accounts/utils_conciliacao_ofx.py)
+                contadores = conciliar_extrato_ofx(
+                    request.user, ofx_import, bank_account, ofx.account.statement.transactions,
+                    payable_category, receivable_category,
+                )
+                new_transactions_count = contadores['novos']
+                skipped_transactions_count = contadores['ignorados']
+                reconciled_count = contadores['conciliados']
+
+                # --- MENSAGENS DE SUCESSO MELHORADAS ---
+                if new_transactions_count > 0:
+                    messages.success(request, f'{new_transactions_count} nova(s) transação(ões) importada(s) com sucesso.')
+                
+                if reconciled_count > 0: # <<< NOVO
+                    messages.info(request, f'{reconciled_count} transação(ões) existente(s) foram conciliadas (marcadas como pagas/recebidas).')
+                
+                if skipped_transactions_count > 0:
+                    messages.warning(request, f'{skipped_transactions_count} transação(ões) duplicada(s) foram ignoradas.')
+
+                if new_transactions_count == 0 and reconciled_count == 0 and skipped_transactions_count == 0:
+                    messages.info(request, 'O arquivo foi processado, mas nenhuma transação foi encontrada.')
+                elif new_transactions_count == 0 and reconciled_count == 0 and skipped_transactions_count > 0:
+                     messages.info(request, 'Nenhuma transação nova foi encontrada. Todas as transações do arquivo já haviam sido importadas.')
+
+                return redirect('importar_ofx') # Redireciona para a própria página de importação
+
+            except Exception as e:
+                messages.error(request, f'Erro ao processar o arquivo OFX: {str(e)}')
+                ofx_import.delete()
+                return redirect('importar_ofx')
+        else:
+             messages.error(request, f'Erro no formulário: {form.errors.as_text()}')
+    else:
+        form = OFXImportForm(user=request.user)
+
+    # --- NOVA LÓGICA DE SALDO ---
+    saldo_inter = None
+    # Verifica se o usuário tem credenciais configuradas antes de tentar buscar
+    if hasattr(request.user, 'inter_creds'):
+        try:
+            # Busca o saldo
+            resp_saldo = buscar_saldo_inter(request.user)
+            
+            # Se a API retornou o campo 'disponivel', salvamos na variável
+            if 'disponivel' in resp_saldo:
+                saldo_inter = resp_saldo['disponivel']
+        except Exception as e:
+            print(f"Não foi possível carregar o saldo: {e}")
+            # Não vamos travar a página se o saldo falhar, apenas segue sem ele
+
+    # ▼▼▼ NOVO: SALDO MERCADO PAGO ▼▼▼
+    saldo_mp = None
+    if hasattr(request.user, 'mercadopago_creds'):
+        try:
+            resp_saldo_mp = buscar_saldo_mercadopago(request.user)
+            if 'disponivel' in resp_saldo_mp:
+                saldo_mp = resp_saldo_mp['disponivel']
+        except Exception as e:
+            print(f"Erro saldo MP: {e}")
+    # ▲▲▲ FIM NOVO BLOCO ▲▲▲   
+
+    # ▼▼▼ NOVO: SALDO ASAAS ▼▼▼
+    saldo_asaas = None
+    if hasattr(request.user, 'asaas_creds'):
+        try:
+            resp_saldo_asaas = buscar_saldo_asaas(request.user)
+            if 'disponivel' in resp_saldo_asaas:
+                saldo_asaas = resp_saldo_asaas['disponivel']
+        except Exception as e:
+            print(f"Erro saldo Asaas: {e}")
+    # ▲▲▲ FIM NOVO BLOCO ▲▲▲     
+
+    # ▼▼▼ [INÍCIO] SALDO BANCO CORA ▼▼▼
+    saldo_cora = None
+    if hasattr(request.user, 'cora_creds'):
+        try:
+            resp_saldo_cora = buscar_saldo_cora(request.user)
+            if 'disponivel' in resp_saldo_cora:
+                saldo_cora = resp_saldo_cora['disponivel']
+        except Exception as e:
+            print(f"Erro saldo Cora: {e}")
+    # ▲▲▲ [FIM] SALDO BANCO CORA ▲▲▲
+    # ▼▼▼ [INÍCIO] SALDO SICREDI ▼▼▼
+    saldo_sicredi = None
+    if hasattr(request.user, 'sicredi_creds'):
+        try:
+            from ..utils_sicredi import buscar_saldo_sicredi
+            resp_saldo = buscar_saldo_sicredi(request.user)
+            if 'disponivel' in resp_saldo:
+                saldo_sicredi = resp_saldo['disponivel']
+        except Exception as e:
+            print(f"Erro saldo Sicredi: {e}")
+    # ▲▲▲ [FIM] SALDO SICREDI ▲▲▲
+
+    context = {
+        'ofx_form': form,
+        'saldo_inter': saldo_inter,
+        'saldo_mp': saldo_mp,
+        'saldo_asaas': saldo_asaas,
+        'saldo_cora': saldo_cora,
+        'saldo_sicredi': saldo_sicredi,
+        'tarefa_acompanhada': _tarefa_acompanhada(request),
+    }
+
+    return render(request, 'accounts/importar_ofx.html', context)
+
+
+CLIENT_ID = os.environ.get('CONTA_AZUL_CLIENT_ID')
+
+
+CLIENT_SECRET = os.environ.get('CONTA_AZUL_CLIENT_SECRET')
+
+
+REDIRECT_URI = os.environ.get('CONTA_AZUL_REDIRECT_URI')
+
+
+# Endereços da API Conta Azul (CORRIGIDOS)
+AUTHORIZATION_URL = 'https://auth.contaazul.com/oauth2/authorize' # <-- MUDADO AQUI
+
+
+TOKEN_URL = 'https://auth.contaazul.com/oauth2/token'         # <-- MUDADO AQUI
+
+
+@login_required
+def contaazul_auth_redirect(request):
+    """Redireciona para o Conta Azul para autorização."""
+    from requests_oauthlib import OAuth2Session
+
+    # Escopo corrigido (com espaços)
+    scope = "openid profile aws.cognito.signin.user.admin" 
+    
+    oauth = OAuth2Session(CLIENT_ID, redirect_uri=REDIRECT_URI, scope=scope)
+    
+    # --- ALTERAÇÃO AQUI ---
+    # Adicionamos kwargs={'prompt': 'login consent'} para forçar o login e a escolha
+    authorization_url, state = oauth.authorization_url(
+        AUTHORIZATION_URL,
+        prompt='login consent' 
+    )
+    # ----------------------
+    
+    request.session['oauth_state'] = state
+    return redirect(authorization_url)
+
+
+@login_required
+def contaazul_callback(request):
+    """Recebe o callback do Conta Azul após autorização."""
+    from requests_oauthlib import OAuth2Session
+
+    # Garante que CLIENT_ID e CLIENT_SECRET foram carregados
+    if not CLIENT_ID or not CLIENT_SECRET:
+        messages.error(request, "Credenciais do Conta Azul não configuradas no servidor.")
+        return redirect('home')
+
+    try:
+        oauth = OAuth2Session(
+            CLIENT_ID,
+            redirect_uri=REDIRECT_URI, # Usará a URL do Render aqui
+            state=request.session.get('oauth_state')
+        )
+        # Monta a URL completa de resposta (incluindo https)
+        # Use request.scheme para obter https
+        full_response_url = request.scheme + '://' + request.get_host() + request.get_full_path()
+
+        token = oauth.fetch_token(
+            TOKEN_URL,
+            # Usa a URL completa na resposta
+            authorization_response=full_response_url,
+            # Inclui client_id e client_secret no corpo para alguns fluxos
+            # client_secret=CLIENT_SECRET # Descomente se fetch_token reclamar
+            # Pode precisar passar explicitamente:
+             auth=(CLIENT_ID, CLIENT_SECRET) # Autenticação Basic para o token endpoint
+        )
+
+        expires_in = token.get('expires_in', 3600) # Default 1 hora
+        expires_at_time = timezone.now() + timedelta(seconds=expires_in)
+
+        creds, created = ContaAzulCredentials.objects.update_or_create(
+            user=request.user,
+            defaults={
+                'access_token': token['access_token'],
+                'refresh_token': token.get('refresh_token'), # refresh_token pode não vir sempre
+                'expires_at': expires_at_time
+            }
+        )
+        messages.success(request, 'Conta Azul conectada com sucesso!')
+        return redirect('home')
+
+    except Exception as e:
+        # Log detalhado do erro no servidor para depuração
+        import traceback
+        print(f"Erro no callback Conta Azul: {e}")
+        print(traceback.format_exc())
+        messages.error(request, f'Erro ao conectar com Conta Azul. Verifique as configurações e tente novamente. Detalhe: {e}')
+        return redirect('home')
+
+
+@login_required
+@subscription_required
+def configurar_inter_view(request):
+    # Tenta pegar a instância existente ou cria uma nova
+    try:
+        instance = request.user.inter_creds
+    except InterCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = InterCredentialsForm(request.POST, request.FILES, instance=instance)
+        if form.is_valid():
+            creds = form.save(commit=False)
+            creds.user = request.user
+            creds.save()
+            messages.success(request, 'Credenciais do Banco Inter salvas com sucesso!')
+            return redirect('importar_ofx')
+        else:
+            messages.error(request, 'Erro ao salvar. Verifique os arquivos.')
+    else:
+        form = InterCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_inter.html', {'form': form})
+
+
+@login_required
+@subscription_required
+def configurar_mercadopago_view(request):
+    # Tenta pegar a instância existente ou define como None para criar
+    try:
+        instance = request.user.mercadopago_creds
+    except MercadoPagoCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = MercadoPagoCredentialsForm(request.POST, instance=instance)
+        if form.is_valid():
+            creds = form.save(commit=False)
+            creds.user = request.user
+            creds.save()
+            messages.success(request, 'Credenciais do Mercado Pago salvas com sucesso!')
+            # Redireciona para a tela de importação, igual ao fluxo do Banco Inter
+            return redirect('importar_ofx')
+        else:
+            messages.error(request, 'Erro ao salvar. Verifique os dados inseridos.')
+    else:
+        form = MercadoPagoCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_mercadopago.html', {'form': form})
+
+
+@login_required
+@subscription_required
+def configurar_asaas_view(request):
+    try:
+        instance = request.user.asaas_creds
+    except AsaasCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = AsaasCredentialsForm(request.POST, instance=instance)
+        if form.is_valid():
+            creds = form.save(commit=False)
+            creds.user = request.user
+            creds.save()
+            messages.success(request, 'Credenciais do Asaas salvas com sucesso!')
+            return redirect('importar_ofx')
+        else:
+            messages.error(request, 'Erro ao salvar. Verifique a chave inserida.')
+    else:
+        form = AsaasCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_asaas.html', {'form': form})
+
+
+@login_required
+@subscription_required
+def configurar_omie_view(request):
+    # Tenta pegar a instância existente ou cria uma nova
+    try:
+        instance = request.user.omie_creds
+    except OmieCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = OmieCredentialsForm(request.POST, instance=instance)
+        if form.is_valid():
+            creds = form.save(commit=False)
+            creds.user = request.user
+            if form.has_changed():
+                # Outra conta no ERP: a próxima sincronização volta a ser completa
+                creds.reiniciar_marca()
+            creds.save()
+            messages.success(request, 'Credenciais Omie salvas com sucesso!')
+            # Redireciona para a tela de importação, mantendo o fluxo das outras integrações
+            return redirect('importar_ofx')
+        else:
+            messages.error(request, 'Erro ao salvar. Verifique as chaves inseridas.')
+    else:
+        form = OmieCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_omie.html', {'form': form})
+
+
+@login_required
+@owner_required
+def configurar_cora_view(request):
+    try:
+        instance = request.user.cora_creds
+    except CoraCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = CoraCredentialsForm(request.POST, request.FILES, instance=instance)
+        
+        if form.is_valid():
+            try:
+                creds = form.save(commit=False)
+                creds.user = request.user
+                creds.is_sandbox = False 
+                creds.save() # Salva no banco e o arquivo no storage
+
+                # IMPORTANTE: Força o Django a ler o arquivo do disco/storage novamente
+                # Isso garante que o caminho do arquivo (.path) esteja disponível
+                creds.refresh_from_db()
+
+                # --- VALIDAÇÃO EM TEMPO REAL ---
+                from ..utils_cora import buscar_saldo_cora
+                
+                # Chamamos o teste
+                teste_conexao = buscar_saldo_cora(request.user)
+                
+                if 'erro' in teste_conexao:
+                    # Se deu erro, mas é uma instância nova, limpamos para não deixar lixo
+                    if instance is None:
+                        creds.delete()
+                    
+                    # Log amigável para o erro de leitura de arquivo no Render
+                    erro_msg = teste_conexao['erro']
+                    if "FileNotFound" in erro_msg or "No such file" in erro_msg:
+                        messages.error(request, "Erro de permissão no servidor: Não foi possível ler os arquivos após o upload. Verifique as configurações de storage.")
+                    else:
+                        messages.error(request, f"Erro na Cora: {erro_msg}")
+                else:
+                    messages.success(request, "Conexão com a Cora validada e configurada com sucesso!")
+                    return redirect('importar_ofx')
+
+            except Exception as e:
+                messages.error(request, f"Erro crítico no servidor: {str(e)}")
+        else:
+            messages.error(request, "Formulário inválido. Certifique-se de que os arquivos são .pem e .key.")
+    else:
+        form = CoraCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_cora.html', {'form': form})
+
+
+@login_required
+@subscription_required
+def configurar_nibo_view(request):
+    try:
+        instance = request.user.nibo_creds
+    except NiboCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = NiboCredentialsForm(request.POST, instance=instance)
+        if form.is_valid():
+            creds = form.save(commit=False)
+            creds.user = request.user
+            if form.has_changed():
+                # Outra conta no ERP: a próxima sincronização volta a ser completa
+                creds.reiniciar_marca()
+            creds.save()
+            messages.success(request, 'Credenciais Nibo salvas com sucesso!')
+            return redirect('importar_ofx')
+        else:
+            messages.error(request, 'Erro ao salvar. Verifique o token inserido.')
+    else:
+        form = NiboCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_nibo.html', {'form': form})
+
+
+@login_required
+@subscription_required
+def configurar_tiny_view(request):
+    try:
+        instance = request.user.tiny_creds
+    except TinyCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = TinyCredentialsForm(request.POST, instance=instance)
+        if form.is_valid():
+            creds = form.save(commit=False)
+            creds.user = request.user
+            if form.has_changed():
+                # Outra conta no ERP: a próxima sincronização volta a ser completa
+                creds.reiniciar_marca()
+            creds.save()
+            messages.success(request, 'Credenciais do Tiny salvas com sucesso!')
+            return redirect('importar_ofx')
+        else:
+            messages.error(request, 'Erro ao salvar. Verifique o token inserido.')
+    else:
+        form = TinyCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_tiny.html', {'form': form})
+
+
+@csrf_exempt
+def cora_webhook(request):
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            
+            # A Cora envia o tipo de evento
+            event_type = data.get('event')
+            resource = data.get('resource', {})
+            external_id = resource.get('id')
+            
+            # Log para debug no Render/Terminal
+            print(f"--- Webhook Cora: {event_type} | ID: {external_id} ---")
+
+            if event_type in ['invoice.paid', 'transaction.created']:
+                # --- CORREÇÃO DO VALOR ---
+                # Cora envia em centavos (INT). Dividimos por 100.
+                valor_centavos = int(resource.get('amount', 0))
+                valor_real = Decimal(valor_centavos) / 100
+                
+                # Exemplo: Buscando pelo ID da transação no seu sistema
+                # Ajuste 'Receita' para o nome real da sua tabela de lançamentos
+                # conta = Receita.objects.filter(id_cora=external_id).first()
+                
+                # SE VOCÊ TIVER A LÓGICA DE BAIXA AUTOMÁTICA:
+                # if conta and not conta.pago:
+                #     conta.pago = True
+                #     conta.data_pagamento = timezone.now().date()
+                #     conta.valor = valor_real
+                #     conta.descricao += " (Baixa via Webhook Cora)"
+                #     conta.save()
+                #     print(f"Conta {conta.id} baixada automaticamente.")
+
+            return HttpResponse(status=200) # Sempre retornar 200 OK
+            
+        except Exception as e:
+            logger.error(f"Erro Webhook Cora: {str(e)}")
+            return HttpResponse(status=500)
+            
+    return HttpResponse(status=405)
+
+
+@login_required
+@owner_required
+def configurar_sicredi_view(request):
+    try:
+        instance = request.user.sicredi_creds
+    except SicrediCredentials.DoesNotExist:
+        instance = None
+
+    if request.method == 'POST':
+        form = SicrediCredentialsForm(request.POST, instance=instance)
+        if form.is_valid():
+            creds = form.save(commit=False)
+            creds.user = request.user
+            creds.save()
+            
+            # Validação em tempo real (igual você faz na Cora)
+            from ..utils_sicredi import testar_conexao_sicredi
+            teste = testar_conexao_sicredi(request.user)
+            
+            if 'erro' in teste:
+                messages.error(request, f"Credenciais salvas, mas o teste falhou: {teste['erro']}")
+            else:
+                messages.success(request, 'Conexão com o Sicredi validada com sucesso!')
+                return redirect('importar_ofx')
+        else:
+            messages.error(request, 'Erro no formulário. Verifique os campos.')
+    else:
+        form = SicrediCredentialsForm(instance=instance)
+
+    return render(request, 'accounts/configurar_sicredi.html', {'form': form})
+
+
+@login_required
+def baixar_guia_sicredi_view(request):
+    from ..utils_sicredi import gerar_pdf_instrucoes_sicredi
+
+    pdf_content = gerar_pdf_instrucoes_sicredi()
+    response = HttpResponse(pdf_content, content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename="Guia_Integracao_Sicredi.pdf"'
+    return response
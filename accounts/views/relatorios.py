@@ -0,0 +1,566 @@
+# accounts/views/relatorios.py
+"""
+Relatórios: laudos em PDF, central de relatórios, tarefas em segundo plano,
+estatísticas do cache, requisições lentas e perfis de requisição.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+import os
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db.models import Sum, F
+from django.db.models.functions import TruncMonth
+from django.http import FileResponse, Http404, JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ..decorators import subscription_required, check_employee_permission
+from ..models import (
+    PayableAccount, ReceivableAccount, BankAccount, Venda, ItemVenda, Orcamento, ResumoDiario,
+    TarefaSegundoPlano, PerfilRequisicao,
+)
+from ..utils_cache import estatisticas_cache
+from ..utils_desempenho import LIMITE_CONSULTAS, LIMITE_MS, TAMANHO_BUFFER, requisicoes_lentas
+from ..utils_dre import calcular_dre_periodo
+
+
+@login_required
+@check_employee_permission('can_access_painel_financeiro')
+def gerar_laudo_financeiro(request):
+    # --- 1. Definição das Datas (Estrutura Mantida) ---
+    period = request.GET.get('period', '30')
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+
+    if period == 'custom' and start_date_str and end_date_str:
+        start_date = parse_date(start_date_str)
+        end_date = parse_date(end_date_str)
+    else:
+        end_date = datetime.today().date()
+        days = int(period) if period in ['90', '180'] else 30
+        start_date = end_date - timedelta(days=days)
+
+    # Datas do período anterior para comparação (Month-over-Month ou Period-over-Period)
+    duration = end_date - start_date
+    prev_end_date = start_date - timedelta(days=1)
+    prev_start_date = prev_end_date - duration
+
+    # --- 2. Coleta de Dados (Estrutura Mantida - Regime de Caixa, via motor da DRE) ---
+    dre_atual = calcular_dre_periodo(request.user, start_date, end_date)
+    dre_anterior = calcular_dre_periodo(request.user, prev_start_date, prev_end_date)
+
+    # PERÍODO ATUAL
+    entradas = dre_atual['entradas']
+    saidas = dre_atual['saidas']
+
+    geracao_caixa = entradas - saidas
+
+    # PERÍODO ANTERIOR
+    entradas_ant = dre_anterior['entradas']
+    saidas_ant = dre_anterior['saidas']
+
+    geracao_caixa_ant = entradas_ant - saidas_ant
+
+    # --- 3. Cálculos de Variação e KPI's (Expandido) ---
+    
+    # Variações Percentuais
+    var_entradas = 0
+    if entradas_ant > 0:
+        var_entradas = ((entradas - entradas_ant) / entradas_ant) * 100
+    
+    var_saidas = 0
+    if saidas_ant > 0:
+        var_saidas = ((saidas - saidas_ant) / saidas_ant) * 100
+
+    # Variação do Resultado Líquido
+    var_caixa = 0
+    if abs(geracao_caixa_ant) > 0:
+        var_caixa = ((geracao_caixa - geracao_caixa_ant) / abs(geracao_caixa_ant)) * 100
+
+    # Margem de Caixa (Eficiência de conversão de receita em caixa livre)
+    margem_caixa = 0
+    if entradas > 0:
+        margem_caixa = (geracao_caixa / entradas) * 100
+
+    # Gap de Crescimento (Receita vs Despesa) - Positivo indica ganho de alavancagem
+    gap_crescimento = var_entradas - var_saidas
+
+    # ... (MANTENHA TODO O CÓDIGO DAS SEÇÕES 1, 2 e 3 IGUAL AO SEU) ...
+
+    # --- 4. Geração do HTML do Laudo (ESTILO PROFISSIONAL) ---
+    
+    periodo_str = f"{start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}"
+
+    # Aqui definimos o CSS diretamente dentro da string HTML
+    # Isso garante que o PDF respeite o visual independente do JavaScript
+    style_block = """
+    <style>
+        .laudo-container {
+            font-family: 'Helvetica', 'Arial', sans-serif;
+            color: #333;
+            line-height: 1.8; /* AUMENTA O ESPAÇAMENTO ENTRE LINHAS */
+            text-align: justify;
+            font-size: 14px;
+        }
+        .laudo-header {
+            text-align: center;
+            margin-bottom: 30px;
+            border-bottom: 2px solid #2c3e50;
+            padding-bottom: 15px;
+        }
+        .laudo-header h2 {
+            margin: 0;
+            color: #fff;
+            font-size: 22px;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+        }
+        .laudo-header p {
+            color: #7f8c8d;
+            font-size: 12px;
+            margin-top: 5px;
+        }
+        .section-title {
+            color: #2c3e50;
+            margin-top: 25px;
+            margin-bottom: 15px;
+            font-size: 16px;
+            border-left: 4px solid #2980b9;
+            padding-left: 10px;
+            background-color: #f4f6f7;
+            padding-top: 5px;
+            padding-bottom: 5px;
+        }
+        .destaque-box {
+            background-color: #fdfefe;
+            border: 1px solid #bdc3c7;
+            padding: 15px;
+            border-radius: 4px;
+            margin-bottom: 20px;
+        }
+        .footer-note {
+            margin-top: 40px;
+            padding-top: 10px;
+            border-top: 1px solid #ddd;
+            font-size: 10px;
+            color: #999;
+            text-align: center;
+        }
+        /* Utilitários de cor */
+        .txt-verde { color: #27ae60; font-weight: bold; }
+        .txt-vermelho { color: #c0392b; font-weight: bold; }
+        .txt-laranja { color: #d35400; font-weight: bold; }
+        ul li { margin-bottom: 8px; }
+    </style>
+    """
+
+    # Início da construção do HTML com o container e estilos
+    laudo_html = style_block + "<div class='laudo-container'>"
+    
+    # Cabeçalho
+    laudo_html += f"""
+    <div class="laudo-header">
+        <h2>Relatório Executivo Financeiro</h2>
+        <p>Período de Análise: {periodo_str}</p>
+    </div>
+    """
+    
+    # Seção 1: Sumário Executivo
+    saldo_class = "txt-verde" if geracao_caixa >= 0 else "txt-vermelho"
+    sinal_saldo = "SUPERÁVIT" if geracao_caixa >= 0 else "DÉFICIT"
+    cor_margem = "txt-verde" if margem_caixa >= 10 else ("txt-laranja" if margem_caixa > 0 else "txt-vermelho")
+    
+    laudo_html += f"""
+    <h3 class="section-title">1. Sumário Executivo de Caixa</h3>
+    <div class="destaque-box">
+        <p>O período encerrou com um <strong>{sinal_saldo} OPERACIONAL</strong> de <span class="{saldo_class}" style="font-size: 1.2em;">R$ {geracao_caixa:,.2f}</span>.</p>
+        <ul style="list-style-type: none; padding-left: 0;">
+            <li>🔹 <strong>Entradas Totais:</strong> R$ {entradas:,.2f}</li>
+            <li>🔻 <strong>Saídas Totais:</strong> R$ {saidas:,.2f}</li>
+            <li>📊 <strong>Margem de Caixa:</strong> <span class="{cor_margem}">{margem_caixa:.1f}%</span> <small>(Eficiência de conversão em caixa)</small></li>
+        </ul>
+    </div>
+    """
+
+    # Seção 2: Análise de Tendência
+    laudo_html += '<h3 class="section-title">2. Análise de Tendência e Eficiência</h3>'
+    
+    # Lógica do texto (mantida a sua original, apenas formatada)
+    if var_entradas > 5:
+        analise_ent = f"As entradas apresentaram uma <span class='txt-verde'>expansão sólida de {var_entradas:.1f}%</span> frente ao período anterior, indicando aquecimento nas vendas ou melhora na inadimplência."
+    elif var_entradas >= -5:
+        analise_ent = f"As entradas mantiveram-se <strong>estáveis ({var_entradas:.1f}%)</strong>, sugerindo manutenção do patamar de faturamento."
+    else:
+        analise_ent = f"Houve uma <span class='txt-vermelho'>retração de {var_entradas:.1f}%</span> nas entradas. Recomendamos investigar sazonalidade ou performance comercial."
+
+    laudo_html += f"<p>{analise_ent}</p>"
+
+    if var_entradas > var_saidas:
+        laudo_html += f"""
+        <p>✅ <strong>Ganho de Alavancagem:</strong> Positivamente, as receitas cresceram acima das despesas (Gap de {gap_crescimento:.1f} p.p.). Isso demonstra diluição de custos fixos e aumento da eficiência operacional no período.</p>
+        """
+    elif var_saidas > var_entradas:
+        laudo_html += f"""
+        <p>⚠️ <strong>Atenção à Eficiência:</strong> As despesas cresceram em ritmo acelerado ({var_saidas:.1f}%), superando a variação das receitas ({var_entradas:.1f}%). É crucial auditar os custos variáveis e fixos para evitar erosão da margem.</p>
+        """
+    
+    # Seção 3: Diagnóstico
+    laudo_html += '<h3 class="section-title">3. Diagnóstico e Plano de Ação</h3>'
+
+    if geracao_caixa < 0:
+        laudo_html += """
+        <p><strong>Situação: <span class='txt-vermelho'>CONSUMO DE CAIXA (BURN RATE).</span></strong></p>
+        <p>A operação não foi capaz de se autofinanciar neste período. Dependência de capital de terceiros ou reservas.</p>
+        <p><strong>Plano Recomendado:</strong></p>
+        <ul>
+            <li>Suspender investimentos não essenciais imediatamente.</li>
+            <li>Renegociar prazos com fornecedores Curva A.</li>
+            <li>Realizar ação comercial de 'Liquidez Imediata' para antecipar recebíveis.</li>
+        </ul>
+        """
+    elif margem_caixa < 10:
+        laudo_html += f"""
+        <p><strong>Situação: <span class='txt-laranja'>EQUILÍBRIO TENSO (Margem Baixa).</span></strong></p>
+        <p>A operação é sustentável, mas vulnerável a imprevistos. A margem de {margem_caixa:.1f}% deixa pouco espaço para reinvestimento.</p>
+        <p><strong>Plano Recomendado:</strong></p>
+        <ul>
+            <li>Focar em produtos/serviços de maior margem de contribuição.</li>
+            <li>Revisar contratos recorrentes em busca de saving de 5-10%.</li>
+            <li>Evitar novas dívidas de curto prazo.</li>
+        </ul>
+        """
+    else:
+        laudo_html += f"""
+        <p><strong>Situação: <span class='txt-verde'>SOLIDEZ FINANCEIRA (Alta Liquidez).</span></strong></p>
+        <p>Excelente performance com geração de caixa de {margem_caixa:.1f}%. A empresa demonstra capacidade de investimento sem comprometer o fluxo.</p>
+        <p><strong>Plano Recomendado:</strong></p>
+        <ul>
+            <li>Constituir ou reforçar reserva de emergência (mínimo 3 meses de custo fixo).</li>
+            <li>Avaliar antecipação de pagamentos com desconto junto a fornecedores.</li>
+            <li>Planejar investimentos estratégicos para expansão (CAPEX).</li>
+        </ul>
+        """
+
+    # Rodapé e Fechamento do Container
+    laudo_html += """
+        <div class="footer-note">
+            <p>Relatório gerado via Inteligência de Dados Financlass. Base de cálculo: Movimentações financeiras efetivamente liquidadas (Regime de Caixa).</p>
+        </div>
+    </div>
+    """
+
+    return JsonResponse({'laudo_html': laudo_html})
+
+
+@login_required
+@check_employee_permission('can_access_painel_vendas')
+def gerar_laudo_comercial(request):
+    # 1. PEGAR OS FILTROS DE PERÍODO (código similar ao da view de faturamento)
+    period = request.GET.get('period', 'all')
+    start_date_str = request.GET.get('start_date')
+    end_date_str = request.GET.get('end_date')
+    
+    today = timezone.now().date()
+    vendas_filtradas = Venda.objects.filter(user=request.user)
+
+    if period == 'custom' and start_date_str and end_date_str:
+        start_date = parse_date(start_date_str)
+        end_date = parse_date(end_date_str)
+        vendas_filtradas = vendas_filtradas.filter(data_venda__date__range=[start_date, end_date])
+    elif period.isdigit():
+        days = int(period)
+        end_date = today
+        start_date = end_date - timedelta(days=days)
+        vendas_filtradas = vendas_filtradas.filter(data_venda__date__range=[start_date, end_date])
+    else: # 'all'
+        try:
+            start_date = Venda.objects.filter(user=request.user).earliest('data_venda').data_venda.date()
+        except Venda.DoesNotExist:
+            start_date = today
+        end_date = today
+
+    # 2. CALCULAR MÉTRICAS COMERCIAIS
+    total_vendido = vendas_filtradas.aggregate(total=Sum('valor_total_liquido'))['total'] or Decimal('0')
+    qtd_vendas = vendas_filtradas.count()
+    ticket_medio = total_vendido / qtd_vendas if qtd_vendas > 0 else Decimal('0')
+    
+    top_produtos = ItemVenda.objects.filter(venda__in=vendas_filtradas).values('produto__nome').annotate(valor=Sum(F('quantidade') * F('preco_unitario'))).order_by('-valor')[:3]
+    top_clientes = vendas_filtradas.values('cliente__nome').annotate(valor_total=Sum('valor_total_liquido')).order_by('-valor_total')[:3]
+    top_vendedores = vendas_filtradas.filter(vendedor__isnull=False).values('vendedor__nome').annotate(valor_vendas=Sum('valor_total_liquido')).order_by('-valor_vendas')[:3]
+
+    # 3. GERAR O TEXTO DO LAUDO
+    periodo_str = f"{start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}"
+    laudo_html = f"<h2>Laudo Comercial<br><small>Período {periodo_str}</small></h2><hr>"
+    laudo_html += "<h3><strong>Análise Sintética e Recomendações</strong></h3>"
+
+    # Seção 1: Desempenho Geral
+    laudo_html += "<h4>📈 1. Desempenho Geral de Vendas</h4>"
+    laudo_html += f"<p><strong>Situação:</strong> No período analisado, o faturamento total foi de R$ {total_vendido:,.2f}, realizado através de {qtd_vendas} vendas, resultando em um ticket médio de R$ {ticket_medio:,.2f}.</p>"
+    if ticket_medio > 500: # Exemplo de condição
+        laudo_html += "<p><strong>Recomendação:</strong> ✅ Seu ticket médio é robusto. Continue focando em estratégias de up-sell e cross-sell para mantê-lo ou aumentá-lo.</p>"
+    else:
+        laudo_html += "<p><strong>Recomendação:</strong> 💡 O ticket médio pode ser otimizado. Avalie a criação de kits de produtos, ofertas 'compre junto' ou programas de fidelidade para incentivar compras de maior valor.</p>"
+
+    # Seção 2: Análise de Produtos
+    produtos_str = ", ".join([p['produto__nome'] for p in top_produtos]) or "N/A"
+    laudo_html += "<h4>📦 2. Análise de Produtos e Serviços</h4>"
+    laudo_html += f"<p><strong>Destaques:</strong> Seus produtos/serviços de maior faturamento foram: {produtos_str}.</p>"
+    laudo_html += "<p><strong>Recomendação:</strong> 🚀 Destaque seus produtos campeões em campanhas de marketing. Para os demais, considere promoções ou revise a estratégia de precificação para aumentar a saída.</p>"
+
+    # Seção 3: Análise de Clientes
+    clientes_str = ", ".join([c['cliente__nome'] for c in top_clientes]) or "N/A"
+    laudo_html += "<h4>👥 3. Análise de Clientes</h4>"
+    laudo_html += f"<p><strong>Destaques:</strong> Seus principais clientes por faturamento foram: {clientes_str}.</p>"
+    laudo_html += "<p><strong>Recomendação:</strong> 🎯 Fortaleça o relacionamento com seus clientes-chave. Um contato pós-venda ou uma oferta exclusiva pode garantir a recorrência e a fidelidade.</p>"
+
+    # Seção 4: Análise de Vendedores
+    if top_vendedores:
+        vendedores_str = ", ".join([v['vendedor__nome'] for v in top_vendedores]) or "N/A"
+        laudo_html += "<h4>🏆 4. Análise de Vendedores</h4>"
+        laudo_html += f"<p><strong>Destaques:</strong> Seus vendedores com melhor desempenho no período foram: {vendedores_str}.</p>"
+        laudo_html += "<p><strong>Recomendação:</strong> 👏 Reconheça o bom desempenho dos seus top vendedores. Analise suas estratégias e compartilhe as melhores práticas com o restante da equipe para nivelar o time por cima.</p>"
+
+    # Conclusão
+    laudo_html += "<h4><strong>Conclusão e Próximos Passos</strong></h4>"
+    laudo_html += "<p>A análise comercial indica uma base sólida de produtos e clientes. O foco agora deve ser em aumentar o ticket médio e replicar as estratégias de sucesso dos principais vendedores para toda a equipe. Monitore a performance dos produtos de menor saída e crie ações para impulsioná-los.</p>"
+
+    return JsonResponse({'laudo_html': laudo_html})
+
+
+@login_required
+@subscription_required
+def relatorios_view(request):
+    from ..utils_exports import (
+        gerar_excel_generic, gerar_pdf_generic, gerar_excel_orcamento, gerar_pdf_orcamento, gerar_excel_dre,
+        gerar_pdf_dre, gerar_excel_fluxo_caixa, gerar_pdf_fluxo_caixa,
+    )
+
+    if request.method == 'POST' or request.GET.get('gerar'):
+        tipo = request.GET.get('tipo') or request.POST.get('tipo')
+        formato = request.GET.get('formato') or request.POST.get('formato')
+        start_date_str = request.GET.get('start_date') or request.POST.get('start_date')
+        end_date_str = request.GET.get('end_date') or request.POST.get('end_date')
+        
+        # Define datas padrão se não vierem
+        if not start_date_str or not end_date_str:
+            hj = datetime.now().date()
+            start_date = hj.replace(day=1)
+            end_date = hj
+        else:
+            start_date = parse_date(start_date_str)
+            end_date = parse_date(end_date_str)
+
+        periodo_label = f"{start_date.strftime('%d/%m/%Y')} a {end_date.strftime('%d/%m/%Y')}"
+
+        # --- DRE GERENCIAL ---
+        if tipo == 'dre':
+            # Mesma DRE (Regime de Caixa) do Dashboard, calculada pelo motor único
+            dados_dre = calcular_dre_periodo(request.user, start_date, end_date)
+
+            if formato == 'pdf': return gerar_pdf_dre(dados_dre, periodo_label)
+            elif formato == 'excel': return gerar_excel_dre(dados_dre, periodo_label)
+
+        # --- FLUXO DE CAIXA ---
+        elif tipo == 'fluxo_caixa':
+            # Agrupa por mês dentro do período selecionado
+            entradas_qs = ResumoDiario.objects.filter(
+                user=request.user, tipo='RECEIVABLE', liquidado=True, dia__range=[start_date, end_date]
+            ).exclude(dre_area='NAO_CONSTAR').annotate(month=TruncMonth('dia')).values('month').annotate(total=Sum('total')).order_by('month')
+
+            saidas_qs = ResumoDiario.objects.filter(
+                user=request.user, tipo='PAYABLE', liquidado=True, dia__range=[start_date, end_date]
+            ).exclude(dre_area='NAO_CONSTAR').annotate(month=TruncMonth('dia')).values('month').annotate(total=Sum('total')).order_by('month')
+
+            # Organiza os dados em dicionários por mês
+            entradas_dict = {e['month'].strftime('%b/%Y'): float(e['total']) for e in entradas_qs}
+            saidas_dict = {s['month'].strftime('%b/%Y'): float(s['total']) for s in saidas_qs}
+
+            # Cria lista unificada de todos os meses que têm dados
+            todos_meses = sorted(list(set(list(entradas_dict.keys()) + list(saidas_dict.keys()))), 
+                                 key=lambda x: datetime.strptime(x, '%b/%Y'))
+
+            labels = []
+            lista_entradas = []
+            lista_saidas = []
+            lista_saldos = []
+
+            # Se não houver dados, cria pelo menos uma entrada vazia
+            if not todos_meses:
+                labels = ["Sem dados"]
+                lista_entradas = [0]
+                lista_saidas = [0]
+                lista_saldos = [0]
+            else:
+                for mes in todos_meses:
+                    ent = entradas_dict.get(mes, 0)
+                    sai = saidas_dict.get(mes, 0)
+                    labels.append(mes)
+                    lista_entradas.append(ent)
+                    lista_saidas.append(sai)
+                    lista_saldos.append(ent - sai)
+
+            dados_fc = {
+                'labels': labels,
+                'entradas': lista_entradas,
+                'saidas': lista_saidas,
+                'geracao_caixa': lista_saldos
+            }
+
+            if formato == 'pdf': return gerar_pdf_fluxo_caixa(dados_fc, periodo_label)
+            elif formato == 'excel': return gerar_excel_fluxo_caixa(dados_fc, periodo_label)
+
+        # --- ORÇAMENTO ANUAL ---
+        elif tipo == 'orcamento':
+            # (Mantém a lógica que já criamos para Orçamento...)
+            try:
+                ano = start_date.year
+            except:
+                ano = datetime.now().year
+            
+            # ... (Copie/Mantenha a lógica de coleta de dados do orçamento aqui) ...
+            # Para economizar espaço na resposta, estou assumindo que o código anterior 
+            # do orçamento permanece aqui.
+            
+            # 1. Busca dados do Banco
+            orcamentos = Orcamento.objects.filter(user=request.user, mes_ano__year=ano)
+            realizado_pagar = ResumoDiario.objects.filter(user=request.user, tipo='PAYABLE', liquidado=True, dia__year=ano).annotate(month=TruncMonth('dia')).values('category__name', 'month').annotate(total=Sum('total'))
+            realizado_receber = ResumoDiario.objects.filter(user=request.user, tipo='RECEIVABLE', liquidado=True, dia__year=ano).annotate(month=TruncMonth('dia')).values('category__name', 'month').annotate(total=Sum('total'))
+
+            revenue_data = defaultdict(lambda: {'orcado_mensal': [Decimal(0)]*12, 'realizado_mensal': [Decimal(0)]*12})
+            for o in orcamentos:
+                if o.category and o.category.category_type == 'RECEIVABLE': revenue_data[o.category.name]['orcado_mensal'][o.mes_ano.month - 1] += o.valor_orcado
+            for r in realizado_receber:
+                if r['category__name']: revenue_data[r['category__name']]['realizado_mensal'][r['month'].month - 1] += r['total']
+
+            expense_data = defaultdict(lambda: {'orcado_mensal': [Decimal(0)]*12, 'realizado_mensal': [Decimal(0)]*12})
+            for o in orcamentos:
+                if o.category and o.category.category_type == 'PAYABLE': expense_data[o.category.name]['orcado_mensal'][o.mes_ano.month - 1] += o.valor_orcado
+            for p in realizado_pagar:
+                if p['category__name']: expense_data[p['category__name']]['realizado_mensal'][p['month'].month - 1] += p['total']
+
+            for d in revenue_data.values(): d['total_orcado_ano'] = sum(d['orcado_mensal']); d['total_realizado_ano'] = sum(d['realizado_mensal'])
+            for d in expense_data.values(): d['total_orcado_ano'] = sum(d['orcado_mensal']); d['total_realizado_ano'] = sum(d['realizado_mensal'])
+
+            dados_consolidados = {'receitas': dict(revenue_data), 'despesas': dict(expense_data)}
+
+            if formato == 'pdf': return gerar_pdf_orcamento(dados_consolidados, ano)
+            elif formato == 'excel': return gerar_excel_orcamento(dados_consolidados, ano)
+
+
+        # --- LÓGICA PADRÃO (Contas a Pagar/Receber) ---
+        status = request.GET.get('status') or request.POST.get('status')
+        bank_id = request.GET.get('bank') or request.POST.get('bank')
+
+        queryset = None
+        if tipo == 'pagar':
+            queryset = PayableAccount.objects.filter(user=request.user).order_by('due_date')
+            if status == 'aberto': queryset = queryset.filter(is_paid=False)
+            elif status == 'pago': queryset = queryset.filter(is_paid=True)
+        else: # receber
+            queryset = ReceivableAccount.objects.filter(user=request.user).order_by('due_date')
+            if status == 'aberto': queryset = queryset.filter(is_received=False)
+            elif status == 'recebido': queryset = queryset.filter(is_received=True)
+
+        if start_date: queryset = queryset.filter(due_date__gte=start_date)
+        if end_date: queryset = queryset.filter(due_date__lte=end_date)
+        if bank_id: queryset = queryset.filter(bank_account_id=bank_id)
+
+        if formato == 'pdf': return gerar_pdf_generic(queryset, tipo)
+        elif formato == 'excel': return gerar_excel_generic(queryset, tipo)
+
+    user_banks = BankAccount.objects.filter(user=request.user)
+    return render(request, 'accounts/relatorios.html', {'user_banks': user_banks})
+
+
+@login_required
+def cache_stats_view(request):
+    """ Contadores de acerto/erro do cache de resultados dos dashboards (somente superusuários). """
+    if not request.real_user.is_superuser:
+        return JsonResponse({'status': 'error', 'message': 'Acesso negado'}, status=403)
+    return JsonResponse(estatisticas_cache())
+
+
+@login_required
+def requisicoes_lentas_view(request):
+    """ Requisições lentas guardadas por este processo (somente superusuários; ?formato=json). """
+    if not request.real_user.is_superuser:
+        return JsonResponse({'status': 'error', 'message': 'Acesso negado'}, status=403)
+
+    requisicoes = requisicoes_lentas()
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({'requisicoes': requisicoes})
+    return render(request, 'accounts/requisicoes_lentas.html', {
+        'requisicoes': requisicoes,
+        'limite_ms': getattr(settings, 'DESEMPENHO_LIMITE_MS', LIMITE_MS),
+        'limite_consultas': getattr(settings, 'DESEMPENHO_LIMITE_CONSULTAS', LIMITE_CONSULTAS),
+        'tamanho_buffer': getattr(settings, 'DESEMPENHO_TAMANHO_BUFFER', TAMANHO_BUFFER),
+    })
+
+
+@login_required
+def perfis_view(request):
+    """ Perfis gravados com ?_perfil=1 / X-Perfil (somente superusuários). """
+    if not request.real_user.is_superuser:
+        return JsonResponse({'status': 'error', 'message': 'Acesso negado'}, status=403)
+    perfis = PerfilRequisicao.objects.select_related('solicitante', 'tenant').defer('consultas')[:50]
+    return render(request, 'accounts/perfis.html', {'perfis': perfis})
+
+
+@login_required
+def perfil_download_view(request, perfil_id):
+    """ Download do arquivo .prof (python -m pstats / snakeviz). """
+    if not request.real_user.is_superuser:
+        raise Http404("Perfil não encontrado.")
+    perfil = get_object_or_404(PerfilRequisicao, pk=perfil_id)
+    if not perfil.arquivo:
+        raise Http404("Arquivo não disponível.")
+    return FileResponse(perfil.arquivo.open('rb'), as_attachment=True, filename=os.path.basename(perfil.arquivo.name))
+
+
+@login_required
+def perfil_sql_view(request, perfil_id):
+    """ Consultas SQL do perfil, em JSON, como anexo. """
+    if not request.real_user.is_superuser:
+        raise Http404("Perfil não encontrado.")
+    perfil = get_object_or_404(PerfilRequisicao, pk=perfil_id)
+    response = JsonResponse({
+        'caminho': perfil.caminho,
+        'total_consultas': perfil.total_consultas,
+        'sql_ms': perfil.sql_ms,
+        'consultas': perfil.consultas,
+    }, json_dumps_params={'ensure_ascii': False, 'indent': 2})
+    response['Content-Disposition'] = f'attachment; filename="perfil_{perfil.pk}_sql.json"'
+    return response
+
+
+@login_required
+def tarefa_status_view(request, tarefa_id):
+    """ Estado de uma tarefa em segundo plano do tenant, consultado pela tela (polling). """
+    tarefa = get_object_or_404(TarefaSegundoPlano, pk=tarefa_id, user=request.user)
+    resultado = tarefa.resultado or {}
+    return JsonResponse({
+        'id': tarefa.pk,
+        'tipo': tarefa.tipo,
+        'status': tarefa.status,
+        'status_display': tarefa.get_status_display(),
+        'finalizada': tarefa.finalizada,
+        'progresso': tarefa.progresso,
+        'mensagem': tarefa.mensagem,
+        'tentativas': tarefa.tentativas,
+        'mensagens': resultado.get('mensagens', []),
+        'download_url': reverse('tarefa_download', args=[tarefa.pk]) if tarefa.arquivo else None,
+    })
+
+
+@login_required
+def tarefa_download_view(request, tarefa_id):
+    """ Download do arquivo gerado por uma tarefa (exportações grandes). """
+    tarefa = get_object_or_404(TarefaSegundoPlano, pk=tarefa_id, user=request.user)
+    if not tarefa.arquivo:
+        raise Http404("Arquivo não disponível.")
+    return FileResponse(tarefa.arquivo.open('rb'), as_attachment=True, filename=os.path.basename(tarefa.arquivo.name))
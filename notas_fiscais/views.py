@@ -1,6 +1,6 @@
 
 
-import requests
+from accounts.utils_http import requisitar
 import re
 from collections import OrderedDict
 
@@ -221,7 +221,7 @@ def consultar_nota_view(request, nota_id):
         # 2. SE FOR ID DE PAGAMENTO (pay_), BUSCA A NOTA VINCULADA
         if current_id.startswith('pay_'):
             url_v = f"{service.base_url}/payments/{current_id}/invoices"
-            res_v = requests.get(url_v, headers=headers, timeout=service.timeout)
+            res_v = requisitar('asaas', 'GET', url_v, headers=headers, timeout=service.timeout)
             # Proteção contra erro de decodificação
             dados_v = service.safe_json(res_v)
             
@@ -241,7 +241,7 @@ def consultar_nota_view(request, nota_id):
 
         # 3. CONSULTA OS DETALHES DA NOTA REAL (inv_...)
         url_f = f"{service.base_url}/invoices/{current_id}"
-        response = requests.get(url_f, headers=headers, timeout=service.timeout)
+        response = requisitar('asaas', 'GET', url_f, headers=headers, timeout=service.timeout)
         dados = service.safe_json(response)
         
         # AQUI ESTÁ A PROTEÇÃO: Só processamos se o status for 200 e for um JSON válido
@@ -10,7 +10,7 @@ from django.db import transaction
 from django.db.models import F, Q
 from django.utils import timezone
 from django.db.models import Sum, Q
-import requests
+from accounts.utils_http import requisitar
 from django.conf import settings
 from notas_fiscais.models import NotaFiscal # Seu model de notas
 from accounts.decorators import check_employee_permission
@@ -363,7 +363,7 @@ def emitir_nfce_pdv(request, venda_id):
 
         # 7. Envia para a API (POST)
         url = f"{BASE_URL}/v2/nfce?ref={nota.id}" # ?ref ajuda a Focus a evitar duplicidade
-        response = requests.post(url, json=dados_nfce, auth=(API_TOKEN, ""))
+        response = requisitar('focus', 'POST', url, json=dados_nfce, auth=(API_TOKEN, ""))
         
         resp_data = response.json()
         
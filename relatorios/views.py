@@ -3,8 +3,10 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum
+from django.db.models.functions import ExtractDay, ExtractMonth
 from django.utils import timezone
 from accounts.models import PayableAccount, ReceivableAccount
+from accounts.utils_cache import valor_em_cache
 import calendar # <--- Adicione isso junto com os outros imports
 # O login_required vem direto do Django
 from django.contrib.auth.decorators import login_required 
@@ -12,16 +14,24 @@ from django.contrib.auth.decorators import login_required
 # Os outros vêm do seu arquivo de decorators customizados
 from accounts.decorators import subscription_required, check_employee_permission, module_access_required
 
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+# openpyxl e xhtml2pdf são importados dentro das views de exportação (pesados para o boot)
 from django.http import HttpResponse
 from django.template.loader import render_to_string
-from xhtml2pdf import pisa
 from django.template.loader import get_template # Certifique-se de ter este import também
 # ... mantenha seus outros imports (login_required, etc) ...
 
 # --- FUNÇÃO AUXILIAR (Extrai a lógica para ser usada na Tela, Excel e PDF) ---
 def _processar_dados_fluxo(request, ano_atual, mes_atual, view_mode, status_view):
+    # Tela, Excel e PDF gerados em sequência reaproveitam o cálculo; a chave leva a
+    # versão do ledger, então qualquer conta criada/editada/paga invalida a matriz
+    parametros = (ano_atual, mes_atual if view_mode == 'diario' else 0, view_mode, status_view)
+    return valor_em_cache(
+        request.user.id, 'fluxo_analitico', parametros,
+        lambda: _calcular_dados_fluxo(request.user, ano_atual, mes_atual, view_mode, status_view),
+    )
+
+
+def _calcular_dados_fluxo(user, ano_atual, mes_atual, view_mode, status_view):
     # 1. Definir Colunas
     if view_mode == 'diario':
         _, num_dias = calendar.monthrange(ano_atual, mes_atual)
@@ -31,12 +41,12 @@ def _processar_dados_fluxo(request, ano_atual, mes_atual, view_mode, status_view
         colunas_ids = range(1, 13)
         colunas_labels = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
 
-    # 2. Função interna de processamento
+    # 2. Função interna de processamento: UMA consulta agrupada (nome x coluna) por modelo, pivotada em memória
     def processar_modelo(modelo, is_field):
         campo_data = 'payment_date' if status_view == 'realizado' else 'due_date'
         
         filtro_base = {
-            'user': request.user,
+            'user': user,
             f'{campo_data}__year': ano_atual
         }
         
@@ -45,27 +55,32 @@ def _processar_dados_fluxo(request, ano_atual, mes_atual, view_mode, status_view
 
         if view_mode == 'diario':
             filtro_base[f'{campo_data}__month'] = mes_atual
+            extrair_coluna = ExtractDay(campo_data)
+        else:
+            extrair_coluna = ExtractMonth(campo_data)
+
+        celulas = (
+            modelo.objects.filter(**filtro_base)
+            .annotate(coluna=extrair_coluna)
+            .values('name', 'coluna')
+            .annotate(total=Sum('amount'))
+            .order_by('name')
+        )
+
+        matriz = {}
+        for celula in celulas:
+            matriz.setdefault(celula['name'], {})[celula['coluna']] = celula['total'] or 0
 
-        nomes = modelo.objects.filter(**filtro_base).values_list('name', flat=True).distinct().order_by('name')
-        
         dados = []
         totais_coluna = {c: 0 for c in colunas_ids}
         total_geral_ano = 0
 
-        for nome in nomes:
+        for nome, valores_nome in matriz.items():
             valores_periodo = []
             total_linha = 0
             
             for col in colunas_ids:
-                filtro_celula = filtro_base.copy()
-                filtro_celula['name'] = nome
-                
-                if view_mode == 'diario':
-                    filtro_celula[f'{campo_data}__day'] = col
-                else:
-                    filtro_celula[f'{campo_data}__month'] = col
-
-                valor = modelo.objects.filter(**filtro_celula).aggregate(Sum('amount'))['amount__sum'] or 0
+                valor = valores_nome.get(col, 0)
                 
                 valores_periodo.append(valor)
                 total_linha += valor
@@ -132,6 +147,9 @@ def fluxo_caixa_analitico(request):
 # --- VIEW EXPORTAR EXCEL ---
 @login_required
 def exportar_fluxo_excel(request):
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
     # Pega os mesmos parâmetros da tela
     ano_get = request.GET.get('ano', str(timezone.now().year))
     try:
@@ -209,6 +227,8 @@ def exportar_fluxo_excel(request):
 # --- VIEW EXPORTAR PDF (Versão xhtml2pdf - Compatível com Windows) ---
 @login_required
 def exportar_fluxo_pdf(request):
+    from xhtml2pdf import pisa
+
     # Mesma lógica de parâmetros
     ano_get = request.GET.get('ano', str(timezone.now().year))
     try:
@@ -56,11 +56,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'accounts.middleware.DesempenhoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'accounts.middleware.BPOManagementMiddleware',
+    'accounts.middleware.PerfilMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +81,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'accounts.context_processors.global_announcement',
                 'accounts.context_processors.employee_context',
+                'accounts.context_processors.tenant_values',
             ],
         },
     },
@@ -128,6 +131,51 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # Os índices "covering" (INCLUDE) do ledger só existem no PostgreSQL; no SQLite local
+    # as colunas extras são ignoradas, então só aqui o aviso models.W040 não se aplica.
+    SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+# ==================================================================
+#  CACHE (Redis em produção, memória local no desenvolvimento)
+# ==================================================================
+# Usa o mesmo Redis do channels_redis quando REDIS_URL estiver definido (Render)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'sistemclass',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sistemclass-local',
+        }
+    }
+
+# Tempo máximo (segundos) que os resultados dos dashboards ficam em cache.
+# A invalidação normal acontece pela versão do ledger de cada cliente.
+RESULTADO_CACHE_TIMEOUT = int(os.environ.get('RESULTADO_CACHE_TIMEOUT', '300'))
+
+# Fila de tarefas em segundo plano (accounts/utils_tarefas.py, comando run_task_worker)
+# Máximo de tarefas simultâneas por cliente (tenant).
+TAREFAS_POR_TENANT = int(os.environ.get('TAREFAS_POR_TENANT', '1'))
+# Base (segundos) do backoff exponencial entre tentativas.
+TAREFAS_BACKOFF_BASE = int(os.environ.get('TAREFAS_BACKOFF_BASE', '30'))
+# Tarefa "executando" sem heartbeat por mais que isso (segundos) volta para a fila,
+# a menos que o processo do worker ainda exista (verificado quando está no mesmo host).
+TAREFAS_TIMEOUT = int(os.environ.get('TAREFAS_TIMEOUT', '1800'))
+# Sem worker (desenvolvimento), executa a tarefa na própria requisição.
+TAREFAS_EXECUTAR_NA_HORA = os.environ.get('TAREFAS_EXECUTAR_NA_HORA', 'False').lower() == 'true'
+
+# Medição por requisição (accounts/utils_desempenho.py, DesempenhoMiddleware)
+# Requisições acima destes limites ficam no buffer de admin-tools/requisicoes-lentas/.
+DESEMPENHO_LIMITE_MS = int(os.environ.get('DESEMPENHO_LIMITE_MS', '1000'))
+DESEMPENHO_LIMITE_CONSULTAS = int(os.environ.get('DESEMPENHO_LIMITE_CONSULTAS', '50'))
+# Quantas requisições lentas cada processo guarda (as mais antigas são descartadas).
+DESEMPENHO_TAMANHO_BUFFER = int(os.environ.get('DESEMPENHO_TAMANHO_BUFFER', '200'))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators